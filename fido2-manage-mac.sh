@@ -65,6 +65,7 @@ reset=false
 uvs=false
 uvd=false
 fingerprint=false
+dryRun=false
 forcePINchange=false
 setMinimumPIN=""
 help=false
@@ -92,6 +93,7 @@ while [[ "$#" -gt 0 ]]; do
         -reset) reset=true ;;
         -uvs) uvs=true ;;
         -uvd) uvd=true ;;
+        -dryRun) dryRun=true ;;
         -forcePINchange) forcePINchange=true ;;
         -setMinimumPIN) setMinimumPIN="$2"; shift ;;
         -help) help=true ;;
@@ -110,7 +112,7 @@ This is a wrapper for libfido2 library - modified for macOS
 
 (c) Token2 Sarl
 
-Usage: fido2-manage [-list] [-info -device <number>] [-storage -device <number>] [-residentKeys -device <number> -domain <domain>] [-uvs] [-uvd] [-delete -device <number> -credential <credential>] [-forcePINchange -device <number>] [-setMinimumPIN <min> -device <number>] [-help]
+Usage: fido2-manage [-list] [-info -device <number>] [-storage -device <number>] [-residentKeys -device <number> -domain <domain>] [-uvs] [-uvd] [-dryRun] [-delete -device <number> -credential <credential>] [-forcePINchange -device <number>] [-setMinimumPIN <min> -device <number>] [-help]
 
 Examples:
 - List available devices:
@@ -131,6 +133,10 @@ Examples:
 - Disable enforcing user verification to be always requested on a specific device:
   fido2-manage -uvd -device 1
 
+- Show which configuration changes would be applied, without applying them
+  (combine with -uvs, -uvd, -forcePINchange or -setMinimumPIN; settings already in place are skipped):
+  fido2-manage -uvs -dryRun -device 1
+
 - Sets PIN of a specific device:
   fido2-manage -setPIN -device 1
 
@@ -244,25 +250,25 @@ if [[ -n $device ]]; then
 
     if $uvs; then
         show_message "Enforcing user verification."
-        "$FIDO2_TOKEN_CMD" -Su "$device_string"
+        "$FIDO2_TOKEN_CMD" -Su $($dryRun && echo "-x") "$device_string"
         exit 0
     fi
 
     if $uvd; then
         show_message "Disabling user verification."
-        "$FIDO2_TOKEN_CMD" -Du "$device_string"
+        "$FIDO2_TOKEN_CMD" -Du $($dryRun && echo "-x") "$device_string"
         exit 0
     fi
 
     if $forcePINchange; then
         show_message "Forcing PIN change on device $device"
-        "$FIDO2_TOKEN_CMD" -S -f "$device_string"
+        "$FIDO2_TOKEN_CMD" -S -f $($dryRun && echo "-x") "$device_string"
         exit 0
     fi
 
     if [[ -n $setMinimumPIN ]]; then
         show_message "Setting minimum PIN length to $setMinimumPIN on device $device"
-        "$FIDO2_TOKEN_CMD" -S -l "$setMinimumPIN" "$device_string"
+        "$FIDO2_TOKEN_CMD" -S -l "$setMinimumPIN" $($dryRun && echo "-x") "$device_string"
         exit 0
     fi
 
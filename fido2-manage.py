@@ -0,0 +1,8 @@
+#!/usr/bin/env python3
+"""fido2-manage.sh, without the shell pipeline. See fido2manage/cli.py."""
+
+import sys
+
+from fido2manage.cli import main
+
+sys.exit(main())
@@ -18,6 +18,7 @@ uvs=false
 uvd=false
 setMinimumPIN=""
 fingerprint=false
+dryRun=false
 help=false
 
 show_message() {
@@ -44,6 +45,7 @@ while [[ "$#" -gt 0 ]]; do
         -setMinimumPIN) setMinimumPIN="$2"; shift ;;
         -uvs) uvs=true ;;
         -uvd) uvd=true ;;
+        -dryRun) dryRun=true ;;
         -help) help=true ;;
         *) show_message "Unknown parameter: $1" "Error"; exit 1 ;;
     esac
@@ -59,7 +61,7 @@ This is a wrapper for libfido2 library
 
 (c) Token2 Sarl
 
-Usage: ./fido2-manage.sh [-list] [-info -device <number>] [-storage -device <number>] [-residentKeys -device <number> -domain <domain>] [-uvs] [-uvd] [-delete -device <number> -credential <credential>] [-help]
+Usage: ./fido2-manage.sh [-list] [-info -device <number>] [-storage -device <number>] [-residentKeys -device <number> -domain <domain>] [-uvs] [-uvd] [-dryRun] [-delete -device <number> -credential <credential>] [-help]
 
 Examples:
 - List available devices:
@@ -80,13 +82,19 @@ Examples:
 - Disable enforcing user verification to be always requested on a specific device:
   ./fido2-manage.sh -uvd -device 1
 
+- Show which configuration changes would be applied, without applying them
+  (combine with -uvs, -uvd or -setMinimumPIN; settings already in place are skipped):
+  ./fido2-manage.sh -uvs -dryRun -device 1
+
 - Sets PIN of a specific device:
   ./fido2-manage.sh -setPIN -device 1
 
 - Enrolls a fingerprint to a specific device (biometric models only, simplified method - does not allow deleting fingerprints):
   ./fido2-manage.sh -fingerprint -device 1
+  With -pin, each sample's status is printed as it is taken, without prompting:
+  ./fido2-manage.sh -fingerprint -device 1 -pin 1234
 
-- Perform a factory reset on a specific device:
+- Perform a factory reset on a specific device (after confirming, re-plug the key; the reset is sent as soon as it is back):
   ./fido2-manage.sh -reset -device 1
 
 - Change PIN of a specific device:
@@ -144,7 +152,13 @@ if [[ -n $device ]]; then
     if $reset; then
         show_message "WARNING: Factory reset will remove all data and settings of the device, including its PIN, fingerprints, and passkeys stored. The factory reset process is irreversible. Are you sure you want to proceed? (Y/N)"
         read -r confirmation
-        if [[ $confirmation =~ [Yy] ]]; then
+        script_dir=$(dirname "$(readlink -f "$0")")
+        if [[ $confirmation =~ [Yy] ]] && [[ -d $script_dir/fido2manage ]] && command -v python3 >/dev/null; then
+            # Armed on the key: the reset is sent the moment it is re-plugged,
+            # well inside its 10-second window.
+            PYTHONPATH="$script_dir" python3 -m fido2manage.reset -device "$device_string"
+            exit $?
+        elif [[ $confirmation =~ [Yy] ]]; then
             show_message "Touch or press the security key button when it starts blinking."
             output=$($FIDO2_TOKEN_CMD -R "$device_string" 2>&1)
             if [[ $output == *"FIDO_ERR_NOT_ALLOWED"* ]]; then
@@ -166,13 +180,13 @@ if [[ -n $device ]]; then
 
     if $uvs; then
         show_message "Enforcing user verification."
-        $FIDO2_TOKEN_CMD -Su "$device_string"
+        $FIDO2_TOKEN_CMD -Su $($dryRun && echo "-x") "$device_string"
         exit 0
     fi
 
     if $uvd; then
         show_message "Disabling user verification."
-        $FIDO2_TOKEN_CMD -Du "$device_string"
+        $FIDO2_TOKEN_CMD -Du $($dryRun && echo "-x") "$device_string"
         exit 0
     fi
 
@@ -184,7 +198,7 @@ if [[ -n $device ]]; then
 
     if [[ -n $setMinimumPIN ]]; then
         show_message "Setting minimum PIN length to $setMinimumPIN on device $device"
-        "$FIDO2_TOKEN_CMD" -S -l "$setMinimumPIN" "$device_string"
+        "$FIDO2_TOKEN_CMD" -S -l "$setMinimumPIN" $($dryRun && echo "-x") "$device_string"
         if [ $? -ne 0 ]; then
             show_message "Error: Failed to set minimum PIN length." "Error"
             exit 1
@@ -206,8 +220,15 @@ if [[ -n $device ]]; then
 
     if $fingerprint; then
         echo "Enrolling fingerprints (for bio models only)"
-        $FIDO2_TOKEN_CMD -S -e "$device_string" $([[ -n $pin ]] && echo "-w $pin")
-        exit 0
+        # With the PIN given, enroll in process: one line per sample as it
+        # is taken, and no terminal needed. Otherwise fido2-token2 asks.
+        script_dir=$(dirname "$(readlink -f "$0")")
+        if [[ -n $pin ]] && [[ -d $script_dir/fido2manage ]] && command -v python3 >/dev/null; then
+            FIDO2_PIN="$pin" PYTHONPATH="$script_dir" python3 -m fido2manage.enroll -device "$device_string"
+        else
+            $FIDO2_TOKEN_CMD -S -e "$device_string" $([[ -n $pin ]] && echo "-w $pin")
+        fi
+        exit $?
     fi
 
     if $storage; then
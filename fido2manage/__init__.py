@@ -0,0 +1,2 @@
+"""Python support code for fido2-manage: libfido2 binding and helpers
+shared by the command line tool and the GUIs."""
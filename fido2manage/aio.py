@@ -0,0 +1,128 @@
+"""
+asyncio front end for the libfido2 binding.
+
+Each AsyncDevice owns a single worker thread, so calls on one handle run in
+submission order (as libfido2 requires) while calls on different devices
+overlap. The worker releases the GIL inside libfido2, so one event loop can
+keep a dozen authenticators busy at once:
+
+    async def inventory():
+        devices = [await AsyncDevice.open(d.path)
+                   for d in await manifest()]
+        try:
+            return await asyncio.gather(*(d.cbor_info() for d in devices))
+        finally:
+            await asyncio.gather(*(d.close() for d in devices))
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from . import libfido2
+
+
+async def manifest(max_devices=64):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, functools.partial(libfido2.manifest, max_devices))
+
+
+class AsyncDevice:
+    """Awaitable wrapper around libfido2.Device."""
+
+    def __init__(self, device, executor):
+        self.path = device.path
+        self._device = device
+        self._executor = executor
+
+    @classmethod
+    async def open(cls, path, timeout_ms=None):
+        executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f"fido2:{path}")
+        loop = asyncio.get_running_loop()
+        try:
+            device = await loop.run_in_executor(
+                executor, libfido2.Device, path, timeout_ms)
+        except BaseException:
+            executor.shutdown(wait=False)
+            raise
+        return cls(device, executor)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _call(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, *args))
+
+    async def close(self):
+        if self._executor is None:
+            return
+        try:
+            await self._call(self._device.close)
+        finally:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def set_retry_policy(self, retries, backoff_ms):
+        return await self._call(self._device.set_retry_policy, retries,
+                                backoff_ms)
+
+    async def io_retries(self):
+        return await self._call(self._device.io_retries)
+
+    async def cbor_info(self):
+        return await self._call(self._device.cbor_info)
+
+    async def retry_count(self):
+        return await self._call(self._device.retry_count)
+
+    async def uv_retry_count(self):
+        return await self._call(self._device.uv_retry_count)
+
+    async def credman_metadata(self, pin):
+        return await self._call(self._device.credman_metadata, pin)
+
+    async def credman_rps(self, pin):
+        return await self._call(self._device.credman_rps, pin)
+
+    async def credman_rks(self, rp_id, pin):
+        return await self._call(self._device.credman_rks, rp_id, pin)
+
+    async def credman_delete(self, cred_id, pin):
+        return await self._call(self._device.credman_delete, cred_id, pin)
+
+    async def bio_info(self):
+        return await self._call(self._device.bio_info)
+
+    async def bio_templates(self, pin):
+        return await self._call(self._device.bio_templates, pin)
+
+    async def bio_enroll(self, pin, timeout_ms=10000):
+        """Enroll a fingerprint, yielding (last_status, remaining_samples)
+        after every sample. Each sample is collected on the device's worker
+        thread; leaving the loop early cancels the enrollment."""
+        gen = self._device.bio_enroll(pin, timeout_ms)
+        done = object()
+        try:
+            while True:
+                sample = await self._call(next, gen, done)
+                if sample is done:
+                    return
+                yield sample
+        finally:
+            await self._call(gen.close)
+
+    async def touch_begin(self):
+        return await self._call(self._device.touch_begin)
+
+    async def touch_status(self, timeout_ms):
+        return await self._call(self._device.touch_status, timeout_ms)
+
+    async def reset(self):
+        return await self._call(self._device.reset)
@@ -0,0 +1,216 @@
+"""
+Bulk re-verification of recorded assertions, for relying-party audits.
+
+    python3 -m fido2manage.assertions -keys KEYS [-j N] [FILE ...]
+
+KEYS holds the credential public keys, one JSON object per line:
+
+    id            how assertions refer to the key, e.g. the base64
+                  credential ID
+    type          es256 (default), es384, rs256 or eddsa
+    pem or pubkey the SubjectPublicKeyInfo in PEM, as fido2-cred -V
+                  writes it, or base64 of the raw key as
+                  fido_cred_pubkey_ptr() returns it
+
+The assertions (FILE, or stdin) are JSON lines too, binary fields in base64:
+
+    key           the id of the key in KEYS
+    rp_id
+    client_data_hash, or client_data_json to hash here
+    authdata      the raw authenticator data
+    sig
+    up, uv        whether user presence (default true) and verification
+                  were required
+    extensions    extension outputs expected, e.g. ["hmac-secret"]
+
+Each worker process (one per core unless -j says otherwise) reads KEYS once
+and decodes a key into an es256_pk_t, rs256_pk_t, ... the first time an
+assertion uses it, then reuses it for every later assertion by the same
+credential; verification itself is fido_assert_verify(). Results are one
+JSON line per assertion, in input order, as in fido2manage.attest.
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+
+from . import batch, libfido2
+from .records import COSE
+
+_TYPES = {name: alg for alg, name in COSE.items()}
+
+# rs256_pk_from_ptr() takes the modulus and exponent at these widths
+_RSA_MODULUS = 256
+_RSA_EXPONENT = 3
+
+
+class VerificationError(Exception):
+    pass
+
+
+def _der(data, pos):
+    """Return (tag, start, end) of the DER element at pos."""
+    tag = data[pos]
+    length = data[pos + 1]
+    pos += 2
+    if length & 0x80:
+        n = length & 0x7f
+        length = int.from_bytes(data[pos:pos + n], "big")
+        pos += n
+    if pos + length > len(data):
+        raise ValueError("truncated DER")
+    return tag, pos, pos + length
+
+
+def _spki_key(der, cose_type):
+    """Extract the raw public key that <type>_pk_from_ptr() takes from a
+    DER SubjectPublicKeyInfo."""
+    _, start, _ = _der(der, 0)
+    _, _, alg_end = _der(der, start)
+    tag, start, end = _der(der, alg_end)
+    if tag != 0x03:
+        raise ValueError("no public key in SubjectPublicKeyInfo")
+    key = der[start + 1:end]
+    if cose_type != -257:
+        # ECDSA points keep their 0x04 prefix, which <type>_pk_from_ptr()
+        # accepts
+        return key
+    # RSAPublicKey ::= SEQUENCE { modulus INTEGER, publicExponent INTEGER }
+    _, start, _ = _der(key, 0)
+    _, n_start, n_end = _der(key, start)
+    _, e_start, e_end = _der(key, n_end)
+    n = key[n_start:n_end].lstrip(b"\0")
+    e = key[e_start:e_end].lstrip(b"\0")
+    if len(n) > _RSA_MODULUS or len(e) > _RSA_EXPONENT:
+        raise ValueError("only 2048-bit RSA keys are supported")
+    return n.rjust(_RSA_MODULUS, b"\0") + e.rjust(_RSA_EXPONENT, b"\0")
+
+
+def load_keys(path):
+    """Read KEYS into {id: (COSE algorithm, raw key)}, without decoding the
+    keys yet."""
+    keys = {}
+    with open(path) as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                cose_type = _TYPES[entry.get("type", "es256")]
+                if "pem" in entry:
+                    body = "".join(row for row in entry["pem"].splitlines()
+                                   if not row.startswith("-----"))
+                    raw = _spki_key(base64.b64decode(body), cose_type)
+                else:
+                    raw = base64.b64decode(entry["pubkey"], validate=True)
+                keys[entry["id"]] = (cose_type, raw)
+            except (AttributeError, IndexError, KeyError, TypeError,
+                    ValueError, binascii.Error) as e:
+                raise VerificationError(f"{path}:{n}: bad key: {e!r}")
+    return keys
+
+
+class KeyCache:
+    """Public keys by id, decoded on first use."""
+
+    def __init__(self, keys):
+        self._keys = keys
+        self._decoded = {}
+        self.decodes = 0
+
+    def get(self, key_id):
+        pk = self._decoded.get(key_id)
+        if pk is None:
+            try:
+                cose_type, raw = self._keys[key_id]
+            except (KeyError, TypeError):
+                raise VerificationError(f"unknown key {key_id!r}")
+            pk = self._decoded[key_id] = libfido2.PublicKey(cose_type, raw)
+            self.decodes += 1
+        return pk
+
+
+def verify_record(cache, record):
+    """Verify one parsed assertion; raise VerificationError or
+    libfido2.FidoError if it does not check out."""
+    try:
+        if "client_data_hash" in record:
+            cdh = base64.b64decode(record["client_data_hash"], validate=True)
+        else:
+            cdh = hashlib.sha256(base64.b64decode(
+                record["client_data_json"], validate=True)).digest()
+        extensions = 0
+        for name in record.get("extensions") or ():
+            extensions |= libfido2.EXTENSIONS[name]
+        rp_id = record["rp_id"]
+        if not isinstance(rp_id, str):
+            raise TypeError("rp_id must be a string")
+        args = (cdh, rp_id,
+                base64.b64decode(record["authdata"], validate=True),
+                base64.b64decode(record["sig"], validate=True))
+        pk = cache.get(record["key"])
+    except (AttributeError, KeyError, TypeError, ValueError,
+            binascii.Error) as e:
+        raise VerificationError(f"malformed record: {e!r}")
+    libfido2.assert_verify(pk, *args, up=bool(record.get("up", True)),
+                           uv=bool(record.get("uv")), extensions=extensions)
+
+
+_cache = None
+
+
+def _init_worker(keys_path):
+    global _cache
+    _cache = KeyCache(load_keys(keys_path))
+
+
+def _verify(record):
+    verify_record(_cache, record)
+
+
+def _verify_chunk(lines):
+    return batch.verify_lines(lines, _verify,
+                              (VerificationError, libfido2.FidoError))
+
+
+def verify_stream(files, keys_path, jobs=None):
+    """Yield a result dict for every non-empty line of files, in order;
+    see fido2manage.batch."""
+    load_keys(keys_path)  # report a bad key file before starting workers
+    return batch.run(files, _verify_chunk, _init_worker, (keys_path,), jobs)
+
+
+def main(argv=None):
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(
+        description="Verify a stream of recorded assertions.")
+    parser.add_argument("file", nargs="*",
+                        help="JSON lines of assertions (default: stdin)")
+    parser.add_argument("-keys", required=True,
+                        help="JSON lines of credential public keys")
+    parser.add_argument("-j", type=int, metavar="N",
+                        help="worker processes (default: one per core)")
+    parser.add_argument("-q", action="store_true",
+                        help="only print assertions that failed")
+    args = parser.parse_intermixed_args(argv)
+
+    try:
+        files = batch.open_inputs(args.file)
+    except OSError as e:
+        print(f"[Error] {e}", file=sys.stderr)
+        return 2
+    try:
+        return batch.report(verify_stream(files, args.keys, args.j),
+                            args.q, "assertions")
+    except (OSError, VerificationError) as e:
+        print(f"[Error] {e}", file=sys.stderr)
+        return 2
+    finally:
+        batch.close_inputs(files)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,254 @@
+"""
+Batch verification of attestation statements, for checking at intake that
+every key accepted has genuine attestation.
+
+    python3 -m fido2manage.attest -anchors ROOTS.pem [-j N] [FILE ...]
+
+The input (FILE, or stdin) holds one JSON object per line with what
+fido2-cred -V reads for one credential, binary fields in base64:
+
+    client_data_hash, rp_id
+    fmt           packed, fido-u2f or tpm
+    authdata      the raw authenticator data
+    sig, x5c      the attestation signature and certificate chain,
+                  attestation certificate first
+    attstmt       the CBOR attStmt, instead of sig; tpm needs it for
+                  certInfo and pubArea. x5c may then be left out if
+                  libfido2 is 1.13 or later, which lists the chain in the
+                  statement; older ones only return its first certificate.
+                  If given, x5c must start with the statement's
+                  certificate and only adds intermediates
+    attobj        the whole attestation object, instead of all of the
+                  above but the client data hash and RP ID (libfido2 1.13)
+    type          es256 (default), es384, rs256 or eddsa
+    uv, prot, extensions
+                  what was asked for at creation, when it should be
+                  checked: true, 1-3, a list such as ["hmac-secret"]
+
+For each credential fido_cred_verify() checks the signature with the
+attestation certificate, then the chain is validated against the trust
+anchors with `openssl verify`. Batch attestation means a shipment of keys
+shares a handful of chains, so validation results are cached by the SHA-256
+fingerprints of the certificates, and anchors are parsed once: every
+credential after the first of its batch costs one signature check.
+
+Records are verified in chunks by a pool of processes, one per core unless
+-j says otherwise; each keeps its own chain cache. One JSON line per
+record, {"line": n, "ok": true} or with "error", goes to stdout in input
+order, and a summary with verifications per second to stderr. The exit
+status is 1 if any record failed.
+"""
+
+import base64
+import binascii
+import concurrent.futures
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+
+from . import batch, libfido2
+from .records import COSE
+
+_TYPES = {name: alg for alg, name in COSE.items()}
+
+
+class AttestationError(Exception):
+    pass
+
+
+def _pem(der):
+    lines = base64.encodebytes(der).decode().replace("\n", "")
+    return ("-----BEGIN CERTIFICATE-----\n" +
+            "\n".join(lines[i:i + 64] for i in range(0, len(lines), 64)) +
+            "\n-----END CERTIFICATE-----\n")
+
+
+def anchor_bundle(anchors, path):
+    """Write the trust anchor certificates in the files anchors, PEM or DER,
+    to path as one PEM bundle."""
+    with open(path, "w") as out:
+        for name in anchors:
+            with open(name, "rb") as f:
+                data = f.read()
+            out.write(data.decode() if b"-----BEGIN" in data else _pem(data))
+
+
+class ChainCache:
+    """Validates x5c chains against the trust anchors in cafile, a PEM
+    bundle, remembering the outcome for each chain. Safe to share between
+    threads: a chain seen by several at once is validated once, and the
+    others wait for the result."""
+
+    def __init__(self, cafile):
+        if shutil.which("openssl") is None:
+            raise AttestationError("validating chains needs the openssl "
+                                   "command")
+        self._cafile = cafile
+        self._lock = threading.Lock()
+        self._results = {}
+        self.validations = 0
+
+    def check(self, chain):
+        """Raise AttestationError unless chain, a list of DER certificates
+        starting with the attestation certificate, leads to an anchor."""
+        key = tuple(hashlib.sha256(der).digest() for der in chain)
+        with self._lock:
+            result = self._results.get(key)
+            owner = result is None
+            if owner:
+                result = self._results[key] = concurrent.futures.Future()
+        if owner:
+            try:
+                result.set_result(self._validate(chain))
+            except Exception as e:
+                result.set_exception(e)
+        error = result.result()
+        if error is not None:
+            raise AttestationError(error)
+
+    def _validate(self, chain):
+        self.validations += 1
+        with tempfile.TemporaryDirectory(prefix="fido2-attest-") as tmp:
+            leaf = os.path.join(tmp, "leaf.pem")
+            with open(leaf, "w") as f:
+                f.write(_pem(chain[0]))
+            args = ["openssl", "verify", "-CAfile", self._cafile]
+            if len(chain) > 1:
+                untrusted = os.path.join(tmp, "chain.pem")
+                with open(untrusted, "w") as f:
+                    f.write("".join(_pem(der) for der in chain[1:]))
+                args += ["-untrusted", untrusted]
+            result = subprocess.run(args + [leaf], capture_output=True,
+                                    text=True)
+        if result.returncode == 0:
+            return None
+        # "error 20 at 1 depth lookup: unable to get local issuer
+        # certificate"; the last line only names the temporary file
+        for line in (result.stderr + result.stdout).splitlines():
+            if line.startswith("error ") and " depth " in line:
+                return "chain: " + line.split(": ", 1)[-1]
+        return "chain: openssl verify failed"
+
+
+def _decode(record, name):
+    value = record.get(name)
+    return base64.b64decode(value, validate=True) if value is not None \
+        else None
+
+
+def verify_record(cache, record):
+    """Verify one parsed input record; raise AttestationError or
+    libfido2.FidoError if it does not check out."""
+    try:
+        x5c = [base64.b64decode(c, validate=True)
+               for c in record.get("x5c") or ()]
+        extensions = 0
+        for name in record.get("extensions") or ():
+            extensions |= libfido2.EXTENSIONS[name]
+        kwargs = dict(
+            cose_type=_TYPES[record.get("type", "es256")],
+            fmt=record.get("fmt"),
+            authdata=_decode(record, "authdata"),
+            sig=_decode(record, "sig"),
+            x5c=x5c[0] if x5c else None,
+            attstmt=_decode(record, "attstmt"),
+            attobj=_decode(record, "attobj"),
+            uv=bool(record.get("uv")),
+            prot=int(record.get("prot") or 0),
+            extensions=extensions)
+        cdh = base64.b64decode(record["client_data_hash"], validate=True)
+        rp_id = record["rp_id"]
+        if not isinstance(rp_id, str) or not isinstance(
+                kwargs["fmt"], (str, type(None))):
+            raise TypeError("rp_id and fmt must be strings")
+    except (AttributeError, KeyError, TypeError, ValueError,
+            binascii.Error) as e:
+        raise AttestationError(f"malformed record: {e!r}")
+    if kwargs["attobj"] is None and (
+            kwargs["fmt"] is None or kwargs["authdata"] is None or
+            kwargs["attstmt"] is None and (kwargs["sig"] is None or not x5c)):
+        raise AttestationError("no attestation statement (self attestation "
+                               "or missing fields)")
+
+    carried = libfido2.cred_verify(cdh, rp_id, **kwargs)
+    if kwargs["attstmt"] is None and kwargs["attobj"] is None:
+        # the signature was checked with x5c[0]
+        chain = x5c
+    else:
+        # the signature was checked with the statement's certificate, so
+        # that is the one to validate; x5c may only add intermediates
+        chain = carried
+        if chain and chain[0] and x5c:
+            if x5c[0] != chain[0]:
+                raise AttestationError("x5c does not match the attestation "
+                                       "certificate in the statement")
+            chain = chain + [der for der in x5c[1:] if der not in chain]
+    if not chain or not chain[0]:
+        raise AttestationError("no attestation certificate")
+    cache.check(chain)
+
+
+_cache = None
+
+
+def _init_worker(cafile):
+    global _cache
+    _cache = ChainCache(cafile)
+
+
+def _verify(record):
+    verify_record(_cache, record)
+
+
+def _verify_chunk(lines):
+    return batch.verify_lines(lines, _verify, (
+        AttestationError, libfido2.FidoError, NotImplementedError))
+
+
+def verify_stream(files, anchors, jobs=None):
+    """Yield a result dict for every non-empty line of files, in order;
+    see fido2manage.batch."""
+    with tempfile.TemporaryDirectory(prefix="fido2-attest-") as tmp:
+        cafile = os.path.join(tmp, "anchors.pem")
+        anchor_bundle(anchors, cafile)
+        yield from batch.run(files, _verify_chunk, _init_worker, (cafile,),
+                             jobs)
+
+
+def main(argv=None):
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(
+        description="Verify the attestation of a stream of credentials.")
+    parser.add_argument("file", nargs="*",
+                        help="JSON lines of credentials (default: stdin)")
+    parser.add_argument("-anchors", action="append", required=True,
+                        help="trust anchor certificates, PEM or DER; "
+                             "repeatable")
+    parser.add_argument("-j", type=int, metavar="N",
+                        help="worker processes (default: one per core)")
+    parser.add_argument("-q", action="store_true",
+                        help="only print records that failed")
+    args = parser.parse_intermixed_args(argv)
+
+    try:
+        files = batch.open_inputs(args.file)
+    except OSError as e:
+        print(f"[Error] {e}", file=sys.stderr)
+        return 2
+    try:
+        return batch.report(verify_stream(files, args.anchors, args.j),
+                            args.q, "credentials")
+    except (OSError, AttestationError) as e:
+        print(f"[Error] {e}", file=sys.stderr)
+        return 2
+    finally:
+        batch.close_inputs(files)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
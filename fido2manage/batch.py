@@ -0,0 +1,117 @@
+"""
+Verification of long streams of JSON-lines records on every core, shared by
+fido2manage.attest and fido2manage.assertions.
+
+Lines are read in chunks and handed to a pool of worker processes, at most
+two chunks per worker in flight, so memory stays flat however long the
+stream is and results come back in input order. libfido2's signature checks
+release the GIL, but decoding and setting up each record does not; separate
+processes keep throughput growing with the number of cores.
+
+A tool provides an initializer, run once per worker to build the state its
+checks reuse (parsed keys, validated chains), and a module-level function
+that verifies one decoded record against that state and raises one of the
+tool's expected errors when it does not check out.
+"""
+
+import concurrent.futures
+import json
+import os
+import sys
+import time
+
+
+def chunks(files, size):
+    """Yield lists of up to size (line number, text) pairs, skipping blank
+    lines; numbers run on across files."""
+    chunk = []
+    n = 0
+    for f in files:
+        for text in f:
+            n += 1
+            if text.strip():
+                chunk.append((n, text))
+                if len(chunk) == size:
+                    yield chunk
+                    chunk = []
+    if chunk:
+        yield chunk
+
+
+def verify_lines(lines, verify, errors):
+    """Run verify on each decoded line, returning a result dict per line:
+    {"line": n, "ok": true}, or with "ok": false and the "error" raised,
+    one of the exception types in errors."""
+    results = []
+    for n, text in lines:
+        result = {"line": n, "ok": True}
+        try:
+            verify(json.loads(text))
+        except json.JSONDecodeError as e:
+            result.update(ok=False, error=f"not JSON: {e}")
+        except errors as e:
+            result.update(ok=False, error=str(e))
+        results.append(result)
+    return results
+
+
+def run(files, verify_chunk, initializer, initargs=(), jobs=None,
+        chunk=256):
+    """Yield the results of verify_chunk on chunks of files, in order.
+
+    With jobs (default: one per core) above 1, every worker process runs
+    initializer(*initargs) once; otherwise it runs in this process."""
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1:
+        initializer(*initargs)
+        for lines in chunks(files, chunk):
+            yield from verify_chunk(lines)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(
+            jobs, initializer=initializer, initargs=initargs) as pool:
+        pending = []
+        for lines in chunks(files, chunk):
+            pending.append(pool.submit(verify_chunk, lines))
+            if len(pending) >= 2 * jobs:
+                yield from pending.pop(0).result()
+        for future in pending:
+            yield from future.result()
+
+
+def open_inputs(names):
+    """Open the named files, or return [stdin] when there are none."""
+    files = []
+    try:
+        for name in names:
+            files.append(open(name))
+    except OSError:
+        close_inputs(files)
+        raise
+    return files or [sys.stdin]
+
+
+def close_inputs(files):
+    for f in files:
+        if f is not sys.stdin:
+            f.close()
+
+
+def report(results, quiet=False, what="records"):
+    """Print results as JSON lines, only failures if quiet, then a summary
+    with the throughput to stderr. Returns the exit status: 1 if anything
+    failed."""
+    total = failed = 0
+    start = time.perf_counter()
+    for result in results:
+        total += 1
+        if not result["ok"]:
+            failed += 1
+        elif quiet:
+            continue
+        print(json.dumps(result))
+    elapsed = time.perf_counter() - start
+    print(f"{total} {what}, {failed} failed, {elapsed:.2f} s, "
+          f"{total / elapsed if elapsed else 0:.0f} verifications/s",
+          file=sys.stderr)
+    return 1 if failed else 0
@@ -0,0 +1,79 @@
+"""
+Compare fido2-manage.sh with fido2-manage.py on wall time and process count.
+
+    python3 -m fido2manage.bench_cli -n 10 -device 1 -pin 1234
+
+Each command is run with both wrappers; the median wall time is reported,
+along with the number of programs executed (execve calls, counted with
+strace -f when it is installed). Without -device only -list is measured;
+-pin adds -storage and -residentKeys, which otherwise prompt.
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+WRAPPERS = ("./fido2-manage.sh", "./fido2-manage.py")
+
+
+def commands(device, pin, domain):
+    yield ["-list"]
+    if device is None:
+        return
+    yield ["-info", "-device", device]
+    if pin is None:
+        return
+    yield ["-storage", "-device", device, "-pin", pin]
+    yield ["-residentKeys", "-device", device, "-pin", pin]
+    if domain is not None:
+        yield ["-residentKeys", "-device", device, "-pin", pin,
+               "-domain", domain]
+
+
+def wall_time(argv, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(argv, stdin=subprocess.DEVNULL,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def exec_count(argv):
+    if shutil.which("strace") is None:
+        return None
+    with tempfile.NamedTemporaryFile("r") as log:
+        subprocess.run(["strace", "-f", "-qq", "-e", "trace=execve",
+                        "-o", log.name] + argv, stdin=subprocess.DEVNULL,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return sum(1 for line in log if "execve(" in line and "= 0" in line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-n", type=int, default=5, help="runs per command")
+    parser.add_argument("-device")
+    parser.add_argument("-pin")
+    parser.add_argument("-domain")
+    args = parser.parse_args(argv)
+
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    print(f"{'command':<40} {'wrapper':<20} {'median ms':>10} {'execs':>6}")
+    for command in commands(args.device, args.pin, args.domain):
+        shown = " ".join("****" if a == args.pin else a for a in command)
+        for wrapper in WRAPPERS:
+            argv = [wrapper] + command
+            ms = wall_time(argv, args.n) * 1000
+            execs = exec_count(argv)
+            print(f"{shown:<40} {wrapper:<20} {ms:>10.1f} "
+                  f"{'-' if execs is None else execs:>6}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+Benchmark listing the large-blob array with fido2-token2 -L -b, and blob
+compression.
+
+    python3 -m fido2manage.bench_largeblob record TRACE -device 1 -pin PIN
+    python3 -m fido2manage.bench_largeblob run TRACE -pin PIN [-n 20]
+                                               [-tool PATH ...]
+    python3 -m fido2manage.bench_largeblob compress BLOB [-n 20]
+                                               [-maxmsg 1200] [-max 4096]
+
+Listing reads every resident credential and the whole array, then finds
+which credential's largeBlobKey decrypts each entry. The host side of that
+grows with entries times credentials, so record on a key that has many of
+both: fill it with credentials made with fido2-cred -M -b and give a good
+share of them a blob with fido2-token2 -S -b.
+
+record lists the array once on the key while libfido2 writes the session
+to TRACE (FIDO2_TRACE, see fido_dev_set_trace(3)). run replays it -n times
+as fast as possible through each -tool (default: FIDO2_TOKEN_CMD, as in
+fido2manage.cli), so that builds can be compared on the same array: the
+time left is the tool's own enumeration, CBOR and decryption work.
+
+compress needs no key. For every level fido2-token2 -S -b -z takes, it
+deflates BLOB as libfido2 does (raw deflate, zlib's defaults otherwise) and
+reports compression and decompression throughput, the stored size and the
+fragments needed to write and read the array if BLOB were its only entry,
+on a key with the given maxMsgSize and maxLargeBlobArray (see fido2-token2
+-I). The level -z fit would pick is marked.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import time
+import zlib
+
+from .cli import FIDO2_TOKEN_CMD
+
+
+def list_blobs(tool, device, env):
+    return subprocess.run([tool, "-L", "-b", device], env=env,
+                          stdin=subprocess.DEVNULL, capture_output=True,
+                          text=True)
+
+
+def record(trace, device, pin, tool):
+    from .devices import AddressError, Resolver
+
+    try:
+        path = Resolver().resolve(device)
+    except AddressError as e:
+        raise SystemExit(f"[Error] {e}")
+    env = dict(os.environ, FIDO2_PIN=pin, FIDO2_TRACE=trace)
+    start = time.perf_counter()
+    result = list_blobs(tool, path, env)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise SystemExit(f"[Error] {result.stderr.strip()}")
+    entries = len(result.stdout.splitlines()) - 1
+    print(f"recorded {max(entries, 0)} entries from {path} to {trace} in "
+          f"{elapsed * 1000:.1f} ms")
+
+
+def replay(trace, pin, runs, tool):
+    # the trace stands in for the device; see open_dev() in tools/util.c
+    env = dict(os.environ, FIDO2_PIN=pin, FIDO2_REPLAY=trace)
+    env.pop("FIDO2_TRACE", None)
+    env.pop("FIDO2_REPLAY_REALTIME", None)
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = list_blobs(tool, trace, env)
+        times.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            raise SystemExit(f"[Error] {tool}: {result.stderr.strip()}")
+    times.sort()
+    unknown = result.stdout.count("<unknown>")
+    print(f"{tool}: median {statistics.median(times) * 1000:.2f} ms, "
+          f"min {times[0] * 1000:.2f} ms, "
+          f"p95 {times[int(len(times) * 0.95) - 1] * 1000:.2f} ms"
+          f"{f', {unknown} unmatched' if unknown else ''}")
+
+
+# at most what libfido2 adds around the compressed blob: the array header,
+# the entry's map with its nonce and original size, and the AES-GCM tag
+_ENTRY_OVERHEAD = 1 + 1 + 6 + 2 + 13 + 2 + 9 + 16
+_DIGEST = 16
+
+
+def _best(func, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return result, statistics.median(times)
+
+
+def compress(path, runs, maxmsg, maxarray):
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data:
+        raise SystemExit(f"[Error] {path} is empty")
+    chunk = min(maxmsg, 2048) - 64  # get_chunklen() in src/largeblob.c
+    if chunk <= 0:
+        raise SystemExit("[Error] -maxmsg must be more than 64")
+    mb = len(data) / 1e6
+    fit = None
+    print(f"{path}: {len(data)} bytes, {chunk}-byte fragments, "
+          f"{maxarray}-byte array")
+    print("level  comp MB/s  decomp MB/s    stored  write  read")
+    for level in range(10):
+        def deflate():
+            z = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+            return z.compress(data) + z.flush()
+
+        packed, ctime = _best(deflate, runs)
+        _, dtime = _best(lambda: zlib.decompress(packed, -zlib.MAX_WBITS),
+                         runs)
+        array = len(packed) + _ENTRY_OVERHEAD
+        writes = -(-array // chunk) + 1  # the digest goes on its own
+        reads = (array + _DIGEST) // chunk + 1
+        fits = array + _DIGEST <= maxarray
+        mark = ""
+        if fits and fit is None:
+            fit = level
+            mark = "  <- fit"
+        elif not fits:
+            mark = "  (too big)"
+        print(f"{level:5}  {mb / ctime:9.1f}  {mb / dtime:11.1f}  "
+              f"{len(packed):8}  {writes:5}  {reads:4}{mark}")
+    if fit is None:
+        print("no level fits: -z fit fails with FIDO_ERR_LARGEBLOB_"
+              "STORAGE_FULL")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("mode", choices=("record", "run", "compress"))
+    parser.add_argument("trace", help="trace, or blob to compress")
+    parser.add_argument("-device", help="key to record (see devices.py)")
+    parser.add_argument("-pin", help="needed to record and run")
+    parser.add_argument("-n", type=int, default=20)
+    parser.add_argument("-tool", action="append",
+                        help="fido2-token2 to run; repeatable")
+    parser.add_argument("-maxmsg", type=int, default=1200,
+                        help="key's maxMsgSize, for compress")
+    parser.add_argument("-max", type=int, default=4096,
+                        help="key's maxLargeBlobArray, for compress")
+    args = parser.parse_intermixed_args(argv)
+    tools = args.tool or [FIDO2_TOKEN_CMD]
+    if args.mode != "compress" and args.pin is None:
+        parser.error(f"{args.mode} needs -pin")
+
+    try:
+        if args.mode == "compress":
+            compress(args.trace, max(args.n, 1), args.maxmsg, args.max)
+        elif args.mode == "record":
+            if args.device is None:
+                parser.error("record needs -device")
+            record(args.trace, args.device, args.pin, tools[0])
+        else:
+            for tool in tools:
+                replay(args.trace, args.pin, max(args.n, 1), tool)
+    except OSError as e:
+        raise SystemExit(f"[Error] {e}")
+
+
+if __name__ == "__main__":
+    main()
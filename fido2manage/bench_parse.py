@@ -0,0 +1,82 @@
+"""
+Benchmark fido2manage.parse on synthetic output with many credentials.
+
+    python3 -m fido2manage.bench_parse [-n 1000 10000 100000]
+
+For each size, times parsing fido2-token2 -L -k output and the
+"Domain: / Credential ID: ..., User: ..." listing the GUIs display, and
+reports microseconds and bytes of retained records per credential, which
+should stay flat as the count grows.
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from . import parse
+
+
+def resident_key_output(n):
+    return "".join(
+        f"{i % 100:02d}: Y+Dh/tSy/Q2IdZt6PW/{i:08d}== Display Name {i} "
+        f"user{i}@example.com dXNlcg{i:04d}== es256 uvopt\n"
+        for i in range(n))
+
+
+def passkey_listing(n, per_domain=25):
+    out = []
+    for i in range(n):
+        if i % per_domain == 0:
+            out.append(f"\nDomain: rp{i // per_domain}.example.com\n")
+        out.append(f"[Info] Credential ID: Y+Dh/tSy/Q2IdZt6PW/{i:08d}==, "
+                   f"User: Display Name {i} user{i}@example.com\n")
+    return "".join(out)
+
+
+def best_of(runs, func, *args):
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def retained(func, *args):
+    tracemalloc.start()
+    try:
+        result = func(*args)
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-n", type=int, nargs="+",
+                        default=[1000, 10000, 100000])
+    parser.add_argument("-runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    cases = (
+        ("resident_keys", resident_key_output,
+         lambda text: list(parse.resident_keys(text))),
+        ("passkeys", passkey_listing,
+         lambda text: list(parse.passkeys(text))),
+    )
+    print(f"{'parser':<16} {'credentials':>12} {'total ms':>10} "
+          f"{'us/cred':>8} {'B/cred':>7}")
+    for name, make, run in cases:
+        for n in args.n:
+            text = make(n)
+            assert len(run(text)) == n
+            seconds = best_of(args.runs, run, text)
+            size = retained(run, text)
+            print(f"{name:<16} {n:>12} {seconds * 1000:>10.1f} "
+                  f"{seconds * 1e6 / n:>8.2f} {size / n:>7.0f}")
+
+
+if __name__ == "__main__":
+    main()
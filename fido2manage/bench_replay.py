@@ -0,0 +1,96 @@
+"""
+Benchmark a management session without hardware, from a recorded trace.
+
+    python3 -m fido2manage.bench_replay record TRACE -device 1 [-pin PIN]
+    python3 -m fido2manage.bench_replay run TRACE [-pin PIN] [-n 200]
+                                            [-realtime]
+
+The trace is recorded once on a real key. The session opens the key and
+reads getInfo and the PIN retry counter; with -pin it also reads the
+credential metadata and enumerates every relying party and its
+credentials, as the GUIs do. record runs it on a key while libfido2 writes
+every HID report and its timing to TRACE (see fido_dev_set_trace(3)); run
+replays it -n times through the replay transport, and must be given -pin
+if record was. The PIN itself is not checked on replay.
+
+As fast as possible, the replay measures the host side alone: libfido2's
+framing, CBOR and PIN protocol work and this binding, which is what changes
+to src/io.c or the HID backends affect. With -realtime every response is
+delayed as recorded, and the total should match the recorded session.
+
+Both need this tree's libfido2, which has fido_dev_set_trace() and
+fido_dev_set_replay().
+"""
+
+import argparse
+import statistics
+import time
+
+from . import libfido2
+
+
+def session(dev, pin):
+    """The calls that are recorded and replayed; returns the number of
+    credentials seen."""
+    dev.cbor_info()
+    dev.retry_count()
+    if pin is None:
+        return 0
+    dev.credman_metadata(pin)
+    return sum(len(dev.credman_rks(rp.rp_id, pin))
+               for rp in dev.credman_rps(pin))
+
+
+def record(trace, device, pin):
+    from .devices import AddressError, Resolver
+
+    try:
+        path = Resolver().resolve(device)
+    except AddressError as e:
+        raise SystemExit(f"[Error] {e}")
+    start = time.perf_counter()
+    with libfido2.Device(path, trace=trace) as dev:
+        creds = session(dev, pin)
+    print(f"recorded {creds} credentials from {path} to {trace} in "
+          f"{(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+def replay(trace, pin, runs, realtime):
+    flags = libfido2.FIDO_REPLAY_REALTIME if realtime else 0
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        with libfido2.Device(trace, replay=flags) as dev:
+            creds = session(dev, pin)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    print(f"{runs} replays of {trace}, {creds} credentials"
+          f"{' in real time' if realtime else ''}")
+    print(f"median {statistics.median(times) * 1000:.2f} ms, "
+          f"min {times[0] * 1000:.2f} ms, "
+          f"p95 {times[int(len(times) * 0.95) - 1] * 1000:.2f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("mode", choices=("record", "run"))
+    parser.add_argument("trace")
+    parser.add_argument("-device", help="key to record (see devices.py)")
+    parser.add_argument("-pin")
+    parser.add_argument("-n", type=int, default=200)
+    parser.add_argument("-realtime", action="store_true")
+    args = parser.parse_intermixed_args(argv)
+
+    try:
+        if args.mode == "record":
+            if args.device is None:
+                parser.error("record needs -device")
+            record(args.trace, args.device, args.pin)
+        else:
+            replay(args.trace, args.pin, max(args.n, 1), args.realtime)
+    except (libfido2.FidoError, NotImplementedError, OSError) as e:
+        raise SystemExit(f"[Error] {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+"""
+Command line front end with the flags of fido2-manage.sh.
+
+Each command runs in a single process. Device lookup, -list, -storage,
+-residentKeys, -delete and -fingerprint go through the libfido2 binding
+in-process; commands that need fido2-token2's interactive flows (-info,
+-setPIN, -changePIN, -reset, -uvs, -uvd, -setMinimumPIN, -updateUsers) run
+it once, replacing this process where no output has to be post-processed.
+The shell wrapper instead forks fido2-token2 -L, sed and cut on every
+-device, grep for every -list line, and four awk processes per credential.
+
+--json prints machine-readable output for -list, -info, -storage and
+-residentKeys. This module never imports tkinter.
+"""
+
+import base64
+import getpass
+import json
+import os
+import subprocess
+import sys
+
+from . import mds, parse
+from .devices import AddressError, Resolver, usb_serial
+from .records import b64, to_json
+
+FIDO2_TOKEN_CMD = os.environ.get("FIDO2_TOKEN_CMD",
+                                 "/usr/local/bin/fido2-token2")
+
+# what fido2-token2 uses (tools/extern.h)
+IO_RETRIES = 3
+IO_RETRY_MS = 50
+
+FLAGS = ("-list", "-info", "-storage", "-fingerprint", "-residentKeys",
+         "-delete", "-changePIN", "-setPIN", "-reset", "-uvs", "-uvd",
+         "-dryRun", "-help", "--json")
+VALUES = ("-device", "-pin", "-domain", "-credential", "-setMinimumPIN",
+          "-updateUsers")
+
+JSON_COMMANDS = ("list", "info", "storage", "residentKeys")
+
+HELP = """\
+FIDO2 Token Management Tool
+v 0.2.2
+This is a wrapper for libfido2 library
+
+(c) Token2 Sarl
+
+Usage: ./fido2-manage.py [-list] [-info -device <number>] [-storage -device <number>] [-residentKeys -device <number> -domain <domain>] [-uvs] [-uvd] [-dryRun] [-delete -device <number> -credential <credential>] [-updateUsers <file> -device <number>] [--json] [-help]
+
+Takes the same arguments as fido2-manage.sh; see ./fido2-manage.sh -help
+for examples. --json prints -list, -info, -storage and -residentKeys
+output as JSON.
+
+-device also accepts a stable address, which keeps pointing at the same
+key across re-plugs:
+  /dev/hidraw3            a device path
+  serial:ABC123           a USB serial number (Linux)
+  aaguid:<hex>[@<path>]   an AAGUID, optionally checked at a path
+
+With FIDO2_MDS_BLOB set to an offline FIDO Metadata Service BLOB (and
+FIDO2_MDS_ROOT to its root certificate), -info also prints the model and
+certification status of the key.
+
+-updateUsers <file> renames many passkeys at once, under one PIN: file is
+CSV, one "credential_id,user_name,display_name" per line, or a JSON object
+mapping each credential ID to {"name": ..., "display_name": ...}. Empty or
+missing fields are left as they are; the outcome of every passkey is
+printed.
+"""
+
+
+class UsageError(Exception):
+    pass
+
+
+def show_message(message, kind="Info"):
+    print(f"[{kind}] {message}")
+
+
+def parse_args(argv):
+    opts = {flag.lstrip("-"): False for flag in FLAGS}
+    opts.update({name.lstrip("-"): None for name in VALUES})
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg in FLAGS:
+            opts[arg.lstrip("-")] = True
+        elif arg in VALUES:
+            if i + 1 >= len(argv):
+                raise UsageError(f"Missing value for {arg}")
+            opts[arg.lstrip("-")] = argv[i + 1]
+            i += 1
+        else:
+            raise UsageError(f"Unknown parameter: {arg}")
+        i += 1
+    return opts
+
+
+def _libfido2():
+    # deferred so -help and usage errors do not need libfido2
+    from . import libfido2
+    return libfido2
+
+
+def list_devices():
+    return _libfido2().manifest()
+
+
+def resolve(device):
+    """Map a -device address to a libfido2 path; see devices.py."""
+    return Resolver().resolve(device)
+
+
+def open_device(path):
+    dev = _libfido2().Device(path)
+    try:
+        dev.set_retry_policy(IO_RETRIES, IO_RETRY_MS)
+    except NotImplementedError:
+        pass
+    return dev
+
+
+def ask_pin(path, pin):
+    if pin:
+        return pin
+    return getpass.getpass(f"Enter PIN for {path}: ")
+
+
+def token(args, capture=False):
+    """Run fido2-token2 with args. Unless capture is set and nothing else is
+    left to do, this process is replaced by it."""
+    command = [FIDO2_TOKEN_CMD] + args
+    if capture:
+        return subprocess.run(command, capture_output=True, text=True)
+    sys.stdout.flush()
+    os.execv(FIDO2_TOKEN_CMD, command)
+
+
+def pin_args(pin):
+    return ["-w", pin] if pin else []
+
+
+def dry_run_args(opts):
+    return ["-x"] if opts["dryRun"] else []
+
+
+def cmd_list(opts):
+    devices = list_devices()
+    if opts["json"]:
+        return [dict(to_json(d), serial=usb_serial(d.path)) for d in devices]
+    for d in devices:
+        print(d.label)
+
+
+def cmd_info(opts, path):
+    # with an MDS BLOB configured, the output is annotated with the model
+    annotate = bool(os.environ.get("FIDO2_MDS_BLOB"))
+    if not opts["json"]:
+        show_message(f"Device {opts['device']} Information:")
+        if not annotate:
+            token(["-I", path])
+    result = token(["-I", path], capture=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip())
+    info = dict(parse.key_values(result.stdout))
+    rows = mds.info_rows(info["aaguid"]) \
+        if annotate and "aaguid" in info else []
+    if not opts["json"]:
+        sys.stderr.write(result.stderr)
+        print(result.stdout, end="")
+        for key, value in rows:
+            print(f"{key}: {value}")
+        return None
+    info.update(rows)
+    return info
+
+
+def cmd_storage(opts, path):
+    with open_device(path) as dev:
+        existing, remaining = dev.credman_metadata(ask_pin(path, opts["pin"]))
+    if opts["json"]:
+        return {"existing": existing, "remaining": remaining}
+    print(f"existing rk(s): {existing}")
+    print(f"remaining rk(s): {remaining}")
+
+
+def cmd_relying_parties(opts, path):
+    with open_device(path) as dev:
+        rps = dev.credman_rps(ask_pin(path, opts["pin"]))
+    if opts["json"]:
+        return [to_json(rp) for rp in rps]
+    for i, rp in enumerate(rps):
+        print(f"{i:02d}: {b64(rp.id_hash)} {rp.rp_id}")
+
+
+def cmd_resident_keys(opts, path):
+    with open_device(path) as dev:
+        rks = dev.credman_rks(opts["domain"], ask_pin(path, opts["pin"]))
+    if opts["json"]:
+        return [to_json(rk) for rk in rks]
+    for rk in rks:
+        show_message(f"Credential ID: {b64(rk.credential_id)}, "
+                     f"User: {rk.user}")
+
+
+def cmd_delete(opts, path):
+    show_message("WARNING: Deleting a credential is irreversible. Are you "
+                 "sure you want to proceed? (Y/N)")
+    if "y" not in sys.stdin.readline().lower():
+        show_message("Deletion canceled.")
+        return
+    with open_device(path) as dev:
+        dev.credman_delete(base64.b64decode(opts["credential"]),
+                           ask_pin(path, opts["pin"]))
+    show_message("Passing credential deletion request")
+
+
+def cmd_reset(opts, path):
+    show_message("WARNING: Factory reset will remove all data and settings "
+                 "of the device, including its PIN, fingerprints, and "
+                 "passkeys stored. The factory reset process is "
+                 "irreversible. Are you sure you want to proceed? (Y/N)")
+    if "y" not in sys.stdin.readline().lower():
+        show_message("Factory reset canceled.")
+        return
+    # armed on the key: the reset is sent the moment it is re-plugged, well
+    # inside its 10-second window, as fido2-manage.sh does
+    from .reset import run
+
+    return run(path)
+
+
+def cmd_fingerprint(opts, path):
+    from .enroll import run
+
+    print("Enrolling fingerprints (for bio models only)")
+    return run(path, ask_pin(path, opts["pin"]))
+
+
+def cmd_set_minimum_pin(opts, path):
+    show_message(f"Setting minimum PIN length to {opts['setMinimumPIN']} "
+                 f"on device {opts['device']}")
+    sys.stdout.flush()
+    r = subprocess.call([FIDO2_TOKEN_CMD, "-S", "-l", opts["setMinimumPIN"]] +
+                        dry_run_args(opts) + [path])
+    if r != 0:
+        show_message("Error: Failed to set minimum PIN length.", "Error")
+        return 1
+
+
+def user_updates(path):
+    """Read an -updateUsers file into the CSV fido2-token2 -S -c -t takes.
+    A CSV file is passed as it is."""
+    import csv
+    import io
+
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if not text.lstrip().startswith("{"):
+        return text
+    try:
+        updates = json.loads(text)
+    except ValueError as e:
+        raise UsageError(f"{path}: {e}")
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    for credential_id, user in updates.items():
+        if not isinstance(user, dict):
+            raise UsageError(f"{path}: {credential_id}: expected an object")
+        writer.writerow([credential_id, user.get("name") or "",
+                         user.get("display_name") or ""])
+    return out.getvalue()
+
+
+def cmd_update_users(opts, path):
+    updates = user_updates(opts["updateUsers"])
+    sys.stdout.flush()
+    return subprocess.run([FIDO2_TOKEN_CMD, "-S", "-c", "-t"] +
+                          pin_args(opts["pin"]) + ["-", path],
+                          input=updates, text=True).returncode
+
+
+def device_command(opts, path):
+    """Dispatch in the order fido2-manage.sh checks its flags."""
+    if opts["reset"]:
+        return cmd_reset(opts, path)
+    if opts["changePIN"]:
+        show_message("Enter the old and new PIN below.")
+        token(["-C", path])
+    if opts["uvs"]:
+        show_message("Enforcing user verification.")
+        token(["-Su"] + dry_run_args(opts) + [path])
+    if opts["uvd"]:
+        show_message("Disabling user verification.")
+        token(["-Du"] + dry_run_args(opts) + [path])
+    if opts["setPIN"]:
+        show_message("Enter and confirm the PIN as prompted below.")
+        token(["-S", path])
+    if opts["setMinimumPIN"]:
+        return cmd_set_minimum_pin(opts, path)
+    if opts["delete"] and opts["credential"]:
+        return cmd_delete(opts, path)
+    if opts["updateUsers"]:
+        return cmd_update_users(opts, path)
+    if opts["fingerprint"]:
+        return cmd_fingerprint(opts, path)
+    if opts["storage"]:
+        return cmd_storage(opts, path)
+    if opts["residentKeys"]:
+        if opts["domain"]:
+            return cmd_resident_keys(opts, path)
+        return cmd_relying_parties(opts, path)
+    if opts["info"]:
+        return cmd_info(opts, path)
+
+
+def command_name(opts):
+    for name in JSON_COMMANDS:
+        if opts[name]:
+            return name
+    return None
+
+
+def main(argv=None):
+    try:
+        opts = parse_args(sys.argv[1:] if argv is None else argv)
+    except UsageError as e:
+        show_message(str(e), "Error")
+        return 1
+
+    if opts["help"]:
+        print(HELP, end="")
+        return 0
+
+    if not any(opts[k] for k in opts if k not in ("dryRun", "json", "pin")):
+        print(HELP, end="")
+        return 1
+
+    if opts["json"] and command_name(opts) is None:
+        show_message("--json is only supported with " +
+                     ", ".join("-" + c for c in JSON_COMMANDS), "Error")
+        return 1
+
+    try:
+        libfido2 = _libfido2()
+    except OSError as e:
+        show_message(f"Cannot load libfido2: {e}", "Error")
+        return 1
+
+    try:
+        if opts["list"]:
+            result = cmd_list(opts)
+        elif opts["device"] is not None:
+            result = device_command(opts, resolve(opts["device"]))
+        else:
+            return 0
+    except (UsageError, AddressError, RuntimeError, OSError,
+            libfido2.FidoError) as e:
+        show_message(str(e), "Error")
+        return 1
+    except KeyboardInterrupt:
+        return 130
+
+    if isinstance(result, int):
+        return result
+    if opts["json"]:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+"""
+Stable device addresses for the command line tools.
+
+A device can be addressed as:
+
+- N                   the Nth key in -list output, as fido2-manage.sh does;
+- /dev/hidrawN, pcsc://slot0, ...
+                      a libfido2 path, used as is;
+- serial:S            the key whose USB serial number is S (Linux);
+- aaguid:HEX[@PATH]   the key with this AAGUID, optionally at PATH.
+
+Resolutions are cached in $XDG_CACHE_HOME/fido2-manage/devices.json
+together with the identity of the devnodes involved (device number, inode
+and ctime, which change when a key is re-plugged). A cached entry is used
+only if stat() still reports the same identity, so a hit costs a few
+stat() calls instead of an enumeration, and a re-plugged key, or a
+different key that took over its position, always misses. Index entries
+additionally require the set of hidraw nodes to be unchanged, since a key
+plugged in elsewhere can shift positions without touching the cached one.
+"""
+
+import json
+import os
+import re
+import tempfile
+
+CACHE_VERSION = 1
+
+_PORT = re.compile(r"^\d+-[\d.]+$")
+
+
+class AddressError(Exception):
+    pass
+
+
+def _libfido2():
+    from . import libfido2
+    return libfido2
+
+
+def cache_path():
+    override = os.environ.get("FIDO2_DEVICE_CACHE")
+    if override:
+        return override
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "fido2-manage", "devices.json")
+
+
+def node_identity(path):
+    """Identity of a devnode, or None if path is not a file (pcsc://,
+    ioreg://, windows://) or does not exist."""
+    try:
+        st = os.stat(path)
+    except (OSError, ValueError):
+        return None
+    return [st.st_rdev, st.st_ino, st.st_ctime_ns]
+
+
+def hidraw_nodes():
+    try:
+        return sorted(n for n in os.listdir("/dev") if n.startswith("hidraw"))
+    except OSError:
+        return None
+
+
+FIDO_USAGE_PAGE = 0xf1d0
+
+
+def _usage_pages(descriptor):
+    """Yield every Usage Page set in a HID report descriptor."""
+    i = 0
+    while i < len(descriptor):
+        prefix = descriptor[i]
+        if prefix == 0xfe:  # long item
+            if i + 1 >= len(descriptor):
+                return
+            i += 3 + descriptor[i + 1]
+            continue
+        size = (0, 1, 2, 4)[prefix & 3]
+        if prefix & 0xfc == 0x04:  # Usage Page
+            yield int.from_bytes(descriptor[i + 1:i + 1 + size], "little")
+        i += 1 + size
+
+
+def fido_hidraw_nodes():
+    """The hidraw nodes of FIDO keys, told from mice, keyboards and
+    headsets by the FIDO usage page in their report descriptor, as libfido2
+    does (Linux only)."""
+    names = hidraw_nodes()
+    if names is None:
+        return None
+    fido = []
+    for name in names:
+        try:
+            with open(f"/sys/class/hidraw/{name}/device/report_descriptor",
+                      "rb") as f:
+                descriptor = f.read()
+        except OSError:
+            continue
+        if FIDO_USAGE_PAGE in _usage_pages(descriptor):
+            fido.append(name)
+    return fido
+
+
+def usb_serial(path):
+    """USB serial number of a hidraw node, from sysfs (Linux only)."""
+    name = os.path.basename(path)
+    try:
+        with open(f"/sys/class/hidraw/{name}/device/uevent") as f:
+            for line in f:
+                if line.startswith("HID_UNIQ="):
+                    return line[len("HID_UNIQ="):].strip() or None
+    except OSError:
+        pass
+    return None
+
+
+def usb_port(path):
+    """USB port of a hidraw node as sysfs names it, e.g. 1-2.3 for port 3
+    of the hub on port 2 of bus 1 (Linux only)."""
+    name = os.path.basename(path)
+    device = os.path.realpath(f"/sys/class/hidraw/{name}/device")
+    ports = [p for p in device.split("/") if _PORT.match(p)]
+    return ports[-1] if ports else None
+
+
+class Resolver:
+    """Resolve addresses to libfido2 paths through the on-disk cache."""
+
+    def __init__(self, path=None):
+        self.path = path or cache_path()
+        self.hits = 0
+        self.misses = 0
+        self._entries = None
+        self._devices = None
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                with open(self.path) as f:
+                    data = json.load(f)
+                self._entries = (data["entries"]
+                                 if data.get("version") == CACHE_VERSION
+                                 else {})
+            except (OSError, ValueError, KeyError, AttributeError):
+                self._entries = {}
+        return self._entries
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(prefix=".devices-", dir=directory)
+            with os.fdopen(fd, "w") as f:
+                json.dump({"version": CACHE_VERSION,
+                           "entries": self._entries}, f)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass  # a cache that cannot be written only costs enumerations
+
+    def _manifest(self):
+        if self._devices is None:
+            self._devices = _libfido2().manifest()
+        return self._devices
+
+    def _lookup(self, address):
+        entry = self._load().get(address)
+        if entry is None:
+            return None
+        if entry.get("hidraw") is not None and \
+                entry["hidraw"] != hidraw_nodes():
+            return None
+        for path, identity in entry["nodes"]:
+            if identity is None or node_identity(path) != identity:
+                return None
+        if entry.get("serial") is not None and \
+                usb_serial(entry["path"]) != entry["serial"]:
+            return None
+        return entry["path"]
+
+    def _store(self, address, path, nodes, hidraw=None, serial=None):
+        identities = [[p, node_identity(p)] for p in nodes]
+        if any(identity is None for _, identity in identities):
+            return  # not a devnode; nothing cheap to validate against
+        self._load()[address] = {"path": path, "nodes": identities,
+                                 "hidraw": hidraw, "serial": serial}
+        self._save()
+
+    def resolve(self, address):
+        """Return the libfido2 path for address."""
+        address = address.strip()
+        if address.isdigit():
+            kind = "index"
+        elif address.startswith("serial:"):
+            kind = "serial"
+        elif address.startswith("aaguid:"):
+            kind = "aaguid"
+        else:
+            return address
+
+        path = self._lookup(address)
+        if path is not None:
+            self.hits += 1
+            return path
+        self.misses += 1
+        return getattr(self, f"_resolve_{kind}")(address)
+
+    def _resolve_index(self, address):
+        hidraw = hidraw_nodes()
+        devices = self._manifest()
+        paths = [d.path for d in devices]
+        if "pcsc://slot0" in paths:
+            return "pcsc://slot0"  # as fido2-manage.sh
+        index = int(address) - 1
+        if not 0 <= index < len(paths):
+            raise AddressError(f"No device [{address}] found")
+        # the position depends on every key listed, so all are validated
+        self._store(address, paths[index], paths, hidraw=hidraw)
+        return paths[index]
+
+    def _resolve_serial(self, address):
+        serial = address[len("serial:"):]
+        for d in self._manifest():
+            if usb_serial(d.path) == serial:
+                self._store(address, d.path, [d.path], serial=serial)
+                return d.path
+        raise AddressError(f"No device with serial number {serial} found")
+
+    def _resolve_aaguid(self, address):
+        spec, _, path = address[len("aaguid:"):].partition("@")
+        try:
+            aaguid = bytes.fromhex(spec.replace("-", ""))
+        except ValueError:
+            raise AddressError(f"Invalid AAGUID: {spec}")
+        candidates = [path] if path else [d.path for d in self._manifest()]
+        libfido2 = _libfido2()
+        matches = []
+        for candidate in candidates:
+            try:
+                with libfido2.Device(candidate) as dev:
+                    if dev.cbor_info()["aaguid"] == aaguid:
+                        matches.append(candidate)
+            except libfido2.FidoError:
+                continue
+        if not matches:
+            raise AddressError(f"No device with AAGUID {spec} found" +
+                               (f" at {path}" if path else ""))
+        if len(matches) > 1:
+            raise AddressError(f"Several devices have AAGUID {spec}; "
+                               f"use aaguid:{spec}@PATH or serial:")
+        self._store(address, matches[0], [matches[0]])
+        return matches[0]
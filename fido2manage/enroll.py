@@ -0,0 +1,164 @@
+"""
+Fingerprint enrollment in process, reporting every sample as it is taken.
+
+    python3 -m fido2manage.enroll -device 1 [-pin PIN] [-timeout 10]
+
+An Enrollment drives fido_bio_dev_enroll_begin() and
+fido_bio_dev_enroll_continue() through libfido2.Device.bio_enroll() on the
+device's Scheduler worker, so it waits behind, and never races, other
+operations on the key. Each sample is put on a queue as an EnrollSample the
+moment the key reports it; the GUIs drain it from their event loop with
+poll(), and only the worker waits for the finger.
+
+cancel() may be called from any thread. It ends the enrollment before the
+next sample and, through Device.cancel(), ends a sample being waited for at
+once; closing the bio_enroll() generator then calls
+fido_bio_dev_enroll_cancel().
+
+From the command line, samples are printed as [Info] lines like those of
+fido2-manage.sh, and the new template ID last. The PIN may also be given
+in FIDO2_PIN, as for fido2-token2.
+"""
+
+import queue
+import sys
+import threading
+
+from .records import EnrollSample
+from .scheduler import TOUCH
+
+
+class Enrollment:
+    """One enrollment on the key at path. start() returns a Future for the
+    new template ID, or None if the enrollment was cancelled."""
+
+    def __init__(self, scheduler, path, pin, timeout_ms=10000):
+        self.scheduler = scheduler
+        self.path = path
+        self.pin = pin
+        self.timeout_ms = timeout_ms
+        self.samples = queue.Queue()
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._dev = None
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def start(self):
+        return self.scheduler.submit(self.path, self._run, lane=TOUCH,
+                                     label="enroll")
+
+    def poll(self):
+        """Return the samples taken since the last poll(), without
+        blocking."""
+        taken = []
+        while True:
+            try:
+                taken.append(self.samples.get_nowait())
+            except queue.Empty:
+                return taken
+
+    def cancel(self):
+        self._cancelled.set()
+        with self._lock:
+            if self._dev is not None:
+                try:
+                    self._dev.cancel()
+                except Exception:
+                    pass  # the sample ends on its own at the timeout
+
+    def _run(self):
+        from . import libfido2
+
+        if self.cancelled:
+            return None
+        dev = libfido2.Device(self.path)
+        with self._lock:
+            self._dev = dev
+        try:
+            enroll = dev.bio_enroll(self.pin, self.timeout_ms)
+            try:
+                while not self.cancelled:
+                    status, remaining = next(enroll)
+                    self.samples.put(EnrollSample(
+                        status, libfido2.bio_enroll_strerr(status),
+                        remaining))
+            except StopIteration as done:
+                return done.value
+            except libfido2.FidoError:
+                # a cancelled sample fails, typically with
+                # FIDO_ERR_KEEPALIVE_CANCEL
+                if self.cancelled:
+                    return None
+                raise
+            finally:
+                enroll.close()
+            return None
+        finally:
+            with self._lock:
+                self._dev = None
+            dev.close()
+
+
+def run(path, pin, timeout_ms=10000):
+    """Enroll on path, printing every sample as it is taken; return the
+    exit status."""
+    from .records import b64
+    from .scheduler import Scheduler
+
+    enrollment = Enrollment(Scheduler(), path, pin, timeout_ms)
+    future = enrollment.start()
+    print("[Info] Touch the sensor.", flush=True)
+    try:
+        while True:
+            try:
+                sample = enrollment.samples.get(timeout=0.1)
+            except queue.Empty:
+                if future.done():
+                    break
+                continue
+            left = (f", {sample.remaining} more sample"
+                    f"{'' if sample.remaining == 1 else 's'}"
+                    if sample.remaining else "")
+            print(f"[Info] {sample.message}{left}.", flush=True)
+        template_id = future.result()
+    except KeyboardInterrupt:
+        enrollment.cancel()
+        future.exception()  # wait for the key to be released
+        print("[Info] Enrollment canceled.")
+        return 1
+    except Exception as e:
+        print(f"[Error] {e}", file=sys.stderr)
+        return 1
+    print(f"[Info] Enrolled fingerprint {b64(template_id)}.")
+    return 0
+
+
+def main(argv=None):
+    import argparse
+    import os
+
+    from .devices import AddressError, Resolver
+
+    parser = argparse.ArgumentParser(
+        description="Enroll a fingerprint, printing every sample.")
+    parser.add_argument("-device", required=True,
+                        help="key to enroll on (see devices.py)")
+    parser.add_argument("-pin")
+    parser.add_argument("-timeout", type=int, default=10,
+                        help="seconds to wait for each sample")
+    args = parser.parse_intermixed_args(argv)
+
+    try:
+        path = Resolver().resolve(args.device)
+    except AddressError as e:
+        print(f"[Error] {e}", file=sys.stderr)
+        return 2
+    return run(path, args.pin or os.environ.get("FIDO2_PIN"),
+               args.timeout * 1000)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,84 @@
+"""
+The fingerprints of a bio key, read once per device session.
+
+read() is a Session read (see prefetch.py) that opens the key once for both
+fido_bio_dev_get_info() and fido_bio_dev_get_template_array(); the GUIs
+keep its Fingerprints record as the session's "fingerprints". rename() and
+remove() change the key in process on the device's Scheduler worker and,
+when the key accepts the change, patch that record with added(), renamed()
+or removed() instead of enumerating the templates again, so the
+Fingerprints window redraws from memory. An enrollment (see enroll.py)
+patches it with the new template ID in the same way. Refresh re-reads.
+
+PINs are as the GUIs hold them: "0000" stands for no PIN.
+"""
+
+from dataclasses import replace
+
+from .records import BioTemplate, Fingerprints
+
+NAME = "fingerprints"
+
+
+def _pin(pin):
+    return pin if pin and pin != "0000" else None
+
+
+def read(s):
+    """Return the key's Fingerprints; a key with none enrolled may refuse
+    to enumerate them, which reads as an empty list."""
+    from . import libfido2
+
+    with libfido2.Device(s.device) as dev:
+        sensor_type, max_samples = dev.bio_info()
+        s.check()
+        try:
+            templates = tuple(dev.bio_templates(_pin(s.pin)))
+        except libfido2.FidoError as e:
+            if e.code != libfido2.FIDO_ERR_INVALID_OPTION:
+                raise
+            templates = ()
+    return Fingerprints(templates, sensor_type, max_samples)
+
+
+def added(fps, template_id, name=None):
+    if any(t.template_id == template_id for t in fps.templates):
+        return fps
+    return replace(fps, templates=fps.templates +
+                   (BioTemplate(template_id, name),))
+
+
+def renamed(fps, template_id, name):
+    return replace(fps, templates=tuple(
+        BioTemplate(t.template_id, name) if t.template_id == template_id
+        else t for t in fps.templates))
+
+
+def removed(fps, template_id):
+    return replace(fps, templates=tuple(
+        t for t in fps.templates if t.template_id != template_id))
+
+
+def _change(s, op, patch):
+    from . import libfido2
+
+    s.check()
+    with libfido2.Device(s.device) as dev:
+        op(dev)
+    s.patch(NAME, patch)
+
+
+def rename(s, template_id, name):
+    """Name the template on the key; returns a Future."""
+    return s.scheduler.submit(
+        s.device, _change, s,
+        lambda dev: dev.bio_set_name(template_id, name, _pin(s.pin)),
+        lambda fps: renamed(fps, template_id, name), label="bio rename")
+
+
+def remove(s, template_id):
+    """Delete the template from the key; returns a Future."""
+    return s.scheduler.submit(
+        s.device, _change, s,
+        lambda dev: dev.bio_remove(template_id, _pin(s.pin)),
+        lambda fps: removed(fps, template_id), label="bio remove")
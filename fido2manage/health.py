@@ -0,0 +1,233 @@
+"""
+Health and latency probe for attached authenticators, to tell a flaky hub
+or a marginal NFC reader from a bad key.
+
+    python3 -m fido2manage.health [-n 50] [-probe getinfo|open]
+                                  [-timeout 2000] [-retries 2] [-json]
+                                  [DEVICE ...]
+
+Every key (or each DEVICE, addressed as in fido2manage.devices) is probed
+in its own thread, so a station full of keys is done in the time the
+slowest one takes. A probe is -n cheap round trips that need no PIN or
+touch:
+
+    getinfo   authenticatorGetInfo on one open handle (the default; keys
+              without CTAP2 fall back to open)
+    open      open and close the key: CTAPHID_INIT, and getInfo on CTAP2
+              keys, every time
+
+Each round trip is timed; a failure is counted by its libfido2 error name
+(FIDO_ERR_RX, FIDO_ERR_TIMEOUT, ...) and the probe goes on. Busy or lost
+responses are retried as fido_dev_set_retry_policy(3) describes, -retries
+times with a 10 ms backoff; the retries libfido2 performed are reported
+(fido_dev_io_retries()), as a key that mostly succeeds on a retry is sitting
+on a bad link too.
+
+Results are per key, with its USB port (sysfs name, e.g. 1-2.3; Linux) or
+libfido2 path otherwise, so that a port that fails whatever key is put in
+it stands out. With -json, one JSON object per key goes to stdout, with the
+latency histogram as counts per upper bound in milliseconds. The exit
+status is 1 if any round trip failed.
+"""
+
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .devices import usb_port
+
+# upper bounds, in milliseconds, of the latency histogram
+BUCKETS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+PROBES = ("getinfo", "open")
+
+
+def _percentile(times, q):
+    return times[min(len(times) - 1, int(len(times) * q))]
+
+
+def summarize(device, probe, times, errors, retries):
+    """Build the report of one key from its round-trip times (in seconds)
+    and {error name: count}."""
+    rounds = len(times) + sum(errors.values())
+    histogram = [0] * (len(BUCKETS) + 1)
+    for t in times:
+        ms = t * 1000
+        histogram[next((i for i, bound in enumerate(BUCKETS)
+                        if ms <= bound), len(BUCKETS))] += 1
+    times = sorted(times)
+    latency = None
+    if times:
+        latency = {
+            "min": times[0] * 1000,
+            "p50": _percentile(times, 0.5) * 1000,
+            "p95": _percentile(times, 0.95) * 1000,
+            "p99": _percentile(times, 0.99) * 1000,
+            "max": times[-1] * 1000,
+            "mean": sum(times) / len(times) * 1000,
+        }
+    return {
+        "device": device.path,
+        "description": device.description,
+        "port": (usb_port(device.path) if device.path.startswith("/dev/")
+                 else None) or device.path,
+        "probe": probe,
+        "rounds": rounds,
+        "ok": len(times),
+        "error_rate": (rounds - len(times)) / rounds if rounds else None,
+        "errors": dict(sorted(errors.items())),
+        "retries": retries,
+        "latency_ms": latency,
+        "histogram_ms": dict(zip([str(b) for b in BUCKETS] + ["+Inf"],
+                                 histogram)),
+    }
+
+
+def probe(device, rounds, probe="getinfo", timeout_ms=2000, retries=2):
+    """Run the probe on one key; returns its report."""
+    from . import libfido2
+
+    times = []
+    errors = {}
+    io_retries = [0]
+
+    def failed(e):
+        errors[e.name] = errors.get(e.name, 0) + 1
+
+    def open_dev():
+        # -timeout and -retries have to cover the open itself
+        try:
+            return libfido2.Device(device.path, timeout_ms,
+                                   retry=(retries, 10))
+        except NotImplementedError:
+            return libfido2.Device(device.path, timeout_ms)
+
+    def close_dev(dev):
+        try:
+            n = dev.io_retries()
+        except NotImplementedError:
+            n = None
+        dev.close()
+        if n is None or io_retries[0] is None:
+            io_retries[0] = None
+        else:
+            io_retries[0] += n
+
+    def timed(func):
+        start = time.perf_counter()
+        try:
+            result = func()
+        except libfido2.FidoError as e:
+            failed(e)
+            return None
+        times.append(time.perf_counter() - start)
+        return result
+
+    if probe == "getinfo":
+        dev = timed(open_dev)
+        if dev is None:
+            return summarize(device, probe, [], errors, None)
+        times.clear()  # opening is not a getinfo round trip
+        try:
+            if dev.is_fido2():
+                for _ in range(rounds):
+                    timed(dev.cbor_info)
+            else:
+                probe = "open"
+        finally:
+            close_dev(dev)
+    if probe == "open":
+        for _ in range(rounds):
+            dev = timed(open_dev)
+            if dev is not None:
+                close_dev(dev)
+    return summarize(device, probe, times, errors, io_retries[0])
+
+
+def run(devices, rounds, probe_name="getinfo", timeout_ms=2000, retries=2):
+    """Probe every device at once; returns their reports in order."""
+    with ThreadPoolExecutor(max_workers=max(len(devices), 1),
+                            thread_name_prefix="fido2-health") as pool:
+        return list(pool.map(
+            lambda d: probe(d, rounds, probe_name, timeout_ms, retries),
+            devices))
+
+
+def _ms(value):
+    return f"{value:.1f}" if value is not None else "-"
+
+
+def print_table(reports):
+    print(f"{'port':<16} {'ok':>9} {'err%':>6} {'p50':>7} {'p95':>7} "
+          f"{'max':>7} {'retries':>7}  errors")
+    for r in reports:
+        latency = r["latency_ms"] or {}
+        rate = r["error_rate"]
+        print(f"{r['port']:<16} {r['ok']:>4}/{r['rounds']:<4} "
+              f"{rate * 100 if rate is not None else 0:>6.1f} "
+              f"{_ms(latency.get('p50')):>7} {_ms(latency.get('p95')):>7} "
+              f"{_ms(latency.get('max')):>7} "
+              f"{r['retries'] if r['retries'] is not None else '-':>7}  "
+              + ", ".join(f"{name} x{n}" for name, n in
+                          r["errors"].items()))
+
+
+def main(argv=None):
+    import argparse
+
+    from . import libfido2
+    from .devices import AddressError, Resolver
+    from .records import DeviceInfo
+
+    parser = argparse.ArgumentParser(
+        description="Probe the attached keys for errors and latency.")
+    parser.add_argument("device", nargs="*",
+                        help="keys to probe (default: all attached)")
+    parser.add_argument("-n", type=int, default=50,
+                        help="round trips per key (default: 50)")
+    parser.add_argument("-probe", choices=PROBES, default="getinfo")
+    parser.add_argument("-timeout", type=int, default=2000,
+                        help="milliseconds per round trip (default: 2000)")
+    parser.add_argument("-retries", type=int, default=2,
+                        help="retries of a busy or lost response "
+                             "(default: 2)")
+    parser.add_argument("-json", action="store_true",
+                        help="one JSON object per key")
+    args = parser.parse_intermixed_args(argv)
+
+    try:
+        attached = libfido2.manifest()
+        if args.device:
+            resolver = Resolver()
+            by_path = {d.path: d for d in attached}
+            devices = []
+            for address in args.device:
+                path = resolver.resolve(address)
+                devices.append(by_path.get(path) or
+                               DeviceInfo(len(devices) + 1, path, path,
+                                          None, None))
+        else:
+            devices = attached
+    except (AddressError, libfido2.FidoError, OSError) as e:
+        print(f"[Error] {e}", file=sys.stderr)
+        return 2
+    if not devices:
+        print("[Error] No devices found.", file=sys.stderr)
+        return 2
+
+    start = time.perf_counter()
+    reports = run(devices, max(args.n, 1), args.probe, args.timeout,
+                  args.retries)
+    if args.json:
+        for r in reports:
+            print(json.dumps(r))
+    else:
+        print_table(reports)
+        print(f"{len(reports)} keys probed in "
+              f"{time.perf_counter() - start:.1f} s", file=sys.stderr)
+    return 1 if any(r["ok"] < r["rounds"] for r in reports) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,145 @@
+"""
+Find out which attached key is which: every key blinks, and the one touched
+first is reported.
+
+    python3 -m fido2manage.identify [-timeout 30]
+
+An Identify calls fido_dev_get_touch_begin() on all keys at once, one
+operation per key on its Scheduler worker, so the keys are asked in
+parallel and each request waits behind, never races, other operations on
+the same key. Every worker then polls fido_dev_get_touch_status() for
+poll_ms at a time; the first to see a touch resolves the Future returned
+by start(), and the others stop within poll_ms and send CTAPHID_CANCEL
+(fido_dev_cancel()) so that their keys stop blinking. The time to a result
+is the time to the touch plus at most one poll.
+
+A key that fails (unplugged, or not a FIDO key after all) is left out; the
+Future only fails if every key did. It resolves to None at the timeout or
+after cancel().
+
+From the command line, the touched key is printed as in -list output, with
+its libfido2 path.
+"""
+
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+from .scheduler import TOUCH
+
+
+class Identify:
+    """Ask every key in devices, a dict of libfido2 paths keyed by the
+    Scheduler queue each one is used through, for a touch. start() returns a
+    Future for the key of the first key touched."""
+
+    def __init__(self, scheduler, devices, timeout_ms=30000, poll_ms=100):
+        self.scheduler = scheduler
+        self.devices = dict(devices)
+        self.timeout_ms = timeout_ms
+        self.poll_ms = poll_ms
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._left = len(self.devices)
+        self._error = None
+        self._result = Future()
+
+    def start(self):
+        self._result.set_running_or_notify_cancel()
+        if not self.devices:
+            self._result.set_result(None)
+        for key, path in self.devices.items():
+            future = self.scheduler.submit(key, self._wait, key, path,
+                                           lane=TOUCH, label="identify")
+            future.add_done_callback(self._finished)
+        return self._result
+
+    def cancel(self):
+        self._stop.set()
+
+    def _finished(self, future):
+        with self._lock:
+            self._left -= 1
+            if not future.cancelled() and future.exception() is not None \
+                    and self._error is None:
+                self._error = future.exception()
+            if self._left or self._result.done():
+                return
+        if self._error is not None and not self._stop.is_set():
+            self._result.set_exception(self._error)
+        else:
+            self._result.set_result(None)
+
+    def _touched(self, key):
+        with self._lock:
+            if self._result.done():
+                return
+            self._stop.set()
+            self._result.set_result(key)
+
+    def _wait(self, key, path):
+        from . import libfido2
+
+        if self._stop.is_set():
+            return
+        deadline = time.monotonic() + self.timeout_ms / 1000
+        with libfido2.Device(path) as dev:
+            dev.touch_begin()
+            while not self._stop.is_set():
+                if dev.touch_status(self.poll_ms):
+                    self._touched(key)
+                    return
+                if time.monotonic() >= deadline:
+                    self._stop.set()
+                    break
+            try:
+                dev.cancel()
+            except libfido2.FidoError:
+                pass  # the key stops blinking at its own timeout
+
+
+def main(argv=None):
+    import argparse
+
+    from . import libfido2
+    from .scheduler import Scheduler
+
+    parser = argparse.ArgumentParser(
+        description="Blink every attached key and report the one touched.")
+    parser.add_argument("-timeout", type=float, default=30,
+                        help="seconds to wait for a touch (default: 30)")
+    args = parser.parse_args(argv)
+
+    try:
+        devices = libfido2.manifest()
+    except (libfido2.FidoError, OSError) as e:
+        print(f"[Error] {e}", file=sys.stderr)
+        return 1
+    if not devices:
+        print("[Error] No devices found.", file=sys.stderr)
+        return 1
+    identify = Identify(Scheduler(), {d.path: d.path for d in devices},
+                        int(args.timeout * 1000))
+    future = identify.start()
+    print(f"[Info] Touch the key to identify ({len(devices)} blinking).",
+          flush=True)
+    try:
+        path = future.result()
+    except KeyboardInterrupt:
+        identify.cancel()
+        future.exception()  # wait for the keys to stop blinking
+        return 1
+    except Exception as e:
+        print(f"[Error] {e}", file=sys.stderr)
+        return 1
+    if path is None:
+        print("[Error] No key was touched.", file=sys.stderr)
+        return 1
+    device = next(d for d in devices if d.path == path)
+    print(f"{device.label} ({device.path})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
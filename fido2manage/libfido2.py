@@ -0,0 +1,838 @@
+"""
+ctypes binding for the subset of libfido2 used by the management tools.
+
+Every libfido2 function is called through a ctypes.CDLL, which releases the
+GIL for the duration of the foreign call. Blocking CTAP I/O such as
+fido_dev_get_cbor_info(), fido_credman_get_dev_rk() or
+fido_bio_dev_enroll_continue() therefore only blocks the calling thread, and
+several authenticators can be driven from one process in parallel.
+
+Thread safety:
+
+- fido_init() is called once, when this module is imported.
+- A Device wraps one fido_dev_t. libfido2 keeps per-handle channel state
+  (CID, nonce, pending keepalives), so a Device must not be used by more
+  than one thread at a time. Distinct Device objects, including two handles
+  on the same path, may be used from distinct threads.
+  The exception is Device.cancel(), which only sends CTAPHID_CANCEL and
+  may be called while another thread waits in a touch- or
+  fingerprint-gated call on the same Device, to end it early.
+- Everything a Device method returns is plain Python data, or a frozen
+  record from fido2manage.records, copied out of the libfido2 object, which
+  is freed before the method returns. Results can be shared between threads
+  freely.
+- manifest(), cred_verify() and assert_verify() allocate their own
+  libfido2 objects and are safe to call from any thread.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import sys
+import time
+
+from .metrics import REGISTRY as _metrics
+from .records import BioTemplate, DeviceInfo, RelyingParty, ResidentKey
+
+FIDO_OK = 0x00
+FIDO_ERR_TIMEOUT = 0x05
+FIDO_ERR_CHANNEL_BUSY = 0x06
+FIDO_ERR_INVALID_OPTION = 0x2c
+FIDO_ERR_NOT_ALLOWED = 0x30
+FIDO_ERR_PIN_REQUIRED = 0x36
+FIDO_ERR_UNAUTHORIZED_PERM = 0x40
+FIDO_ERR_UV_BLOCKED = 0x3c
+FIDO_ERR_UV_INVALID = 0x3f
+FIDO_ERR_TX = -1
+FIDO_ERR_RX = -2
+FIDO_ERR_INVALID_ARGUMENT = -7
+
+FIDO_OPT_TRUE = 2
+
+FIDO_REPLAY_REALTIME = 0x01
+
+FIDO_EXT_HMAC_SECRET = 0x01
+FIDO_EXT_CRED_PROTECT = 0x02
+FIDO_EXT_LARGEBLOB_KEY = 0x04
+FIDO_EXT_CRED_BLOB = 0x08
+FIDO_EXT_MINPINLEN = 0x10
+
+# extension names as WebAuthn and fido2-cred/fido2-assert spell them
+EXTENSIONS = {
+    "hmac-secret": FIDO_EXT_HMAC_SECRET,
+    "credProtect": FIDO_EXT_CRED_PROTECT,
+    "largeBlobKey": FIDO_EXT_LARGEBLOB_KEY,
+    "credBlob": FIDO_EXT_CRED_BLOB,
+    "minPinLength": FIDO_EXT_MINPINLEN,
+}
+
+# COSE algorithm -> prefix of the libfido2 public key type
+_PK_TYPES = {-7: "es256", -35: "es384", -257: "rs256", -8: "eddsa"}
+
+FIDO_BIO_ENROLL_FP_GOOD = 0x00
+
+_BIO_ENROLL_STATUS = {
+    0x00: "Sample ok",
+    0x01: "Sample too high",
+    0x02: "Sample too low",
+    0x03: "Sample too left",
+    0x04: "Sample too right",
+    0x05: "Sample too fast",
+    0x06: "Sample too slow",
+    0x07: "Poor quality sample",
+    0x08: "Sample too skewed",
+    0x09: "Sample too short",
+    0x0a: "Sample merge failure",
+    0x0b: "Sample exists",
+    0x0c: "Fingerprint database full",
+    0x0d: "No user activity",
+    0x0e: "No user presence transition",
+}
+
+
+class FidoError(Exception):
+    """A libfido2 call returned something other than FIDO_OK."""
+
+    def __init__(self, func, code):
+        self.func = func
+        self.code = code
+        self.name = strerr(code)
+        super().__init__(f"{func}: {self.name} (0x{code & 0xffffffff:x})")
+
+
+def _load_library():
+    override = os.environ.get("FIDO2_LIBRARY")
+    if override:
+        return ctypes.CDLL(override)
+    if sys.platform == "darwin":
+        default = "libfido2.1.dylib"
+    elif sys.platform.startswith("win"):
+        default = "fido2.dll"
+    else:
+        default = "libfido2.so.1"
+    try:
+        return ctypes.CDLL(default)
+    except OSError:
+        # find_library() spawns ldconfig or a compiler; only pay for it
+        # when the default name does not resolve
+        found = ctypes.util.find_library("fido2")
+        if not found:
+            raise
+        return ctypes.CDLL(found)
+
+
+_lib = _load_library()
+
+_p = ctypes.c_void_p
+_c = ctypes.c_char_p
+_sz = ctypes.c_size_t
+_int = ctypes.c_int
+_u8p = ctypes.POINTER(ctypes.c_ubyte)
+
+_PROTOTYPES = {
+    "fido_init": (None, [_int]),
+    "fido_strerr": (_c, [_int]),
+    "fido_dev_info_new": (_p, [_sz]),
+    "fido_dev_info_free": (None, [ctypes.POINTER(_p), _sz]),
+    "fido_dev_info_manifest": (_int, [_p, _sz, ctypes.POINTER(_sz)]),
+    "fido_dev_info_ptr": (_p, [_p, _sz]),
+    "fido_dev_info_path": (_c, [_p]),
+    "fido_dev_info_vendor": (ctypes.c_int16, [_p]),
+    "fido_dev_info_product": (ctypes.c_int16, [_p]),
+    "fido_dev_info_manufacturer_string": (_c, [_p]),
+    "fido_dev_info_product_string": (_c, [_p]),
+    "fido_dev_new": (_p, []),
+    "fido_dev_free": (None, [ctypes.POINTER(_p)]),
+    "fido_dev_open": (_int, [_p, _c]),
+    "fido_dev_close": (_int, [_p]),
+    "fido_dev_set_timeout": (_int, [_p, _int]),
+    "fido_dev_is_fido2": (ctypes.c_bool, [_p]),
+    "fido_dev_has_pin": (ctypes.c_bool, [_p]),
+    "fido_dev_get_retry_count": (_int, [_p, ctypes.POINTER(_int)]),
+    "fido_dev_get_uv_retry_count": (_int, [_p, ctypes.POINTER(_int)]),
+    "fido_dev_get_touch_begin": (_int, [_p]),
+    "fido_dev_get_touch_status": (_int, [_p, ctypes.POINTER(_int), _int]),
+    "fido_dev_cancel": (_int, [_p]),
+    "fido_dev_reset": (_int, [_p]),
+    "fido_cbor_info_new": (_p, []),
+    "fido_cbor_info_free": (None, [ctypes.POINTER(_p)]),
+    "fido_dev_get_cbor_info": (_int, [_p, _p]),
+    "fido_cbor_info_aaguid_ptr": (_u8p, [_p]),
+    "fido_cbor_info_aaguid_len": (_sz, [_p]),
+    "fido_cbor_info_versions_ptr": (ctypes.POINTER(_c), [_p]),
+    "fido_cbor_info_versions_len": (_sz, [_p]),
+    "fido_cbor_info_extensions_ptr": (ctypes.POINTER(_c), [_p]),
+    "fido_cbor_info_extensions_len": (_sz, [_p]),
+    "fido_cbor_info_transports_ptr": (ctypes.POINTER(_c), [_p]),
+    "fido_cbor_info_transports_len": (_sz, [_p]),
+    "fido_cbor_info_options_name_ptr": (ctypes.POINTER(_c), [_p]),
+    "fido_cbor_info_options_value_ptr": (ctypes.POINTER(ctypes.c_bool), [_p]),
+    "fido_cbor_info_options_len": (_sz, [_p]),
+    "fido_cbor_info_fwversion": (ctypes.c_uint64, [_p]),
+    "fido_cbor_info_maxlargeblob": (ctypes.c_uint64, [_p]),
+    "fido_cbor_info_maxrpid_minpinlen": (ctypes.c_uint64, [_p]),
+    "fido_cbor_info_minpinlen": (ctypes.c_uint64, [_p]),
+    "fido_cbor_info_rk_remaining": (ctypes.c_int64, [_p]),
+    "fido_cbor_info_new_pin_required": (ctypes.c_bool, [_p]),
+    "fido_credman_metadata_new": (_p, []),
+    "fido_credman_metadata_free": (None, [ctypes.POINTER(_p)]),
+    "fido_credman_get_dev_metadata": (_int, [_p, _p, _c]),
+    "fido_credman_rk_existing": (ctypes.c_uint64, [_p]),
+    "fido_credman_rk_remaining": (ctypes.c_uint64, [_p]),
+    "fido_credman_rp_new": (_p, []),
+    "fido_credman_rp_free": (None, [ctypes.POINTER(_p)]),
+    "fido_credman_get_dev_rp": (_int, [_p, _p, _c]),
+    "fido_credman_rp_count": (_sz, [_p]),
+    "fido_credman_rp_id": (_c, [_p, _sz]),
+    "fido_credman_rp_name": (_c, [_p, _sz]),
+    "fido_credman_rp_id_hash_ptr": (_u8p, [_p, _sz]),
+    "fido_credman_rp_id_hash_len": (_sz, [_p, _sz]),
+    "fido_credman_rk_new": (_p, []),
+    "fido_credman_rk_free": (None, [ctypes.POINTER(_p)]),
+    "fido_credman_get_dev_rk": (_int, [_p, _c, _p, _c]),
+    "fido_credman_rk_count": (_sz, [_p]),
+    "fido_credman_rk": (_p, [_p, _sz]),
+    "fido_credman_del_dev_rk": (_int, [_p, _u8p, _sz, _c]),
+    "fido_cred_id_ptr": (_u8p, [_p]),
+    "fido_cred_id_len": (_sz, [_p]),
+    "fido_cred_user_id_ptr": (_u8p, [_p]),
+    "fido_cred_user_id_len": (_sz, [_p]),
+    "fido_cred_user_name": (_c, [_p]),
+    "fido_cred_display_name": (_c, [_p]),
+    "fido_cred_prot": (_int, [_p]),
+    "fido_cred_type": (_int, [_p]),
+    "fido_cred_largeblob_key_len": (_sz, [_p]),
+    "fido_cred_new": (_p, []),
+    "fido_cred_free": (None, [ctypes.POINTER(_p)]),
+    "fido_cred_set_type": (_int, [_p, _int]),
+    "fido_cred_set_clientdata_hash": (_int, [_p, _c, _sz]),
+    "fido_cred_set_rp": (_int, [_p, _c, _c]),
+    "fido_cred_set_fmt": (_int, [_p, _c]),
+    "fido_cred_set_authdata_raw": (_int, [_p, _c, _sz]),
+    "fido_cred_set_x509": (_int, [_p, _c, _sz]),
+    "fido_cred_set_sig": (_int, [_p, _c, _sz]),
+    "fido_cred_set_attstmt": (_int, [_p, _c, _sz]),
+    "fido_cred_set_uv": (_int, [_p, _int]),
+    "fido_cred_set_prot": (_int, [_p, _int]),
+    "fido_cred_set_extensions": (_int, [_p, _int]),
+    "fido_cred_verify": (_int, [_p]),
+    "fido_cred_x5c_ptr": (_u8p, [_p]),
+    "fido_cred_x5c_len": (_sz, [_p]),
+    "fido_assert_new": (_p, []),
+    "fido_assert_free": (None, [ctypes.POINTER(_p)]),
+    "fido_assert_set_count": (_int, [_p, _sz]),
+    "fido_assert_set_clientdata_hash": (_int, [_p, _c, _sz]),
+    "fido_assert_set_rp": (_int, [_p, _c]),
+    "fido_assert_set_authdata_raw": (_int, [_p, _sz, _c, _sz]),
+    "fido_assert_set_sig": (_int, [_p, _sz, _c, _sz]),
+    "fido_assert_set_up": (_int, [_p, _int]),
+    "fido_assert_set_uv": (_int, [_p, _int]),
+    "fido_assert_set_extensions": (_int, [_p, _int]),
+    "fido_assert_verify": (_int, [_p, _sz, _int, _p]),
+    "es256_pk_new": (_p, []),
+    "es256_pk_free": (None, [ctypes.POINTER(_p)]),
+    "es256_pk_from_ptr": (_int, [_p, _c, _sz]),
+    "es384_pk_new": (_p, []),
+    "es384_pk_free": (None, [ctypes.POINTER(_p)]),
+    "es384_pk_from_ptr": (_int, [_p, _c, _sz]),
+    "rs256_pk_new": (_p, []),
+    "rs256_pk_free": (None, [ctypes.POINTER(_p)]),
+    "rs256_pk_from_ptr": (_int, [_p, _c, _sz]),
+    "eddsa_pk_new": (_p, []),
+    "eddsa_pk_free": (None, [ctypes.POINTER(_p)]),
+    "eddsa_pk_from_ptr": (_int, [_p, _c, _sz]),
+    "fido_bio_info_new": (_p, []),
+    "fido_bio_info_free": (None, [ctypes.POINTER(_p)]),
+    "fido_bio_dev_get_info": (_int, [_p, _p]),
+    "fido_bio_info_type": (ctypes.c_uint8, [_p]),
+    "fido_bio_info_max_samples": (ctypes.c_uint8, [_p]),
+    "fido_bio_template_array_new": (_p, []),
+    "fido_bio_template_array_free": (None, [ctypes.POINTER(_p)]),
+    "fido_bio_dev_get_template_array": (_int, [_p, _p, _c]),
+    "fido_bio_template_array_count": (_sz, [_p]),
+    "fido_bio_template": (_p, [_p, _sz]),
+    "fido_bio_template_id_ptr": (_u8p, [_p]),
+    "fido_bio_template_id_len": (_sz, [_p]),
+    "fido_bio_template_name": (_c, [_p]),
+    "fido_bio_template_new": (_p, []),
+    "fido_bio_template_free": (None, [ctypes.POINTER(_p)]),
+    "fido_bio_template_set_id": (_int, [_p, _u8p, _sz]),
+    "fido_bio_template_set_name": (_int, [_p, _c]),
+    "fido_bio_enroll_new": (_p, []),
+    "fido_bio_enroll_free": (None, [ctypes.POINTER(_p)]),
+    "fido_bio_enroll_last_status": (ctypes.c_uint8, [_p]),
+    "fido_bio_enroll_remaining_samples": (ctypes.c_uint8, [_p]),
+    "fido_bio_dev_enroll_begin": (_int, [_p, _p, _p, ctypes.c_uint32, _c]),
+    "fido_bio_dev_enroll_continue": (_int, [_p, _p, _p, ctypes.c_uint32]),
+    "fido_bio_dev_enroll_cancel": (_int, [_p]),
+    "fido_bio_dev_enroll_remove": (_int, [_p, _p, _c]),
+    "fido_bio_dev_set_template_name": (_int, [_p, _p, _c]),
+}
+
+# Entry points only present in this tree's libfido2, or in releases newer
+# than the oldest we load; a library without them still loads, and the
+# corresponding methods raise NotImplementedError.
+_OPTIONAL = {
+    "fido_dev_set_retry_policy": (_int, [_p, _int, _int]),
+    "fido_dev_io_retries": (ctypes.c_uint64, [_p]),
+    "fido_dev_set_trace": (_int, [_p, _c]),
+    "fido_dev_set_replay": (_int, [_p, _int]),
+    "fido_cred_set_attobj": (_int, [_p, _c, _sz]),
+    "fido_cred_x5c_list_count": (_sz, [_p]),
+    "fido_cred_x5c_list_ptr": (_u8p, [_p, _sz]),
+    "fido_cred_x5c_list_len": (_sz, [_p, _sz]),
+}
+
+# Calls that talk to the authenticator, by the CTAP command they issue.
+# Their latency and result are recorded in fido2manage.metrics.
+_COMMANDS = {
+    "fido_dev_open": "ctaphid.init",
+    "fido_dev_get_cbor_info": "getInfo",
+    "fido_dev_get_retry_count": "clientPIN.getPINRetries",
+    "fido_dev_get_uv_retry_count": "clientPIN.getUVRetries",
+    "fido_dev_reset": "reset",
+    "fido_credman_get_dev_metadata": "credentialManagement.getCredsMetadata",
+    "fido_credman_get_dev_rp": "credentialManagement.enumerateRPs",
+    "fido_credman_get_dev_rk": "credentialManagement.enumerateCredentials",
+    "fido_credman_del_dev_rk": "credentialManagement.deleteCredential",
+    "fido_bio_dev_get_info": "bioEnrollment.getFingerprintSensorInfo",
+    "fido_bio_dev_get_template_array": "bioEnrollment.enumerateEnrollments",
+    "fido_bio_dev_set_template_name": "bioEnrollment.setFriendlyName",
+    "fido_bio_dev_enroll_remove": "bioEnrollment.removeEnrollment",
+    "fido_bio_dev_enroll_begin": "bioEnrollment.enrollBegin",
+    "fido_bio_dev_enroll_continue": "bioEnrollment.enrollCaptureNextSample",
+    "fido_bio_dev_enroll_cancel": "bioEnrollment.cancelCurrentEnrollment",
+}
+
+
+def _timed(func, command):
+    def call(*args):
+        start = time.perf_counter()
+        r = func(*args)
+        _metrics.record(command, strerr(r) if r else "FIDO_OK",
+                        time.perf_counter() - start)
+        return r
+    return call
+
+
+for _name, (_restype, _argtypes) in _PROTOTYPES.items():
+    _f = getattr(_lib, _name)
+    _f.restype = _restype
+    _f.argtypes = _argtypes
+
+for _name, (_restype, _argtypes) in _OPTIONAL.items():
+    _f = getattr(_lib, _name, None)
+    if _f is not None:
+        _f.restype = _restype
+        _f.argtypes = _argtypes
+
+_lib.fido_init(0)
+
+for _name, _command in _COMMANDS.items():
+    setattr(_lib, _name, _timed(getattr(_lib, _name), _command))
+
+
+def _optional(name):
+    f = getattr(_lib, name, None)
+    if f is None:
+        raise NotImplementedError(f"{name} is not available in this libfido2")
+    return f
+
+
+def strerr(code):
+    """Return libfido2's name for an error code, e.g. FIDO_ERR_PIN_INVALID."""
+    return _lib.fido_strerr(code).decode()
+
+
+def bio_enroll_strerr(status):
+    """Return a human-readable description of a bio enrollment status."""
+    return _BIO_ENROLL_STATUS.get(status, "Unknown error")
+
+
+def _check(func, r):
+    if r != FIDO_OK:
+        raise FidoError(func, r)
+
+
+def _str(ptr):
+    return ptr.decode("utf-8", "replace") if ptr is not None else None
+
+
+def _bytes(ptr, length):
+    return ctypes.string_at(ptr, length) if length else b""
+
+
+def _str_array(ptr, length):
+    return [_str(ptr[i]) for i in range(length)]
+
+
+def _pin(pin):
+    return pin.encode() if pin is not None else None
+
+
+def _free(func, handle):
+    ref = _p(handle)
+    func(ctypes.byref(ref))
+
+
+def manifest(max_devices=64):
+    """List attached authenticators as DeviceInfo records, described by
+    manufacturer and product string as in -list output."""
+    devlist = _lib.fido_dev_info_new(max_devices)
+    if not devlist:
+        raise MemoryError("fido_dev_info_new")
+    ndevs = _sz(0)
+    try:
+        _check("fido_dev_info_manifest", _lib.fido_dev_info_manifest(
+            devlist, max_devices, ctypes.byref(ndevs)))
+        devices = []
+        for i in range(ndevs.value):
+            di = _lib.fido_dev_info_ptr(devlist, i)
+            description = " ".join(filter(None, (
+                _str(_lib.fido_dev_info_manufacturer_string(di)),
+                _str(_lib.fido_dev_info_product_string(di)))))
+            devices.append(DeviceInfo(
+                i + 1, _str(_lib.fido_dev_info_path(di)), description,
+                _lib.fido_dev_info_vendor(di) & 0xffff,
+                _lib.fido_dev_info_product(di) & 0xffff))
+        _metrics.devices([d.path for d in devices])
+        return devices
+    finally:
+        ref = _p(devlist)
+        _lib.fido_dev_info_free(ctypes.byref(ref), max_devices)
+
+
+def cred_verify(client_data_hash, rp_id, *, cose_type=-7, fmt=None,
+                authdata=None, sig=None, x5c=None, attstmt=None, attobj=None,
+                uv=False, prot=0, extensions=0):
+    """Check the attestation signature of a new credential with
+    fido_cred_verify(), raising FidoError if it does not verify.
+
+    The statement is given either as fmt, the raw authdata, sig and x5c
+    (the DER attestation certificate); as fmt, authdata and the CBOR
+    attStmt, which tpm attestations need; or as a whole attestation object
+    (libfido2 1.13 and later). uv, prot and extensions are what was asked
+    for at creation and are checked against the authenticator data.
+
+    Returns the x5c chain carried by the statement, attestation certificate
+    first. Only its signature over the credential is checked here; the
+    chain is the caller's to validate. Safe to call from any thread: the
+    fido_cred_t is private to the call, and the GIL is released while the
+    signature is checked.
+    """
+    cred = _lib.fido_cred_new()
+    if not cred:
+        raise MemoryError("fido_cred_new")
+    try:
+        def set_blob(func, data):
+            _check(func, getattr(_lib, func)(cred, data, len(data)))
+
+        _check("fido_cred_set_type", _lib.fido_cred_set_type(cred, cose_type))
+        set_blob("fido_cred_set_clientdata_hash", client_data_hash)
+        _check("fido_cred_set_rp",
+               _lib.fido_cred_set_rp(cred, rp_id.encode(), None))
+        if attobj is not None:
+            _check("fido_cred_set_attobj", _optional("fido_cred_set_attobj")(
+                cred, attobj, len(attobj)))
+        else:
+            _check("fido_cred_set_fmt",
+                   _lib.fido_cred_set_fmt(cred, fmt.encode()))
+            set_blob("fido_cred_set_authdata_raw", authdata)
+            if attstmt is not None:
+                set_blob("fido_cred_set_attstmt", attstmt)
+            else:
+                set_blob("fido_cred_set_x509", x5c)
+                set_blob("fido_cred_set_sig", sig)
+        if uv:
+            _check("fido_cred_set_uv",
+                   _lib.fido_cred_set_uv(cred, FIDO_OPT_TRUE))
+        if prot:
+            _check("fido_cred_set_prot", _lib.fido_cred_set_prot(cred, prot))
+        if extensions:
+            _check("fido_cred_set_extensions",
+                   _lib.fido_cred_set_extensions(cred, extensions))
+        _check("fido_cred_verify", _lib.fido_cred_verify(cred))
+
+        if getattr(_lib, "fido_cred_x5c_list_count", None) is not None:
+            return [_bytes(_lib.fido_cred_x5c_list_ptr(cred, i),
+                           _lib.fido_cred_x5c_list_len(cred, i))
+                    for i in range(_lib.fido_cred_x5c_list_count(cred))]
+        return [_bytes(_lib.fido_cred_x5c_ptr(cred),
+                       _lib.fido_cred_x5c_len(cred))]
+    finally:
+        _free(_lib.fido_cred_free, cred)
+
+
+class PublicKey:
+    """A credential public key decoded into libfido2's es256_pk_t,
+    es384_pk_t, rs256_pk_t or eddsa_pk_t, for assert_verify().
+
+    raw is the key as fido_cred_pubkey_ptr() returns it: x || y for ECDSA
+    (optionally with the 0x04 prefix), modulus || exponent for RSA, the
+    32-byte point for EdDSA. Decode once and reuse: verification only reads
+    the key, so one PublicKey may be used by several threads at once.
+    """
+
+    def __init__(self, cose_type, raw):
+        if cose_type not in _PK_TYPES:
+            raise ValueError(f"unsupported COSE algorithm {cose_type}")
+        self.cose_type = cose_type
+        self._prefix = _PK_TYPES[cose_type]
+        self._pk = getattr(_lib, self._prefix + "_pk_new")()
+        if not self._pk:
+            raise MemoryError(self._prefix + "_pk_new")
+        r = getattr(_lib, self._prefix + "_pk_from_ptr")(self._pk, raw,
+                                                          len(raw))
+        if r != FIDO_OK:
+            self.close()
+            raise FidoError(self._prefix + "_pk_from_ptr", r)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._pk:
+            _free(getattr(_lib, self._prefix + "_pk_free"), self._pk)
+            self._pk = None
+
+
+def assert_verify(pk, client_data_hash, rp_id, authdata, sig, up=True,
+                  uv=False, extensions=0):
+    """Check an assertion signature with fido_assert_verify(), raising
+    FidoError if it does not verify. authdata is the raw authenticator
+    data; up, uv and extensions are what the relying party required and
+    are checked against its flags and extension outputs."""
+    a = _lib.fido_assert_new()
+    if not a:
+        raise MemoryError("fido_assert_new")
+    try:
+        _check("fido_assert_set_count", _lib.fido_assert_set_count(a, 1))
+        _check("fido_assert_set_clientdata_hash",
+               _lib.fido_assert_set_clientdata_hash(
+                   a, client_data_hash, len(client_data_hash)))
+        _check("fido_assert_set_rp",
+               _lib.fido_assert_set_rp(a, rp_id.encode()))
+        _check("fido_assert_set_authdata_raw",
+               _lib.fido_assert_set_authdata_raw(a, 0, authdata,
+                                                 len(authdata)))
+        _check("fido_assert_set_sig",
+               _lib.fido_assert_set_sig(a, 0, sig, len(sig)))
+        if up:
+            _check("fido_assert_set_up",
+                   _lib.fido_assert_set_up(a, FIDO_OPT_TRUE))
+        if uv:
+            _check("fido_assert_set_uv",
+                   _lib.fido_assert_set_uv(a, FIDO_OPT_TRUE))
+        if extensions:
+            _check("fido_assert_set_extensions",
+                   _lib.fido_assert_set_extensions(a, extensions))
+        _check("fido_assert_verify",
+               _lib.fido_assert_verify(a, 0, pk.cose_type, pk._pk))
+    finally:
+        _free(_lib.fido_assert_free, a)
+
+
+class Device:
+    """An open authenticator. See the module docstring for thread safety.
+
+    With trace, every HID report exchanged is recorded to that file until
+    the device is closed. With replay (0 or FIDO_REPLAY_REALTIME), path
+    names such a trace, which is played back instead of opening a device;
+    the same calls that were recorded must then be made.
+
+    timeout_ms and retry, a (retries, backoff_ms) pair as set_retry_policy()
+    takes, are set before the device is opened, so that they also bound the
+    CTAPHID_INIT and getInfo exchanges of the open."""
+
+    def __init__(self, path, timeout_ms=None, trace=None, replay=None,
+                 retry=None):
+        self.path = path
+        self._dev = _lib.fido_dev_new()
+        if not self._dev:
+            raise MemoryError("fido_dev_new")
+        try:
+            if timeout_ms is not None:
+                self.set_timeout(timeout_ms)
+            if retry is not None:
+                self.set_retry_policy(*retry)
+            if trace is not None:
+                _check("fido_dev_set_trace", _optional("fido_dev_set_trace")(
+                    self._dev, os.fsencode(trace)))
+            if replay is not None:
+                _check("fido_dev_set_replay",
+                       _optional("fido_dev_set_replay")(self._dev, replay))
+        except Exception:
+            _free(_lib.fido_dev_free, self._dev)
+            self._dev = None
+            raise
+        r = _lib.fido_dev_open(self._dev, path.encode())
+        if r != FIDO_OK:
+            _free(_lib.fido_dev_free, self._dev)
+            self._dev = None
+            raise FidoError("fido_dev_open", r)
+        _metrics.device_seen(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._dev:
+            _lib.fido_dev_close(self._dev)
+            _free(_lib.fido_dev_free, self._dev)
+            self._dev = None
+
+    def set_timeout(self, timeout_ms):
+        _check("fido_dev_set_timeout",
+               _lib.fido_dev_set_timeout(self._dev, timeout_ms))
+
+    def set_retry_policy(self, retries, backoff_ms):
+        """Retry idempotent commands up to `retries` times on a busy or lost
+        response, backing off from `backoff_ms` milliseconds."""
+        _check("fido_dev_set_retry_policy",
+               _optional("fido_dev_set_retry_policy")(
+                   self._dev, retries, backoff_ms))
+
+    def io_retries(self):
+        return _optional("fido_dev_io_retries")(self._dev)
+
+    def is_fido2(self):
+        return bool(_lib.fido_dev_is_fido2(self._dev))
+
+    def has_pin(self):
+        return bool(_lib.fido_dev_has_pin(self._dev))
+
+    def cbor_info(self):
+        """Run authenticatorGetInfo and return its fields as a dict."""
+        ci = _lib.fido_cbor_info_new()
+        if not ci:
+            raise MemoryError("fido_cbor_info_new")
+        try:
+            _check("fido_dev_get_cbor_info",
+                   _lib.fido_dev_get_cbor_info(self._dev, ci))
+            names = _lib.fido_cbor_info_options_name_ptr(ci)
+            values = _lib.fido_cbor_info_options_value_ptr(ci)
+            options = {
+                _str(names[i]): bool(values[i])
+                for i in range(_lib.fido_cbor_info_options_len(ci))
+            }
+            return {
+                "versions": _str_array(
+                    _lib.fido_cbor_info_versions_ptr(ci),
+                    _lib.fido_cbor_info_versions_len(ci)),
+                "extensions": _str_array(
+                    _lib.fido_cbor_info_extensions_ptr(ci),
+                    _lib.fido_cbor_info_extensions_len(ci)),
+                "transports": _str_array(
+                    _lib.fido_cbor_info_transports_ptr(ci),
+                    _lib.fido_cbor_info_transports_len(ci)),
+                "aaguid": _bytes(_lib.fido_cbor_info_aaguid_ptr(ci),
+                                 _lib.fido_cbor_info_aaguid_len(ci)),
+                "options": options,
+                "fwversion": _lib.fido_cbor_info_fwversion(ci),
+                "maxlargeblob": _lib.fido_cbor_info_maxlargeblob(ci),
+                "maxrpid_minpinlen":
+                    _lib.fido_cbor_info_maxrpid_minpinlen(ci),
+                "minpinlen": _lib.fido_cbor_info_minpinlen(ci),
+                "rk_remaining": _lib.fido_cbor_info_rk_remaining(ci),
+                "new_pin_required":
+                    bool(_lib.fido_cbor_info_new_pin_required(ci)),
+            }
+        finally:
+            _free(_lib.fido_cbor_info_free, ci)
+
+    def retry_count(self):
+        n = _int(0)
+        _check("fido_dev_get_retry_count",
+               _lib.fido_dev_get_retry_count(self._dev, ctypes.byref(n)))
+        _metrics.pin_retries(self.path, n.value)
+        return n.value
+
+    def uv_retry_count(self):
+        n = _int(0)
+        _check("fido_dev_get_uv_retry_count",
+               _lib.fido_dev_get_uv_retry_count(self._dev, ctypes.byref(n)))
+        _metrics.uv_retries(self.path, n.value)
+        return n.value
+
+    def credman_metadata(self, pin):
+        """Return (existing, remaining) resident credential counts."""
+        md = _lib.fido_credman_metadata_new()
+        if not md:
+            raise MemoryError("fido_credman_metadata_new")
+        try:
+            _check("fido_credman_get_dev_metadata",
+                   _lib.fido_credman_get_dev_metadata(self._dev, md,
+                                                       _pin(pin)))
+            return (_lib.fido_credman_rk_existing(md),
+                    _lib.fido_credman_rk_remaining(md))
+        finally:
+            _free(_lib.fido_credman_metadata_free, md)
+
+    def credman_rps(self, pin):
+        """Return the relying parties with resident credentials as
+        RelyingParty records."""
+        rp = _lib.fido_credman_rp_new()
+        if not rp:
+            raise MemoryError("fido_credman_rp_new")
+        try:
+            _check("fido_credman_get_dev_rp",
+                   _lib.fido_credman_get_dev_rp(self._dev, rp, _pin(pin)))
+            return [RelyingParty(
+                        _str(_lib.fido_credman_rp_id(rp, i)),
+                        _str(_lib.fido_credman_rp_name(rp, i)),
+                        _bytes(_lib.fido_credman_rp_id_hash_ptr(rp, i),
+                               _lib.fido_credman_rp_id_hash_len(rp, i)))
+                    for i in range(_lib.fido_credman_rp_count(rp))]
+        finally:
+            _free(_lib.fido_credman_rp_free, rp)
+
+    def credman_rks(self, rp_id, pin):
+        """Return the resident credentials of one relying party as
+        ResidentKey records."""
+        rk = _lib.fido_credman_rk_new()
+        if not rk:
+            raise MemoryError("fido_credman_rk_new")
+        try:
+            _check("fido_credman_get_dev_rk",
+                   _lib.fido_credman_get_dev_rk(self._dev, rp_id.encode(),
+                                                rk, _pin(pin)))
+            creds = []
+            for i in range(_lib.fido_credman_rk_count(rk)):
+                cred = _lib.fido_credman_rk(rk, i)
+                creds.append(ResidentKey(
+                    rp_id,
+                    _bytes(_lib.fido_cred_id_ptr(cred),
+                           _lib.fido_cred_id_len(cred)),
+                    _bytes(_lib.fido_cred_user_id_ptr(cred),
+                           _lib.fido_cred_user_id_len(cred)),
+                    _str(_lib.fido_cred_user_name(cred)),
+                    _str(_lib.fido_cred_display_name(cred)),
+                    _lib.fido_cred_type(cred),
+                    _lib.fido_cred_prot(cred),
+                    _lib.fido_cred_largeblob_key_len(cred) > 0))
+            return creds
+        finally:
+            _free(_lib.fido_credman_rk_free, rk)
+
+    def credman_delete(self, cred_id, pin):
+        buf = (ctypes.c_ubyte * len(cred_id)).from_buffer_copy(cred_id)
+        _check("fido_credman_del_dev_rk",
+               _lib.fido_credman_del_dev_rk(self._dev, buf, len(cred_id),
+                                            _pin(pin)))
+
+    def bio_info(self):
+        """Return (sensor type, max samples for enrollment)."""
+        bi = _lib.fido_bio_info_new()
+        if not bi:
+            raise MemoryError("fido_bio_info_new")
+        try:
+            _check("fido_bio_dev_get_info",
+                   _lib.fido_bio_dev_get_info(self._dev, bi))
+            return (_lib.fido_bio_info_type(bi),
+                    _lib.fido_bio_info_max_samples(bi))
+        finally:
+            _free(_lib.fido_bio_info_free, bi)
+
+    def bio_templates(self, pin):
+        """Return the enrolled fingerprints as BioTemplate records."""
+        ta = _lib.fido_bio_template_array_new()
+        if not ta:
+            raise MemoryError("fido_bio_template_array_new")
+        try:
+            _check("fido_bio_dev_get_template_array",
+                   _lib.fido_bio_dev_get_template_array(self._dev, ta,
+                                                        _pin(pin)))
+            templates = []
+            for i in range(_lib.fido_bio_template_array_count(ta)):
+                t = _lib.fido_bio_template(ta, i)
+                templates.append(BioTemplate(
+                    _bytes(_lib.fido_bio_template_id_ptr(t),
+                           _lib.fido_bio_template_id_len(t)),
+                    _str(_lib.fido_bio_template_name(t))))
+            return templates
+        finally:
+            _free(_lib.fido_bio_template_array_free, ta)
+
+    def _with_template(self, template_id, name, func, *args):
+        t = _lib.fido_bio_template_new()
+        if not t:
+            raise MemoryError("fido_bio_template_new")
+        try:
+            buf = (ctypes.c_ubyte * len(template_id)).from_buffer_copy(
+                template_id)
+            _check("fido_bio_template_set_id",
+                   _lib.fido_bio_template_set_id(t, buf, len(template_id)))
+            if name is not None:
+                _check("fido_bio_template_set_name",
+                       _lib.fido_bio_template_set_name(t, name.encode()))
+            return func(self._dev, t, *args)
+        finally:
+            _free(_lib.fido_bio_template_free, t)
+
+    def bio_set_name(self, template_id, name, pin):
+        _check("fido_bio_dev_set_template_name", self._with_template(
+            template_id, name, _lib.fido_bio_dev_set_template_name,
+            _pin(pin)))
+
+    def bio_remove(self, template_id, pin):
+        _check("fido_bio_dev_enroll_remove", self._with_template(
+            template_id, None, _lib.fido_bio_dev_enroll_remove, _pin(pin)))
+
+    def bio_enroll(self, pin, timeout_ms=10000):
+        """Enroll a fingerprint, yielding (last_status, remaining_samples)
+        after every sample. The template id is returned as the generator's
+        value. Closing the generator early cancels the enrollment."""
+        t = _lib.fido_bio_template_new()
+        if not t:
+            raise MemoryError("fido_bio_template_new")
+        e = _lib.fido_bio_enroll_new()
+        if not e:
+            _free(_lib.fido_bio_template_free, t)
+            raise MemoryError("fido_bio_enroll_new")
+        done = False
+        try:
+            _check("fido_bio_dev_enroll_begin",
+                   _lib.fido_bio_dev_enroll_begin(self._dev, t, e,
+                                                  timeout_ms, _pin(pin)))
+            while True:
+                remaining = _lib.fido_bio_enroll_remaining_samples(e)
+                yield (_lib.fido_bio_enroll_last_status(e), remaining)
+                if remaining == 0:
+                    break
+                _check("fido_bio_dev_enroll_continue",
+                       _lib.fido_bio_dev_enroll_continue(self._dev, t, e,
+                                                         timeout_ms))
+            done = True
+            return _bytes(_lib.fido_bio_template_id_ptr(t),
+                          _lib.fido_bio_template_id_len(t))
+        finally:
+            if not done and self._dev:
+                _lib.fido_bio_dev_enroll_cancel(self._dev)
+            _free(_lib.fido_bio_enroll_free, e)
+            _free(_lib.fido_bio_template_free, t)
+
+    def touch_begin(self):
+        _check("fido_dev_get_touch_begin",
+               _lib.fido_dev_get_touch_begin(self._dev))
+
+    def touch_status(self, timeout_ms):
+        """Poll for a touch requested with touch_begin(); returns True once
+        the authenticator has been touched."""
+        touched = _int(0)
+        _check("fido_dev_get_touch_status",
+               _lib.fido_dev_get_touch_status(self._dev,
+                                              ctypes.byref(touched),
+                                              timeout_ms))
+        return bool(touched.value)
+
+    def cancel(self):
+        _check("fido_dev_cancel", _lib.fido_dev_cancel(self._dev))
+
+    def reset(self):
+        _check("fido_dev_reset", _lib.fido_dev_reset(self._dev))
@@ -0,0 +1,443 @@
+"""
+AAGUID to authenticator model lookup from an offline FIDO Metadata Service
+(MDS3) BLOB.
+
+The BLOB is a JWT of several megabytes. It is verified once, when it is
+first seen: its x5c chain with `openssl verify` against the trust anchor
+(the MDS root certificate, PEM or DER), and its signature with `openssl
+dgst`. Revocation lists are not fetched; the BLOB is meant to be used
+offline. The entries are then compiled into an index file:
+
+    header   magic, version, entry count, size, mtime and SHA-256 of the
+             BLOB, its serial number and nextUpdate date
+    entries  one fixed-size record per AAGUID, sorted: AAGUID, then offset
+             and length of the description, the latest status and the
+             decoded icon
+    data     UTF-8 descriptions and statuses, PNG icons
+
+Index.lookup() binary-searches the memory-mapped entry table, so a lookup
+reads a handful of pages and decodes one entry; the JSON is never parsed
+again. Index.open() rebuilds the index only when the size or mtime of the
+BLOB differ from those recorded in its header.
+
+    with mds.Index.open("blob.jwt", root="root-r3.crt") as index:
+        print(index.lookup("ee882879-721c-4913-9775-3dfcce97072a"))
+
+The GUIs and fido2-manage.py -info use the BLOB named by FIDO2_MDS_BLOB,
+verified against FIDO2_MDS_ROOT, through lookup().
+
+    python3 -m fido2manage.mds BLOB -root ROOT [AAGUID ...]
+"""
+
+import base64
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+import threading
+import uuid
+
+from .records import ModelInfo
+
+MAGIC = b"F2MDSIX\0"
+VERSION = 1
+
+# magic, version, count, blob size, blob mtime_ns, blob sha256, blob serial
+# number, nextUpdate (YYYY-MM-DD)
+_HEADER = struct.Struct("<8sIIQq32sI10s")
+# aaguid, then (offset, length) of description, status and icon
+_ENTRY = struct.Struct("<16s6I")
+
+_DIGESTS = {"ES256": ("-sha256", 32), "ES384": ("-sha384", 48),
+            "RS256": ("-sha256", None)}
+
+
+class MDSError(Exception):
+    pass
+
+
+def index_path(blob):
+    """Where the index of blob is kept: FIDO2_MDS_INDEX, or a file named
+    after the BLOB's path in $XDG_CACHE_HOME/fido2-manage."""
+    override = os.environ.get("FIDO2_MDS_INDEX")
+    if override:
+        return override
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache")
+    name = hashlib.sha256(os.path.abspath(blob).encode()).hexdigest()[:16]
+    return os.path.join(base, "fido2-manage", f"mds-{name}.idx")
+
+
+def parse_aaguid(aaguid):
+    """Accept 16 bytes, 32 hex digits or the dashed UUID form."""
+    if isinstance(aaguid, (bytes, bytearray)):
+        if len(aaguid) != 16:
+            raise ValueError(f"AAGUID must be 16 bytes, not {len(aaguid)}")
+        return bytes(aaguid)
+    return uuid.UUID(aaguid.strip()).bytes
+
+
+def _b64url(data):
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _der_int(value):
+    value = value.lstrip(b"\0") or b"\0"
+    if value[0] & 0x80:
+        value = b"\0" + value
+    return b"\x02" + _der_len(len(value)) + value
+
+
+def _der_len(n):
+    if n < 0x80:
+        return bytes([n])
+    encoded = n.to_bytes((n.bit_length() + 7) // 8, "big")
+    return bytes([0x80 | len(encoded)]) + encoded
+
+
+def _ecdsa_der(raw, size):
+    """JWS carries ECDSA signatures as r || s; openssl wants DER."""
+    if len(raw) != 2 * size:
+        raise MDSError("malformed ECDSA signature")
+    body = _der_int(raw[:size]) + _der_int(raw[size:])
+    return b"\x30" + _der_len(len(body)) + body
+
+
+def _pem(der):
+    lines = base64.encodebytes(der).decode().replace("\n", "")
+    return ("-----BEGIN CERTIFICATE-----\n" +
+            "\n".join(lines[i:i + 64] for i in range(0, len(lines), 64)) +
+            "\n-----END CERTIFICATE-----\n")
+
+
+def _openssl(*args):
+    if shutil.which("openssl") is None:
+        raise MDSError("verifying the MDS BLOB needs the openssl command")
+    result = subprocess.run(["openssl"] + list(args), capture_output=True,
+                            text=True)
+    if result.returncode != 0:
+        raise MDSError(f"openssl {args[0]}: "
+                       f"{(result.stderr or result.stdout).strip()}")
+    return result.stdout
+
+
+def verify(token, root):
+    """Check the JWS signature and x5c chain of token against the trust
+    anchor in the file root; return the decoded payload bytes."""
+    try:
+        header_b64, payload_b64, signature_b64 = token.strip().split(".")
+        header = json.loads(_b64url(header_b64))
+        signature = _b64url(signature_b64)
+        chain = [base64.b64decode(c) for c in header["x5c"]]
+        alg = header["alg"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise MDSError(f"not an MDS BLOB: {e}")
+    if alg not in _DIGESTS:
+        raise MDSError(f"unsupported signature algorithm {alg}")
+    if not chain:
+        raise MDSError("MDS BLOB has an empty x5c chain")
+    digest, ec_size = _DIGESTS[alg]
+
+    with tempfile.TemporaryDirectory(prefix="fido2-mds-") as tmp:
+        def write(name, data):
+            path = os.path.join(tmp, name)
+            with open(path, "wb" if isinstance(data, bytes) else "w") as f:
+                f.write(data)
+            return path
+
+        with open(root, "rb") as f:
+            anchor = f.read()
+        if b"-----BEGIN" in anchor:
+            anchor_path = write("root.pem", anchor)
+        else:
+            anchor_path = write("root.pem", _pem(anchor))
+        leaf = write("leaf.pem", _pem(chain[0]))
+        args = ["verify", "-CAfile", anchor_path]
+        if len(chain) > 1:
+            args += ["-untrusted",
+                     write("chain.pem", "".join(_pem(c) for c in chain[1:]))]
+        _openssl(*args, leaf)
+
+        key = write("key.pem", _openssl("x509", "-in", leaf, "-pubkey",
+                                        "-noout"))
+        if ec_size is not None:
+            signature = _ecdsa_der(signature, ec_size)
+        _openssl("dgst", digest, "-verify", key, "-signature",
+                 write("sig", signature),
+                 write("input", f"{header_b64}.{payload_b64}".encode()))
+    return _b64url(payload_b64)
+
+
+def _latest_status(entry):
+    reports = entry.get("statusReports") or []
+    if not reports:
+        return None
+    latest = max(reports, key=lambda r: r.get("effectiveDate") or "")
+    return latest.get("status")
+
+
+def _icon(statement):
+    icon = statement.get("icon") or ""
+    prefix, sep, data = icon.partition(";base64,")
+    if not sep or not prefix.startswith("data:"):
+        return b""
+    try:
+        return base64.b64decode(data)
+    except ValueError:
+        return b""
+
+
+def compile_index(payload, st, digest, path):
+    """Write the index of a verified BLOB payload to path, atomically."""
+    try:
+        blob = json.loads(payload)
+        entries = blob["entries"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise MDSError(f"malformed MDS payload: {e}")
+
+    records = {}
+    for entry in entries:
+        try:
+            aaguid = uuid.UUID(entry["aaguid"]).bytes
+        except (KeyError, ValueError, TypeError, AttributeError):
+            continue  # U2F and UAF entries are keyed otherwise
+        statement = entry.get("metadataStatement") or {}
+        records[aaguid] = (
+            str(statement.get("description") or "").encode(),
+            str(_latest_status(entry) or "").encode(),
+            _icon(statement))
+
+    count = len(records)
+    offset = _HEADER.size + count * _ENTRY.size
+    table, data = [], []
+    for aaguid in sorted(records):
+        fields = []
+        for value in records[aaguid]:
+            fields += (offset, len(value))
+            data.append(value)
+            offset += len(value)
+        table.append(_ENTRY.pack(aaguid, *fields))
+
+    header = _HEADER.pack(
+        MAGIC, VERSION, count, st.st_size, st.st_mtime_ns, digest,
+        int(blob.get("no") or 0) & 0xffffffff,
+        str(blob.get("nextUpdate") or "").encode()[:10])
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".mds-", suffix=".idx.tmp",
+                               dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            f.write(b"".join(table))
+            f.write(b"".join(data))
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def build(blob, root, path=None):
+    """Verify blob against root and compile its index."""
+    path = path or index_path(blob)
+    with open(blob, "rb") as f:
+        st = os.fstat(f.fileno())
+        token = f.read()
+    try:
+        token = token.decode("ascii")
+    except UnicodeDecodeError:
+        raise MDSError("not an MDS BLOB: not ASCII")
+    payload = verify(token, root)
+    compile_index(payload, st, hashlib.sha256(token.encode()).digest(),
+                  path)
+    return path
+
+
+class _Keys:
+    """Sequence view of the sorted AAGUID column, for bisect."""
+
+    __slots__ = ("buf", "count")
+
+    def __init__(self, buf, count):
+        self.buf = buf
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        start = _HEADER.size + i * _ENTRY.size
+        return self.buf[start:start + 16]
+
+
+class Index:
+    """A memory-mapped AAGUID index."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < _HEADER.size:
+                raise MDSError(f"{path}: truncated index")
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.count, blob_size, blob_mtime, self.sha256,
+         self.serial, next_update) = _HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION or \
+                size < _HEADER.size + self.count * _ENTRY.size:
+            self.close()
+            raise MDSError(f"{path}: not an index of this version")
+        self.source = (blob_size, blob_mtime)
+        self.next_update = next_update.rstrip(b"\0").decode() or None
+        self._keys = _Keys(self._map, self.count)
+
+    @classmethod
+    def open(cls, blob, root=None, path=None):
+        """Open the index of blob, rebuilding it first if blob changed
+        since it was compiled. root is only needed to rebuild."""
+        path = path or index_path(blob)
+        st = os.stat(blob)
+        try:
+            index = cls(path)
+        except (OSError, MDSError):
+            index = None
+        if index is not None:
+            if index.source == (st.st_size, st.st_mtime_ns):
+                return index
+            index.close()
+        if root is None:
+            raise MDSError("the MDS BLOB changed and no trust anchor was "
+                           "given to verify it")
+        build(blob, root, path)
+        return cls(path)
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._map.close()
+
+    def _find(self, aaguid):
+        key = parse_aaguid(aaguid)
+        i = bisect.bisect_left(self._keys, key)
+        if i < self.count and self._keys[i] == key:
+            return _ENTRY.unpack_from(self._map,
+                                      _HEADER.size + i * _ENTRY.size)
+        return None
+
+    def _slice(self, offset, length):
+        return self._map[offset:offset + length]
+
+    def lookup(self, aaguid):
+        """Return the ModelInfo of aaguid, or None if MDS does not list
+        it."""
+        entry = self._find(aaguid)
+        if entry is None:
+            return None
+        key, d_off, d_len, s_off, s_len, _, _ = entry
+        return ModelInfo(key, self._slice(d_off, d_len).decode(),
+                         self._slice(s_off, s_len).decode() or None)
+
+    def icon(self, aaguid):
+        """Return the PNG icon of aaguid, or None."""
+        entry = self._find(aaguid)
+        if entry is None or not entry[6]:
+            return None
+        return self._slice(entry[5], entry[6])
+
+
+_configured = None
+# lookup() runs on the GUIs' device workers; one of them must not close the
+# index while another reads it, nor two open it at once
+_configured_lock = threading.Lock()
+
+
+def lookup(aaguid):
+    """Look aaguid up in the BLOB named by FIDO2_MDS_BLOB, verified against
+    FIDO2_MDS_ROOT. Returns None when no BLOB is configured or MDS does not
+    list the AAGUID; raises MDSError if the BLOB cannot be verified."""
+    global _configured
+    blob = os.environ.get("FIDO2_MDS_BLOB")
+    if not blob:
+        return None
+    with _configured_lock:
+        if _configured is not None:
+            st = os.stat(blob)
+            if _configured.source != (st.st_size, st.st_mtime_ns):
+                _configured.close()
+                _configured = None
+        if _configured is None:
+            _configured = Index.open(blob, os.environ.get("FIDO2_MDS_ROOT"))
+        return _configured.lookup(aaguid)
+
+
+def info_rows(aaguid):
+    """("model", ...) and ("certification", ...) rows for an info table;
+    none if no BLOB is configured or it does not list aaguid."""
+    try:
+        model = lookup(aaguid)
+    except ValueError:
+        return []
+    except (OSError, MDSError) as e:
+        return [("model", f"unknown (MDS: {e})")]
+    if model is None:
+        return []
+    rows = [("model", model.description)]
+    if model.status:
+        rows.append(("certification", model.status))
+    return rows
+
+
+def main(argv=None):
+    import argparse
+    import sys
+    import time
+
+    parser = argparse.ArgumentParser(
+        description="Verify and index an MDS BLOB, then look up AAGUIDs.")
+    parser.add_argument("blob")
+    parser.add_argument("aaguid", nargs="*")
+    parser.add_argument("-root", default=os.environ.get("FIDO2_MDS_ROOT"),
+                        help="MDS root certificate (PEM or DER)")
+    parser.add_argument("-index", help="index file to use")
+    args = parser.parse_intermixed_args(argv)
+
+    start = time.perf_counter()
+    try:
+        index = Index.open(args.blob, args.root, args.index)
+    except (OSError, MDSError) as e:
+        print(f"[Error] {e}", file=sys.stderr)
+        return 1
+    print(f"{len(index)} AAGUIDs, serial {index.serial}, next update "
+          f"{index.next_update}, opened in "
+          f"{(time.perf_counter() - start) * 1000:.1f} ms")
+    with index:
+        for aaguid in args.aaguid:
+            try:
+                model = index.lookup(aaguid)
+            except ValueError as e:
+                print(f"{aaguid}: {e}")
+                continue
+            if model is None:
+                print(f"{aaguid}: not listed")
+            else:
+                print(f"{uuid.UUID(bytes=model.aaguid)}: {model.description}"
+                      f" ({model.status or 'no status'})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
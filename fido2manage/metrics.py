@@ -0,0 +1,285 @@
+"""
+Prometheus metrics for management operations.
+
+Recording is a dict update under a lock, cheap enough to sit on every CTAP
+command. Nothing is formatted or written on the recording path: exposition
+happens either in a background thread that rewrites a node_exporter
+textfile (atomically, via rename) when something changed, or in a
+localhost-only HTTP server that renders on scrape.
+
+    metrics.start(textfile="/var/lib/node_exporter/textfile/fido2.prom")
+
+Metrics:
+
+- fido2_operations_total{operation,result}: operations by outcome, where
+  result is FIDO_OK or the libfido2 error name (FIDO_ERR_PIN_INVALID, ...).
+- fido2_operation_duration_seconds{operation}: latency histogram. The
+  libfido2 binding records one operation per CTAP command (getInfo,
+  credentialManagement.enumerateRPs, ...); the GUIs record the
+  fido2-manage.sh invocations they make.
+- fido2_devices_seen: distinct devices seen by this process.
+- fido2_devices_attached: devices present at the last enumeration.
+- fido2_pin_retries_min{device}, fido2_uv_retries_min{device}: lowest PIN
+  and UV retry counters observed, i.e. how close a key came to blocking.
+"""
+
+import atexit
+import os
+import re
+import tempfile
+import threading
+import time
+
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+           60.0)
+
+_FIDO_ERR = re.compile(r"\bFIDO_ERR_[A-Z0-9_]+")
+
+
+def _escape(value):
+    return (str(value).replace("\\", "\\\\").replace("\"", "\\\"")
+            .replace("\n", "\\n"))
+
+
+def _labels(**labels):
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def error_code(output, returncode=0):
+    """Derive a result label from the output of a fido2-token2 run."""
+    match = _FIDO_ERR.search(output or "")
+    if match:
+        return match.group(0)
+    return "FIDO_OK" if returncode == 0 else f"exit_{returncode}"
+
+
+class _Operation:
+
+    __slots__ = ("result",)
+
+    def __init__(self):
+        self.result = "FIDO_OK"
+
+
+class Registry:
+    """In-memory metric values for one process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ops = {}         # (operation, result) -> count
+        self._latency = {}     # operation -> [bucket counts..., sum, count]
+        self._seen = set()
+        self._attached = 0
+        self._pin_min = {}
+        self._uv_min = {}
+        self.generation = 0    # bumped on every change
+
+    def record(self, operation, result, seconds):
+        with self._lock:
+            key = (operation, result)
+            self._ops[key] = self._ops.get(key, 0) + 1
+            h = self._latency.get(operation)
+            if h is None:
+                h = self._latency[operation] = [0] * (len(BUCKETS) + 2)
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    h[i] += 1
+            h[-2] += seconds
+            h[-1] += 1
+            self.generation += 1
+
+    def operation(self, operation):
+        """Context manager timing one operation. The yielded object's
+        result attribute may be set to an error name; an exception escaping
+        the block is recorded by its class name (or FidoError name)."""
+        return _Timer(self, operation)
+
+    def devices(self, ids):
+        """Note the devices present at an enumeration."""
+        with self._lock:
+            self._seen.update(ids)
+            self._attached = len(ids)
+            self.generation += 1
+
+    def device_seen(self, device):
+        with self._lock:
+            if device not in self._seen:
+                self._seen.add(device)
+                self.generation += 1
+
+    def pin_retries(self, device, retries):
+        self._low_water(self._pin_min, device, retries)
+
+    def uv_retries(self, device, retries):
+        self._low_water(self._uv_min, device, retries)
+
+    def _low_water(self, table, device, value):
+        with self._lock:
+            if device not in table or value < table[device]:
+                table[device] = value
+                self.generation += 1
+
+    def render(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        with self._lock:
+            ops = sorted(self._ops.items())
+            latency = sorted((k, list(v)) for k, v in self._latency.items())
+            seen, attached = len(self._seen), self._attached
+            pin_min = sorted(self._pin_min.items())
+            uv_min = sorted(self._uv_min.items())
+
+        out = []
+        out.append("# HELP fido2_operations_total "
+                   "Management operations by result.")
+        out.append("# TYPE fido2_operations_total counter")
+        for (operation, result), n in ops:
+            out.append("fido2_operations_total{%s} %d" % (
+                _labels(operation=operation, result=result), n))
+
+        out.append("# HELP fido2_operation_duration_seconds "
+                   "Operation latency.")
+        out.append("# TYPE fido2_operation_duration_seconds histogram")
+        for operation, h in latency:
+            name = "fido2_operation_duration_seconds"
+            for bound, n in zip(BUCKETS, h):
+                out.append("%s_bucket{%s} %d" % (
+                    name, _labels(operation=operation, le=_number(bound)), n))
+            out.append("%s_bucket{%s} %d" % (
+                name, _labels(operation=operation, le="+Inf"), h[-1]))
+            out.append("%s_sum{%s} %s" % (
+                name, _labels(operation=operation), _number(h[-2])))
+            out.append("%s_count{%s} %d" % (
+                name, _labels(operation=operation), h[-1]))
+
+        out.append("# HELP fido2_devices_seen "
+                   "Distinct devices seen by this process.")
+        out.append("# TYPE fido2_devices_seen gauge")
+        out.append(f"fido2_devices_seen {seen}")
+        out.append("# HELP fido2_devices_attached "
+                   "Devices present at the last enumeration.")
+        out.append("# TYPE fido2_devices_attached gauge")
+        out.append(f"fido2_devices_attached {attached}")
+
+        for name, what, table in (
+                ("fido2_pin_retries_min", "PIN", pin_min),
+                ("fido2_uv_retries_min", "UV", uv_min)):
+            out.append(f"# HELP {name} Lowest {what} retry counter observed.")
+            out.append(f"# TYPE {name} gauge")
+            for device, n in table:
+                out.append("%s{%s} %d" % (name, _labels(device=device), n))
+
+        return "\n".join(out) + "\n"
+
+    def write_textfile(self, path):
+        """Atomically replace path with the current metrics."""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(prefix=".fido2-", suffix=".prom.tmp",
+                                   dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(self.render())
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+
+class _Timer:
+
+    __slots__ = ("registry", "name", "op", "start")
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.op = _Operation()
+        self.start = time.perf_counter()
+        return self.op
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        result = self.op.result
+        if exc is not None:
+            result = getattr(exc, "name", None) or exc_type.__name__
+        self.registry.record(self.name, result, seconds)
+        return False
+
+
+REGISTRY = Registry()
+
+
+def serve(port, registry=REGISTRY, address="127.0.0.1"):
+    """Serve /metrics on address:port from a daemon thread."""
+    # imported here: http.server alone would double this module's load time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type",
+                             "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((address, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http",
+                     daemon=True).start()
+    return server
+
+
+def export_textfile(path, registry=REGISTRY, interval=15.0):
+    """Rewrite path every interval seconds while metrics change, and once
+    more at exit."""
+    written = [-1]
+
+    def flush():
+        generation = registry.generation
+        if generation != written[0]:
+            registry.write_textfile(path)
+            written[0] = generation
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                flush()
+            except OSError:
+                pass
+
+    flush()
+    atexit.register(flush)
+    threading.Thread(target=loop, name="metrics-textfile",
+                     daemon=True).start()
+
+
+def start(textfile=None, port=None, interval=None):
+    """Enable exposition, falling back to the FIDO2_METRICS_TEXTFILE,
+    FIDO2_METRICS_PORT and FIDO2_METRICS_INTERVAL environment variables.
+    Does nothing if neither a textfile nor a port is configured."""
+    textfile = textfile or os.environ.get("FIDO2_METRICS_TEXTFILE")
+    port = port or os.environ.get("FIDO2_METRICS_PORT")
+    interval = interval or float(
+        os.environ.get("FIDO2_METRICS_INTERVAL", "15"))
+    if textfile:
+        export_textfile(textfile, interval=interval)
+    if port:
+        serve(int(port))
@@ -0,0 +1,132 @@
+"""
+Parsers for the text printed by fido2-token2 and fido2-manage.sh.
+
+Every parser makes one pass over the whole output with a precompiled,
+multiline regular expression and yields a record per matching line; lines
+that do not match (prompts, warnings, blank lines) are skipped. Nothing is
+split twice or rebuilt, so the cost is linear in the size of the output.
+
+fido2-token2 -L -k prints "display_name user_name" unquoted between two
+space-free fields, so the split between them is ambiguous when either
+contains spaces. resident_keys() takes the last word as the user name,
+which keeps display names with spaces intact; user names (account
+identifiers, e-mail addresses) rarely contain spaces.
+
+The parsers yield the records of fido2manage.records, with identifiers
+decoded to bytes; a line whose base64 does not decode is skipped.
+"""
+
+import binascii
+import re
+
+from .records import (COSE, PROT, BioTemplate, DeviceInfo, RelyingParty,
+                      ResidentKey)
+
+_ALGORITHMS = {name: alg for alg, name in COSE.items()}
+_LEVELS = {name: level for level, name in PROT.items()}
+
+# fido2-token2 -L
+_DEVICE = re.compile(
+    r"^(.+?): vendor=0x([0-9a-fA-F]+), product=0x([0-9a-fA-F]+) "
+    r"\((.*)\)\r?$", re.M)
+# fido2-manage.sh -list, and the labels built from it
+_LABEL = re.compile(r"^Device \[(\d+)\] : ?(.*?)\r?$", re.M)
+# "key: value", fido2-token2 -I and -I -c
+_KEY_VALUE = re.compile(r"^(.+?): (.*?)\r?$", re.M)
+# fido2-token2 -L -r: "00: <rp id hash> <rp id>"
+_RP = re.compile(r"^(\d+): (\S+) (.+?)\r?$", re.M)
+# fido2-token2 -L -k: "00: <cred id> <display> <user> <user id> <type> <prot>"
+_RK = re.compile(r"^(\d+): (\S+) (.*) (\S+) (\S+) (\S+)\r?$", re.M)
+# fido2-token2 -L -e: "00: <template id> <name>"
+_TEMPLATE = re.compile(r"^(\d+): (\S+)(?: (.*?))?\r?$", re.M)
+# fido2-manage.sh -residentKeys -domain, optionally under "Domain: <rp id>"
+_PASSKEY = re.compile(
+    r"^(?:Domain: (.*?)|(?:\[Info\] )?Credential ID: ([^,\r\n]*), "
+    r"User: ?(.*?))\r?$", re.M)
+_MIN_PIN_LENGTH = re.compile(r"minpinlen:\s*(\d+)")
+
+
+def _null(value):
+    return None if value == "(null)" else value
+
+
+def _bytes(value):
+    try:
+        return binascii.a2b_base64(value)
+    except ValueError:  # binascii.Error, or non-ASCII input
+        return None
+
+
+def devices(text):
+    """Yield a DeviceInfo per line of fido2-token2 -L output."""
+    for i, m in enumerate(_DEVICE.finditer(text)):
+        yield DeviceInfo(i + 1, m.group(1), m.group(4),
+                         int(m.group(2), 16), int(m.group(3), 16))
+
+
+def device_labels(text):
+    """Yield a DeviceInfo per "Device [n] : ..." line."""
+    for m in _LABEL.finditer(text):
+        yield DeviceInfo(int(m.group(1)), None, m.group(2), None, None)
+
+
+def key_values(text):
+    """Yield (key, value) for every "key: value" line."""
+    for m in _KEY_VALUE.finditer(text):
+        yield m.group(1), m.group(2)
+
+
+def relying_parties(text):
+    """Yield a RelyingParty per line of fido2-token2 -L -r output."""
+    for m in _RP.finditer(text):
+        id_hash = _bytes(m.group(2))
+        if id_hash is not None:
+            yield RelyingParty(m.group(3), None, id_hash)
+
+
+def resident_keys(text, rp_id=None):
+    """Yield a ResidentKey of rp_id per line of fido2-token2 -L -k
+    output."""
+    for m in _RK.finditer(text):
+        credential_id = _bytes(m.group(2))
+        user_id = _bytes(m.group(4))
+        if credential_id is None or user_id is None:
+            continue
+        display, _, user = m.group(3).rpartition(" ")
+        yield ResidentKey(rp_id, credential_id, user_id, _null(user),
+                          _null(display), _ALGORITHMS.get(m.group(5)),
+                          _LEVELS.get(m.group(6)), None)
+
+
+def passkeys(text, rp_id=None):
+    """Yield a ResidentKey per "Credential ID: ..., User: ..." line,
+    attributed to the closest preceding "Domain: ..." line, or to rp_id.
+    The listing joins display name and user name, so the whole "User:"
+    column is kept as the display name."""
+    domain = rp_id
+    for m in _PASSKEY.finditer(text):
+        if m.group(1) is not None:
+            domain = m.group(1).strip()
+            continue
+        encoded = m.group(2).strip()
+        credential_id = _bytes(encoded)
+        if credential_id is None:
+            continue
+        user = m.group(3).replace(encoded, "").strip() \
+            if encoded else m.group(3).strip()
+        yield ResidentKey(domain, credential_id, None, None, user or None,
+                          None, None, None)
+
+
+def bio_templates(text):
+    """Yield a BioTemplate per line of fido2-token2 -L -e output."""
+    for m in _TEMPLATE.finditer(text):
+        template_id = _bytes(m.group(2))
+        if template_id is not None:
+            yield BioTemplate(template_id, _null(m.group(3)))
+
+
+def min_pin_length(text):
+    """Return the minpinlen reported in -I output, or None."""
+    m = _MIN_PIN_LENGTH.search(text)
+    return int(m.group(1)) if m else None
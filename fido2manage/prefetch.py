@@ -0,0 +1,97 @@
+"""
+Per-device session for the GUIs: the PIN, collected once, and reads started
+in the background as soon as it is known.
+
+A Session belongs to one selected device. Its reads go through the device's
+Scheduler queue like any other operation, and their Futures are kept by
+name, so a window that needs passkeys or fingerprints picks up the result
+of the prefetch (finished or still running) instead of starting the walk
+again. A read that failed or was cancelled is started afresh on the next
+fetch(); forget() drops a result that an operation made stale, and patch()
+updates one that an operation changed in a known way.
+
+close() ends the session when another device is selected or the key is
+unplugged: queued reads are cancelled, and running ones stop at their next
+check(), which raises Cancelled. Reads should call check() between the
+commands they issue.
+"""
+
+import threading
+from concurrent.futures import Future
+
+from .scheduler import READ
+
+
+class Cancelled(Exception):
+    """The session was closed while the read was queued or running."""
+
+
+class Session:
+
+    def __init__(self, scheduler, device):
+        self.scheduler = scheduler
+        self.device = device
+        self.pin = None
+        self._closed = threading.Event()
+        self._lock = threading.Lock()
+        self._futures = {}
+
+    @property
+    def closed(self):
+        return self._closed.is_set()
+
+    def check(self):
+        """Raise Cancelled if the session has been closed."""
+        if self._closed.is_set():
+            raise Cancelled(self.device)
+
+    def _run(self, func, args):
+        self.check()
+        return func(self, *args)
+
+    def fetch(self, name, func, *args, lane=READ):
+        """Return a Future for func(session, *args), reusing the one for
+        name unless it failed or was cancelled."""
+        with self._lock:
+            self.check()
+            future = self._futures.get(name)
+            if future is not None and not future.cancelled() and \
+                    not (future.done() and future.exception() is not None):
+                return future
+            future = self.scheduler.submit(self.device, self._run, func, args,
+                                           lane=lane, label=name)
+            self._futures[name] = future
+            return future
+
+    def cached(self, name):
+        """Return the Future for name, or None if it was never fetched."""
+        with self._lock:
+            return self._futures.get(name)
+
+    def forget(self, *names):
+        with self._lock:
+            for name in names:
+                self._futures.pop(name, None)
+
+    def patch(self, name, func):
+        """Replace the result of name's read with func(result), once an
+        operation has changed what was read. A read still queued runs after
+        the operation and sees the change itself, so only a finished,
+        successful one is patched; one that finished after the operation
+        already has it, so func must leave such a result as it is."""
+        with self._lock:
+            future = self._futures.get(name)
+            if future is None or not future.done() or future.cancelled() or \
+                    future.exception() is not None:
+                return
+            patched = Future()
+            patched.set_result(func(future.result()))
+            self._futures[name] = patched
+
+    def close(self):
+        """Cancel queued reads and make running ones stop at check()."""
+        self._closed.set()
+        with self._lock:
+            futures, self._futures = self._futures, {}
+        for future in futures.values():
+            future.cancel()
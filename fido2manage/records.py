@@ -0,0 +1,143 @@
+"""
+Records passed from the backends (the libfido2 binding and the parsers for
+fido2-token2 output) to the views.
+
+Records are frozen and slotted: no per-instance __dict__, so a ResidentKey
+costs its fields and nothing else, and a view can keep thousands of them
+next to its widgets and look one up by position instead of re-parsing the
+text it displayed. Identifiers are kept as bytes and only encoded when
+drawn or printed.
+
+Fields a backend cannot provide are None; fido2-token2 -L -k, for
+instance, does not report whether a credential has a largeBlobKey.
+"""
+
+import base64
+from dataclasses import dataclass, fields
+from typing import Optional, Tuple
+
+# COSE algorithm identifiers and credProtect levels, as fido2-token2 names
+# them
+COSE = {-7: "es256", -35: "es384", -257: "rs256", -8: "eddsa"}
+PROT = {1: "uvopt", 2: "uvopt+id", 3: "uvreq"}
+
+
+def b64(data):
+    return base64.b64encode(data).decode()
+
+
+@dataclass(frozen=True)
+class DeviceInfo:
+    """An attached authenticator. index is its 1-based position in -list
+    output; path, vendor and product are None when only the -list label is
+    known."""
+
+    __slots__ = ("index", "path", "description", "vendor", "product")
+    index: int
+    path: Optional[str]
+    description: str
+    vendor: Optional[int]
+    product: Optional[int]
+
+    @property
+    def label(self):
+        return f"Device [{self.index}] : {self.description}"
+
+
+@dataclass(frozen=True)
+class RelyingParty:
+    __slots__ = ("rp_id", "name", "id_hash")
+    rp_id: str
+    name: Optional[str]
+    id_hash: bytes
+
+
+@dataclass(frozen=True)
+class ResidentKey:
+    """A discoverable credential. prot is the credProtect level (1-3),
+    algorithm the COSE algorithm identifier."""
+
+    __slots__ = ("rp_id", "credential_id", "user_id", "user_name",
+                 "display_name", "algorithm", "prot", "largeblob_key")
+    rp_id: Optional[str]
+    credential_id: bytes
+    user_id: Optional[bytes]
+    user_name: Optional[str]
+    display_name: Optional[str]
+    algorithm: Optional[int]
+    prot: Optional[int]
+    largeblob_key: Optional[bool]
+
+    @property
+    def user(self):
+        """Display name and user name, as fido2-manage.sh shows them."""
+        return " ".join(filter(None, (self.display_name, self.user_name)))
+
+
+@dataclass(frozen=True)
+class BioTemplate:
+    __slots__ = ("template_id", "name")
+    template_id: bytes
+    name: Optional[str]
+
+
+@dataclass(frozen=True)
+class Fingerprints:
+    """The fingerprints enrolled on a bio key, in the key's order, and its
+    sensor as fido_bio_dev_get_info() describes it."""
+
+    __slots__ = ("templates", "sensor_type", "max_samples")
+    templates: Tuple[BioTemplate, ...]
+    sensor_type: int
+    max_samples: int
+
+
+@dataclass(frozen=True)
+class EnrollSample:
+    """One fingerprint sample of an enrollment: the key's status code for
+    it, its description and the samples still needed."""
+
+    __slots__ = ("status", "message", "remaining")
+    status: int
+    message: str
+    remaining: int
+
+
+@dataclass(frozen=True)
+class ReplugTiming:
+    """How fast a factory reset followed the key's return. detect_ms runs
+    from the kernel creating the key's device node to the arrival being
+    seen (None without device nodes, e.g. on macOS); command_ms from there
+    to fido_dev_reset() being issued."""
+
+    __slots__ = ("path", "detect_ms", "command_ms")
+    path: str
+    detect_ms: Optional[float]
+    command_ms: float
+
+
+@dataclass(frozen=True)
+class ModelInfo:
+    """What the FIDO Metadata Service says about an AAGUID. status is the
+    latest status report (FIDO_CERTIFIED_L1, REVOKED, ...)."""
+
+    __slots__ = ("aaguid", "description", "status")
+    aaguid: bytes
+    description: str
+    status: Optional[str]
+
+
+def to_json(record):
+    """Return record as a dict of JSON types: bytes become base64, the
+    algorithm and protection level their fido2-token2 names."""
+    out = {}
+    for f in fields(record):
+        value = getattr(record, f.name)
+        if isinstance(value, bytes):
+            value = b64(value)
+        elif f.name == "algorithm" and value is not None:
+            value = COSE.get(value, "unknown")
+        elif f.name == "prot" and value is not None:
+            value = PROT.get(value, "unknown")
+        out[f.name] = value
+    return out
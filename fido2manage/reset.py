@@ -0,0 +1,210 @@
+"""
+Factory reset that fires as soon as the key is plugged back in.
+
+    python3 -m fido2manage.reset -device 1 [-timeout 60]
+
+Authenticators only accept authenticatorReset within about 10 seconds of
+powering up. A ReplugReset arms itself on the key at path: it notes the
+key's vendor, product and (on Linux) USB serial number, and which devices
+are attached. It then watches for that key to arrive, and opens it and
+issues fido_dev_reset() on the spot, without a prompt or a fido2-token2
+process in between. The key then blinks until it is touched.
+
+With a serial number, any new device carrying it is the key. Without one
+(ioreg:// paths, and many keys on Linux) the key is only known by vendor
+and product, so ReplugReset refuses to arm while another key of the same
+model is attached, and only takes the first one to arrive after the key's
+own device has gone; warning() says so for the user.
+
+Watching costs a listdir("/dev") and a stat() of each hidraw node every
+poll_ms on Linux, where libfido2 only enumerates when the nodes change;
+elsewhere it enumerates every 20 ms. The ReplugTiming of the reset tells
+how long the arrival took to see (from udev setting up the device node, on
+Linux) and how long the command took to follow it.
+
+start() runs the reset on the Scheduler queue "reset" and returns a Future
+for the ReplugTiming, or None if cancel() came first or nothing arrived
+before the timeout; FIDO_ERR_NOT_ALLOWED still means the window was
+missed. state is "armed", "gone" once the key has left, then "sent".
+"""
+
+import sys
+import threading
+import time
+
+from .devices import AddressError, hidraw_nodes, node_identity, usb_serial
+from .records import ReplugTiming
+
+
+def _nodes():
+    names = hidraw_nodes()
+    if names is None:
+        return None
+    return [node_identity(f"/dev/{name}") for name in names]
+
+
+class ReplugReset:
+
+    def __init__(self, scheduler, path, timeout_ms=60000, poll_ms=5):
+        self.scheduler = scheduler
+        self.path = path
+        self.timeout_ms = timeout_ms
+        self.poll_ms = poll_ms
+        self.state = "armed"
+        self.timing = None
+        self.serial = usb_serial(path)
+        self._stop = threading.Event()
+
+    def start(self):
+        return self.scheduler.submit("reset", self._run, label="reset")
+
+    def cancel(self):
+        self._stop.set()
+
+    def warning(self):
+        """A line for the user when the key is only known by its model, or
+        None."""
+        if self.serial is not None:
+            return None
+        return ("The key has no serial number, so it is only recognised by "
+                "vendor and product: keep other keys of the same model "
+                "unplugged until the reset is sent.")
+
+    def _matches(self, target, device):
+        return (device.vendor, device.product) == (target.vendor,
+                                                   target.product) and \
+            (self.serial is None or usb_serial(device.path) == self.serial)
+
+    def _run(self):
+        from . import libfido2
+
+        devices = libfido2.manifest()
+        target = next((d for d in devices if d.path == self.path), None)
+        if target is None:
+            raise AddressError(f"no key at {self.path}")
+        if self.serial is None and sum(
+                self._matches(target, d) for d in devices) > 1:
+            raise AddressError(
+                f"{self.path} has no serial number and other keys with "
+                f"vendor {target.vendor:04x}, product {target.product:04x} "
+                "are attached; unplug them and try again")
+        own = (self.path, node_identity(self.path))
+        present = {(d.path, node_identity(d.path)) for d in devices}
+        nodes = _nodes()
+        interval = self.poll_ms if nodes is not None else max(self.poll_ms,
+                                                              20)
+        deadline = time.monotonic() + self.timeout_ms / 1000
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            time.sleep(interval / 1000)
+            current = _nodes()
+            if current is not None and current == nodes:
+                continue
+            nodes = current
+            devices = libfido2.manifest()
+            previous, present = present, {}
+            for d in devices:
+                present[(d.path, node_identity(d.path))] = d
+            if own not in present:
+                self.state = "gone"
+            # a key of the same model arriving before this one has left
+            # is another key, unless the serial number says otherwise
+            back = [d for i, d in present.items()
+                    if i not in previous and self._matches(target, d) and
+                    (self.serial is not None or self.state == "gone")]
+            if back:
+                return self._reset(libfido2, back[0].path)
+        return None
+
+    def _reset(self, libfido2, path):
+        arrived = time.monotonic()
+        identity = node_identity(path)
+        # the node's ctime is when udev last set it up, on the wall clock
+        detect_ms = (time.time_ns() - identity[2]) / 1e6 \
+            if identity is not None else None
+        with libfido2.Device(path) as dev:
+            command_ms = (time.monotonic() - arrived) * 1000
+            self.timing = ReplugTiming(path, detect_ms, command_ms)
+            self.state = "sent"
+            dev.reset()
+        return self.timing
+
+
+def describe(timing):
+    """One line on how fast the reset followed the arrival."""
+    detect = f"seen {timing.detect_ms:.0f} ms after enumeration, " \
+        if timing.detect_ms is not None else ""
+    return f"Key arrived at {timing.path}: {detect}reset sent " \
+        f"{timing.command_ms:.1f} ms later."
+
+
+def run(path, timeout_ms=60000):
+    """Reset the key at path once it is re-plugged, printing [Info] lines
+    as it goes; return the exit status."""
+    from . import libfido2
+    from .scheduler import Scheduler
+
+    reset = ReplugReset(Scheduler(), path, timeout_ms)
+    future = reset.start()
+    print("[Info] Unplug the security key and plug it back in; the reset is "
+          "sent as soon as it is back.", flush=True)
+    if reset.warning() is not None:
+        print(f"[Info] {reset.warning()}", flush=True)
+    state = reset.state
+    try:
+        while not future.done():
+            time.sleep(0.01)
+            if reset.state != state:
+                state = reset.state
+                if state == "sent":
+                    print(f"[Info] {describe(reset.timing)} Touch or press "
+                          "the security key button when it starts "
+                          "blinking.", flush=True)
+        timing = future.result()
+    except KeyboardInterrupt:
+        reset.cancel()
+        print("[Info] Factory reset canceled.")
+        return 1
+    except AddressError as e:
+        print(f"[Error] {e}", file=sys.stderr)
+        return 1
+    except libfido2.FidoError as e:
+        if e.code == libfido2.FIDO_ERR_NOT_ALLOWED:
+            print("[Error] Factory reset not allowed. Factory reset is only "
+                  "allowed within 10 seconds of powering up of the security "
+                  "key.", file=sys.stderr)
+        else:
+            print(f"[Error] {e}", file=sys.stderr)
+        return 1
+    if timing is None:
+        print("[Error] The security key was not plugged back in.",
+              file=sys.stderr)
+        return 1
+    print("[Info] Factory reset completed.")
+    return 0
+
+
+def main(argv=None):
+    import argparse
+
+    from . import libfido2
+    from .devices import Resolver
+
+    parser = argparse.ArgumentParser(
+        description="Factory reset a key as soon as it is re-plugged.")
+    parser.add_argument("-device", required=True,
+                        help="key to reset (see devices.py)")
+    parser.add_argument("-timeout", type=float, default=60,
+                        help="seconds to wait for the re-plug "
+                             "(default: 60)")
+    args = parser.parse_intermixed_args(argv)
+
+    try:
+        path = Resolver().resolve(args.device)
+    except (AddressError, libfido2.FidoError) as e:
+        print(f"[Error] {e}", file=sys.stderr)
+        return 1
+    return run(path, int(args.timeout * 1000))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
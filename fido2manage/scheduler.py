@@ -0,0 +1,131 @@
+"""
+Per-device operation scheduler.
+
+Operations submitted for the same device run one at a time, in a worker
+thread owned by that device, so two commands can never race for the same
+key and trip CTAP2_ERR_CHANNEL_BUSY. Operations on different devices still
+run in parallel.
+
+Queued operations are served by lane: cheap metadata reads (READ) go ahead
+of long, possibly touch-gated operations (TOUCH) that were queued earlier.
+A running operation is never interrupted. Reads submitted with a coalesce
+key share the result of an identical read that is already queued or
+running instead of being issued again.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+
+READ = 0
+TOUCH = 1
+
+
+class DeviceStats:
+    """Queue depth and wait times observed for one device."""
+
+    __slots__ = ("queued", "running", "completed", "coalesced",
+                 "last_wait", "max_wait", "total_wait")
+
+    def __init__(self):
+        self.queued = 0
+        self.running = None
+        self.completed = 0
+        self.coalesced = 0
+        self.last_wait = 0.0
+        self.max_wait = 0.0
+        self.total_wait = 0.0
+
+    @property
+    def mean_wait(self):
+        return self.total_wait / self.completed if self.completed else 0.0
+
+    def copy(self):
+        other = DeviceStats()
+        for name in self.__slots__:
+            setattr(other, name, getattr(self, name))
+        return other
+
+
+class _DeviceQueue:
+
+    def __init__(self):
+        self.heap = []
+        self.pending = {}  # coalesce key -> Future
+        self.stats = DeviceStats()
+        self.worker = None
+
+
+class Scheduler:
+    """Serialize operations per device, with priority lanes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queues = {}
+        self._seq = itertools.count()
+
+    def submit(self, device, func, *args, lane=READ, coalesce=None,
+               label=None):
+        """Queue func(*args) for device and return a Future for its result.
+
+        With a coalesce key, an identical operation already queued or running
+        for the same device is reused instead of queuing a new one.
+        """
+        with self._lock:
+            q = self._queues.setdefault(device, _DeviceQueue())
+            if coalesce is not None and coalesce in q.pending:
+                q.stats.coalesced += 1
+                return q.pending[coalesce]
+            future = Future()
+            if coalesce is not None:
+                q.pending[coalesce] = future
+            item = (lane, next(self._seq), time.monotonic(), future, func,
+                    args, coalesce, label or getattr(func, "__name__", "?"))
+            heapq.heappush(q.heap, item)
+            q.stats.queued += 1
+            if q.worker is None:
+                q.worker = threading.Thread(
+                    target=self._run, args=(device, q),
+                    name=f"scheduler:{device}", daemon=True)
+                q.worker.start()
+        return future
+
+    def _run(self, device, q):
+        while True:
+            with self._lock:
+                if not q.heap:
+                    q.worker = None
+                    return
+                (_, _, submitted, future, func, args, coalesce,
+                 label) = heapq.heappop(q.heap)
+                waited = time.monotonic() - submitted
+                q.stats.queued -= 1
+                q.stats.running = label
+                q.stats.last_wait = waited
+                q.stats.max_wait = max(q.stats.max_wait, waited)
+                q.stats.total_wait += waited
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(func(*args))
+                except BaseException as e:
+                    future.set_exception(e)
+            with self._lock:
+                q.stats.running = None
+                q.stats.completed += 1
+                if coalesce is not None and q.pending.get(coalesce) is future:
+                    del q.pending[coalesce]
+
+    def stats(self):
+        """Return a snapshot of DeviceStats, keyed by device."""
+        with self._lock:
+            return {device: q.stats.copy()
+                    for device, q in self._queues.items()}
+
+    def busy(self, device):
+        """True if an operation for device is queued or running."""
+        with self._lock:
+            q = self._queues.get(device)
+            return q is not None and (q.stats.queued > 0 or
+                                      q.stats.running is not None)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Fuzz fido2manage.parse, the parsers for fido2-token2 text output.
+
+Every parser must accept arbitrary text without raising, and must return
+exactly the records that went into well-formed output. With atheris
+installed this is a coverage-guided harness:
+
+    python3 fuzz/fuzz_parse.py -max_total_time=600
+
+Without it, the same checks run on randomly generated and mutated output:
+
+    python3 fuzz/fuzz_parse.py [iterations] [seed]
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fido2manage import parse  # noqa: E402
+from fido2manage.records import (COSE, PROT, RelyingParty,  # noqa: E402
+                                 ResidentKey, b64)
+
+PARSERS = (parse.devices, parse.device_labels, parse.key_values,
+           parse.relying_parties, parse.resident_keys, parse.passkeys,
+           parse.bio_templates)
+
+ALPHABET = "abcdefgh XYZ@.-_:,()[]=+/\t\r0123456789é中"
+
+
+def consume(text):
+    for parser in PARSERS:
+        for _ in parser(text):
+            pass
+    parse.min_pin_length(text)
+
+
+def word(rng, spaces=False):
+    chars = ALPHABET if spaces else ALPHABET.replace(" ", "").replace(
+        "\t", "").replace("\r", "")
+    return "".join(rng.choice(chars) for _ in range(rng.randint(1, 12)))
+
+
+def blob(rng):
+    return rng.randbytes(rng.randint(1, 64))
+
+
+def check_roundtrip(rng):
+    """Format random records the way fido2-token2 does and parse them
+    back."""
+    rks = [ResidentKey("x.com", blob(rng), blob(rng), word(rng),
+                       word(rng, spaces=True).strip() or "x",
+                       rng.choice(list(COSE)), rng.choice(list(PROT)), None)
+           for _ in range(rng.randint(0, 50))]
+    text = "".join(f"{i:02d}: {b64(k.credential_id)} {k.display_name} "
+                   f"{k.user_name} {b64(k.user_id)} {COSE[k.algorithm]} "
+                   f"{PROT[k.prot]}\n" for i, k in enumerate(rks))
+    assert list(parse.resident_keys(text, "x.com")) == rks, text
+
+    rps = [RelyingParty(word(rng), None, blob(rng))
+           for _ in range(rng.randint(0, 50))]
+    text = "".join(f"{i:02d}: {b64(r.id_hash)} {r.rp_id}\n"
+                   for i, r in enumerate(rps))
+    assert list(parse.relying_parties(text)) == rps, text
+
+    pks = [(word(rng), blob(rng), word(rng, spaces=True).strip())
+           for _ in range(rng.randint(0, 50))]
+    text = "".join(f"Domain: {domain}\n[Info] Credential ID: "
+                   f"{b64(cred)}, User: {user}\n"
+                   for domain, cred, user in pks)
+    got = list(parse.passkeys(text))
+    assert len(got) == len(pks), text
+    for (domain, cred, _), g in zip(pks, got):
+        assert (g.rp_id, g.credential_id) == (domain, cred)
+
+
+def mutate(rng, text):
+    data = list(text)
+    for _ in range(rng.randint(1, 8)):
+        op = rng.randrange(3)
+        pos = rng.randint(0, len(data))
+        if op == 0:
+            data.insert(pos, rng.choice(ALPHABET + "\n"))
+        elif op == 1 and data:
+            del data[min(pos, len(data) - 1)]
+        elif data:
+            data[min(pos, len(data) - 1)] = rng.choice(ALPHABET + "\n")
+    return "".join(data)
+
+
+SEEDS = (
+    "ioreg://4302783856: vendor=0x349e, product=0x0022 (Token2 FIDO2)\n",
+    "Device [1] : TOKEN2 FIDO2 Security Key\n",
+    "proto: 0x02\ncaps: 0x05 (wink, cbor, msg)\nminpinlen: 4\n",
+    "00: 6dYkRJ7bZ5MPh4dnY4FX8Yp1obwBQUg0yMMVIYYHSoI= login.microsoft.com\n",
+    "00: Y+Dh/tSy/Q2IdZt6PW/G1A== John Doe j@x.com dXNlcg== es256 uvopt\n",
+    "Domain: x.com\n[Info] Credential ID: AAAA, User: Bob b@x\n",
+    "00: AAE= left thumb\n01: AAI= (null)\n",
+)
+
+
+def test_one_input(data):
+    consume(data.decode("utf-8", "replace"))
+
+
+def main():
+    try:
+        import atheris
+    except ImportError:
+        atheris = None
+
+    if atheris is not None:
+        atheris.Setup(sys.argv, test_one_input)
+        atheris.Fuzz()
+        return
+
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rng = random.Random(int(sys.argv[2]) if len(sys.argv) > 2 else 0)
+    for i in range(iterations):
+        consume(mutate(rng, rng.choice(SEEDS) * rng.randint(1, 4)))
+        consume("".join(rng.choice(ALPHABET + "\n")
+                        for _ in range(rng.randint(0, 200))))
+        if i % 10 == 0:
+            check_roundtrip(rng)
+    print(f"{iterations} iterations ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,16 @@
 import os
-import re
 import subprocess
 import sys
 import tempfile
 import tkinter as tk
 from tkinter import messagebox, simpledialog, ttk
+from fido2manage import fingerprints as bio, mds, parse
+from fido2manage.enroll import Enrollment
+from fido2manage.identify import Identify
+from fido2manage.prefetch import Cancelled, Session
+from fido2manage.records import DeviceInfo, b64
+from fido2manage.reset import ReplugReset, describe as describe_replug
+from fido2manage.scheduler import Scheduler
 
 
 
@@ -69,6 +75,12 @@ def get_fido2_binary_path():
 FIDO2_TOKEN_CMD = get_fido2_binary_path()
 #FIDO2_TOKEN_CMD = "/Applications/fido2-manage.app/Contents/MacOS/fido2-token2"
 
+# In-process operations (fingerprint enrollment) load libfido2 through
+# fido2manage.libfido2; the app bundle ships it next to fido2-token2
+BUNDLED_LIBFIDO2 = os.path.join(os.path.dirname(FIDO2_TOKEN_CMD), "libfido2.1.dylib")
+if os.path.exists(BUNDLED_LIBFIDO2):
+    os.environ.setdefault("FIDO2_LIBRARY", BUNDLED_LIBFIDO2)
+
 
 
 
@@ -81,12 +93,14 @@ TERM = os.environ.get("TERM", "x-terminal-emulator")
 
 # Global variables
 PIN = None
-device_strings = []  # Store actual device strings for fido2-token2
+devices = []  # DeviceInfo records, in combobox order
+templates = []  # BioTemplate records, in fingerprint listbox order
+scheduler = Scheduler()
+session = None  # Session of the selected device, keyed by its path
 
 
 def get_device_list():
-    """Get device list directly from fido2-token2"""
-    global device_strings
+    """Get device list directly from fido2-token2, as DeviceInfo records"""
     try:
         # Execute fido2-token2 -L to list devices
         result = subprocess.run([FIDO2_TOKEN_CMD, "-L"], capture_output=True, text=True)
@@ -96,41 +110,13 @@ def get_device_list():
             return []
         
         device_list = []
-        device_strings = []
-        device_count = 1
-        
-        for line in result.stdout.strip().split('\n'):
-            if line.strip() and ':' in line:
-                # Handle pcsc devices specially
-                if 'pcsc://slot0:' in line:
-                    device_string = "pcsc://slot0"
-                    device_description = "pcsc://slot0"
-                else:
-                    # Extract device string - everything before the first space or tab
-                    parts = line.split()
-                    if parts:
-                        device_string = parts[0]
-                        # For ioreg devices, ensure we don't have trailing colon
-                        if device_string.endswith(':'):
-                            device_string = device_string[:-1]
-                    else:
-                        # Fallback: split by colon and reconstruct
-                        colon_parts = line.split(':')
-                        if len(colon_parts) >= 2:
-                            device_string = ':'.join(colon_parts[:2])
-                        else:
-                            device_string = line.strip()
-                    
-                    # Extract device description for display
-                    match = re.search(r'\(([^)]+)\)', line)
-                    if match:
-                        device_description = match.group(1)
-                    else:
-                        device_description = device_string
-                
-                device_strings.append(device_string)
-                device_list.append(f"Device [{device_count}] : {device_description}")
-                device_count += 1
+        for device in parse.devices(result.stdout):
+            # Handle pcsc devices specially
+            if device.path.startswith("pcsc://slot0"):
+                device = DeviceInfo(device.index, "pcsc://slot0", "pcsc://slot0", device.vendor, device.product)
+            elif not device.description:
+                device = DeviceInfo(device.index, device.path, device.path, device.vendor, device.product)
+            device_list.append(device)
         
         return device_list
     
@@ -143,13 +129,19 @@ def get_device_string(device_digit):
     """Get the actual device string for fido2-token2 command"""
     try:
         device_index = int(device_digit) - 1
-        if 0 <= device_index < len(device_strings):
-            return device_strings[device_index]
+        if 0 <= device_index < len(devices):
+            return devices[device_index].path
         return None
     except (ValueError, IndexError):
         return None
 
 
+def selected_digit():
+    """Position of the selected device, taken from the combobox selection"""
+    index = device_combobox.current()
+    return str(devices[index].index) if 0 <= index < len(devices) else None
+
+
 def execute_storage_command(device_digit):
     """Execute storage command directly with fido2-token2"""
     global PIN
@@ -169,10 +161,8 @@ def execute_storage_command(device_digit):
         
         if result.returncode == 0:
             # Parse the output and insert into the treeview
-            for line in reversed(result.stdout.splitlines()):
-                if ": " in line:
-                    key, value = line.split(": ", 1)
-                    tree.insert("", 0, values=(key, value))
+            for key, value in reversed(list(parse.key_values(result.stdout))):
+                tree.insert("", 0, values=(key, value))
         else:
             raise subprocess.CalledProcessError(result.returncode, command)
     except Exception as e:
@@ -241,10 +231,8 @@ def execute_info_command(device_digit):
         
         if result.returncode == 0:
             # Parse storage output
-            for line in result.stdout.splitlines():
-                if ": " in line:
-                    key, value = line.split(": ", 1)
-                    tree.insert("", tk.END, values=(key, value))
+            for key, value in parse.key_values(result.stdout):
+                tree.insert("", tk.END, values=(key, value))
         else:
             raise subprocess.CalledProcessError(result.returncode, storage_command)
     
@@ -262,11 +250,13 @@ def execute_info_command(device_digit):
         result = subprocess.run(info_command, capture_output=True, text=True)
         
         if result.returncode == 0:
-            # Parse info output
-            for line in result.stdout.splitlines():
-                if ": " in line:
-                    key, value = line.split(": ", 1)
-                    tree.insert("", tk.END, values=(key, value))
+            # Parse info output, then name the model from the MDS BLOB, if configured
+            info = list(parse.key_values(result.stdout))
+            aaguid = dict(info).get("aaguid")
+            if aaguid:
+                info += mds.info_rows(aaguid)
+            for key, value in info:
+                tree.insert("", tk.END, values=(key, value))
         else:
             raise subprocess.CalledProcessError(result.returncode, info_command)
     
@@ -282,23 +272,73 @@ def set_pin():
     )
 
 
+def when_done(future, callback):
+    """Call callback(future) on the Tk thread once future has completed"""
+    def poll():
+        if future.done():
+            callback(future)
+        else:
+            root.after(50, poll)
+    poll()
+
+
+def pin_args(pin):
+    """-w PIN for fido2-token2, unless no PIN is set/known"""
+    return ["-w", pin] if pin and pin != "0000" else []
+
+
+def close_session():
+    """Stop the prefetch of the previous device and forget its PIN"""
+    global session
+    if session is not None:
+        session.close()
+        session = None
+
+
+def prefetch(s):
+    """Start reading credentials (and fingerprints, on bio keys) right after PIN entry"""
+    s.fetch("passkeys", list_passkeys)
+    if str(fingerprints_button["state"]) == tk.NORMAL:
+        s.fetch(bio.NAME, bio.read)
+
+
+def watch_devices():
+    """End the session when its key is unplugged; ioreg paths also change on re-plug"""
+    if session is not None and not session.closed:
+        s = session
+        listing = scheduler.submit("list", get_device_list, coalesce="list", label="device list")
+        when_done(listing, lambda f: check_session_device(f, s))
+    root.after(2000, watch_devices)
+
+
+def check_session_device(future, s):
+    if s is session and not s.closed and s.device not in {d.path for d in future.result()}:
+        refresh_combobox()
+
+
 def on_device_selected(event):
     """Handle device selection event"""
-    global PIN
-    selected_device = device_var.get()
-    # Extract the digit inside the first pair of square brackets
-    match = re.search(r"\[(\d+)\]", selected_device)
-    PIN = None
-
-    set_pin()
+    global PIN, session
+    device_digit = selected_digit()
+    device_string = get_device_string(device_digit) if device_digit else None
+
+    # The PIN is asked once per device session
+    if session is None or session.closed or session.device != device_string:
+        close_session()
+        PIN = None
+        set_pin()
+        if device_string and PIN is not None:
+            session = Session(scheduler, device_string)
+            session.pin = PIN
     
-    if match:
-        device_digit = match.group(1)
+    if device_digit:
         if PIN is not None:
             execute_info_command(device_digit)
             check_passkeys_button_state()
             check_fingerprint_button_state()
             check_changepin_button_state()
+            if session is not None:
+                prefetch(session)
     else:
         messagebox.showinfo("Device Selected", "No digit found in the selected device")
 
@@ -359,20 +399,84 @@ def show_message_and_lift(window, message, title="Info"):
     #messagebox.showinfo(title, message)
     window.lift()  # Bring the window back to focus
 
-def open_terminal(device_string, window):
-    selected_device = device_var.get()
-    # Build the command
-    command = [FIDO2_TOKEN_CMD, "-S", "-e", device_string]
-# macOS: open a new Terminal window and run the command
-    subprocess.Popen(["osascript", "-e", f'tell application \"Terminal\" to do script \"(echo \\"Launching...\\"; {FIDO2_TOKEN_CMD} -S -e {device_string}; echo \\"Done\\"; exec $SHELL)\"'])
+def fingerprint_added(template_id):
+    """Add the new fingerprint to the session's list instead of reading it again"""
+    if session is not None:
+        session.patch(bio.NAME, lambda fps: bio.added(fps, template_id))
+
+def add_fingerprint(device_string, window):
+    """Enroll a fingerprint in process, showing each sample as the key reports it"""
+    dialog = tk.Toplevel(window)
+    dialog.title("Add Fingerprint")
+    status = tk.Label(dialog, text="Touch the sensor.", width=45)
+    status.pack(padx=10, pady=10)
+    progress = ttk.Progressbar(dialog, length=300, mode="determinate",
+                               maximum=sensor_samples() or 100)
+    progress.pack(padx=10, pady=5)
+
+    enrollment = Enrollment(scheduler, device_string, PIN if PIN and PIN != "0000" else None)
+    cancel_button = tk.Button(dialog, text="Cancel", command=enrollment.cancel)
+    cancel_button.pack(pady=10)
+    dialog.protocol("WM_DELETE_WINDOW", enrollment.cancel)
+    future = enrollment.start()
+    taken = 0
+
+    def show_samples():
+        nonlocal taken
+        for sample in enrollment.poll():
+            taken += 1
+            progress.config(maximum=taken + sample.remaining, value=taken)
+            left = f" ({sample.remaining} more)" if sample.remaining else ""
+            status.config(text=f"{sample.message}{left}")
+        if future.done():
+            enrollment_done()
+        else:
+            dialog.after(50, show_samples)
+
+    def enrollment_done():
+        try:
+            template_id = future.result()
+        except Exception as e:
+            dialog.destroy()
+            messagebox.showerror("Error", f"Enrollment failed: {e}")
+            window.lift()
+            return
+        dialog.destroy()
+        if template_id is not None:
+            fingerprint_added(template_id)
+            update_fingerprint_list(device_string, window)
+        window.lift()
+
+    show_samples()
+
+def sensor_samples():
+    """Samples the key asks for per enrollment, if the fingerprint list was read"""
+    listing = session.cached(bio.NAME) if session is not None else None
+    if listing is None or not listing.done() or listing.cancelled() or listing.exception() is not None:
+        return None
+    return listing.result().max_samples
+
+def fingerprint_changed(future, device_string, window):
+    """Redraw the list from the session, which the change has patched"""
+    if future.cancelled():
+        return
+    try:
+        future.result()
+    except Cancelled:
+        return
+    except Exception as e:
+        messagebox.showerror("Error", f"An error occurred: {e}")
+        window.lift()
+        return
+    update_fingerprint_list(device_string, window)
 
 def delete_selected(device_string, window):
     try:
         selected_index = listbox.curselection()
-        selected_device = device_var.get()
-        if selected_index:
-            selected_item = listbox.get(selected_index)
-            ID = selected_item.split(":")[1].split()[0]; subprocess.Popen(["osascript", "-e", f'tell application \"Terminal\" to do script \"({FIDO2_TOKEN_CMD} -D -e -i {ID} {device_string}; echo \\\"Done\\\"; exec $SHELL)\"'])
+        if selected_index and session is not None:
+            template_id = templates[selected_index[0]].template_id
+            change = bio.remove(session, template_id)
+            when_done(change, lambda f: fingerprint_changed(f, device_string, window))
         else:
             show_message_and_lift(window, "No item selected.", "Warning")
     except Exception as e:
@@ -382,19 +486,15 @@ def delete_selected(device_string, window):
 def rename_selected(device_string, window):
     try:
         selected_index = listbox.curselection()
-        selected_device = device_var.get()
-        if selected_index:
-            selected_item = listbox.get(selected_index)
-            # Extract template ID
-            template_id = selected_item.split(":")[1].split()[0]
+        if selected_index and session is not None:
+            # Look up the template shown in the selected row
+            template_id = templates[selected_index[0]].template_id
             # Ask the user for a friendly name
             template_name = simpledialog.askstring("Template Name", "Enter a friendly name for the finger:")
-# Only proceed if user entered something
+            # Only proceed if user entered something
             if template_name:
-                subprocess.Popen([
-                    "osascript", "-e",
-                    f'tell application "Terminal" to do script "({FIDO2_TOKEN_CMD} -S -e -i {template_id} -n \\"{template_name}\\" {device_string}; echo \\"Done\\"; exec $SHELL)"'
-                ])
+                change = bio.rename(session, template_id, template_name)
+                when_done(change, lambda f: fingerprint_changed(f, device_string, window))
         else:
             show_message_and_lift(window, "No item selected.", "Warning")
     except Exception as e:
@@ -402,225 +502,163 @@ def rename_selected(device_string, window):
         window.lift()
 
 def refresh_terminal(device_string, window):
-    selected_device = device_var.get()
-    show_message_and_lift(window, f"Refreshing the terminal for {selected_device} with device: {device_string}")
+    """Read the fingerprints from the key again, e.g. after changes made with fido2-token2"""
+    if session is not None:
+        session.forget(bio.NAME)
     update_fingerprint_list(device_string, window)
 
+def fill_fingerprint_list(found):
+    listbox.delete(0, tk.END)
+    templates[:] = found.templates
+    for i, t in enumerate(templates):
+        listbox.insert(tk.END, f"{i:02d}: {b64(t.template_id)} {t.name or ''}")
+
 def update_fingerprint_list(device_string, window):
-    try:
-        selected_device = device_var.get()
-        match = re.search(r"\[(\d+)\]", selected_device)
+    device_digit = selected_digit()
 
-        if match:
-            device_digit = match.group(1)
-            if not device_string:
-                messagebox.showerror("Error", "Invalid device selection")
-                window.lift()
-                return
+    if device_digit:
+        if not device_string:
+            messagebox.showerror("Error", "Invalid device selection")
+            window.lift()
+            return
 
-            if PIN is not None:
-                command = [FIDO2_TOKEN_CMD, "-L", "-e"]
-                if PIN and PIN != "0000":
-                    command.extend(["-w", PIN])
-                command.append(device_string)
-
-                result = subprocess.run(command, capture_output=True, text=True)
-
-                if result.returncode == 0:
-                    listbox.delete(0, tk.END)
-                    fingerprints = result.stdout.strip().split('\n')
-                    for fp in fingerprints:
-                        listbox.insert(tk.END, fp)
-                else:
-                    messagebox.showwarning("Error", f"No fingerprints")
-                    listbox.delete(0, tk.END)
-                    window.lift()
+        if PIN is not None and session is not None:
+            # enrollments, renames and deletions patch the session's list,
+            # so this is the cached result unless Refresh dropped it
+            listing = session.fetch(bio.NAME, bio.read)
+            when_done(listing, lambda f: refresh_fingerprint_list(f, window))
+
+def refresh_fingerprint_list(future, window):
+    if future.cancelled():
+        return
+    try:
+        found = future.result()
+    except Cancelled:
+        return
     except Exception as e:
         messagebox.showerror("Error", f"An error occurred: {e}")
         window.lift()
+        return
+    fill_fingerprint_list(found)
+    if not found.templates:
+        messagebox.showwarning("Error", f"No fingerprints")
+        window.lift()
 
 def fingerprints():
-    global PIN
-
     selected_device = device_var.get()
-    match = re.search(r"\[(\d+)\]", selected_device)
+    device_digit = selected_digit()
 
-    if match:
-        device_digit = match.group(1)
+    if device_digit:
         device_string = get_device_string(device_digit)
 
         if not device_string:
             messagebox.showerror("Error", "Invalid device selection")
             return
 
-        if PIN is not None:
-            command = [FIDO2_TOKEN_CMD, "-L", "-e"]
-            if PIN and PIN != "0000":
-                command.extend(["-w", PIN])
-            command.append(device_string)
-            		
-
-            try:
-                result = subprocess.run(command, capture_output=True, text=True)
-
-                if result.returncode == 0:
-                    fingerprint_window = tk.Toplevel()
-                    fingerprint_window.title("Fingerprints")
-
-                    tk.Label(fingerprint_window, text=f"List of Fingerprints for {selected_device}:").pack(pady=10)
-
-                    global listbox
-                    listbox = tk.Listbox(fingerprint_window, width=50)
-                    listbox.pack(padx=10, pady=10)
-
-                    fingerprints = result.stdout.strip().split('\n')
-                    for fp in fingerprints:
-                        listbox.insert(tk.END, fp)
-
-                    button_frame = tk.Frame(fingerprint_window)
-                    button_frame.pack(pady=10)
-
-                    add_button = tk.Button(button_frame, text="Add", command=lambda: open_terminal(device_string, fingerprint_window))
-                    add_button.pack(side=tk.LEFT, padx=5)
+        if PIN is not None and session is not None:
+            # Opens from the prefetched list, or waits for the read in progress
+            listing = session.fetch(bio.NAME, bio.read)
+            when_done(listing, lambda f: show_fingerprints(f, selected_device, device_string))
 
-                    delete_button = tk.Button(button_frame, text="Delete", command=lambda: delete_selected(device_string, fingerprint_window))
-                    delete_button.pack(side=tk.LEFT, padx=5)
+def show_fingerprints(future, selected_device, device_string):
+    global listbox
 
-                    rename_button = tk.Button(button_frame, text="Rename", command=lambda: rename_selected(device_string, fingerprint_window))
-                    rename_button.pack(side=tk.LEFT, padx=5)
-
-                    refresh_button = tk.Button(button_frame, text="Refresh", command=lambda: refresh_terminal(device_string, fingerprint_window))
-                    refresh_button.pack(side=tk.LEFT, padx=5)
-
-                else:
-                    messagebox.showwarning("Error", f"No fingerprints enrolled")
-                    fingerprint_window = tk.Toplevel()
-                    fingerprint_window.title("Fingerprints")
+    if future.cancelled():
+        return
+    try:
+        found = future.result()
+    except Cancelled:
+        return
+    except Exception as e:
+        messagebox.showerror("Error", f"An error occurred: {e}")
+        return
 
-                    tk.Label(fingerprint_window, text=f"List of Fingerprints for {selected_device}:").pack(pady=10)
+    if not found.templates:
+        messagebox.showwarning("Error", f"No fingerprints enrolled")
 
-                    #global listbox
-                    listbox = tk.Listbox(fingerprint_window, width=50)
-                    listbox.pack(padx=10, pady=10)
+    fingerprint_window = tk.Toplevel()
+    fingerprint_window.title("Fingerprints")
 
-               
+    tk.Label(fingerprint_window, text=f"List of Fingerprints for {selected_device}:").pack(pady=10)
 
-                    button_frame = tk.Frame(fingerprint_window)
-                    button_frame.pack(pady=10)
+    listbox = tk.Listbox(fingerprint_window, width=50)
+    listbox.pack(padx=10, pady=10)
+    fill_fingerprint_list(found)
 
-                    add_button = tk.Button(button_frame, text="Add", command=lambda: open_terminal(device_string, fingerprint_window))
-                    add_button.pack(side=tk.LEFT, padx=5)
+    button_frame = tk.Frame(fingerprint_window)
+    button_frame.pack(pady=10)
 
-                    delete_button = tk.Button(button_frame, text="Delete", command=lambda: delete_selected(device_string, fingerprint_window))
-                    delete_button.pack(side=tk.LEFT, padx=5)
+    add_button = tk.Button(button_frame, text="Add", command=lambda: add_fingerprint(device_string, fingerprint_window))
+    add_button.pack(side=tk.LEFT, padx=5)
 
-                    rename_button = tk.Button(button_frame, text="Rename", command=lambda: rename_selected(device_string, fingerprint_window))
-                    rename_button.pack(side=tk.LEFT, padx=5)
+    delete_button = tk.Button(button_frame, text="Delete", command=lambda: delete_selected(device_string, fingerprint_window))
+    delete_button.pack(side=tk.LEFT, padx=5)
 
-                    refresh_button = tk.Button(button_frame, text="Refresh", command=lambda: refresh_terminal(device_string, fingerprint_window))
-                    refresh_button.pack(side=tk.LEFT, padx=5)
- 
+    rename_button = tk.Button(button_frame, text="Rename", command=lambda: rename_selected(device_string, fingerprint_window))
+    rename_button.pack(side=tk.LEFT, padx=5)
 
-            except Exception as e:
-                messagebox.showerror("Error", f"An error occurred: {e}")
+    refresh_button = tk.Button(button_frame, text="Refresh", command=lambda: refresh_terminal(device_string, fingerprint_window))
+    refresh_button.pack(side=tk.LEFT, padx=5)
 
 #fp management end
 
 
+def list_passkeys(s):
+    """Walk the relying parties and their credentials in the background"""
+    command = [FIDO2_TOKEN_CMD, "-L", "-r"] + pin_args(s.pin) + [s.device]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{subprocess.CalledProcessError(result.returncode, command)}\nOutput: {result.stderr}")
 
+    keys = []
+    for rp in parse.relying_parties(result.stdout):
+        s.check()
+        domain_command = [FIDO2_TOKEN_CMD, "-L", "-k", rp.rp_id] + pin_args(s.pin) + [s.device]
+        domain_result = subprocess.run(domain_command, capture_output=True, text=True)
+        if domain_result.returncode != 0:
+            raise RuntimeError(f"{subprocess.CalledProcessError(domain_result.returncode, domain_command)}\nOutput: {domain_result.stderr}")
+        keys.extend(parse.resident_keys(domain_result.stdout, rp.rp_id))
+    return keys
 
 
-                
-                
 def on_passkeys_button_click():
     """Handle passkeys button click"""
-    global PIN
-    selected_device = device_var.get()
-    match = re.search(r"\[(\d+)\]", selected_device)
+    device_digit = selected_digit()
     
-    if match:
-        device_digit = match.group(1)
+    if device_digit:
         device_string = get_device_string(device_digit)
         
         if not device_string:
             messagebox.showerror("Error", "Invalid device selection")
             return
         
-        if PIN is not None:
-            # Execute command to get resident keys (list domains)
-            command = [FIDO2_TOKEN_CMD, "-L", "-r"]
-            if PIN and PIN != "0000":
-                command.extend(["-w", PIN])
-            command.append(device_string)
-            
-            try:
-                result = subprocess.run(command, capture_output=True, text=True)
-                if result.returncode == 0:
-                    # Parse domains from output
-                    domains = []
-                    for line in result.stdout.splitlines():
-                        match = re.search(r"= (.+)$", line)
-                        if match:
-                            domains.append(match.group(1))
-                    
-                    # Execute command for each domain
-                    cumulated_output = []
-                    for domain in domains:
-                        domain_command = [FIDO2_TOKEN_CMD, "-L", "-k", domain]
-                        if PIN and PIN != "0000":
-                            domain_command.extend(["-w", PIN])
-                        domain_command.append(device_string)
-                        
-                        domain_result = subprocess.run(domain_command, capture_output=True, text=True)
-                        
-                        if domain_result.returncode == 0:
-                            # Process the output line by line
-                            processed_lines = []
-                            for line in domain_result.stdout.splitlines():
-                                if line.strip():
-                                    parts = line.split()
-                                    if len(parts) >= 3:
-                                        key_id = parts[0]
-                                        credential_id = parts[1]
-                                        user_field = " ".join(parts[2:4]) if len(parts) > 3 else parts[2]
-                                        email_field = " ".join(parts[4:6]) if len(parts) > 5 else ""
-                                        
-                                        if user_field == "(null)":
-                                            user_field = ""
-                                        
-                                        # Determine if user_field is an email
-                                        if "@" in user_field:
-                                            email = user_field
-                                            user = ""
-                                        else:
-                                            user = user_field
-                                            email = email_field
-                                        
-                                        processed_lines.append(f"Credential ID: {credential_id}, User: {user} {email}")
-                            
-                            cumulated_output.append(f"Domain: {domain}\n" + "\n".join(processed_lines))
-                        else:
-                            raise subprocess.CalledProcessError(domain_result.returncode, domain_command)
-                    
-                    # Show cumulated output in new window
-                    cumulated_output_str = "\n\n".join(cumulated_output)
-                    show_output_in_new_window(cumulated_output_str, device_digit)
-                else:
-                    raise subprocess.CalledProcessError(result.returncode, command)
-            
-            except Exception as e:
-                messagebox.showerror("Error", f"Command execution failed: {e}\nOutput: {result.stderr}")
+        if PIN is not None and session is not None:
+            # Opens from the prefetched list, or waits for the walk in progress
+            listing = session.fetch("passkeys", list_passkeys)
+            when_done(listing, lambda f: show_passkeys(f, device_digit))
     else:
         messagebox.showinfo("Device Selected", "No digit found in the selected device")
 
 
+def show_passkeys(future, device_digit):
+    """Show the credentials in a new window"""
+    if future.cancelled():
+        return
+    try:
+        keys = future.result()
+    except Cancelled:
+        return
+    except Exception as e:
+        messagebox.showerror("Error", f"Command execution failed: {e}")
+        return
+    show_output_in_new_window(keys, device_digit)
+
+
 def change_pin():
     """Change PIN using direct fido2-token2 command"""
-    selected_device = device_var.get()
-    match = re.search(r"\[(\d+)\]", selected_device)
+    device_digit = selected_digit()
     
-    if match:
-        device_digit = match.group(1)
+    if device_digit:
         device_string = get_device_string(device_digit)
         
         if not device_string:
@@ -644,18 +682,46 @@ def change_pin():
 
 def refresh_combobox():
     """Refresh the device combobox"""
+    close_session()
     device_combobox.set("")
     tree.delete(*tree.get_children())
     passkeys_button.config(state=tk.DISABLED)
     change_pin_button.config(state=tk.DISABLED)
     
-    device_list = get_device_list()
-    if not device_list:
+    devices[:] = get_device_list()
+    if not devices:
         print("No devices found.")
-    device_combobox["values"] = device_list
+    device_combobox["values"] = [d.label for d in devices]
+
+
+def identify_device():
+    """Blink every key at once and select the one the user touches"""
+    if not devices:
+        messagebox.showinfo("Identify", "No devices found.")
+        return
+    dialog = tk.Toplevel(root)
+    dialog.title("Identify")
+    tk.Label(dialog, text=f"Touch the key to select ({len(devices)} blinking).", width=45).pack(padx=10, pady=10)
 
+    identify = Identify(scheduler, {d.path: d.path for d in devices})
+    tk.Button(dialog, text="Cancel", command=identify.cancel).pack(pady=10)
+    dialog.protocol("WM_DELETE_WINDOW", identify.cancel)
+    when_done(identify.start(), lambda f: identify_done(f, dialog))
 
-def show_output_in_new_window(output, device_digit):
+def identify_done(future, dialog):
+    dialog.destroy()
+    try:
+        path = future.result()
+    except Exception as e:
+        messagebox.showerror("Error", f"An error occurred: {e}")
+        return
+    index = next((i for i, d in enumerate(devices) if d.path == path), None)
+    if index is not None:
+        device_combobox.current(index)
+        on_device_selected(None)
+
+
+def show_output_in_new_window(keys, device_digit):
     """Show output in a new window for passkey management"""
     new_window = tk.Toplevel(root)
     new_window.geometry("800x650")
@@ -679,22 +745,15 @@ def show_output_in_new_window(output, device_digit):
     tree_scrollbar_x.pack(side="bottom", fill="x")
     tree_new_window.configure(xscrollcommand=tree_scrollbar_x.set)
 
-    # Parse output and insert into Treeview
-    current_domain = ""
-    for line in output.splitlines():
-        if line.startswith("Domain: "):
-            current_domain = line.split("Domain: ")[1].strip()
-        elif "Credential ID: " in line and "User: " in line:
-            credential_id = line.split("Credential ID: ")[1].split(",")[0].strip()
-            user = line.split("User: ")[1].strip()
-            user = re.sub(re.escape(credential_id), "", user).strip()
-            tree_new_window.insert("", tk.END, values=(current_domain, credential_id, user))
+    # Insert the credentials into Treeview; the row id is the position in keys
+    for i, key in enumerate(keys):
+        tree_new_window.insert("", tk.END, iid=str(i), values=(key.rp_id or "", b64(key.credential_id), key.user))
 
     def show_selected_value():
         """Delete selected passkey"""
         selected_item = tree_new_window.selection()
         if selected_item:
-            credential_id = tree_new_window.item(selected_item, "values")[1]
+            credential_id = b64(keys[int(selected_item[0])].credential_id)
             device_string = get_device_string(device_digit)
             
             if not device_string:
@@ -702,6 +761,8 @@ def show_output_in_new_window(output, device_digit):
                 return
             
             new_window.destroy()
+            if session is not None:
+                session.forget("passkeys")
             command = [FIDO2_TOKEN_CMD, "-D", "-i", credential_id, device_string]
             cmd_str = " ".join(command)
   # macOS: use AppleScript to run in Terminal
@@ -738,44 +799,56 @@ def factory_reset():
     if not confirm_reset:
         return
 
-    # Step 2: Ask to unplug and replug the key
-    replug_key = messagebox.askyesno(
-        "Replug Key",
-        "Please unplug the key, plug it back in, then click Yes to continue. Important - the reset command can be completed only within 10 seconds after plugging the key"
-    )
-    if not replug_key:
+    # Step 2: Arm on the selected key (or the first one), then ask for the re-plug
+    device_digit = selected_digit()
+    device_string = get_device_string(device_digit) if device_digit else None
+    if not device_string:
+        device_string = next((d.path for d in devices if d.path.startswith("ioreg://")), None)
+    if not device_string:
+        messagebox.showerror("Error", "No valid device found")
         return
-
-    # Step 3: Tell user to touch key when it starts blinking
-    messagebox.showinfo(
-        "Touch Key",
-        "When the key starts blinking, touch the sensor to complete reset."
-    )
-
-    try:
-        # Run -L to list the device
-        list_command = [FIDO2_TOKEN_CMD, "-L"]
-        result = subprocess.run(list_command, capture_output=True, text=True, check=True)
-        output = result.stdout.strip()
-
-        # Extract string before first colon (e.g., ioreg://4302783856)
-        match = re.search(r"(ioreg://\d+):", output)
-        if not match:
-            messagebox.showerror("Error", "No valid device found in output")
+    close_session()
+
+    dialog = tk.Toplevel(root)
+    dialog.title("Factory Reset")
+    status = tk.Label(dialog, text="Unplug the key and plug it back in.\nThe reset is sent as soon as it is back.", width=55)
+    status.pack(padx=10, pady=10)
+
+    reset = ReplugReset(scheduler, device_string)
+    if reset.warning() is not None:
+        status.config(text=f"{status.cget('text')}\n\n{reset.warning()}", wraplength=400)
+    cancel_button = tk.Button(dialog, text="Cancel", command=reset.cancel)
+    cancel_button.pack(pady=10)
+    dialog.protocol("WM_DELETE_WINDOW", reset.cancel)
+    future = reset.start()
+
+    # Step 3: Tell user to touch key as soon as the reset has been sent
+    def show_state():
+        if reset.state == "sent":
+            status.config(text=f"{describe_replug(reset.timing)}\nWhen the key starts blinking, touch the sensor to complete reset.")
+            cancel_button.config(state=tk.DISABLED)
+        elif reset.state == "gone":
+            status.config(text="Plug the key back in." + (f"\n\n{reset.warning()}" if reset.warning() else ""))
+        if future.done():
+            reset_done()
+        else:
+            dialog.after(20, show_state)
+
+    def reset_done():
+        dialog.destroy()
+        try:
+            timing = future.result()
+        except Exception as e:
+            if "FIDO_ERR_NOT_ALLOWED" in str(e):
+                messagebox.showerror("Error", "Factory reset not allowed. Factory reset is only allowed within 10 seconds of powering up of the security key.")
+            else:
+                messagebox.showerror("Error", f"Failed to reset: {e}")
             return
+        if timing is not None:
+            messagebox.showinfo("Success", f"Factory reset completed.\n{describe_replug(timing)}")
+        refresh_combobox()
 
-        device_string = match.group(1)
-
-        # Run -R with extracted device string
-        reset_command = [FIDO2_TOKEN_CMD, "-R", device_string]
-        subprocess.run(reset_command, check=True)
-
-        messagebox.showinfo("Success", "Factory reset command sent successfully.")
-
-    except subprocess.CalledProcessError as e:
-        messagebox.showerror("Error", f"Command failed:\n{e.stderr}")
-    except Exception as e:
-        messagebox.showerror("Error", f"Failed to reset: {e}")
+    show_state()
 
 def terminal_path():
     bash_script = """#!/bin/bash
@@ -896,9 +969,8 @@ label = tk.Label(top_frame, text="Select Device:")
 label.pack(side=tk.LEFT, padx=10, pady=10)
 
 # Create ComboBox and populate with device list
-device_list = get_device_list()
-if not device_list:
-    device_list = ["No devices found."]
+devices[:] = get_device_list()
+device_list = [d.label for d in devices] or ["No devices found."]
 
 device_var = tk.StringVar()
 device_combobox = ttk.Combobox(top_frame, textvariable=device_var, values=device_list, width=60)
@@ -909,6 +981,10 @@ device_combobox.bind("<<ComboboxSelected>>", on_device_selected)
 refresh_button = tk.Button(top_frame, text="Refresh", command=refresh_combobox)
 refresh_button.pack(side=tk.LEFT, padx=10, pady=10)
 
+# Create identify button: select the key that is touched
+identify_button = tk.Button(top_frame, text="Identify", command=identify_device)
+identify_button.pack(side=tk.LEFT, padx=10, pady=10)
+
 # Create Treeview for displaying output
 tree_frame = ttk.Frame(root)
 tree_frame.pack(expand=True, fill=tk.BOTH, padx=10, pady=10)
@@ -949,5 +1025,7 @@ terminal_path.pack(side=tk.LEFT, padx=15, pady=10)
 about_button = ttk.Button(root, text="About", command=show_about_message)
 about_button.pack(side=tk.RIGHT, padx=5, pady=10)
 
+watch_devices()
+
 # Run the main loop
 root.mainloop()
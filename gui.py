@@ -1,61 +1,47 @@
+import time
+
+STARTED = time.perf_counter()
+
 import os
-import re
 import subprocess
 import sys
 import tkinter as tk
-import shutil
 from tkinter import messagebox, simpledialog, ttk
-import pexpect
 import argparse
-
-def detect_terminal():
-    candidates = [
-        ("gnome-terminal", ["--"]),
-        ("x-terminal-emulator", ["-e"]),
-        ("xterm", ["-e"]),
-        ("konsole", ["-e"]),
-        ("lxterminal", ["-e"]),
-        ("tilix", ["-e"]),
-        ("mate-terminal", ["-e"]),
-    ]
-    for term, flag in candidates:
-        if shutil.which(term):
-            return term, flag
-    return None, None
+from fido2manage import mds, metrics, parse
+from fido2manage.devices import Resolver, fido_hidraw_nodes
+from fido2manage.identify import Identify
+from fido2manage.prefetch import Cancelled, Session
+from fido2manage.records import b64
+from fido2manage.scheduler import Scheduler, TOUCH
 
 FIDO_COMMAND = "./fido2-manage.sh"
-TERM, TERM_FLAG = detect_terminal()
-
-if TERM is None:
-    messagebox.showerror("Error", "No supported terminal emulator found. Please install xterm or gnome-terminal.")
-    sys.exit(1)
 
-PIN = None
+devices = []  # DeviceInfo records, in combobox order
+listed_paths = {}  # libfido2 path of each listed key, by digit
+scheduler = Scheduler()
+session = None  # Session of the selected device: its PIN and prefetched reads
 
-def set_dpi_awareness():
+def set_dpi_awareness(root):
     
     # Set rowheight based on screen DPI and size
     # Get screen's DPI (dots per inch)
     try:
         # For Windows, use ctypes to get DPI awareness
         if sys.platform.startswith("win"):
-            awareness = ctypes.c_int()
+            import ctypes
             ctypes.windll.shcore.SetProcessDpiAwareness(2)  # Per-monitor DPI aware
             hdc = ctypes.windll.user32.GetDC(0)
             dpi = ctypes.windll.gdi32.GetDeviceCaps(hdc, 88)
         else:
-            # For Linux/Mac, use Tkinter's winfo_fpixels
-            root = tk.Tk()
+            # For Linux/Mac, ask the main window instead of a throwaway root
             dpi = root.winfo_fpixels('1i')
-            root.destroy()
     except Exception:
         dpi = 96  # Fallback to standard DPI
 
     # Get screen height in pixels
     try:
-        root = tk.Tk()
         screen_height = root.winfo_screenheight()
-        root.destroy()
     except Exception:
         screen_height = 1080  # Fallback
 
@@ -70,176 +56,291 @@ def set_dpi_awareness():
     style = ttk.Style()
     style.configure("Treeview", rowheight=rowheight)
 
+def run_fido(operation, arguments):
+    """Run fido2-manage.sh, recording its latency and result in metrics."""
+    with metrics.REGISTRY.operation(operation) as op:
+        result = subprocess.run(
+            [FIDO_COMMAND] + arguments, capture_output=True, text=True
+        )
+        op.result = metrics.error_code(result.stdout + result.stderr, result.returncode)
+    return result
+
 def get_device_list():
     try:
-        result = subprocess.run([FIDO_COMMAND, "-list"], capture_output=True, text=True)
-        device_list = result.stdout.strip().split("\n")
+        result = run_fido("list", ["-list"])
+        device_list = list(parse.device_labels(result.stdout))
+        metrics.REGISTRY.devices([d.label for d in device_list])
         return device_list
     except Exception as e:
         print(f"Error executing device list command: {e}")
         return []
 
+def list_devices():
+    """The -list records, and the libfido2 path of each by digit."""
+    device_list = get_device_list()
+    try:
+        paths = device_paths(device_list)
+    except Exception:
+        paths = {}
+    return device_list, paths
+
+def when_done(future, callback):
+    """Call callback(future) on the Tk thread once future has completed."""
+    def poll():
+        if future.done():
+            callback(future)
+        else:
+            root.after(50, poll)
+    poll()
+
+def run_info(device_digit):
+    result = run_fido("info", ["-info", "-device", device_digit])
+    if result.returncode != 0:
+        raise RuntimeError(f"Command execution failed\nOutput: {result.stderr}")
+    rows = list(parse.key_values(result.stdout))
+    aaguid = None
+    for key, value in rows:
+        if key in ("pin retries", "uv retries") and value.isdigit():
+            record = metrics.REGISTRY.pin_retries if key == "pin retries" else metrics.REGISTRY.uv_retries
+            record(device_digit, int(value))
+        elif key == "aaguid":
+            aaguid = value
+    return rows + (mds.info_rows(aaguid) if aaguid else [])
+
+def probe_storage(device_digit):
+    import pexpect
+
+    with metrics.REGISTRY.operation("storage probe") as op:
+        child = pexpect.spawn(
+            f"{FIDO_COMMAND} -storage -device {device_digit}",
+            encoding="utf-8", timeout=10
+        )
+        index = child.expect([r"Enter PIN for", pexpect.EOF, pexpect.TIMEOUT])
+        output = child.before
+        child.close(force=True)
+        op.result = "TIMEOUT" if index == 2 else metrics.error_code(output)
+    return index, output
+
 def execute_info_command(device_digit):
-    global PIN
     tree.delete(*tree.get_children())
 
-    info_command = [FIDO_COMMAND, "-info", "-device", device_digit]
+    info = scheduler.submit(
+        device_digit, run_info, device_digit,
+        coalesce=("info", device_digit), label="info"
+    )
+    when_done(info, lambda f: show_info(f, device_digit))
+
+    storage = scheduler.submit(
+        device_digit, probe_storage, device_digit,
+        coalesce=("storage", device_digit), label="storage probe"
+    )
+    when_done(storage, lambda f: show_storage_probe(f, device_digit))
 
+def show_info(future, device_digit):
+    if selected_digit() != device_digit:
+        return
     try:
-        result = subprocess.run(info_command, capture_output=True, text=True)
-        if result.returncode == 0:
-            for line in result.stdout.splitlines():
-                if ": " in line:
-                    key, value = line.split(": ", 1)
-                    tree.insert("", tk.END, values=(key, value))
-        else:
-            raise subprocess.CalledProcessError(result.returncode, info_command)
+        rows = future.result()
     except Exception as e:
-        messagebox.showerror("Error", f"Command execution failed: {e}\nOutput: {result.stderr}")
-
-    storage_command = f"{FIDO_COMMAND} -storage -device {device_digit}"
+        messagebox.showerror("Error", str(e))
+        return
+    for key, value in rows:
+        tree.insert("", tk.END, values=(key, value))
 
+def show_storage_probe(future, device_digit):
     try:
-        child = pexpect.spawn(storage_command, encoding="utf-8", timeout=10)
-        index = child.expect([r"Enter PIN for", pexpect.EOF, pexpect.TIMEOUT])
-        output = child.before
+        index, output = future.result()
+    except Exception as e:
+        messagebox.showerror("Error", f"Command execution failed: {e}")
+        return
 
-        if index == 0:
-            pin_button.config(text="Change PIN", state=tk.ACTIVE, command=change_pin)
+    if index == 0:
+        pin_button.config(text="Change PIN", state=tk.ACTIVE, command=change_pin)
+        # a PIN is set: ask for it now and read the credentials meanwhile
+        if selected_digit() == device_digit and session is not None and session.pin is None:
+            get_pin()
 
-        if index == 1:
-            messagebox.showwarning(
-                "Warning",
-                "No PIN is set for this key. You must set a PIN before managing passkeys."
-            )
+    if index == 1:
+        messagebox.showwarning(
+            "Warning",
+            "No PIN is set for this key. You must set a PIN before managing passkeys."
+        )
+        pin_button.config(text="Set PIN", state=tk.ACTIVE, command=set_pin)
+
+    if index == 2:
+        if "FIDO_ERR_PIN_REQUIRED" in output:
             pin_button.config(text="Set PIN", state=tk.ACTIVE, command=set_pin)
 
-        if index == 2:
-            if "FIDO_ERR_PIN_REQUIRED" in output:
-                pin_button.config(text="Set PIN", state=tk.ACTIVE, command=set_pin)
+        if "FIDO_ERR_PIN_INVALID" in output:
+            messagebox.showerror("Error", "Invalid PIN provided")
 
-            if "FIDO_ERR_PIN_INVALID" in output:
-                messagebox.showerror("Error", "Invalid PIN provided")
+        if "FIDO_ERR_PIN_AUTH_BLOCKED" in output:
+            messagebox.showerror("Error", "Wrong PIN provided too many times. Reinsert the key")
 
-            if "FIDO_ERR_PIN_AUTH_BLOCKED" in output:
-                messagebox.showerror("Error", "Wrong PIN provided too many times. Reinsert the key")
+        if "FIDO_ERR_INVALID_CBOR" in output:
+            messagebox.showerror(
+                "Error",
+                "This is an older key (probably FIDO2.0). No passkey management is possible with this key. Only basic information will be shown.",
+            )
 
-            if "FIDO_ERR_INVALID_CBOR" in output:
-                messagebox.showerror(
-                    "Error",
-                    "This is an older key (probably FIDO2.0). No passkey management is possible with this key. Only basic information will be shown.",
-                )
+        messagebox.showerror("Unexpected Device Output", output)
 
-            messagebox.showerror("Unexpected Device Output", output)
-            return False
+def selected_device():
+    index = device_combobox.current()
+    return devices[index] if 0 <= index < len(devices) else None
 
-    except Exception as e:
-        messagebox.showerror("Error", f"Command execution failed: {e}\nOutput: {result.stderr}")
+def selected_digit():
+    device = selected_device()
+    return str(device.index) if device else None
+
+def device_busy(device_digit):
+    if scheduler.busy(device_digit):
+        messagebox.showinfo(
+            "Device busy",
+            "Another operation is still running on this key. Please wait for it to finish."
+        )
+        return True
+    return False
+
+def open_session(device_digit):
+    """Return the session of device_digit, closing the previous device's."""
+    global session
+    if session is not None and session.device == device_digit and not session.closed:
+        return session
+    close_session()
+    session = Session(scheduler, device_digit)
+    return session
+
+def close_session():
+    global session
+    if session is not None:
+        session.close()
+        session = None
 
 def on_device_selected(event):
-    selected_device = device_var.get()
-    match = re.search(r"\[(\d+)\]", selected_device)
+    device_digit = selected_digit()
 
-    if match:
-        device_digit = match.group(1)
+    if device_digit:
+        open_session(device_digit)
         execute_info_command(device_digit)
         passkeys_button.config(state=tk.NORMAL)
     else:
         messagebox.showinfo("Device Selected", "No digit found in the selected device")
 
-def get_pin():
-    global PIN
-    PIN = simpledialog.askstring("PIN Code", "Enter your PIN code:", show="*")
-    return PIN
+def get_pin(start_prefetch=True):
+    """Ask for the PIN of the selected device once per session, and start
+    reading its credentials in the background."""
+    s = session
+    if s is None:
+        return None
+    if s.pin is None:
+        s.pin = simpledialog.askstring("PIN Code", "Enter your PIN code:", show="*")
+        if s.pin is not None and start_prefetch:
+            prefetch(s)
+    return s.pin
+
+def prefetch(s):
+    if s.closed:
+        return
+    storage = s.fetch("storage", read_storage)
+    when_done(storage, lambda f: show_storage(f, s))
+    s.fetch("passkeys", list_passkeys)
+
+def read_storage(s):
+    result = run_fido("storage", ["-storage", "-pin", s.pin, "-device", s.device])
+    if result.returncode != 0:
+        pin_rejected(s, result.stdout + result.stderr)
+        raise RuntimeError(f"Command execution failed\nOutput: {result.stderr}")
+    return [(key, value) for key, value in parse.key_values(result.stdout) if key.endswith("rk(s)")]
+
+def show_storage(future, s):
+    if s is not session or future.cancelled() or future.exception() is not None:
+        return
+    for key, value in future.result():
+        tree.insert("", tk.END, values=(key, value))
+
+def pin_rejected(s, output):
+    """Forget a PIN the key refused, so the next click asks again."""
+    if "FIDO_ERR_PIN_INVALID" in output or "FIDO_ERR_PIN_AUTH_BLOCKED" in output:
+        s.pin = None
+        s.forget("storage", "passkeys")
 
 def on_passkeys_button_click():
-    global PIN
-    selected_device = device_var.get()
-    match = re.search(r"\[(\d+)\]", selected_device)
-    if not match:
+    device_digit = selected_digit()
+    if not device_digit:
         messagebox.showinfo("Device Selected", "No digit found in the selected device")
         return
 
-    device_digit = match.group(1)
-
-    if PIN is None:
+    s = open_session(device_digit)
+    if s.pin is None:
         get_pin()
-        if PIN is None:
+        if s.pin is None:
             return
 
-    command = [
-        FIDO_COMMAND,
-        "-residentKeys",
-        "-pin",
-        PIN,
-        "-device",
-        device_digit,
-    ]
-    try:
-        result = subprocess.run(command, capture_output=True, text=True)
-        if result.returncode == 0:
-            domains = []
-            for line in result.stdout.splitlines():
-                match = re.search(r"= (.+)$", line)
-                if match:
-                    domains.append(match.group(1))
-
-            cumulated_output = []
-            for domain in domains:
-                domain_command = [
-                    FIDO_COMMAND,
-                    "-residentKeys",
-                    "-domain",
-                    domain,
-                    "-pin",
-                    PIN,
-                    "-device",
-                    device_digit,
-                ]
-                domain_result = subprocess.run(
-                    domain_command, capture_output=True, text=True
-                )
-
-                if domain_result.returncode == 0:
-                    cumulated_output.append(
-                        f"Domain: {domain}\n{domain_result.stdout}"
-                    )
-                else:
-                    raise subprocess.CalledProcessError(
-                        domain_result.returncode, domain_command
-                    )
-
-            cumulated_output_str = "\n\n".join(cumulated_output)
-            show_output_in_new_window(cumulated_output_str, device_digit)
+    listing = s.fetch("passkeys", list_passkeys)
+    when_done(listing, lambda f: show_passkeys(f, s))
+
+def list_passkeys(s):
+    result = run_fido("list relying parties", ["-residentKeys", "-pin", s.pin, "-device", s.device])
+    if result.returncode != 0:
+        pin_rejected(s, result.stdout + result.stderr)
+        raise RuntimeError(f"Command execution failed\nOutput: {result.stderr}")
+
+    domains = [rp.rp_id for rp in parse.relying_parties(result.stdout)]
+
+    keys = []
+    for domain in domains:
+        s.check()
+        domain_result = run_fido(
+            "list passkeys",
+            ["-residentKeys", "-domain", domain, "-pin", s.pin, "-device", s.device],
+        )
+
+        if domain_result.returncode == 0:
+            keys.extend(parse.passkeys(domain_result.stdout, domain))
         else:
-            raise subprocess.CalledProcessError(result.returncode, command)
+            raise RuntimeError(
+                f"Command execution failed\nOutput: {domain_result.stderr}"
+            )
+
+    return keys
+
+def show_passkeys(future, s):
+    if s is not session or future.cancelled():
+        return
+    try:
+        keys = future.result()
+    except Cancelled:
+        return
     except Exception as e:
-        messagebox.showerror(
-            "Error", f"Command execution failed: {e}\nOutput: {result.stderr}"
-        )
+        messagebox.showerror("Error", str(e))
+        return
+    show_output_in_new_window(keys, s)
 
 def set_pin():
-    global PIN
-    selected_device = device_var.get()
-    match = re.search(r"\[(\d+)\]", selected_device)
-    if not match:
+    import pexpect
+
+    device_digit = selected_digit()
+    if not device_digit:
         return
 
-    device_digit = match.group(1)
+    if device_busy(device_digit):
+        return
+    s = open_session(device_digit)
 
     while True:
         new_pin = simpledialog.askstring(
             "New PIN", "Enter your new PIN code:", show="*"
         )
         if new_pin is None:
-            PIN = None
+            s.pin = None
             return
 
         new_pin_confirmed = simpledialog.askstring(
             "Confirm new PIN", "Enter your new PIN code:", show="*"
         )
         if new_pin_confirmed is None:
-            PIN = None
+            s.pin = None
             return
 
         if new_pin == new_pin_confirmed:
@@ -250,52 +351,54 @@ def set_pin():
     command = f"{FIDO_COMMAND} -setPIN -device {device_digit}"
 
     try:
-        child = pexpect.spawn(command, encoding="utf-8", timeout=20)
-        child.expect("Enter new PIN")
-        child.sendline(new_pin)
-        child.expect("Enter the same PIN again")
-        child.sendline(new_pin_confirmed)
+        with metrics.REGISTRY.operation("set PIN") as op:
+            child = pexpect.spawn(command, encoding="utf-8", timeout=20)
+            child.expect("Enter new PIN")
+            child.sendline(new_pin)
+            child.expect("Enter the same PIN again")
+            child.sendline(new_pin_confirmed)
 
-        PIN = new_pin
+            s.pin = new_pin
 
-        child.expect(pexpect.EOF)
-        output = child.before.strip()
+            child.expect(pexpect.EOF)
+            output = child.before.strip()
+            op.result = metrics.error_code(output)
 
         if "FIDO_ERR_PIN_POLICY_VIOLATION" in output:
-            match = re.search(r"minpinlen:\s*(\d+)", output)
-            if match:
-                min_pin_len = match.group(1)
+            min_pin_len = parse.min_pin_length(output) or "?"
             messagebox.showerror(
                 "PIN not accepted.",
                 f"The provided PIN does not fulfill the requirements of your device.\n"
                 f"The PIN has to be at least {min_pin_len} long and must not be an easily guessable sequence, like e.g. 123456"
             )
-            PIN = None
+            s.pin = None
         elif "error" in output.lower() or "FIDO_ERR" in output:
             messagebox.showerror("PIN Change Failed", output)
-            PIN = None
+            s.pin = None
         else:
             messagebox.showinfo("Success", "PIN successfully set!")
+            prefetch(s)
     except pexpect.exceptions.TIMEOUT:
         messagebox.showerror("Timeout", "The device did not respond in time.")
-        PIN = None
+        s.pin = None
     except Exception as e:
         messagebox.showerror("Error", str(e))
-        PIN = None
+        s.pin = None
 
 def change_pin():
-    global PIN
-    if PIN is None:
-        get_pin()
+    import pexpect
 
-    selected_device = device_var.get()
-    match = re.search(r"\[(\d+)\]", selected_device)
-    if not match:
+    device_digit = selected_digit()
+    if not device_digit:
         return
 
-    device_digit = match.group(1)
+    if device_busy(device_digit):
+        return
+    s = open_session(device_digit)
+    if s.pin is None:
+        get_pin(start_prefetch=False)
     while True:
-        old_pin = PIN
+        old_pin = s.pin
 
         new_pin = simpledialog.askstring(
             "New PIN", "Enter your new PIN code:", show="*"
@@ -311,6 +414,7 @@ def change_pin():
     command = f"{FIDO_COMMAND} -changePIN -device {device_digit}"
 
     try:
+        started = time.monotonic()
         child = pexpect.spawn(command, encoding="utf-8", timeout=20)
 
         i = child.expect([
@@ -336,22 +440,19 @@ def change_pin():
         child.expect("Enter the same PIN again")
         child.sendline(new_pin_confirmed)
 
-        PIN = new_pin
+        s.pin = new_pin
 
         output = child.before.strip()
 
         idx = child.expect(["FIDO_ERR_PIN_POLICY_VIOLATION", pexpect.EOF], timeout=1)
         if idx == 0:
+            metrics.REGISTRY.record("change PIN", "FIDO_ERR_PIN_POLICY_VIOLATION", time.monotonic() - started)
             command = f"{FIDO_COMMAND} -info -device {device_digit}"
             info = pexpect.spawn(command, encoding="utf-8")
             info.expect(pexpect.EOF)
             info_text = info.before
 
-            match = re.search(r"minpinlen:\s*(\d+)", info_text)
-            if match:
-                min_pin_len = match.group(1)
-            else:
-                min_pin_len = "?"
+            min_pin_len = parse.min_pin_length(info_text) or "?"
 
             messagebox.showerror(
                 "PIN not accepted",
@@ -363,6 +464,7 @@ def change_pin():
 
         child.expect(pexpect.EOF)
         output = child.before.strip()
+        metrics.REGISTRY.record("change PIN", metrics.error_code(output), time.monotonic() - started)
 
         if "error" in output.lower() or "FIDO_ERR" in output:
             messagebox.showerror("PIN Change Failed", output)
@@ -375,16 +477,121 @@ def change_pin():
         messagebox.showerror("Error", str(e))
 
 def refresh_combobox():
-    device_combobox.set("")
+    close_session()
+    device_combobox.set("Scanning for devices…")
+    device_combobox.config(state=tk.DISABLED)
     tree.delete(*tree.get_children())
     passkeys_button.config(state=tk.DISABLED)
     pin_button.config(state=tk.DISABLED)
-    device_list = get_device_list()
-    if not device_list:
+    listing = scheduler.submit("list", list_devices, coalesce="list", label="device list")
+    when_done(listing, show_device_list)
+
+def show_device_list(future, keep=None):
+    """Fill the combobox; keep is the digit to leave selected, if any."""
+    global listed_paths
+    device_list, listed_paths = future.result()
+    devices[:] = device_list
+    labels = [d.label for d in devices]
+    if not labels:
         print("No devices found.")
-    device_combobox["values"] = device_list
+        labels = ["No devices found."]
+    device_combobox.config(state=tk.NORMAL)
+    device_combobox["values"] = labels
+    index = next((i for i, d in enumerate(devices) if str(d.index) == keep), None)
+    if index is None:
+        device_combobox.set("")
+    else:
+        device_combobox.current(index)
+    if args.startup_benchmark:
+        report_startup("device list")
+        root.destroy()
+
+def device_paths(device_list=None):
+    """libfido2 paths of the listed keys, keyed by digit as the scheduler is"""
+    resolver = Resolver()
+    return {str(d.index): resolver.resolve(str(d.index)) for d in (devices if device_list is None else device_list)}
 
-def show_output_in_new_window(output, device_digit):
+def identify_device():
+    """Blink every key at once and select the one the user touches."""
+    if not devices:
+        messagebox.showinfo("Identify", "No devices found.")
+        return
+    dialog = tk.Toplevel(root)
+    dialog.title("Identify")
+    tk.Label(
+        dialog, text=f"Touch the key to select ({len(devices)} blinking).", width=45
+    ).pack(padx=10, pady=10)
+    cancel_button = ttk.Button(dialog, text="Cancel", command=dialog.destroy)
+    cancel_button.pack(pady=10)
+    paths = scheduler.submit("list", device_paths, label="device paths")
+    when_done(paths, lambda f: start_identify(f, dialog, cancel_button))
+
+def start_identify(future, dialog, cancel_button):
+    if not dialog.winfo_exists():
+        return
+    try:
+        paths = future.result()
+    except Exception as e:
+        dialog.destroy()
+        messagebox.showerror("Error", str(e))
+        return
+    identify = Identify(scheduler, paths)
+    cancel_button.config(command=identify.cancel)
+    dialog.protocol("WM_DELETE_WINDOW", identify.cancel)
+    when_done(identify.start(), lambda f: identify_done(f, dialog))
+
+def identify_done(future, dialog):
+    dialog.destroy()
+    try:
+        device_digit = future.result()
+    except Exception as e:
+        messagebox.showerror("Error", str(e))
+        return
+    index = next((i for i, d in enumerate(devices) if str(d.index) == device_digit), None)
+    if index is not None:
+        device_combobox.current(index)
+        on_device_selected(None)
+
+def update_status():
+    device_digit = selected_digit()
+    stats = scheduler.stats().get(device_digit) if device_digit else None
+    if stats is None:
+        status_var.set("")
+    else:
+        running = f"running {stats.running}, " if stats.running else ""
+        status_var.set(
+            f"Device [{device_digit}]: {running}{stats.queued} queued, "
+            f"last wait {stats.last_wait:.1f}s, max wait {stats.max_wait:.1f}s"
+        )
+    root.after(500, update_status)
+
+def watch_devices(nodes):
+    """Re-list devices when a FIDO key is plugged or unplugged; other HID
+    devices coming and going are not looked at."""
+    current = fido_hidraw_nodes()
+    if current != nodes and nodes is not None:
+        listing = scheduler.submit("list", list_devices, coalesce="list", label="device list")
+        when_done(listing, show_changed_devices)
+    root.after(1000, watch_devices, current)
+
+def show_changed_devices(future):
+    """Keep the session, with its PIN and prefetch, while its key is still
+    listed under the same digit; a key's position can shift either way."""
+    s = session
+    keep = None
+    if s is not None and not s.closed:
+        path = listed_paths.get(s.device)
+        if path is not None and future.result()[1].get(s.device) == path:
+            keep = s.device
+    if keep is None:
+        close_session()
+        tree.delete(*tree.get_children())
+        passkeys_button.config(state=tk.DISABLED)
+        pin_button.config(state=tk.DISABLED)
+    show_device_list(future, keep)
+
+def show_output_in_new_window(keys, s):
+    device_digit = s.device
     new_window = tk.Toplevel(root)
     new_window.geometry("800x650")
     new_window.title("Resident Keys / Passkeys")
@@ -408,41 +615,62 @@ def show_output_in_new_window(output, device_digit):
     tree_scrollbar_x.pack(side="bottom", fill="x")
     tree_new_window.configure(xscrollcommand=tree_scrollbar_x.set)
 
-    current_domain = ""
-    for line in output.splitlines():
-        if line.startswith("Domain: "):
-            current_domain = line.split("Domain: ")[1].strip()
-        elif "Credential ID: " in line and "User: " in line:
-            credential_id = line.split("Credential ID: ")[1].split(",")[0].strip()
-            user = line.split("User: ")[1].strip()
-            user = re.sub(re.escape(credential_id), "", user).strip()
-            tree_new_window.insert(
-                "", tk.END, values=(current_domain, credential_id, user)
-            )
+    # the row id is the position in keys, so a selection maps straight back
+    # to its record
+    for i, key in enumerate(keys):
+        tree_new_window.insert(
+            "", tk.END, iid=str(i), values=(key.rp_id or "", b64(key.credential_id), key.user)
+        )
 
     def show_selected_value():
         selected_item = tree_new_window.selection()
         if selected_item:
-            value = tree_new_window.item(selected_item, "values")[1]
+            key = keys[int(selected_item[0])]
+            if not messagebox.askyesno(
+                "Delete Passkey",
+                f"Deleting the passkey of {key.user} on {key.rp_id} is irreversible. "
+                "Are you sure you want to proceed?",
+                parent=new_window,
+            ):
+                return
             new_window.destroy()
-            command = [
-                FIDO_COMMAND,
-                "-delete",
-                "-device",
-                device_digit,
-                "-credential",
-                value,
-            ]
-            if sys.platform.startswith("win"):
-                subprocess.Popen(["start", "cmd", "/c"] + command, shell=True)
-            elif sys.platform.startswith("linux"):
-                subprocess.Popen([TERM] + TERM_FLAG + command)
+            deleting = scheduler.submit(
+                device_digit, delete_passkey, s, key.credential_id, lane=TOUCH, label="delete passkey"
+            )
+            when_done(deleting, lambda f: passkey_deleted(f, s))
 
     show_value_button = tk.Button(
         new_window, text="Delete Passkey", command=show_selected_value
     )
     show_value_button.pack(pady=10)
 
+def delete_passkey(s, credential_id):
+    """Delete the credential in process, on the device's worker, so nothing
+    else reaches the key until the delete is done."""
+    from fido2manage import libfido2
+
+    s.check()
+    with libfido2.Device(Resolver().resolve(s.device)) as dev:
+        try:
+            dev.credman_delete(credential_id, s.pin)
+        except libfido2.FidoError as e:
+            pin_rejected(s, e.name)
+            raise
+    # the prefetched listing and counts are stale now
+    s.forget("storage", "passkeys")
+
+def passkey_deleted(future, s):
+    if future.cancelled():
+        return
+    try:
+        future.result()
+    except Cancelled:
+        return
+    except Exception as e:
+        messagebox.showerror("Error", str(e))
+        return
+    messagebox.showinfo("Delete Passkey", "Passkey deleted.")
+
 def show_about_message():
     messagebox.showinfo(
         "About",
@@ -452,13 +680,30 @@ def show_about_message():
 # parse command-line arguments
 parser = argparse.ArgumentParser(description="FIDO2.1 Manager GUI")
 parser.add_argument("-dpi", action="store_true", help="Set DPI awareness for high-DPI displays")
+parser.add_argument("-metrics-textfile", help="Write Prometheus metrics to this node_exporter textfile")
+parser.add_argument("-metrics-port", type=int, help="Serve Prometheus metrics on this localhost port")
+parser.add_argument("-startup-benchmark", action="store_true", help="Print time to first paint and to device list, then exit")
 args = parser.parse_args()
 
+metrics.start(textfile=args.metrics_textfile, port=args.metrics_port)
+
+def report_startup(milestone):
+    print(f"{milestone}: {(time.perf_counter() - STARTED) * 1000:.0f} ms", file=sys.stderr)
+
+def on_first_paint(event):
+    # bound on the toplevel, so its children's <Map> events arrive here too
+    if event.widget is not root:
+        return
+    root.unbind("<Map>")
+    if args.startup_benchmark:
+        report_startup("first paint")
+    refresh_combobox()
+
 root = tk.Tk()
 
 # Set DPI awareness if requested
 if args.dpi:
-    set_dpi_awareness()
+    set_dpi_awareness(root)
 
 root.geometry("700x600")
 root.title("FIDO2.1 Manager - Python version 0.1 - (c) Token2")
@@ -469,12 +714,9 @@ top_frame.pack(side=tk.TOP, fill=tk.X)
 label = tk.Label(top_frame, text="Select Device:")
 label.pack(side=tk.LEFT, padx=10, pady=10)
 
-device_list = get_device_list()
-if not device_list:
-    device_list = ["No devices found."]
 device_var = tk.StringVar()
 device_combobox = ttk.Combobox(
-    top_frame, textvariable=device_var, values=device_list, width=60
+    top_frame, textvariable=device_var, width=60
 )
 device_combobox.pack(side=tk.LEFT, padx=10, pady=10)
 device_combobox.bind("<<ComboboxSelected>>", on_device_selected)
@@ -482,6 +724,9 @@ device_combobox.bind("<<ComboboxSelected>>", on_device_selected)
 refresh_button = tk.Button(top_frame, text="Refresh", command=refresh_combobox)
 refresh_button.pack(side=tk.LEFT, padx=10, pady=10)
 
+identify_button = tk.Button(top_frame, text="Identify", command=identify_device)
+identify_button.pack(side=tk.LEFT, padx=10, pady=10)
+
 tree_frame = ttk.Frame(root)
 tree_frame.pack(expand=True, fill=tk.BOTH, padx=10, pady=10)
 tree_scrollbar_y = ttk.Scrollbar(tree_frame, orient="vertical")
@@ -514,4 +759,13 @@ pin_button.pack(side=tk.LEFT, padx=5, pady=10)
 about_button = ttk.Button(root, text="About", command=show_about_message)
 about_button.pack(side=tk.RIGHT, padx=5, pady=10)
 
+status_var = tk.StringVar()
+status_label = tk.Label(root, textvariable=status_var, anchor="w")
+status_label.pack(side=tk.LEFT, padx=5, pady=10)
+update_status()
+watch_devices(fido_hidraw_nodes())
+
+# discover devices once the window is on screen
+root.bind("<Map>", on_first_paint)
+
 root.mainloop()
@@ -1,11 +1,12 @@
 import os
-import re
 import subprocess
 import sys
 import tkinter as tk
 import shutil
 from tkinter import messagebox, simpledialog, ttk
 import pexpect
+from fido2manage import parse
+from fido2manage.records import b64
 
 def detect_terminal():
     candidates = [
@@ -30,12 +31,12 @@ if TERM is None:
     sys.exit(1)
 
 PIN = None
+devices = []  # DeviceInfo records, in combobox order
 
 def get_device_list():
     try:
         result = subprocess.run([FIDO_COMMAND, "-list"], capture_output=True, text=True)
-        device_list = result.stdout.strip().split("\n")
-        return device_list
+        return list(parse.device_labels(result.stdout))
     except Exception as e:
         print(f"Error executing device list command: {e}")
         return []
@@ -49,10 +50,8 @@ def execute_info_command(device_digit):
     try:
         result = subprocess.run(info_command, capture_output=True, text=True)
         if result.returncode == 0:
-            for line in result.stdout.splitlines():
-                if ": " in line:
-                    key, value = line.split(": ", 1)
-                    tree.insert("", tk.END, values=(key, value))
+            for key, value in parse.key_values(result.stdout):
+                tree.insert("", tk.END, values=(key, value))
         else:
             raise subprocess.CalledProcessError(result.returncode, info_command)
     except Exception as e:
@@ -97,12 +96,14 @@ def execute_info_command(device_digit):
     except Exception as e:
         messagebox.showerror("Error", f"Command execution failed: {e}\nOutput: {result.stderr}")
 
+def selected_digit():
+    index = device_combobox.current()
+    return str(devices[index].index) if 0 <= index < len(devices) else None
+
 def on_device_selected(event):
-    selected_device = device_var.get()
-    match = re.search(r"\[(\d+)\]", selected_device)
+    device_digit = selected_digit()
 
-    if match:
-        device_digit = match.group(1)
+    if device_digit:
         execute_info_command(device_digit)
         passkeys_button.config(state=tk.NORMAL)
     else:
@@ -115,14 +116,11 @@ def get_pin():
 
 def on_passkeys_button_click():
     global PIN
-    selected_device = device_var.get()
-    match = re.search(r"\[(\d+)\]", selected_device)
-    if not match:
+    device_digit = selected_digit()
+    if not device_digit:
         messagebox.showinfo("Device Selected", "No digit found in the selected device")
         return
 
-    device_digit = match.group(1)
-
     if PIN is None:
         get_pin()
         if PIN is None:
@@ -139,13 +137,9 @@ def on_passkeys_button_click():
     try:
         result = subprocess.run(command, capture_output=True, text=True)
         if result.returncode == 0:
-            domains = []
-            for line in result.stdout.splitlines():
-                match = re.search(r"= (.+)$", line)
-                if match:
-                    domains.append(match.group(1))
+            domains = [rp.rp_id for rp in parse.relying_parties(result.stdout)]
 
-            cumulated_output = []
+            keys = []
             for domain in domains:
                 domain_command = [
                     FIDO_COMMAND,
@@ -162,16 +156,13 @@ def on_passkeys_button_click():
                 )
 
                 if domain_result.returncode == 0:
-                    cumulated_output.append(
-                        f"Domain: {domain}\n{domain_result.stdout}"
-                    )
+                    keys.extend(parse.passkeys(domain_result.stdout, domain))
                 else:
                     raise subprocess.CalledProcessError(
                         domain_result.returncode, domain_command
                     )
 
-            cumulated_output_str = "\n\n".join(cumulated_output)
-            show_output_in_new_window(cumulated_output_str, device_digit)
+            show_output_in_new_window(keys, device_digit)
         else:
             raise subprocess.CalledProcessError(result.returncode, command)
     except Exception as e:
@@ -181,13 +172,10 @@ def on_passkeys_button_click():
 
 def set_pin():
     global PIN
-    selected_device = device_var.get()
-    match = re.search(r"\[(\d+)\]", selected_device)
-    if not match:
+    device_digit = selected_digit()
+    if not device_digit:
         return
 
-    device_digit = match.group(1)
-
     while True:
         new_pin = simpledialog.askstring(
             "New PIN", "Enter your new PIN code:", show="*"
@@ -223,9 +211,7 @@ def set_pin():
         output = child.before.strip()
 
         if "FIDO_ERR_PIN_POLICY_VIOLATION" in output:
-            match = re.search(r"minpinlen:\s*(\d+)", output)
-            if match:
-                min_pin_len = match.group(1)
+            min_pin_len = parse.min_pin_length(output) or "?"
             messagebox.showerror(
                 "PIN not accepted.",
                 f"The provided PIN does not fulfill the requirements of your device.\n"
@@ -249,12 +235,9 @@ def change_pin():
     if PIN is None:
         get_pin()
 
-    selected_device = device_var.get()
-    match = re.search(r"\[(\d+)\]", selected_device)
-    if not match:
+    device_digit = selected_digit()
+    if not device_digit:
         return
-
-    device_digit = match.group(1)
     while True:
         old_pin = PIN
 
@@ -308,11 +291,7 @@ def change_pin():
             info.expect(pexpect.EOF)
             info_text = info.before
 
-            match = re.search(r"minpinlen:\s*(\d+)", info_text)
-            if match:
-                min_pin_len = match.group(1)
-            else:
-                min_pin_len = "?"
+            min_pin_len = parse.min_pin_length(info_text) or "?"
 
             messagebox.showerror(
                 "PIN not accepted",
@@ -340,12 +319,12 @@ def refresh_combobox():
     tree.delete(*tree.get_children())
     passkeys_button.config(state=tk.DISABLED)
     pin_button.config(state=tk.DISABLED)
-    device_list = get_device_list()
-    if not device_list:
+    devices[:] = get_device_list()
+    if not devices:
         print("No devices found.")
-    device_combobox["values"] = device_list
+    device_combobox["values"] = [d.label for d in devices]
 
-def show_output_in_new_window(output, device_digit):
+def show_output_in_new_window(keys, device_digit):
     new_window = tk.Toplevel(root)
     new_window.geometry("800x650")
     new_window.title("Resident Keys / Passkeys")
@@ -369,22 +348,15 @@ def show_output_in_new_window(output, device_digit):
     tree_scrollbar_x.pack(side="bottom", fill="x")
     tree_new_window.configure(xscrollcommand=tree_scrollbar_x.set)
 
-    current_domain = ""
-    for line in output.splitlines():
-        if line.startswith("Domain: "):
-            current_domain = line.split("Domain: ")[1].strip()
-        elif "Credential ID: " in line and "User: " in line:
-            credential_id = line.split("Credential ID: ")[1].split(",")[0].strip()
-            user = line.split("User: ")[1].strip()
-            user = re.sub(re.escape(credential_id), "", user).strip()
-            tree_new_window.insert(
-                "", tk.END, values=(current_domain, credential_id, user)
-            )
+    for i, key in enumerate(keys):
+        tree_new_window.insert(
+            "", tk.END, iid=str(i), values=(key.rp_id or "", b64(key.credential_id), key.user)
+        )
 
     def show_selected_value():
         selected_item = tree_new_window.selection()
         if selected_item:
-            value = tree_new_window.item(selected_item, "values")[1]
+            value = b64(keys[int(selected_item[0])].credential_id)
             new_window.destroy()
             command = [
                 FIDO_COMMAND,
@@ -420,9 +392,8 @@ top_frame.pack(side=tk.TOP, fill=tk.X)
 label = tk.Label(top_frame, text="Select Device:")
 label.pack(side=tk.LEFT, padx=10, pady=10)
 
-device_list = get_device_list()
-if not device_list:
-    device_list = ["No devices found."]
+devices[:] = get_device_list()
+device_list = [d.label for d in devices] or ["No devices found."]
 device_var = tk.StringVar()
 device_combobox = ttk.Combobox(
     top_frame, textvariable=device_var, values=device_list, width=60
@@ -255,6 +255,38 @@ rfc1951_reinflate(void)
 	free(out.ptr);
 }
 
+static void
+rfc1951_levels(void)
+{
+	fido_blob_t in, out, back;
+	size_t stored = 0;
+
+	memset(&in, 0, sizeof(in));
+	in.ptr = random_words;
+	in.len = sizeof(random_words);
+
+	for (int level = 0; level <= 9; level++) {
+		memset(&out, 0, sizeof(out));
+		memset(&back, 0, sizeof(back));
+		assert(fido_compress_level(&out, &in, level) == FIDO_OK);
+		if (level == 0)
+			stored = out.len;
+		else
+			assert(out.len < stored);
+		assert(fido_uncompress(&back, &out,
+		    sizeof(random_words)) == FIDO_OK);
+		assert(back.len == sizeof(random_words));
+		assert(memcmp(back.ptr, random_words, back.len) == 0);
+		free(out.ptr);
+		free(back.ptr);
+	}
+
+	memset(&out, 0, sizeof(out));
+	assert(fido_compress_level(&out, &in, -2) == FIDO_ERR_INVALID_ARGUMENT);
+	assert(fido_compress_level(&out, &in, 10) == FIDO_ERR_INVALID_ARGUMENT);
+	assert(out.ptr == NULL && out.len == 0);
+}
+
 int
 main(void)
 {
@@ -263,6 +295,7 @@ main(void)
 	rfc1950_inflate();
 	rfc1951_inflate();
 	rfc1951_reinflate();
+	rfc1951_levels();
 
 	exit(0);
 }
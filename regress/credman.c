@@ -0,0 +1,365 @@
+/*
+ * Copyright (c) 2026 Token2. All rights reserved.
+ * Use of this source code is governed by a BSD-style
+ * license that can be found in the LICENSE file.
+ * SPDX-License-Identifier: BSD-2-Clause
+ */
+
+#undef NDEBUG
+
+#include <assert.h>
+#include <stdlib.h>
+#include <string.h>
+
+#define _FIDO_INTERNAL
+
+#include <fido.h>
+#include <fido/credman.h>
+
+#include "../fuzz/wiredata_fido2.h"
+
+#define REPORT_LEN	(64 + 1)
+#define CTAP_CLIENT_PIN	0x06
+#define CTAP_CREDMAN	0x41 /* credentialManagement (preview) */
+
+static uint8_t	 ctap_nonce[8];
+static uint8_t	*wiredata_ptr;
+static size_t	 wiredata_len;
+static int	 fake_dev_handle;
+static int	 initialised;
+static int	 n_client_pin;	/* clientPin commands written */
+static int	 n_credman;	/* credentialManagement commands written */
+static int	 n_credman_auth; /* ... of them with a pinUvAuthParam */
+
+static const uint8_t cred_id[] = { 0x01, 0x02, 0x03, 0x04 };
+static const uint8_t user_id[] = { 0x05, 0x06, 0x07, 0x08 };
+
+static void *
+dummy_open(const char *path)
+{
+	(void)path;
+
+	return (&fake_dev_handle);
+}
+
+static void
+dummy_close(void *handle)
+{
+	assert(handle == &fake_dev_handle);
+}
+
+static int
+dummy_read(void *handle, unsigned char *ptr, size_t len, int ms)
+{
+	size_t n;
+
+	(void)ms;
+
+	assert(handle == &fake_dev_handle);
+	assert(ptr != NULL);
+	assert(len == REPORT_LEN - 1);
+
+	if (wiredata_ptr == NULL)
+		return (-1);
+
+	if (!initialised) {
+		assert(wiredata_len >= REPORT_LEN - 1);
+		memcpy(&wiredata_ptr[7], &ctap_nonce, sizeof(ctap_nonce));
+		initialised = 1;
+	}
+
+	if (wiredata_len < len)
+		n = wiredata_len;
+	else
+		n = len;
+
+	memcpy(ptr, wiredata_ptr, n);
+	wiredata_ptr += n;
+	wiredata_len -= n;
+
+	return ((int)n);
+}
+
+static int
+dummy_write(void *handle, const unsigned char *ptr, size_t len)
+{
+	assert(handle == &fake_dev_handle);
+	assert(ptr != NULL);
+	assert(len == REPORT_LEN);
+
+	if (!initialised)
+		memcpy(&ctap_nonce, &ptr[8], sizeof(ctap_nonce));
+
+	/* the first frame of a CTAPHID_CBOR message: report id, cid, cmd */
+	if (ptr[5] == 0x90) {
+		if (ptr[8] == CTAP_CLIENT_PIN)
+			n_client_pin++;
+		if (ptr[8] == CTAP_CREDMAN) {
+			n_credman++;
+			/* subCommand, params, protocol, pinUvAuthParam */
+			if (ptr[9] == 0xa4)
+				n_credman_auth++;
+		}
+	}
+
+	return ((int)len);
+}
+
+static uint8_t *
+wiredata_setup(const uint8_t *data, size_t len)
+{
+	const uint8_t ctap_init_data[] = { WIREDATA_CTAP_INIT };
+
+	assert(wiredata_ptr == NULL);
+	assert(SIZE_MAX - len > sizeof(ctap_init_data));
+	assert((wiredata_ptr = malloc(sizeof(ctap_init_data) + len)) != NULL);
+
+	memcpy(wiredata_ptr, ctap_init_data, sizeof(ctap_init_data));
+
+	if (len)
+		memcpy(wiredata_ptr + sizeof(ctap_init_data), data, len);
+
+	wiredata_len = sizeof(ctap_init_data) + len;
+	n_client_pin = n_credman = n_credman_auth = 0;
+
+	return (wiredata_ptr);
+}
+
+static void
+wiredata_clear(uint8_t **wiredata)
+{
+	free(*wiredata);
+	*wiredata = NULL;
+	wiredata_ptr = NULL;
+	wiredata_len = 0;
+	initialised = 0;
+}
+
+/* a CTAP2 reply carrying only 'status' */
+#define STATUS_REPLY(status)					\
+	0x00, 0x22, 0x00, 0x02, 0x90, 0x00, 0x01, status,	\
+	0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,		\
+	0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,		\
+	0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,		\
+	0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,		\
+	0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,		\
+	0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,		\
+	0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00
+
+static fido_dev_t *
+open_dev(void)
+{
+	fido_dev_t	*dev;
+	fido_dev_io_t	 io;
+
+	memset(&io, 0, sizeof(io));
+
+	io.open = dummy_open;
+	io.close = dummy_close;
+	io.read = dummy_read;
+	io.write = dummy_write;
+
+	assert((dev = fido_dev_new()) != NULL);
+	assert(fido_dev_set_io_functions(dev, &io) == FIDO_OK);
+	assert(fido_dev_open(dev, "dummy") == FIDO_OK);
+
+	return (dev);
+}
+
+static fido_credman_batch_t *
+new_batch(size_t n)
+{
+	fido_credman_batch_t *batch;
+
+	assert((batch = fido_credman_batch_new()) != NULL);
+	for (size_t i = 0; i < n; i++)
+		assert(fido_credman_batch_set_user(batch, cred_id,
+		    sizeof(cred_id), user_id, sizeof(user_id), "user",
+		    "display") == FIDO_OK);
+	assert(fido_credman_batch_count(batch) == n);
+	for (size_t i = 0; i < n; i++)
+		assert(fido_credman_batch_status(batch, i) ==
+		    FIDO_ERR_INTERNAL);
+
+	return (batch);
+}
+
+static void
+batch_args(void)
+{
+	fido_credman_batch_t	*batch;
+	const uint8_t		 cbor_info_data[] = { WIREDATA_CTAP_CBOR_INFO };
+	uint8_t			*wiredata;
+	fido_dev_t		*dev;
+
+	assert((batch = fido_credman_batch_new()) != NULL);
+	assert(fido_credman_batch_count(batch) == 0);
+	assert(fido_credman_batch_status(batch, 0) ==
+	    FIDO_ERR_INVALID_ARGUMENT);
+	assert(fido_credman_batch_set_user(NULL, cred_id, sizeof(cred_id),
+	    user_id, sizeof(user_id), "user", NULL) ==
+	    FIDO_ERR_INVALID_ARGUMENT);
+	assert(fido_credman_batch_set_user(batch, NULL, 0, user_id,
+	    sizeof(user_id), "user", NULL) == FIDO_ERR_INVALID_ARGUMENT);
+	assert(fido_credman_batch_set_user(batch, cred_id, sizeof(cred_id),
+	    NULL, 0, "user", NULL) == FIDO_ERR_INVALID_ARGUMENT);
+	assert(fido_credman_batch_count(batch) == 0);
+
+	/* an empty batch is refused before anything is sent */
+	wiredata = wiredata_setup(cbor_info_data, sizeof(cbor_info_data));
+	dev = open_dev();
+	assert(fido_credman_set_dev_rk_batch(dev, batch, "1234") ==
+	    FIDO_ERR_INVALID_ARGUMENT);
+	assert(fido_credman_set_dev_rk_batch(dev, NULL, "1234") ==
+	    FIDO_ERR_INVALID_ARGUMENT);
+	assert(n_client_pin == 0 && n_credman == 0);
+	assert(fido_dev_close(dev) == FIDO_OK);
+	fido_dev_free(&dev);
+	wiredata_clear(&wiredata);
+
+	fido_credman_batch_free(&batch);
+	assert(batch == NULL);
+	fido_credman_batch_free(&batch);
+	fido_credman_batch_free(NULL);
+}
+
+/* every update goes out under the one token */
+static void
+batch_ok(void)
+{
+	const uint8_t		 data[] = {
+		WIREDATA_CTAP_CBOR_INFO,
+		WIREDATA_CTAP_CBOR_AUTHKEY,
+		WIREDATA_CTAP_CBOR_PINTOKEN,
+		WIREDATA_CTAP_CBOR_STATUS,
+		WIREDATA_CTAP_CBOR_STATUS,
+		WIREDATA_CTAP_CBOR_STATUS,
+	};
+	fido_credman_batch_t	*batch;
+	uint8_t			*wiredata;
+	fido_dev_t		*dev;
+
+	wiredata = wiredata_setup(data, sizeof(data));
+	dev = open_dev();
+	batch = new_batch(3);
+	assert(fido_credman_set_dev_rk_batch(dev, batch, "1234") == FIDO_OK);
+	for (size_t i = 0; i < 3; i++)
+		assert(fido_credman_batch_status(batch, i) == FIDO_OK);
+	/* getKeyAgreement and getPinToken once, for all three */
+	assert(n_client_pin == 2);
+	assert(n_credman == 3 && n_credman_auth == 3);
+	assert(wiredata_len == 0);
+	fido_credman_batch_free(&batch);
+	assert(fido_dev_close(dev) == FIDO_OK);
+	fido_dev_free(&dev);
+	wiredata_clear(&wiredata);
+}
+
+/* a refused update does not stop the others */
+static void
+batch_refused(void)
+{
+	const uint8_t		 data[] = {
+		WIREDATA_CTAP_CBOR_INFO,
+		WIREDATA_CTAP_CBOR_AUTHKEY,
+		WIREDATA_CTAP_CBOR_PINTOKEN,
+		WIREDATA_CTAP_CBOR_STATUS,
+		STATUS_REPLY(FIDO_ERR_NO_CREDENTIALS),
+		WIREDATA_CTAP_CBOR_STATUS,
+	};
+	fido_credman_batch_t	*batch;
+	uint8_t			*wiredata;
+	fido_dev_t		*dev;
+
+	wiredata = wiredata_setup(data, sizeof(data));
+	dev = open_dev();
+	batch = new_batch(3);
+	assert(fido_credman_set_dev_rk_batch(dev, batch, "1234") ==
+	    FIDO_ERR_NO_CREDENTIALS);
+	assert(fido_credman_batch_status(batch, 0) == FIDO_OK);
+	assert(fido_credman_batch_status(batch, 1) == FIDO_ERR_NO_CREDENTIALS);
+	assert(fido_credman_batch_status(batch, 2) == FIDO_OK);
+	assert(n_client_pin == 2 && n_credman == 3);
+	assert(wiredata_len == 0);
+	fido_credman_batch_free(&batch);
+	assert(fido_dev_close(dev) == FIDO_OK);
+	fido_dev_free(&dev);
+	wiredata_clear(&wiredata);
+}
+
+/* a token rejected halfway is renewed, and the update sent again */
+static void
+batch_renew(void)
+{
+	const uint8_t		 data[] = {
+		WIREDATA_CTAP_CBOR_INFO,
+		WIREDATA_CTAP_CBOR_AUTHKEY,
+		WIREDATA_CTAP_CBOR_PINTOKEN,
+		WIREDATA_CTAP_CBOR_STATUS,
+		STATUS_REPLY(FIDO_ERR_PIN_AUTH_INVALID),
+		WIREDATA_CTAP_CBOR_AUTHKEY,
+		WIREDATA_CTAP_CBOR_PINTOKEN,
+		WIREDATA_CTAP_CBOR_STATUS,
+		WIREDATA_CTAP_CBOR_STATUS,
+	};
+	fido_credman_batch_t	*batch;
+	uint8_t			*wiredata;
+	fido_dev_t		*dev;
+
+	wiredata = wiredata_setup(data, sizeof(data));
+	dev = open_dev();
+	batch = new_batch(3);
+	assert(fido_credman_set_dev_rk_batch(dev, batch, "1234") == FIDO_OK);
+	for (size_t i = 0; i < 3; i++)
+		assert(fido_credman_batch_status(batch, i) == FIDO_OK);
+	assert(n_client_pin == 4);
+	assert(n_credman == 4 && n_credman_auth == 4);
+	assert(wiredata_len == 0);
+	fido_credman_batch_free(&batch);
+	assert(fido_dev_close(dev) == FIDO_OK);
+	fido_dev_free(&dev);
+	wiredata_clear(&wiredata);
+}
+
+/* a transport error ends the batch; the updates not sent carry it */
+static void
+batch_rx(void)
+{
+	const uint8_t		 data[] = {
+		WIREDATA_CTAP_CBOR_INFO,
+		WIREDATA_CTAP_CBOR_AUTHKEY,
+		WIREDATA_CTAP_CBOR_PINTOKEN,
+		WIREDATA_CTAP_CBOR_STATUS,
+	};
+	fido_credman_batch_t	*batch;
+	uint8_t			*wiredata;
+	fido_dev_t		*dev;
+
+	wiredata = wiredata_setup(data, sizeof(data));
+	dev = open_dev();
+	batch = new_batch(3);
+	assert(fido_credman_set_dev_rk_batch(dev, batch, "1234") ==
+	    FIDO_ERR_RX);
+	assert(fido_credman_batch_status(batch, 0) == FIDO_OK);
+	assert(fido_credman_batch_status(batch, 1) == FIDO_ERR_RX);
+	assert(fido_credman_batch_status(batch, 2) == FIDO_ERR_RX);
+	assert(n_credman == 2);
+	fido_credman_batch_free(&batch);
+	assert(fido_dev_close(dev) == FIDO_OK);
+	fido_dev_free(&dev);
+	wiredata_clear(&wiredata);
+}
+
+int
+main(void)
+{
+	fido_init(0);
+
+	batch_args();
+	batch_ok();
+	batch_refused();
+	batch_renew();
+	batch_rx();
+
+	exit(0);
+}
@@ -14,6 +14,7 @@
 #define _FIDO_INTERNAL
 
 #include <fido.h>
+#include <fido/credman.h>
 
 #include "../fuzz/wiredata_fido2.h"
 
@@ -420,6 +421,241 @@ timeout_misc(void)
 	fido_dev_free(&dev);
 }
 
+/* CTAPHID_ERROR carrying ERR_CHANNEL_BUSY */
+#define WIREDATA_CTAP_BUSY					\
+	0x00, 0x22, 0x00, 0x02, 0xbf, 0x00, 0x01, 0x06,		\
+	0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,		\
+	0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,		\
+	0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,		\
+	0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,		\
+	0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,		\
+	0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,		\
+	0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00
+
+/* a CTAP2 reply carrying only 'status' */
+#define WIREDATA_CTAP_CBOR_STATUS_(status)			\
+	0x00, 0x22, 0x00, 0x02, 0x90, 0x00, 0x01, status,	\
+	0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,		\
+	0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,		\
+	0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,		\
+	0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,		\
+	0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,		\
+	0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,		\
+	0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00
+
+/* a response lost in transit: what arrives is a reply to CTAPHID_MSG */
+#define WIREDATA_CTAP_LOST					\
+	0x00, 0x22, 0x00, 0x02, 0x83, 0x00, 0x02, 0x90,		\
+	0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,		\
+	0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,		\
+	0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,		\
+	0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,		\
+	0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,		\
+	0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,		\
+	0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00
+
+static fido_dev_t *
+retry_open(const uint8_t *data, size_t len, uint8_t **wiredata)
+{
+	fido_dev_t	*dev = NULL;
+	fido_dev_io_t	 io;
+
+	memset(&io, 0, sizeof(io));
+
+	io.open = dummy_open;
+	io.close = dummy_close;
+	io.read = dummy_read;
+	io.write = dummy_write;
+
+	*wiredata = wiredata_setup(data, len);
+	assert((dev = fido_dev_new()) != NULL);
+	assert(fido_dev_set_io_functions(dev, &io) == FIDO_OK);
+	assert(fido_dev_open(dev, "dummy") == FIDO_OK);
+	assert(fido_dev_io_retries(dev) == 0);
+
+	return (dev);
+}
+
+static void
+retry_close(fido_dev_t **dev, uint8_t **wiredata)
+{
+	assert(fido_dev_close(*dev) == FIDO_OK);
+	fido_dev_free(dev);
+	wiredata_clear(wiredata);
+}
+
+static void
+retry_policy(void)
+{
+	fido_dev_t *dev;
+
+	assert((dev = fido_dev_new()) != NULL);
+	assert(fido_dev_set_retry_policy(dev, -1, 10) ==
+	    FIDO_ERR_INVALID_ARGUMENT);
+	assert(fido_dev_set_retry_policy(dev, 17, 10) ==
+	    FIDO_ERR_INVALID_ARGUMENT);
+	assert(fido_dev_set_retry_policy(dev, 3, 0) ==
+	    FIDO_ERR_INVALID_ARGUMENT);
+	assert(fido_dev_set_retry_policy(dev, 3, 10001) ==
+	    FIDO_ERR_INVALID_ARGUMENT);
+	assert(fido_dev_set_retry_policy(dev, 0, 1) == FIDO_OK);
+	assert(fido_dev_set_retry_policy(dev, 16, 10000) == FIDO_OK);
+	assert(fido_dev_io_retries(dev) == 0);
+	fido_dev_free(&dev);
+}
+
+/* ERR_CHANNEL_BUSY, as a CTAPHID error or a CTAP2 status, is retried */
+static void
+retry_busy(void)
+{
+	const uint8_t	 busy_data[] = {
+			    WIREDATA_CTAP_CBOR_INFO,
+			    WIREDATA_CTAP_BUSY,
+			    WIREDATA_CTAP_CBOR_STATUS_(FIDO_ERR_CHANNEL_BUSY),
+			    WIREDATA_CTAP_CBOR_INFO,
+			    WIREDATA_CTAP_BUSY,
+			    WIREDATA_CTAP_CBOR_INFO
+			 };
+	uint8_t		*wiredata;
+	fido_dev_t	*dev;
+	fido_cbor_info_t *ci;
+
+	assert((ci = fido_cbor_info_new()) != NULL);
+	dev = retry_open(busy_data, sizeof(busy_data), &wiredata);
+
+	/* not without a policy */
+	assert(fido_dev_get_cbor_info(dev, ci) == FIDO_ERR_RX);
+	assert(fido_dev_io_retries(dev) == 0);
+
+	assert(fido_dev_set_retry_policy(dev, 2, 1) == FIDO_OK);
+	assert(fido_dev_get_cbor_info(dev, ci) == FIDO_OK);
+	assert(fido_dev_io_retries(dev) == 1);
+	assert(fido_cbor_info_versions_len(ci) > 0);
+	assert(fido_dev_get_cbor_info(dev, ci) == FIDO_OK);
+	assert(fido_dev_io_retries(dev) == 2);
+	assert(wiredata_len == 0);
+
+	retry_close(&dev, &wiredata);
+	fido_cbor_info_free(&ci);
+}
+
+/* retries stop at the policy's limit */
+static void
+retry_exhausted(void)
+{
+	const uint8_t	 busy_data[] = {
+			    WIREDATA_CTAP_CBOR_INFO,
+			    WIREDATA_CTAP_BUSY,
+			    WIREDATA_CTAP_BUSY,
+			    WIREDATA_CTAP_BUSY,
+			    WIREDATA_CTAP_CBOR_INFO
+			 };
+	const uint8_t	 cbor_info_data[] = { WIREDATA_CTAP_CBOR_INFO };
+	uint8_t		*wiredata;
+	fido_dev_t	*dev;
+	fido_cbor_info_t *ci;
+
+	assert((ci = fido_cbor_info_new()) != NULL);
+	dev = retry_open(busy_data, sizeof(busy_data), &wiredata);
+	assert(fido_dev_set_retry_policy(dev, 2, 1) == FIDO_OK);
+	assert(fido_dev_get_cbor_info(dev, ci) == FIDO_ERR_RX);
+	assert(fido_dev_io_retries(dev) == 2);
+	assert(wiredata_len == sizeof(cbor_info_data));
+	retry_close(&dev, &wiredata);
+	fido_cbor_info_free(&ci);
+}
+
+/* a retry whose backoff would not fit in the timeout is not attempted */
+static void
+retry_backoff(void)
+{
+	const uint8_t	 busy_data[] = {
+			    WIREDATA_CTAP_CBOR_INFO,
+			    WIREDATA_CTAP_BUSY,
+			    WIREDATA_CTAP_CBOR_INFO
+			 };
+	const uint8_t	 cbor_info_data[] = { WIREDATA_CTAP_CBOR_INFO };
+	uint8_t		*wiredata;
+	fido_dev_t	*dev;
+	fido_cbor_info_t *ci;
+
+	assert((ci = fido_cbor_info_new()) != NULL);
+	dev = retry_open(busy_data, sizeof(busy_data), &wiredata);
+	/* a backoff of 1000 ms waits at least 500 ms */
+	assert(fido_dev_set_retry_policy(dev, 3, 1000) == FIDO_OK);
+	assert(fido_dev_set_timeout(dev, 100) == FIDO_OK);
+	assert(fido_dev_get_cbor_info(dev, ci) == FIDO_ERR_RX);
+	assert(fido_dev_io_retries(dev) == 0);
+	assert(wiredata_len == sizeof(cbor_info_data));
+	retry_close(&dev, &wiredata);
+	fido_cbor_info_free(&ci);
+}
+
+/*
+ * A lost response is only retried where reissuing the command is safe:
+ * getInfo is, the multi-exchange credential enumeration is not.
+ */
+static void
+retry_lost(void)
+{
+	const uint8_t	 info_data[] = {
+			    WIREDATA_CTAP_CBOR_INFO,
+			    WIREDATA_CTAP_LOST,
+			    WIREDATA_CTAP_CBOR_INFO
+			 };
+	const uint8_t	 rk_data[] = {
+			    WIREDATA_CTAP_CBOR_INFO,
+			    WIREDATA_CTAP_CBOR_AUTHKEY,
+			    WIREDATA_CTAP_CBOR_PINTOKEN,
+			    WIREDATA_CTAP_LOST,
+			    WIREDATA_CTAP_CBOR_STATUS
+			 };
+	const uint8_t	 rk_busy_data[] = {
+			    WIREDATA_CTAP_CBOR_INFO,
+			    WIREDATA_CTAP_CBOR_AUTHKEY,
+			    WIREDATA_CTAP_CBOR_PINTOKEN,
+			    WIREDATA_CTAP_BUSY,
+			    WIREDATA_CTAP_CBOR_AUTHKEY,
+			    WIREDATA_CTAP_CBOR_PINTOKEN,
+			    WIREDATA_CTAP_CBOR_STATUS_(FIDO_ERR_NO_CREDENTIALS)
+			 };
+	const uint8_t	 status_data[] = { WIREDATA_CTAP_CBOR_STATUS };
+	uint8_t		*wiredata;
+	fido_dev_t	*dev;
+	fido_cbor_info_t *ci;
+	fido_credman_rk_t *rk;
+
+	assert((ci = fido_cbor_info_new()) != NULL);
+	assert((rk = fido_credman_rk_new()) != NULL);
+
+	dev = retry_open(info_data, sizeof(info_data), &wiredata);
+	assert(fido_dev_set_retry_policy(dev, 3, 1) == FIDO_OK);
+	assert(fido_dev_get_cbor_info(dev, ci) == FIDO_OK);
+	assert(fido_dev_io_retries(dev) == 1);
+	assert(wiredata_len == 0);
+	retry_close(&dev, &wiredata);
+
+	dev = retry_open(rk_data, sizeof(rk_data), &wiredata);
+	assert(fido_dev_set_retry_policy(dev, 3, 1) == FIDO_OK);
+	assert(fido_credman_get_dev_rk(dev, "example.com", rk,
+	    "pin") == FIDO_ERR_RX);
+	assert(fido_dev_io_retries(dev) == 0);
+	assert(wiredata_len == sizeof(status_data));
+	retry_close(&dev, &wiredata);
+
+	/* but an explicit busy indication restarts it */
+	dev = retry_open(rk_busy_data, sizeof(rk_busy_data), &wiredata);
+	assert(fido_dev_set_retry_policy(dev, 3, 1) == FIDO_OK);
+	assert(fido_credman_get_dev_rk(dev, "example.com", rk,
+	    "pin") == FIDO_ERR_NO_CREDENTIALS);
+	assert(fido_dev_io_retries(dev) == 1);
+	assert(wiredata_len == 0);
+	retry_close(&dev, &wiredata);
+
+	fido_credman_rk_free(&rk);
+	fido_cbor_info_free(&ci);
+}
+
 int
 main(void)
 {
@@ -434,6 +670,11 @@ main(void)
 	timeout_rx();
 	timeout_ok();
 	timeout_misc();
+	retry_policy();
+	retry_busy();
+	retry_exhausted();
+	retry_backoff();
+	retry_lost();
 
 	exit(0);
 }
@@ -0,0 +1,571 @@
+/*
+ * Copyright (c) 2026 Token2. All rights reserved.
+ * Use of this source code is governed by a BSD-style
+ * license that can be found in the LICENSE file.
+ * SPDX-License-Identifier: BSD-2-Clause
+ */
+
+#undef NDEBUG
+
+#include <sys/stat.h>
+
+#include <assert.h>
+#include <errno.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+#define _FIDO_INTERNAL
+
+#include <fido.h>
+
+#include <openssl/sha.h>
+
+#include "../fuzz/wiredata_fido2.h"
+
+#ifdef _WIN32
+#include <direct.h>
+#define mkdir(path, mode)	_mkdir(path)
+#define rmdir(path)		_rmdir(path)
+#else
+#include <unistd.h>
+#endif
+
+#define REPORT_LEN	(64 + 1)
+#define FRAME_LEN	(REPORT_LEN - 1)
+#define CTAP_LARGEBLOB	0x0c
+#define DIGEST_LEN	16
+#define ARRAY_MAX	128
+#define CACHE_DIR	"regress_largeblob.d"
+#define CACHE_FILE	"regress_largeblob.cache"
+
+struct array {
+	uint8_t	ptr[ARRAY_MAX];
+	size_t	len;
+};
+
+static uint8_t	 ctap_nonce[8];
+static uint8_t	*wiredata_ptr;
+static size_t	 wiredata_len;
+static int	 fake_dev_handle;
+static int	 initialised;
+static int	 n_largeblob;	/* largeBlobs commands written */
+static int	 n_set;		/* of which set fragments */
+
+static uint8_t	 replies[16 * FRAME_LEN];
+static size_t	 replies_len;
+
+/* the AAGUID in WIREDATA_CTAP_CBOR_INFO */
+static const uint8_t aaguid[16] = {
+	0x19, 0x56, 0xe5, 0xbd, 0xa3, 0x74, 0x45, 0xf1,
+	0xa8, 0x14, 0x35, 0x64, 0x03, 0xfd, 0xbc, 0x18,
+};
+
+static void *
+dummy_open(const char *path)
+{
+	(void)path;
+
+	return (&fake_dev_handle);
+}
+
+static void
+dummy_close(void *handle)
+{
+	assert(handle == &fake_dev_handle);
+}
+
+static int
+dummy_read(void *handle, unsigned char *ptr, size_t len, int ms)
+{
+	size_t n;
+
+	(void)ms;
+
+	assert(handle == &fake_dev_handle);
+	assert(ptr != NULL);
+	assert(len == REPORT_LEN - 1);
+
+	if (wiredata_ptr == NULL)
+		return (-1);
+
+	if (!initialised) {
+		assert(wiredata_len >= REPORT_LEN - 1);
+		memcpy(&wiredata_ptr[7], &ctap_nonce, sizeof(ctap_nonce));
+		initialised = 1;
+	}
+
+	if (wiredata_len < len)
+		n = wiredata_len;
+	else
+		n = len;
+
+	memcpy(ptr, wiredata_ptr, n);
+	wiredata_ptr += n;
+	wiredata_len -= n;
+
+	return ((int)n);
+}
+
+static int
+dummy_write(void *handle, const unsigned char *ptr, size_t len)
+{
+	assert(handle == &fake_dev_handle);
+	assert(ptr != NULL);
+	assert(len == REPORT_LEN);
+
+	if (!initialised)
+		memcpy(&ctap_nonce, &ptr[8], sizeof(ctap_nonce));
+
+	/* the first frame of a CTAPHID_CBOR message: report id, cid, cmd */
+	if (ptr[5] == 0x90 && ptr[8] == CTAP_LARGEBLOB) {
+		n_largeblob++;
+		/* { 2: set, ... } rather than { 1: get, ... } */
+		if (ptr[10] == 0x02)
+			n_set++;
+	}
+
+	return ((int)len);
+}
+
+static uint8_t *
+wiredata_setup(const uint8_t *data, size_t len)
+{
+	const uint8_t ctap_init_data[] = { WIREDATA_CTAP_INIT };
+
+	assert(wiredata_ptr == NULL);
+	assert(SIZE_MAX - len > sizeof(ctap_init_data));
+	assert((wiredata_ptr = malloc(sizeof(ctap_init_data) + len)) != NULL);
+
+	memcpy(wiredata_ptr, ctap_init_data, sizeof(ctap_init_data));
+
+	if (len)
+		memcpy(wiredata_ptr + sizeof(ctap_init_data), data, len);
+
+	wiredata_len = sizeof(ctap_init_data) + len;
+
+	return (wiredata_ptr);
+}
+
+static void
+wiredata_clear(uint8_t **wiredata)
+{
+	free(*wiredata);
+	*wiredata = NULL;
+	wiredata_ptr = NULL;
+	wiredata_len = 0;
+	initialised = 0;
+}
+
+/* a serialised large-blob array: 'body' followed by its truncated digest */
+static void
+array_set(struct array *a, const uint8_t *body, size_t len)
+{
+	uint8_t dgst[SHA256_DIGEST_LENGTH];
+
+	assert(len + DIGEST_LEN <= sizeof(a->ptr));
+	assert(SHA256(body, len, dgst) != NULL);
+	memcpy(a->ptr, body, len);
+	memcpy(a->ptr + len, dgst, DIGEST_LEN);
+	a->len = len + DIGEST_LEN;
+}
+
+/* queue a single-frame CTAP2 reply */
+static void
+reply_status(uint8_t status)
+{
+	uint8_t *frame;
+
+	assert(replies_len + FRAME_LEN <= sizeof(replies));
+	frame = replies + replies_len;
+	memset(frame, 0, FRAME_LEN);
+	frame[0] = 0x00; /* cid */
+	frame[1] = 0x22;
+	frame[2] = 0x00;
+	frame[3] = 0x02;
+	frame[4] = 0x90; /* CTAPHID_CBOR */
+	frame[5] = 0x00;
+	frame[6] = 0x01;
+	frame[7] = status;
+	replies_len += FRAME_LEN;
+}
+
+/* queue canned frames */
+static void
+reply_data(const uint8_t *ptr, size_t len)
+{
+	assert(len % FRAME_LEN == 0);
+	assert(replies_len + len <= sizeof(replies));
+	memcpy(replies + replies_len, ptr, len);
+	replies_len += len;
+}
+
+/* queue a largeBlobs reply: { 1: chunk } */
+static void
+reply_chunk(const uint8_t *ptr, size_t len)
+{
+	uint8_t	*frame;
+	size_t	 hdr;
+
+	assert(len <= 0xff);
+	hdr = len < 24 ? 1 : 2;
+	assert(8 + 2 + hdr + len <= FRAME_LEN);
+	reply_status(0x00);
+	frame = replies + replies_len - FRAME_LEN;
+	frame[6] = (uint8_t)(1 + 2 + hdr + len);
+	frame[8] = 0xa1;
+	frame[9] = 0x01;
+	if (hdr == 1)
+		frame[10] = (uint8_t)(0x40 | len);
+	else {
+		frame[10] = 0x58;
+		frame[11] = (uint8_t)len;
+	}
+	memcpy(frame + 10 + hdr, ptr, len);
+}
+
+static void
+reply_array(const struct array *a)
+{
+	reply_chunk(a->ptr, a->len);
+}
+
+/* what a probe of 'cached' reads from an authenticator holding 'a' */
+static void
+reply_probe(const struct array *a, const struct array *cached)
+{
+	size_t offset = cached->len - DIGEST_LEN;
+	size_t n = DIGEST_LEN + 1;
+
+	assert(offset <= a->len);
+	if (n > a->len - offset)
+		n = a->len - offset;
+	reply_chunk(a->ptr + offset, n);
+}
+
+static void
+get_array(fido_dev_t *dev, const struct array *expected, int n_tx,
+    uint64_t hits, uint64_t misses)
+{
+	unsigned char	*cbor_ptr = NULL;
+	size_t		 cbor_len = 0;
+
+	n_largeblob = 0;
+	assert(fido_dev_largeblob_get_array(dev, &cbor_ptr,
+	    &cbor_len) == FIDO_OK);
+	assert(cbor_len == expected->len - DIGEST_LEN);
+	assert(memcmp(cbor_ptr, expected->ptr, cbor_len) == 0);
+	assert(n_largeblob == n_tx);
+	assert(fido_dev_largeblob_cache_hits(dev) == hits);
+	assert(fido_dev_largeblob_cache_misses(dev) == misses);
+	free(cbor_ptr);
+}
+
+/* open 'path' on dummy io serving INIT, getInfo and the queued replies */
+static fido_dev_t *
+open_dev(const char *path, const char *cache_path, uint8_t **wiredata)
+{
+	const uint8_t	 cbor_info_data[] = { WIREDATA_CTAP_CBOR_INFO };
+	uint8_t		 data[sizeof(cbor_info_data) + sizeof(replies)];
+	fido_dev_io_t	 io;
+	fido_dev_t	*dev;
+
+	memcpy(data, cbor_info_data, sizeof(cbor_info_data));
+	memcpy(data + sizeof(cbor_info_data), replies, replies_len);
+	*wiredata = wiredata_setup(data, sizeof(cbor_info_data) + replies_len);
+	replies_len = 0;
+
+	memset(&io, 0, sizeof(io));
+
+	io.open = dummy_open;
+	io.close = dummy_close;
+	io.read = dummy_read;
+	io.write = dummy_write;
+
+	assert((dev = fido_dev_new()) != NULL);
+	assert(fido_dev_set_io_functions(dev, &io) == FIDO_OK);
+	assert(fido_dev_set_largeblob_cache(dev, cache_path) == FIDO_OK);
+	assert(fido_dev_open(dev, path) == FIDO_OK);
+	assert(fido_dev_largeblob_cache_hits(dev) == 0);
+	assert(fido_dev_largeblob_cache_misses(dev) == 0);
+
+	return (dev);
+}
+
+static void
+close_dev(fido_dev_t **dev, uint8_t **wiredata)
+{
+	assert(wiredata_len == 0);
+	assert(fido_dev_close(*dev) == FIDO_OK);
+	fido_dev_free(dev);
+	wiredata_clear(wiredata);
+}
+
+static void
+cache(void)
+{
+	const uint8_t	 one[] = { 0x81, 0x01 };
+	const uint8_t	 two[] = { 0x81, 0x02 };
+	const uint8_t	 empty[] = { 0x80 };
+	uint8_t		 big[3 + 27];
+	uint8_t		*wiredata;
+	struct array	 a, b, c, d, e;
+	fido_dev_t	*dev;
+
+	array_set(&a, one, sizeof(one));
+	array_set(&b, two, sizeof(two));
+	/* b, digest included, and one more byte: not a valid array */
+	memcpy(&c, &b, sizeof(c));
+	c.ptr[c.len++] = 0x00;
+	array_set(&e, empty, sizeof(empty));
+	big[0] = 0x81; /* [ bstr ] */
+	big[1] = 0x58;
+	big[2] = sizeof(big) - 3;
+	memset(big + 3, 0x2a, sizeof(big) - 3);
+	array_set(&d, big, sizeof(big));
+	assert(a.len == b.len);
+	assert(d.len - DIGEST_LEN > a.len);
+
+	replies_len = 0;
+	reply_array(&a);	/* empty cache: read in full */
+	reply_probe(&a, &a);	/* unchanged */
+	reply_probe(&b, &a);	/* same length, another digest */
+	reply_array(&b);
+	reply_probe(&c, &b);	/* longer array, same bytes at the digest */
+	reply_array(&c);
+	reply_probe(&d, &b);	/* cache d */
+	reply_array(&d);
+	reply_status(0x02);	/* a's end is before d's digest */
+	reply_array(&a);
+	reply_probe(&a, &a);
+	dev = open_dev("dummy", NULL, &wiredata);
+
+	get_array(dev, &a, 1, 0, 1);
+	get_array(dev, &a, 1, 1, 1);	/* hit */
+	get_array(dev, &b, 2, 1, 2);	/* changed digest */
+	get_array(dev, &e, 2, 1, 3);	/* longer array */
+	get_array(dev, &d, 2, 1, 4);
+	get_array(dev, &a, 2, 1, 5);	/* offset past the end */
+	get_array(dev, &a, 1, 2, 5);	/* hit */
+	close_dev(&dev, &wiredata);
+}
+
+/* where a cache directory keeps the copy of the key opened on 'path' */
+static void
+cache_file(const char *path, char *name, size_t len)
+{
+	uint8_t	dgst[SHA256_DIGEST_LENGTH];
+	size_t	n;
+
+	assert(SHA256((const uint8_t *)path, strlen(path), dgst) != NULL);
+	n = (size_t)snprintf(name, len, "%s/", CACHE_DIR);
+	for (size_t i = 0; i < sizeof(aaguid); i++)
+		n += (size_t)snprintf(name + n, len - n, "%02x", aaguid[i]);
+	n += (size_t)snprintf(name + n, len - n, "-");
+	for (size_t i = 0; i < 8; i++)
+		n += (size_t)snprintf(name + n, len - n, "%02x", dgst[i]);
+	assert(n < len);
+}
+
+static void
+cache_file_check(const char *path, const struct array *expected)
+{
+	char	 name[256];
+	uint8_t	 buf[ARRAY_MAX + 1];
+	FILE	*f;
+
+	cache_file(path, name, sizeof(name));
+	assert((f = fopen(name, "rb")) != NULL);
+	assert(fread(buf, 1, sizeof(buf), f) == expected->len);
+	assert(memcmp(buf, expected->ptr, expected->len) == 0);
+	fclose(f);
+}
+
+/* a cache directory keeps one copy per authenticator */
+static void
+cache_dir(void)
+{
+	const uint8_t	 one[] = { 0x81, 0x01 };
+	const uint8_t	 two[] = { 0x81, 0x02 };
+	char		 name[256];
+	uint8_t		*wiredata;
+	struct array	 a, b;
+	fido_dev_t	*dev;
+
+	array_set(&a, one, sizeof(one));
+	array_set(&b, two, sizeof(two));
+	assert(mkdir(CACHE_DIR, 0700) == 0 || errno == EEXIST);
+
+	reply_array(&a);
+	dev = open_dev("dummy1", CACHE_DIR, &wiredata);
+	get_array(dev, &a, 1, 0, 1);
+	close_dev(&dev, &wiredata);
+	cache_file_check("dummy1", &a);
+
+	/* another key does not overwrite the first one's copy */
+	reply_array(&b);
+	dev = open_dev("dummy2", CACHE_DIR, &wiredata);
+	get_array(dev, &b, 1, 0, 1);
+	close_dev(&dev, &wiredata);
+	cache_file_check("dummy1", &a);
+	cache_file_check("dummy2", &b);
+
+	/* and each is confirmed from its own copy */
+	reply_probe(&a, &a);
+	dev = open_dev("dummy1", CACHE_DIR, &wiredata);
+	get_array(dev, &a, 1, 1, 0);
+	close_dev(&dev, &wiredata);
+	reply_probe(&b, &b);
+	dev = open_dev("dummy2", CACHE_DIR, &wiredata);
+	get_array(dev, &b, 1, 1, 0);
+	close_dev(&dev, &wiredata);
+
+	cache_file("dummy1", name, sizeof(name));
+	assert(remove(name) == 0);
+	cache_file("dummy2", name, sizeof(name));
+	assert(remove(name) == 0);
+	assert(rmdir(CACHE_DIR) == 0);
+}
+
+/* what a cache file holds: the array last read or written */
+static void
+cache_file_read(const char *name, struct array *a)
+{
+	FILE *f;
+
+	assert((f = fopen(name, "rb")) != NULL);
+	a->len = fread(a->ptr, 1, sizeof(a->ptr), f);
+	assert(a->len > DIGEST_LEN && a->len < sizeof(a->ptr));
+	fclose(f);
+}
+
+/* ECDH and a PIN token, then an array written in one fragment */
+static void
+reply_set(uint8_t status)
+{
+	const uint8_t auth_data[] = {
+		WIREDATA_CTAP_CBOR_AUTHKEY,
+		WIREDATA_CTAP_CBOR_PINTOKEN,
+	};
+
+	reply_data(auth_data, sizeof(auth_data));
+	reply_status(status);
+	if (status == 0x00)
+		reply_status(0x00);	/* the digest */
+}
+
+static void
+commit(void)
+{
+	const uint8_t	 empty[] = { 0x80 };
+	/* at least a block each once compressed, as aes256_gcm() requires */
+	const char	 hello[] = "the quick brown fox jumps over";
+	const char	 world[] = "pack my box with five dozen jugs";
+	uint8_t		 k1[32], k2[32], k3[32];
+	unsigned char	*blob_ptr;
+	size_t		 blob_len;
+	uint8_t		*wiredata;
+	struct array	 e, w;
+	fido_dev_t	*dev;
+	fido_largeblob_batch_t *batch;
+
+	memset(k1, 0x01, sizeof(k1));
+	memset(k2, 0x02, sizeof(k2));
+	memset(k3, 0x03, sizeof(k3));
+	array_set(&e, empty, sizeof(empty));
+
+	assert((batch = fido_largeblob_batch_new()) != NULL);
+	assert(fido_largeblob_batch_set(batch, k1, sizeof(k1),
+	    (const unsigned char *)hello, strlen(hello)) == FIDO_OK);
+	assert(fido_largeblob_batch_set(batch, k2, sizeof(k2),
+	    (const unsigned char *)world, strlen(world)) == FIDO_OK);
+	assert(fido_largeblob_batch_remove(batch, k1, sizeof(k1)) == FIDO_OK);
+	assert(fido_largeblob_batch_count(batch) == 3);
+
+	/* every edit lands in a single read and a single write */
+	remove(CACHE_FILE);
+	reply_array(&e);
+	reply_set(0x00);
+	dev = open_dev("dummy", CACHE_FILE, &wiredata);
+	n_largeblob = n_set = 0;
+	assert(fido_dev_largeblob_commit(dev, batch, "pin") == FIDO_OK);
+	assert(fido_largeblob_batch_failed(batch) == 3);
+	assert(n_set == 2);	/* the array, then its digest */
+	assert(n_largeblob - n_set == 1);
+	close_dev(&dev, &wiredata);
+
+	/* and the array written holds the outcome of all of them */
+	cache_file_read(CACHE_FILE, &w);
+	reply_probe(&w, &w);
+	reply_probe(&w, &w);
+	dev = open_dev("dummy", CACHE_FILE, &wiredata);
+	assert(fido_dev_largeblob_get(dev, k2, sizeof(k2), &blob_ptr,
+	    &blob_len) == FIDO_OK);
+	assert(blob_len == strlen(world));
+	assert(memcmp(blob_ptr, world, blob_len) == 0);
+	free(blob_ptr);
+	assert(fido_dev_largeblob_get(dev, k1, sizeof(k1), &blob_ptr,
+	    &blob_len) == FIDO_ERR_NOTFOUND);
+	assert(fido_dev_largeblob_cache_hits(dev) == 2);
+	close_dev(&dev, &wiredata);
+	fido_largeblob_batch_free(&batch);
+
+	/* an edit that does not apply: nothing is written */
+	assert((batch = fido_largeblob_batch_new()) != NULL);
+	assert(fido_largeblob_batch_set(batch, k1, sizeof(k1),
+	    (const unsigned char *)hello, strlen(hello)) == FIDO_OK);
+	assert(fido_largeblob_batch_remove(batch, k3, sizeof(k3)) == FIDO_OK);
+	assert(fido_largeblob_batch_set(batch, k2, sizeof(k2),
+	    (const unsigned char *)world, strlen(world)) == FIDO_OK);
+	reply_array(&e);
+	dev = open_dev("dummy", NULL, &wiredata);
+	n_largeblob = n_set = 0;
+	assert(fido_dev_largeblob_commit(dev, batch,
+	    "pin") == FIDO_ERR_NOTFOUND);
+	assert(fido_largeblob_batch_failed(batch) == 1);
+	assert(n_largeblob == 1);
+	assert(n_set == 0);
+	close_dev(&dev, &wiredata);
+	fido_largeblob_batch_free(&batch);
+
+	/* the write fails: no edit is reported as the culprit */
+	assert((batch = fido_largeblob_batch_new()) != NULL);
+	assert(fido_largeblob_batch_set(batch, k1, sizeof(k1),
+	    (const unsigned char *)hello, strlen(hello)) == FIDO_OK);
+	assert(fido_largeblob_batch_set(batch, k2, sizeof(k2),
+	    (const unsigned char *)world, strlen(world)) == FIDO_OK);
+	reply_array(&e);
+	reply_set(FIDO_ERR_PIN_AUTH_INVALID);
+	dev = open_dev("dummy", NULL, &wiredata);
+	n_largeblob = n_set = 0;
+	assert(fido_dev_largeblob_commit(dev, batch,
+	    "pin") == FIDO_ERR_PIN_AUTH_INVALID);
+	assert(fido_largeblob_batch_failed(batch) == 2);
+	assert(n_set == 1);
+	close_dev(&dev, &wiredata);
+	fido_largeblob_batch_free(&batch);
+
+	/* nothing to commit */
+	assert((batch = fido_largeblob_batch_new()) != NULL);
+	dev = open_dev("dummy", NULL, &wiredata);
+	assert(fido_dev_largeblob_commit(dev, batch,
+	    "pin") == FIDO_ERR_INVALID_ARGUMENT);
+	assert(fido_dev_largeblob_commit(dev, NULL,
+	    "pin") == FIDO_ERR_INVALID_ARGUMENT);
+	close_dev(&dev, &wiredata);
+	fido_largeblob_batch_free(&batch);
+
+	assert(remove(CACHE_FILE) == 0);
+}
+
+int
+main(void)
+{
+	fido_init(0);
+
+	cache();
+	cache_dir();
+	commit();
+
+	exit(0);
+}
@@ -0,0 +1,317 @@
+/*
+ * Copyright (c) 2026 Token2. All rights reserved.
+ * Use of this source code is governed by a BSD-style
+ * license that can be found in the LICENSE file.
+ * SPDX-License-Identifier: BSD-2-Clause
+ */
+
+#undef NDEBUG
+
+#include <assert.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+#define _FIDO_INTERNAL
+
+#include <fido.h>
+
+#include "../fuzz/wiredata_fido2.h"
+
+#define REPORT_LEN	(64 + 1)
+#define TRACE		"regress_trace.trc"
+#define BAD_TRACE	"regress_trace_bad.trc"
+#define MAGIC_LEN	8
+#define EVENT_HDR_LEN	7
+
+static uint8_t	 ctap_nonce[8];
+static uint8_t	*wiredata_ptr;
+static size_t	 wiredata_len;
+static int	 fake_dev_handle;
+static int	 initialised;
+
+static void *
+dummy_open(const char *path)
+{
+	(void)path;
+
+	return (&fake_dev_handle);
+}
+
+static void
+dummy_close(void *handle)
+{
+	assert(handle == &fake_dev_handle);
+}
+
+static int
+dummy_read(void *handle, unsigned char *ptr, size_t len, int ms)
+{
+	size_t n;
+
+	(void)ms;
+
+	assert(handle == &fake_dev_handle);
+	assert(ptr != NULL);
+	assert(len == REPORT_LEN - 1);
+
+	if (wiredata_ptr == NULL)
+		return (-1);
+
+	if (!initialised) {
+		assert(wiredata_len >= REPORT_LEN - 1);
+		memcpy(&wiredata_ptr[7], &ctap_nonce, sizeof(ctap_nonce));
+		initialised = 1;
+	}
+
+	if (wiredata_len < len)
+		n = wiredata_len;
+	else
+		n = len;
+
+	memcpy(ptr, wiredata_ptr, n);
+	wiredata_ptr += n;
+	wiredata_len -= n;
+
+	return ((int)n);
+}
+
+static int
+dummy_write(void *handle, const unsigned char *ptr, size_t len)
+{
+	assert(handle == &fake_dev_handle);
+	assert(ptr != NULL);
+	assert(len == REPORT_LEN);
+
+	if (!initialised)
+		memcpy(&ctap_nonce, &ptr[8], sizeof(ctap_nonce));
+
+	return ((int)len);
+}
+
+static uint8_t *
+wiredata_setup(const uint8_t *data, size_t len)
+{
+	const uint8_t ctap_init_data[] = { WIREDATA_CTAP_INIT };
+
+	assert(wiredata_ptr == NULL);
+	assert(SIZE_MAX - len > sizeof(ctap_init_data));
+	assert((wiredata_ptr = malloc(sizeof(ctap_init_data) + len)) != NULL);
+
+	memcpy(wiredata_ptr, ctap_init_data, sizeof(ctap_init_data));
+
+	if (len)
+		memcpy(wiredata_ptr + sizeof(ctap_init_data), data, len);
+
+	wiredata_len = sizeof(ctap_init_data) + len;
+
+	return (wiredata_ptr);
+}
+
+static void
+wiredata_clear(uint8_t **wiredata)
+{
+	free(*wiredata);
+	*wiredata = NULL;
+	wiredata_ptr = NULL;
+	wiredata_len = 0;
+	initialised = 0;
+}
+
+static unsigned char *
+read_trace(const char *path, size_t *len)
+{
+	FILE		*f;
+	unsigned char	*buf;
+	long		 size;
+
+	assert((f = fopen(path, "rb")) != NULL);
+	assert(fseek(f, 0, SEEK_END) == 0);
+	assert((size = ftell(f)) > 0);
+	assert(fseek(f, 0, SEEK_SET) == 0);
+	assert((buf = malloc((size_t)size)) != NULL);
+	assert(fread(buf, 1, (size_t)size, f) == (size_t)size);
+	fclose(f);
+	*len = (size_t)size;
+
+	return (buf);
+}
+
+static void
+write_trace(const char *path, const unsigned char *buf, size_t len)
+{
+	FILE *f;
+
+	assert((f = fopen(path, "wb")) != NULL);
+	assert(fwrite(buf, 1, len, f) == len);
+	assert(fclose(f) == 0);
+}
+
+/*
+ * Record INIT, the getInfo issued by fido_dev_open() and an explicit
+ * getInfo; returns the info read from the device.
+ */
+static fido_cbor_info_t *
+record(void)
+{
+	const uint8_t		 cbor_info_data[] = { WIREDATA_CTAP_CBOR_INFO,
+				     WIREDATA_CTAP_CBOR_INFO };
+	uint8_t			*wiredata;
+	fido_dev_t		*dev = NULL;
+	fido_dev_io_t		 io;
+	fido_cbor_info_t	*ci;
+
+	memset(&io, 0, sizeof(io));
+
+	io.open = dummy_open;
+	io.close = dummy_close;
+	io.read = dummy_read;
+	io.write = dummy_write;
+
+	wiredata = wiredata_setup(cbor_info_data, sizeof(cbor_info_data));
+
+	assert((dev = fido_dev_new()) != NULL);
+	assert(fido_dev_set_io_functions(dev, &io) == FIDO_OK);
+	assert(fido_dev_set_trace(dev, TRACE) == FIDO_OK);
+	assert(fido_dev_open(dev, "dummy") == FIDO_OK);
+	/* too late once the device is open */
+	assert(fido_dev_set_trace(dev, TRACE) == FIDO_ERR_INVALID_ARGUMENT);
+	assert((ci = fido_cbor_info_new()) != NULL);
+	assert(fido_dev_get_cbor_info(dev, ci) == FIDO_OK);
+	assert(fido_dev_close(dev) == FIDO_OK);
+	fido_dev_free(&dev);
+
+	wiredata_clear(&wiredata);
+
+	return (ci);
+}
+
+static fido_dev_t *
+new_replay(int flags)
+{
+	fido_dev_t *dev;
+
+	assert((dev = fido_dev_new()) != NULL);
+	assert(fido_dev_set_replay(dev, flags) == FIDO_OK);
+
+	return (dev);
+}
+
+static void
+replay(const fido_cbor_info_t *recorded, int flags)
+{
+	fido_dev_t		*dev;
+	fido_cbor_info_t	*ci;
+
+	/*
+	 * The library sends a fresh random INIT nonce and checks the reply
+	 * against it, so the open only succeeds if replay substitutes it.
+	 */
+	dev = new_replay(flags);
+	assert(fido_dev_open(dev, TRACE) == FIDO_OK);
+	assert(fido_dev_is_fido2(dev));
+	assert((ci = fido_cbor_info_new()) != NULL);
+	assert(fido_dev_get_cbor_info(dev, ci) == FIDO_OK);
+	assert(fido_cbor_info_versions_len(ci) ==
+	    fido_cbor_info_versions_len(recorded));
+	assert(fido_cbor_info_aaguid_len(ci) ==
+	    fido_cbor_info_aaguid_len(recorded));
+	assert(memcmp(fido_cbor_info_aaguid_ptr(ci),
+	    fido_cbor_info_aaguid_ptr(recorded),
+	    fido_cbor_info_aaguid_len(ci)) == 0);
+	assert(fido_cbor_info_maxmsgsiz(ci) ==
+	    fido_cbor_info_maxmsgsiz(recorded));
+	/* the recording ends here */
+	assert(fido_dev_get_cbor_info(dev, ci) != FIDO_OK);
+	fido_cbor_info_free(&ci);
+	assert(fido_dev_close(dev) == FIDO_OK);
+	fido_dev_free(&dev);
+}
+
+/* a command other than the recorded one is refused */
+static void
+diverge(void)
+{
+	fido_dev_t *dev;
+
+	dev = new_replay(0);
+	assert(fido_dev_open(dev, TRACE) == FIDO_OK);
+	assert(fido_dev_cancel(dev) == FIDO_ERR_TX);
+	assert(fido_dev_close(dev) == FIDO_OK);
+	fido_dev_free(&dev);
+}
+
+static void
+open_bad(const unsigned char *buf, size_t len)
+{
+	fido_dev_t *dev;
+
+	write_trace(BAD_TRACE, buf, len);
+	dev = new_replay(0);
+	assert(fido_dev_open(dev, BAD_TRACE) != FIDO_OK);
+	fido_dev_free(&dev);
+}
+
+static void
+corrupt(void)
+{
+	unsigned char	*buf, *bad;
+	size_t		 len;
+	fido_dev_t	*dev;
+
+	buf = read_trace(TRACE, &len);
+	assert(len > MAGIC_LEN + EVENT_HDR_LEN);
+	assert(memcmp(buf, "FIDOTRC1", MAGIC_LEN) == 0);
+	assert((bad = malloc(len)) != NULL);
+
+	/* truncated in the middle of an event, and of its header */
+	open_bad(buf, len - 1);
+	open_bad(buf, MAGIC_LEN + EVENT_HDR_LEN - 1);
+	/* only the header: nothing to replay */
+	open_bad(buf, MAGIC_LEN);
+	/* not a trace */
+	memcpy(bad, buf, len);
+	bad[0] = 'X';
+	open_bad(bad, len);
+	/* unknown direction */
+	memcpy(bad, buf, len);
+	bad[MAGIC_LEN] = '?';
+	open_bad(bad, len);
+	/* an event longer than a report */
+	memcpy(bad, buf, len);
+	bad[MAGIC_LEN + 1] = 0xff;
+	bad[MAGIC_LEN + 2] = 0x00;
+	open_bad(bad, len);
+	/* a missing file */
+	dev = new_replay(0);
+	assert(fido_dev_open(dev, "regress_trace_missing.trc") != FIDO_OK);
+	fido_dev_free(&dev);
+
+	/* unknown flags */
+	assert((dev = fido_dev_new()) != NULL);
+	assert(fido_dev_set_replay(dev, 0x80) == FIDO_ERR_INVALID_ARGUMENT);
+	fido_dev_free(&dev);
+
+	free(bad);
+	free(buf);
+}
+
+int
+main(void)
+{
+	fido_cbor_info_t *ci;
+
+	fido_init(0);
+
+	ci = record();
+	replay(ci, 0);
+	replay(ci, FIDO_REPLAY_REALTIME);
+	diverge();
+	corrupt();
+	fido_cbor_info_free(&ci);
+
+	remove(TRACE);
+	remove(BAD_TRACE);
+
+	exit(0);
+}
@@ -291,11 +291,16 @@ fido_bio_dev_get_template_array(fido_dev_t *dev, fido_bio_template_array_t *ta,
     const char *pin)
 {
 	int ms = dev->timeout_ms;
+	int r, n = 0;
 
 	if (pin == NULL)
 		return (FIDO_ERR_INVALID_ARGUMENT);
 
-	return (bio_get_template_array_wait(dev, ta, pin, &ms));
+	do {
+		r = bio_get_template_array_wait(dev, ta, pin, &ms);
+	} while (r != FIDO_OK && fido_io_retry(dev, r, true, &n, &ms));
+
+	return (r);
 }
 
 static int
@@ -741,8 +746,13 @@ int
 fido_bio_dev_get_info(fido_dev_t *dev, fido_bio_info_t *i)
 {
 	int ms = dev->timeout_ms;
+	int r, n = 0;
 
-	return (bio_get_info_wait(dev, i, &ms));
+	do {
+		r = bio_get_info_wait(dev, i, &ms);
+	} while (r != FIDO_OK && fido_io_retry(dev, r, true, &n, &ms));
+
+	return (r);
 }
 
 const char *
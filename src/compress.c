@@ -98,10 +98,11 @@ fail:
 
 /* raw deflate */
 static int
-rfc1951_deflate(fido_blob_t *out, const fido_blob_t *in)
+rfc1951_deflate(fido_blob_t *out, const fido_blob_t *in, int level)
 {
 	z_stream zs;
 	u_int ilen, olen;
+	u_long bound;
 	int r, z;
 
 	memset(&zs, 0, sizeof(zs));
@@ -111,13 +112,21 @@ rfc1951_deflate(fido_blob_t *out, const fido_blob_t *in)
 		fido_log_debug("%s: in->len=%zu", __func__, in->len);
 		return FIDO_ERR_INVALID_ARGUMENT;
 	}
-	if ((z = deflateInit2(&zs, Z_DEFAULT_COMPRESSION, Z_DEFLATED,
-	    -MAX_WBITS, 8, Z_DEFAULT_STRATEGY)) != Z_OK) {
+	if (level != Z_DEFAULT_COMPRESSION && (level < Z_NO_COMPRESSION ||
+	    level > Z_BEST_COMPRESSION)) {
+		fido_log_debug("%s: level=%d", __func__, level);
+		return FIDO_ERR_INVALID_ARGUMENT;
+	}
+	if ((z = deflateInit2(&zs, level, Z_DEFLATED, -MAX_WBITS, 8,
+	    Z_DEFAULT_STRATEGY)) != Z_OK) {
 		fido_log_debug("%s: deflateInit2: %d", __func__, z);
 		return FIDO_ERR_COMPRESS;
 	}
 
-	olen = BOUND;
+	/* no more than rfc1951_inflate() takes back */
+	if ((bound = deflateBound(&zs, ilen)) > BOUND)
+		bound = BOUND;
+	olen = (u_int)bound;
 	if ((out->ptr = calloc(1, olen)) == NULL) {
 		r = FIDO_ERR_INTERNAL;
 		goto fail;
@@ -156,7 +165,13 @@ fail:
 int
 fido_compress(fido_blob_t *out, const fido_blob_t *in)
 {
-	return rfc1951_deflate(out, in);
+	return rfc1951_deflate(out, in, Z_DEFAULT_COMPRESSION);
+}
+
+int
+fido_compress_level(fido_blob_t *out, const fido_blob_t *in, int level)
+{
+	return rfc1951_deflate(out, in, level);
 }
 
 int
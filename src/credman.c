@@ -120,9 +120,14 @@ credman_get_cmd(const fido_dev_t *dev)
 	return (CTAP_CBOR_CRED_MGMT_PRE);
 }
 
+/*
+ * Send a credentialManagement subcommand. With 'token', a pinUvAuthToken
+ * obtained beforehand (see credman_get_token()), the command is
+ * authenticated with it instead of a token fetched for this command alone.
+ */
 static int
 credman_tx(fido_dev_t *dev, uint8_t subcmd, const void *param, const char *pin,
-    const char *rp_id, fido_opt_t uv, int *ms)
+    const char *rp_id, fido_opt_t uv, const fido_blob_t *token, int *ms)
 {
 	fido_blob_t	 f;
 	fido_blob_t	*ecdh = NULL;
@@ -149,7 +154,17 @@ credman_tx(fido_dev_t *dev, uint8_t subcmd, const void *param, const char *pin,
 	}
 
 	/* pinProtocol, pinAuth */
-	if (pin != NULL || uv == FIDO_OPT_TRUE) {
+	if (token != NULL) {
+		if (credman_prepare_hmac(subcmd, param, &argv[1], &hmac) < 0) {
+			fido_log_debug("%s: credman_prepare_hmac", __func__);
+			goto fail;
+		}
+		if ((argv[3] = cbor_encode_pin_auth(dev, token, &hmac)) == NULL ||
+		    (argv[2] = cbor_encode_pin_opt(dev)) == NULL) {
+			fido_log_debug("%s: cbor encode", __func__);
+			goto fail;
+		}
+	} else if (pin != NULL || uv == FIDO_OPT_TRUE) {
 		if (credman_prepare_hmac(subcmd, param, &argv[1], &hmac) < 0) {
 			fido_log_debug("%s: credman_prepare_hmac", __func__);
 			goto fail;
@@ -247,7 +262,7 @@ credman_get_metadata_wait(fido_dev_t *dev, fido_credman_metadata_t *metadata,
 	int r;
 
 	if ((r = credman_tx(dev, CMD_CRED_METADATA, NULL, pin, NULL,
-	    FIDO_OPT_TRUE, ms)) != FIDO_OK ||
+	    FIDO_OPT_TRUE, NULL, ms)) != FIDO_OK ||
 	    (r = credman_rx_metadata(dev, metadata, ms)) != FIDO_OK)
 		return (r);
 
@@ -259,8 +274,13 @@ fido_credman_get_dev_metadata(fido_dev_t *dev, fido_credman_metadata_t *metadata
     const char *pin)
 {
 	int ms = dev->timeout_ms;
+	int r, n = 0;
 
-	return (credman_get_metadata_wait(dev, metadata, pin, &ms));
+	do {
+		r = credman_get_metadata_wait(dev, metadata, pin, &ms);
+	} while (r != FIDO_OK && fido_io_retry(dev, r, true, &n, &ms));
+
+	return (r);
 }
 
 static int
@@ -445,13 +465,13 @@ credman_get_rk_wait(fido_dev_t *dev, const char *rp_id, fido_credman_rk_t *rk,
 	rp_dgst.len = sizeof(dgst);
 
 	if ((r = credman_tx(dev, CMD_RK_BEGIN, &rp_dgst, pin, rp_id,
-	    FIDO_OPT_TRUE, ms)) != FIDO_OK ||
+	    FIDO_OPT_TRUE, NULL, ms)) != FIDO_OK ||
 	    (r = credman_rx_rk(dev, rk, ms)) != FIDO_OK)
 		return (r);
 
 	while (rk->n_rx < rk->n_alloc) {
 		if ((r = credman_tx(dev, CMD_RK_NEXT, NULL, NULL, NULL,
-		    FIDO_OPT_FALSE, ms)) != FIDO_OK ||
+		    FIDO_OPT_FALSE, NULL, ms)) != FIDO_OK ||
 		    (r = credman_rx_next_rk(dev, rk, ms)) != FIDO_OK)
 			return (r);
 		rk->n_rx++;
@@ -465,8 +485,14 @@ fido_credman_get_dev_rk(fido_dev_t *dev, const char *rp_id,
     fido_credman_rk_t *rk, const char *pin)
 {
 	int ms = dev->timeout_ms;
+	int r, n = 0;
 
-	return (credman_get_rk_wait(dev, rp_id, rk, pin, &ms));
+	/* multi-exchange; only restarted on an explicit busy indication */
+	do {
+		r = credman_get_rk_wait(dev, rp_id, rk, pin, &ms);
+	} while (r != FIDO_OK && fido_io_retry(dev, r, false, &n, &ms));
+
+	return (r);
 }
 
 static int
@@ -482,7 +508,7 @@ credman_del_rk_wait(fido_dev_t *dev, const unsigned char *cred_id,
 		return (FIDO_ERR_INVALID_ARGUMENT);
 
 	if ((r = credman_tx(dev, CMD_DELETE_CRED, &cred, pin, NULL,
-	    FIDO_OPT_TRUE, ms)) != FIDO_OK ||
+	    FIDO_OPT_TRUE, NULL, ms)) != FIDO_OK ||
 	    (r = fido_rx_cbor_status(dev, ms)) != FIDO_OK)
 		goto fail;
 
@@ -663,13 +689,13 @@ credman_get_rp_wait(fido_dev_t *dev, fido_credman_rp_t *rp, const char *pin,
 	int r;
 
 	if ((r = credman_tx(dev, CMD_RP_BEGIN, NULL, pin, NULL,
-	    FIDO_OPT_TRUE, ms)) != FIDO_OK ||
+	    FIDO_OPT_TRUE, NULL, ms)) != FIDO_OK ||
 	    (r = credman_rx_rp(dev, rp, ms)) != FIDO_OK)
 		return (r);
 
 	while (rp->n_rx < rp->n_alloc) {
 		if ((r = credman_tx(dev, CMD_RP_NEXT, NULL, NULL, NULL,
-		    FIDO_OPT_FALSE, ms)) != FIDO_OK ||
+		    FIDO_OPT_FALSE, NULL, ms)) != FIDO_OK ||
 		    (r = credman_rx_next_rp(dev, rp, ms)) != FIDO_OK)
 			return (r);
 		rp->n_rx++;
@@ -682,8 +708,14 @@ int
 fido_credman_get_dev_rp(fido_dev_t *dev, fido_credman_rp_t *rp, const char *pin)
 {
 	int ms = dev->timeout_ms;
+	int r, n = 0;
+
+	/* multi-exchange; only restarted on an explicit busy indication */
+	do {
+		r = credman_get_rp_wait(dev, rp, pin, &ms);
+	} while (r != FIDO_OK && fido_io_retry(dev, r, false, &n, &ms));
 
-	return (credman_get_rp_wait(dev, rp, pin, &ms));
+	return (r);
 }
 
 static int
@@ -693,7 +725,7 @@ credman_set_dev_rk_wait(fido_dev_t *dev, fido_cred_t *cred, const char *pin,
 	int r;
 
 	if ((r = credman_tx(dev, CMD_UPDATE_CRED, cred, pin, NULL,
-	    FIDO_OPT_TRUE, ms)) != FIDO_OK ||
+	    FIDO_OPT_TRUE, NULL, ms)) != FIDO_OK ||
 	    (r = fido_rx_cbor_status(dev, ms)) != FIDO_OK)
 		return (r);
 
@@ -708,6 +740,188 @@ fido_credman_set_dev_rk(fido_dev_t *dev, fido_cred_t *cred, const char *pin)
 	return (credman_set_dev_rk_wait(dev, cred, pin, &ms));
 }
 
+static int
+credman_get_token(fido_dev_t *dev, const char *pin, fido_blob_t *token,
+    int *ms)
+{
+	fido_blob_t	*ecdh = NULL;
+	es256_pk_t	*pk = NULL;
+	int		 r;
+
+	if (fido_dev_is_fido2(dev) == false) {
+		fido_log_debug("%s: fido_dev_is_fido2", __func__);
+		return (FIDO_ERR_INVALID_COMMAND);
+	}
+	fido_blob_reset(token);
+	if ((r = fido_do_ecdh(dev, &pk, &ecdh, ms)) != FIDO_OK) {
+		fido_log_debug("%s: fido_do_ecdh", __func__);
+		goto fail;
+	}
+	if ((r = fido_dev_get_uv_token(dev, credman_get_cmd(dev), pin, ecdh, pk,
+	    NULL, token, ms)) != FIDO_OK) {
+		fido_log_debug("%s: fido_dev_get_uv_token", __func__);
+		goto fail;
+	}
+
+	r = FIDO_OK;
+fail:
+	es256_pk_free(&pk);
+	fido_blob_free(&ecdh);
+
+	return (r);
+}
+
+static int
+credman_set_rk_token(fido_dev_t *dev, fido_cred_t *cred,
+    const fido_blob_t *token, int *ms)
+{
+	int r;
+
+	if ((r = credman_tx(dev, CMD_UPDATE_CRED, cred, NULL, NULL,
+	    FIDO_OPT_TRUE, token, ms)) != FIDO_OK ||
+	    (r = fido_rx_cbor_status(dev, ms)) != FIDO_OK)
+		return (r);
+
+	return (FIDO_OK);
+}
+
+/*
+ * Apply every update in 'batch' under one pinUvAuthToken, instead of an
+ * ECDH exchange and a token per credential. A token rejected halfway (CTAP
+ * 2.1 authenticators limit how long one may be used) is replaced once per
+ * update. An update the authenticator refuses does not stop the others; a
+ * transport error does, and the updates not attempted carry it.
+ */
+int
+fido_credman_set_dev_rk_batch(fido_dev_t *dev, fido_credman_batch_t *batch,
+    const char *pin)
+{
+	fido_blob_t	*token = NULL;
+	int		 ms = dev->timeout_ms;
+	int		 r, first = FIDO_OK;
+	size_t		 i = 0;
+
+	if (batch == NULL || batch->len == 0) {
+		fido_log_debug("%s: empty batch", __func__);
+		return (FIDO_ERR_INVALID_ARGUMENT);
+	}
+	if ((token = fido_blob_new()) == NULL) {
+		r = FIDO_ERR_INTERNAL;
+		goto fail;
+	}
+	if ((r = credman_get_token(dev, pin, token, &ms)) != FIDO_OK) {
+		fido_log_debug("%s: credman_get_token", __func__);
+		goto fail;
+	}
+	for (; i < batch->len; i++) {
+		r = credman_set_rk_token(dev, &batch->cred[i], token, &ms);
+		if (r == FIDO_ERR_PIN_AUTH_INVALID) {
+			fido_log_debug("%s: renewing token at %zu", __func__,
+			    i);
+			if ((r = credman_get_token(dev, pin, token,
+			    &ms)) != FIDO_OK)
+				goto fail;
+			r = credman_set_rk_token(dev, &batch->cred[i], token,
+			    &ms);
+		}
+		batch->status[i] = r;
+		if (r != FIDO_OK && first == FIDO_OK)
+			first = r;
+		if (r == FIDO_ERR_TX || r == FIDO_ERR_RX) {
+			fido_log_debug("%s: update %zu", __func__, i);
+			i++;
+			goto fail;
+		}
+	}
+
+	r = first;
+fail:
+	for (; i < batch->len; i++)
+		batch->status[i] = r;
+	fido_blob_free(&token);
+
+	return (first != FIDO_OK ? first : r);
+}
+
+fido_credman_batch_t *
+fido_credman_batch_new(void)
+{
+	return (calloc(1, sizeof(fido_credman_batch_t)));
+}
+
+void
+fido_credman_batch_free(fido_credman_batch_t **batch_p)
+{
+	fido_credman_batch_t *batch;
+
+	if (batch_p == NULL || (batch = *batch_p) == NULL)
+		return;
+	for (size_t i = 0; i < batch->len; i++) {
+		fido_cred_reset_tx(&batch->cred[i]);
+		fido_cred_reset_rx(&batch->cred[i]);
+	}
+	free(batch->cred);
+	free(batch->status);
+	free(batch);
+	*batch_p = NULL;
+}
+
+int
+fido_credman_batch_set_user(fido_credman_batch_t *batch,
+    const unsigned char *cred_id, size_t cred_id_len,
+    const unsigned char *user_id, size_t user_id_len, const char *name,
+    const char *display_name)
+{
+	fido_cred_t	*cred;
+	int		*status;
+	int		 r;
+
+	if (batch == NULL || cred_id == NULL || user_id == NULL ||
+	    batch->len == SIZE_MAX) {
+		fido_log_debug("%s: invalid argument", __func__);
+		return (FIDO_ERR_INVALID_ARGUMENT);
+	}
+	if ((cred = recallocarray(batch->cred, batch->len, batch->len + 1,
+	    sizeof(*cred))) == NULL) {
+		fido_log_debug("%s: recallocarray", __func__);
+		return (FIDO_ERR_INTERNAL);
+	}
+	batch->cred = cred;
+	if ((status = recallocarray(batch->status, batch->len, batch->len + 1,
+	    sizeof(*status))) == NULL) {
+		fido_log_debug("%s: recallocarray", __func__);
+		return (FIDO_ERR_INTERNAL);
+	}
+	batch->status = status;
+	cred = &batch->cred[batch->len];
+	if ((r = fido_cred_set_id(cred, cred_id, cred_id_len)) != FIDO_OK ||
+	    (r = fido_cred_set_user(cred, user_id, user_id_len, name,
+	    display_name, NULL)) != FIDO_OK) {
+		fido_log_debug("%s: fido_cred_set", __func__);
+		fido_cred_reset_tx(cred);
+		fido_cred_reset_rx(cred);
+		return (r);
+	}
+	batch->status[batch->len++] = FIDO_ERR_INTERNAL;
+
+	return (FIDO_OK);
+}
+
+size_t
+fido_credman_batch_count(const fido_credman_batch_t *batch)
+{
+	return (batch->len);
+}
+
+int
+fido_credman_batch_status(const fido_credman_batch_t *batch, size_t idx)
+{
+	if (idx >= batch->len)
+		return (FIDO_ERR_INVALID_ARGUMENT);
+
+	return (batch->status[idx]);
+}
+
 fido_credman_rk_t *
 fido_credman_rk_new(void)
 {
@@ -123,6 +123,12 @@ fido_dev_open_tx(fido_dev_t *dev, const char *path, int *ms)
 		return (FIDO_ERR_INTERNAL);
 	}
 
+	if (fido_trace_open(dev) < 0) {
+		fido_log_debug("%s: fido_trace_open", __func__);
+		r = FIDO_ERR_INTERNAL;
+		goto fail;
+	}
+
 	if (dev->io_own) {
 		dev->rx_len = CTAP_MAX_REPORT_LEN;
 		dev->tx_len = CTAP_MAX_REPORT_LEN;
@@ -158,6 +164,7 @@ fido_dev_open_tx(fido_dev_t *dev, const char *path, int *ms)
 
 	return (FIDO_OK);
 fail:
+	fido_trace_close(dev);
 	dev->io.close(dev->io_handle);
 	dev->io_handle = NULL;
 
@@ -211,8 +218,13 @@ fido_dev_open_rx(fido_dev_t *dev, int *ms)
 		}
 	}
 
+	memset(dev->lb_aaguid, 0, sizeof(dev->lb_aaguid));
 	if (fido_dev_is_fido2(dev) && info != NULL) {
 		dev->maxmsgsize = fido_cbor_info_maxmsgsiz(info);
+		dev->lb_max = fido_cbor_info_maxlargeblob(info);
+		if (fido_cbor_info_aaguid_len(info) == sizeof(dev->lb_aaguid))
+			memcpy(dev->lb_aaguid, fido_cbor_info_aaguid_ptr(info),
+			    sizeof(dev->lb_aaguid));
 		fido_log_debug("%s: FIDO_MAXMSG=%d, maxmsgsiz=%lu", __func__,
 		    FIDO_MAXMSG, (unsigned long)dev->maxmsgsize);
 	}
@@ -222,6 +234,7 @@ fail:
 	fido_cbor_info_free(&info);
 
 	if (r != FIDO_OK) {
+		fido_trace_close(dev);
 		dev->io.close(dev->io_handle);
 		dev->io_handle = NULL;
 	}
@@ -242,6 +255,8 @@ fido_dev_open_wait(fido_dev_t *dev, const char *path, int *ms)
 	    (r = fido_dev_open_rx(dev, ms)) != FIDO_OK)
 		return (r);
 
+	fido_largeblob_cache_bind(dev, path);
+
 	return (FIDO_OK);
 }
 
@@ -324,6 +339,7 @@ fido_dev_close(fido_dev_t *dev)
 	if (dev->io_handle == NULL || dev->io.close == NULL)
 		return (FIDO_ERR_INVALID_ARGUMENT);
 
+	fido_trace_close(dev);
 	dev->io.close(dev->io_handle);
 	dev->io_handle = NULL;
 	dev->cid = CTAP_CID_BROADCAST;
@@ -424,6 +440,7 @@ fido_dev_new(void)
 
 	dev->cid = CTAP_CID_BROADCAST;
 	dev->timeout_ms = -1;
+	dev->lb_level = FIDO_LARGEBLOB_DEFAULT;
 	dev->io = (fido_dev_io_t) {
 		&fido_hid_open,
 		&fido_hid_close,
@@ -456,6 +473,7 @@ fido_dev_new_with_info(const fido_dev_info_t *di)
 	dev->transport = di->transport;
 	dev->cid = CTAP_CID_BROADCAST;
 	dev->timeout_ms = -1;
+	dev->lb_level = FIDO_LARGEBLOB_DEFAULT;
 
 	if ((dev->path = strdup(di->path)) == NULL) {
 		fido_log_debug("%s: strdup", __func__);
@@ -474,6 +492,11 @@ fido_dev_free(fido_dev_t **dev_p)
 	if (dev_p == NULL || (dev = *dev_p) == NULL)
 		return;
 
+	fido_trace_close(dev);
+	free(dev->trace_path);
+	fido_blob_free(&dev->lb_cache);
+	free(dev->lb_cache_path);
+	free(dev->lb_cache_dir);
 	free(dev->path);
 	free(dev);
 
@@ -604,3 +627,22 @@ fido_dev_set_timeout(fido_dev_t *dev, int ms)
 
 	return (FIDO_OK);
 }
+
+int
+fido_dev_set_retry_policy(fido_dev_t *dev, int retries, int backoff_ms)
+{
+	if (retries < 0 || retries > 16 || backoff_ms < 1 ||
+	    backoff_ms > 10000)
+		return (FIDO_ERR_INVALID_ARGUMENT);
+
+	dev->retry_max = retries;
+	dev->retry_ms = backoff_ms;
+
+	return (FIDO_OK);
+}
+
+uint64_t
+fido_dev_io_retries(const fido_dev_t *dev)
+{
+	return (dev->retry_cnt);
+}
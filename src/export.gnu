@@ -141,6 +141,11 @@
 		fido_cred_id_ptr;
 		fido_cred_aaguid_len;
 		fido_cred_aaguid_ptr;
+		fido_credman_batch_count;
+		fido_credman_batch_free;
+		fido_credman_batch_new;
+		fido_credman_batch_set_user;
+		fido_credman_batch_status;
 		fido_credman_del_dev_rk;
 		fido_credman_get_dev_metadata;
 		fido_credman_get_dev_rk;
@@ -161,6 +166,7 @@
 		fido_credman_rp_name;
 		fido_credman_rp_new;
 		fido_credman_set_dev_rk;
+		fido_credman_set_dev_rk_batch;
 		fido_cred_new;
 		fido_cred_pin_minlen;
 		fido_cred_prot;
@@ -229,6 +235,7 @@
 		fido_dev_info_set;
 		fido_dev_info_vendor;
 		fido_dev_io_handle;
+		fido_dev_io_retries;
 		fido_dev_is_fido2;
 		fido_dev_is_winhello;
 		fido_dev_major;
@@ -241,11 +248,17 @@
 		fido_dev_protocol;
 		fido_dev_reset;
 		fido_dev_set_io_functions;
+		fido_dev_set_largeblob_cache;
+		fido_dev_set_largeblob_level;
+		fido_dev_set_largeblob_progress;
 		fido_dev_set_pin;
 		fido_dev_set_pin_minlen;
 		fido_dev_set_pin_minlen_rpid;
+		fido_dev_set_replay;
+		fido_dev_set_retry_policy;
 		fido_dev_set_sigmask;
 		fido_dev_set_timeout;
+		fido_dev_set_trace;
 		fido_dev_set_transport_functions;
 		fido_dev_supports_cred_prot;
 		fido_dev_supports_credman;
@@ -253,12 +266,21 @@
 		fido_dev_supports_pin;
 		fido_dev_supports_uv;
 		fido_dev_toggle_always_uv;
+		fido_dev_largeblob_cache_hits;
+		fido_dev_largeblob_cache_misses;
+		fido_dev_largeblob_commit;
 		fido_dev_largeblob_get;
 		fido_dev_largeblob_get_array;
 		fido_dev_largeblob_remove;
 		fido_dev_largeblob_set;
 		fido_dev_largeblob_set_array;
 		fido_init;
+		fido_largeblob_batch_count;
+		fido_largeblob_batch_failed;
+		fido_largeblob_batch_free;
+		fido_largeblob_batch_new;
+		fido_largeblob_batch_remove;
+		fido_largeblob_batch_set;
 		fido_set_log_handler;
 		fido_strerr;
 		rs256_pk_free;
@@ -98,6 +98,7 @@ int cbor_array_drop(cbor_item_t **, size_t);
 
 /* deflate */
 int fido_compress(fido_blob_t *, const fido_blob_t *);
+int fido_compress_level(fido_blob_t *, const fido_blob_t *, int);
 int fido_uncompress(fido_blob_t *, const fido_blob_t *, size_t);
 
 #ifndef nitems
@@ -156,6 +157,15 @@ int fido_winhello_make_cred(fido_dev_t *, fido_cred_t *, const char *, int);
 int fido_rx_cbor_status(fido_dev_t *, int *);
 int fido_rx(fido_dev_t *, uint8_t, void *, size_t, int *);
 int fido_tx(fido_dev_t *, uint8_t, const void *, size_t, int *);
+int fido_io_retry(fido_dev_t *, int, bool, int *, int *);
+
+/* large-blob array cache */
+void fido_largeblob_cache_bind(fido_dev_t *, const char *);
+
+/* trace */
+int fido_trace_open(fido_dev_t *);
+void fido_trace_close(fido_dev_t *);
+void fido_trace_frame(fido_dev_t *, int, const void *, size_t);
 
 /* log */
 #ifdef FIDO_NO_DIAGNOSTIC
@@ -218,6 +228,7 @@ int fido_get_random(void *, size_t);
 int fido_sha256(fido_blob_t *, const u_char *, size_t);
 int fido_time_now(struct timespec *);
 int fido_time_delta(const struct timespec *, int *);
+int fido_time_sleep(int);
 int fido_to_uint64(const char *, int, uint64_t *);
 
 /* crypto */
@@ -197,6 +197,9 @@ int fido_dev_set_io_functions(fido_dev_t *, const fido_dev_io_t *);
 int fido_dev_set_pin(fido_dev_t *, const char *, const char *);
 int fido_dev_set_transport_functions(fido_dev_t *, const fido_dev_transport_t *);
 int fido_dev_set_timeout(fido_dev_t *, int);
+int fido_dev_set_retry_policy(fido_dev_t *, int, int);
+int fido_dev_set_trace(fido_dev_t *, const char *);
+int fido_dev_set_replay(fido_dev_t *, int);
 
 size_t fido_assert_authdata_len(const fido_assert_t *, size_t);
 size_t fido_assert_authdata_raw_len(const fido_assert_t *, size_t);
@@ -252,6 +255,7 @@ uint64_t fido_cbor_info_maxrpid_minpinlen(const fido_cbor_info_t *);
 uint64_t fido_cbor_info_minpinlen(const fido_cbor_info_t *);
 uint64_t fido_cbor_info_uv_attempts(const fido_cbor_info_t *);
 uint64_t fido_cbor_info_uv_modality(const fido_cbor_info_t *);
+uint64_t fido_dev_io_retries(const fido_dev_t *);
 int64_t  fido_cbor_info_rk_remaining(const fido_cbor_info_t *);
 
 bool fido_dev_has_pin(const fido_dev_t *);
@@ -275,6 +279,23 @@ int fido_dev_largeblob_get_array(fido_dev_t *, unsigned char **, size_t *);
 int fido_dev_largeblob_set_array(fido_dev_t *, const unsigned char *, size_t,
     const char *);
 
+fido_largeblob_batch_t *fido_largeblob_batch_new(void);
+void fido_largeblob_batch_free(fido_largeblob_batch_t **);
+int fido_largeblob_batch_set(fido_largeblob_batch_t *, const unsigned char *,
+    size_t, const unsigned char *, size_t);
+int fido_largeblob_batch_remove(fido_largeblob_batch_t *,
+    const unsigned char *, size_t);
+size_t fido_largeblob_batch_count(const fido_largeblob_batch_t *);
+size_t fido_largeblob_batch_failed(const fido_largeblob_batch_t *);
+int fido_dev_largeblob_commit(fido_dev_t *, fido_largeblob_batch_t *,
+    const char *);
+int fido_dev_set_largeblob_cache(fido_dev_t *, const char *);
+uint64_t fido_dev_largeblob_cache_hits(const fido_dev_t *);
+uint64_t fido_dev_largeblob_cache_misses(const fido_dev_t *);
+int fido_dev_set_largeblob_level(fido_dev_t *, int);
+int fido_dev_set_largeblob_progress(fido_dev_t *, fido_largeblob_progress_t *,
+    void *);
+
 #ifdef __cplusplus
 } /* extern "C" */
 #endif /* __cplusplus */
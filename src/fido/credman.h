@@ -69,8 +69,15 @@ struct fido_credman_rk {
 	size_t n_alloc; /* number of allocated entries */
 	size_t n_rx;    /* number of populated entries */
 };
+
+struct fido_credman_batch {
+	fido_cred_t *cred; /* updates, in order */
+	int *status;       /* outcome of each update */
+	size_t len;        /* number of updates */
+};
 #endif
 
+typedef struct fido_credman_batch fido_credman_batch_t;
 typedef struct fido_credman_metadata fido_credman_metadata_t;
 typedef struct fido_credman_rk fido_credman_rk_t;
 typedef struct fido_credman_rp fido_credman_rp_t;
@@ -82,10 +89,14 @@ const fido_cred_t *fido_credman_rk(const fido_credman_rk_t *, size_t);
 const unsigned char *fido_credman_rp_id_hash_ptr(const fido_credman_rp_t *,
     size_t);
 
+fido_credman_batch_t *fido_credman_batch_new(void);
 fido_credman_metadata_t *fido_credman_metadata_new(void);
 fido_credman_rk_t *fido_credman_rk_new(void);
 fido_credman_rp_t *fido_credman_rp_new(void);
 
+int fido_credman_batch_set_user(fido_credman_batch_t *, const unsigned char *,
+    size_t, const unsigned char *, size_t, const char *, const char *);
+int fido_credman_batch_status(const fido_credman_batch_t *, size_t);
 int fido_credman_del_dev_rk(fido_dev_t *, const unsigned char *, size_t,
     const char *);
 int fido_credman_get_dev_metadata(fido_dev_t *, fido_credman_metadata_t *,
@@ -94,7 +105,10 @@ int fido_credman_get_dev_rk(fido_dev_t *, const char *, fido_credman_rk_t *,
     const char *);
 int fido_credman_get_dev_rp(fido_dev_t *, fido_credman_rp_t *, const char *);
 int fido_credman_set_dev_rk(fido_dev_t *, fido_cred_t *, const char *);
+int fido_credman_set_dev_rk_batch(fido_dev_t *, fido_credman_batch_t *,
+    const char *);
 
+size_t fido_credman_batch_count(const fido_credman_batch_t *);
 size_t fido_credman_rk_count(const fido_credman_rk_t *);
 size_t fido_credman_rp_count(const fido_credman_rp_t *);
 size_t fido_credman_rp_id_hash_len(const fido_credman_rp_t *, size_t);
@@ -102,6 +116,7 @@ size_t fido_credman_rp_id_hash_len(const fido_credman_rp_t *, size_t);
 uint64_t fido_credman_rk_existing(const fido_credman_metadata_t *);
 uint64_t fido_credman_rk_remaining(const fido_credman_metadata_t *);
 
+void fido_credman_batch_free(fido_credman_batch_t **);
 void fido_credman_metadata_free(fido_credman_metadata_t **);
 void fido_credman_rk_free(fido_credman_rk_t **);
 void fido_credman_rp_free(fido_credman_rp_t **);
@@ -44,6 +44,7 @@
 #define CTAP_CMD_CBOR			0x10
 #define CTAP_CMD_CANCEL			0x11
 #define CTAP_KEEPALIVE			0x3b
+#define CTAP_CMD_ERROR			0x3f
 #define CTAP_FRAME_INIT			0x80
 
 /* CTAPHID CBOR command opcodes. */
@@ -136,6 +137,17 @@
 #define FIDO_CRED_PROT_UV_OPTIONAL_WITH_ID	0x02
 #define FIDO_CRED_PROT_UV_REQUIRED		0x03
 
+/* fido_dev_set_replay() flags. */
+#define FIDO_REPLAY_REALTIME	0x01 /* delay reads as recorded */
+
+/* fido_dev_set_largeblob_level() levels, besides zlib's 0 to 9. */
+#define FIDO_LARGEBLOB_DEFAULT	-1 /* zlib's default */
+#define FIDO_LARGEBLOB_FIT	-2 /* fastest level that fits the array */
+
+/* fido_largeblob_progress_t operations. */
+#define FIDO_LARGEBLOB_READ	0x01
+#define FIDO_LARGEBLOB_WRITE	0x02
+
 #ifdef _FIDO_INTERNAL
 #define FIDO_EXT_ASSERT_MASK	(FIDO_EXT_HMAC_SECRET|FIDO_EXT_LARGEBLOB_KEY| \
 				 FIDO_EXT_CRED_BLOB)
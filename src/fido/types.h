@@ -69,6 +69,7 @@ typedef enum {
 } fido_opt_t;
 
 typedef void fido_log_handler_t(const char *);
+typedef void fido_largeblob_progress_t(void *, int, size_t, size_t);
 
 #undef  _FIDO_SIGSET_DEFINED
 #define _FIDO_SIGSET_DEFINED
@@ -301,6 +302,17 @@ struct fido_ctap_info {
 	uint8_t  flags;    /* capabilities flags; see FIDO_CAP_* */
 })
 
+typedef struct fido_largeblob_edit {
+	fido_blob_t key;  /* largeBlobKey */
+	fido_blob_t body; /* blob to set; empty to remove */
+} fido_largeblob_edit_t;
+
+typedef struct fido_largeblob_batch {
+	fido_largeblob_edit_t *edit;   /* edits, in order */
+	size_t                 len;    /* number of edits */
+	size_t                 failed; /* edit that aborted the last commit */
+} fido_largeblob_batch_t;
+
 typedef struct fido_dev {
 	uint64_t              nonce;      /* issued nonce */
 	fido_ctap_info_t      attr;       /* device attributes */
@@ -315,6 +327,22 @@ typedef struct fido_dev {
 	fido_dev_transport_t  transport;  /* transport functions */
 	uint64_t	      maxmsgsize; /* max message size */
 	int		      timeout_ms; /* read timeout in ms */
+	int		      retry_max;  /* retries of idempotent commands */
+	int		      retry_ms;   /* initial retry backoff in ms */
+	uint64_t	      retry_cnt;  /* retries performed so far */
+	bool		      rx_busy;    /* last rx was ERR_CHANNEL_BUSY */
+	char		     *trace_path; /* where to record reports */
+	void		     *trace;      /* recording in progress */
+	fido_blob_t	     *lb_cache;   /* last verified largeBlobs array */
+	char		     *lb_cache_path; /* where lb_cache is kept */
+	char		     *lb_cache_dir; /* per-device lb_cache files */
+	uint8_t		      lb_aaguid[16]; /* names the lb_cache file */
+	uint64_t	      lb_hits;    /* reads served from lb_cache */
+	uint64_t	      lb_misses;  /* reads that fetched the array */
+	uint64_t	      lb_max;     /* maxLargeBlobArray, 0 if unknown */
+	int		      lb_level;   /* blob compression level */
+	fido_largeblob_progress_t *lb_progress; /* per fragment */
+	void		     *lb_progress_arg; /* passed to lb_progress */
 } fido_dev_t;
 
 #else
@@ -323,6 +351,7 @@ typedef struct fido_cbor_info fido_cbor_info_t;
 typedef struct fido_cred fido_cred_t;
 typedef struct fido_dev fido_dev_t;
 typedef struct fido_dev_info fido_dev_info_t;
+typedef struct fido_largeblob_batch fido_largeblob_batch_t;
 typedef struct es256_pk es256_pk_t;
 typedef struct es256_sk es256_sk_t;
 typedef struct es384_pk es384_pk_t;
@@ -408,8 +408,13 @@ int
 fido_dev_get_cbor_info(fido_dev_t *dev, fido_cbor_info_t *ci)
 {
 	int ms = dev->timeout_ms;
+	int r, n = 0;
 
-	return (fido_dev_get_cbor_info_wait(dev, ci, &ms));
+	do {
+		r = fido_dev_get_cbor_info_wait(dev, ci, &ms);
+	} while (r != FIDO_OK && fido_io_retry(dev, r, true, &n, &ms));
+
+	return (r);
 }
 
 /*
@@ -40,6 +40,8 @@ tx_pkt(fido_dev_t *d, const void *pkt, size_t len, int *ms)
 		return (-1);
 
 	n = d->io.write(d->io_handle, pkt, len);
+	if (n > 0)
+		fido_trace_frame(d, '>', pkt, (size_t)n);
 
 	if (fido_time_delta(&ts, ms) != 0)
 		return (-1);
@@ -192,12 +194,16 @@ rx_frame(fido_dev_t *d, struct frame *fp, int *ms)
 	    (unsigned char *)fp, d->rx_len, *ms)) < 0 || (size_t)n != d->rx_len)
 		return (-1);
 
+	fido_trace_frame(d, '<', fp, (size_t)n);
+
 	return (fido_time_delta(&ts, ms));
 }
 
 static int
 rx_preamble(fido_dev_t *d, uint8_t cmd, struct frame *fp, int *ms)
 {
+	d->rx_busy = false;
+
 	do {
 		if (rx_frame(d, fp, ms) < 0)
 			return (-1);
@@ -215,6 +221,14 @@ rx_preamble(fido_dev_t *d, uint8_t cmd, struct frame *fp, int *ms)
 	fp->body.init.cmd = (CTAP_FRAME_INIT | cmd);
 #endif
 
+	if (fp->cid == d->cid &&
+	    fp->body.init.cmd == (CTAP_FRAME_INIT | CTAP_CMD_ERROR) &&
+	    fp->body.init.data[0] == FIDO_ERR_CHANNEL_BUSY) {
+		fido_log_debug("%s: channel busy", __func__);
+		d->rx_busy = true;
+		return (-1);
+	}
+
 	if (fp->cid != d->cid || fp->body.init.cmd != (CTAP_FRAME_INIT | cmd)) {
 		fido_log_debug("%s: cid (0x%x, 0x%x), cmd (0x%02x, 0x%02x)",
 		    __func__, fp->cid, d->cid, fp->body.init.cmd, cmd);
@@ -354,3 +368,53 @@ out:
 
 	return (r);
 }
+
+/*
+ * Decide whether an idempotent command that failed with 'r' should be
+ * reissued, as configured by fido_dev_set_retry_policy(). An explicit busy
+ * indication (CTAPHID ERR_CHANNEL_BUSY, or CTAP1_ERR_CHANNEL_BUSY as status)
+ * is always retried; a lost request or response (FIDO_ERR_TX, FIDO_ERR_RX)
+ * only if 'lost_ok' is set by the caller, since a late reply to a
+ * multi-exchange command could be mistaken for the reply to the next one.
+ * Before returning 1, waits an exponentially growing, jittered backoff that
+ * is charged to '*ms'; a retry that would not fit in '*ms' is not attempted.
+ */
+int
+fido_io_retry(fido_dev_t *d, int r, bool lost_ok, int *attempt, int *ms)
+{
+	struct timespec ts;
+	uint32_t jitter;
+	int backoff;
+	bool busy = d->rx_busy;
+
+	d->rx_busy = false;
+
+	if (*attempt >= d->retry_max)
+		return (0);
+	if (r != FIDO_ERR_CHANNEL_BUSY && !(busy && r == FIDO_ERR_RX) &&
+	    !(lost_ok && (r == FIDO_ERR_RX || r == FIDO_ERR_TX)))
+		return (0);
+
+	/* uniformly distributed in [backoff / 2, backoff * 3 / 2] */
+	backoff = d->retry_ms << MIN(*attempt, 10);
+	if (fido_get_random(&jitter, sizeof(jitter)) < 0)
+		jitter = 0;
+	backoff = backoff / 2 + (int)(jitter % ((uint32_t)backoff + 1));
+
+	if (*ms >= 0 && backoff >= *ms) {
+		fido_log_debug("%s: backoff=%d, ms=%d", __func__, backoff, *ms);
+		return (0);
+	}
+
+	fido_log_debug("%s: r=0x%x, busy=%d, attempt=%d, backoff=%d", __func__,
+	    r, busy, *attempt, backoff);
+
+	if (fido_time_now(&ts) != 0 || fido_time_sleep(backoff) < 0 ||
+	    fido_time_delta(&ts, ms) != 0)
+		return (0);
+
+	(*attempt)++;
+	d->retry_cnt++;
+
+	return (1);
+}
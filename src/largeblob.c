@@ -7,12 +7,18 @@
 
 #include <openssl/sha.h>
 
+#include <sys/stat.h>
+
+#include <errno.h>
+#include <stdio.h>
+
 #include "fido.h"
 #include "fido/es256.h"
 
 #define LARGEBLOB_DIGEST_LENGTH	16
 #define LARGEBLOB_NONCE_LENGTH	12
 #define LARGEBLOB_TAG_LENGTH	16
+#define LARGEBLOB_CACHE_MAX	(16UL * 1024UL * 1024UL)
 
 typedef struct largeblob {
 	size_t origsiz;
@@ -116,7 +122,7 @@ fail:
 
 static int
 largeblob_seal(largeblob_t *blob, const fido_blob_t *body,
-    const fido_blob_t *key)
+    const fido_blob_t *key, int level)
 {
 	fido_blob_t *plaintext = NULL, *aad = NULL;
 	int ok = -1;
@@ -126,8 +132,8 @@ largeblob_seal(largeblob_t *blob, const fido_blob_t *body,
 		fido_log_debug("%s: fido_blob_new", __func__);
 		goto fail;
 	}
-	if (fido_compress(plaintext, body) != FIDO_OK) {
-		fido_log_debug("%s: fido_compress", __func__);
+	if (fido_compress_level(plaintext, body, level) != FIDO_OK) {
+		fido_log_debug("%s: fido_compress_level", __func__);
 		goto fail;
 	}
 	if (largeblob_aad(aad, body->len) < 0) {
@@ -329,14 +335,14 @@ largeblob_decode(largeblob_t *blob, const cbor_item_t *item)
 }
 
 static cbor_item_t *
-largeblob_encode(const fido_blob_t *body, const fido_blob_t *key)
+largeblob_encode(const fido_blob_t *body, const fido_blob_t *key, int level)
 {
 	largeblob_t *blob;
 	cbor_item_t *argv[3], *item = NULL;
 
 	memset(argv, 0, sizeof(argv));
 	if ((blob = largeblob_new()) == NULL ||
-	    largeblob_seal(blob, body, key) < 0) {
+	    largeblob_seal(blob, body, key, level) < 0) {
 		fido_log_debug("%s: largeblob_seal", __func__);
 		goto fail;
 	}
@@ -430,6 +436,183 @@ largeblob_array_check(const fido_blob_t *array)
 	    sizeof(expected_hash));
 }
 
+/*
+ * The on-host cache of the array. Whatever its origin, the cached copy is
+ * only used once the authenticator has been seen to hold an array of the
+ * same length ending in the same digest, which covers everything before
+ * it: the digest is fetched by asking for one byte more than it holds,
+ * starting where it begins in the cached copy. That takes one round trip
+ * instead of one per get_chunklen() bytes.
+ */
+static void
+largeblob_cache_save(const fido_dev_t *dev)
+{
+	FILE *f;
+
+	if (dev->lb_cache_path == NULL)
+		return;
+	if ((f = fopen(dev->lb_cache_path, "wb")) == NULL) {
+		fido_log_error(errno, "%s: fopen %s", __func__,
+		    dev->lb_cache_path);
+		return;
+	}
+	/* a short write fails the digest check when loaded */
+	if (fwrite(dev->lb_cache->ptr, 1, dev->lb_cache->len,
+	    f) != dev->lb_cache->len)
+		fido_log_debug("%s: fwrite", __func__);
+	if (fclose(f) != 0)
+		fido_log_error(errno, "%s: fclose", __func__);
+}
+
+static void
+largeblob_cache_load(fido_dev_t *dev)
+{
+	unsigned char buf[4096];
+	FILE *f;
+	size_t n;
+
+	if ((f = fopen(dev->lb_cache_path, "rb")) == NULL) {
+		fido_log_debug("%s: fopen %s", __func__, dev->lb_cache_path);
+		return;
+	}
+	while ((n = fread(buf, 1, sizeof(buf), f)) > 0)
+		if (dev->lb_cache->len > LARGEBLOB_CACHE_MAX - n ||
+		    fido_blob_append(dev->lb_cache, buf, n) < 0) {
+			fido_log_debug("%s: fido_blob_append", __func__);
+			break;
+		}
+	if (ferror(f) || !feof(f) ||
+	    largeblob_array_check(dev->lb_cache) != 0) {
+		fido_log_debug("%s: invalid %s", __func__, dev->lb_cache_path);
+		fido_blob_reset(dev->lb_cache);
+	}
+	fclose(f);
+	explicit_bzero(buf, sizeof(buf));
+}
+
+/*
+ * With a cache directory, each authenticator has its own file there,
+ * named after its AAGUID and a digest of the path it was opened on, so
+ * that keys used in turn do not overwrite each other's copy.
+ */
+void
+fido_largeblob_cache_bind(fido_dev_t *dev, const char *path)
+{
+	unsigned char dgst[SHA256_DIGEST_LENGTH];
+	char name[2 * sizeof(dev->lb_aaguid) + 1 + 2 * 8 + 1];
+	char *p;
+	size_t i, len;
+
+	if (dev->lb_cache == NULL || dev->lb_cache_dir == NULL)
+		return;
+	if (SHA256((const u_char *)path, strlen(path), dgst) != dgst) {
+		fido_log_debug("%s: SHA256", __func__);
+		return;
+	}
+	for (i = 0; i < sizeof(dev->lb_aaguid); i++)
+		snprintf(&name[2 * i], 3, "%02x", dev->lb_aaguid[i]);
+	name[2 * i] = '-';
+	for (i = 0; i < 8; i++)
+		snprintf(&name[2 * sizeof(dev->lb_aaguid) + 1 + 2 * i], 3,
+		    "%02x", dgst[i]);
+	len = strlen(dev->lb_cache_dir) + 1 + strlen(name) + 1;
+	if ((p = malloc(len)) == NULL) {
+		fido_log_debug("%s: malloc", __func__);
+		return;
+	}
+	snprintf(p, len, "%s/%s", dev->lb_cache_dir, name);
+	if (dev->lb_cache_path != NULL && strcmp(p, dev->lb_cache_path) == 0) {
+		free(p);
+		return;
+	}
+	free(dev->lb_cache_path);
+	dev->lb_cache_path = p;
+	fido_blob_reset(dev->lb_cache);
+	largeblob_cache_load(dev);
+}
+
+static void
+largeblob_cache_store(fido_dev_t *dev, const u_char *ptr, size_t len,
+    const u_char *dgst)
+{
+	if (dev->lb_cache == NULL)
+		return;
+	if (len > LARGEBLOB_CACHE_MAX - LARGEBLOB_DIGEST_LENGTH ||
+	    fido_blob_set(dev->lb_cache, ptr, len) < 0 ||
+	    (dgst != NULL && fido_blob_append(dev->lb_cache, dgst,
+	    LARGEBLOB_DIGEST_LENGTH) < 0)) {
+		fido_log_debug("%s: fido_blob_set", __func__);
+		fido_blob_reset(dev->lb_cache);
+		return;
+	}
+	largeblob_cache_save(dev);
+}
+
+static int
+largeblob_cache_probe(fido_dev_t *dev, int *ms)
+{
+	const fido_blob_t *cache = dev->lb_cache;
+	fido_blob_t *chunk = NULL;
+	size_t offset;
+	int r;
+
+	offset = cache->len - LARGEBLOB_DIGEST_LENGTH;
+	if ((r = largeblob_get_tx(dev, offset, LARGEBLOB_DIGEST_LENGTH + 1,
+	    ms)) != FIDO_OK || (r = largeblob_get_rx(dev, &chunk,
+	    ms)) != FIDO_OK) {
+		fido_log_debug("%s: largeblob_get_wait", __func__);
+		goto fail;
+	}
+	if (chunk->len != LARGEBLOB_DIGEST_LENGTH ||
+	    timingsafe_bcmp(chunk->ptr, cache->ptr + offset,
+	    LARGEBLOB_DIGEST_LENGTH) != 0) {
+		fido_log_debug("%s: array changed", __func__);
+		r = FIDO_ERR_NOTFOUND;
+		goto fail;
+	}
+
+	r = FIDO_OK;
+fail:
+	fido_blob_free(&chunk);
+
+	return r;
+}
+
+static int
+largeblob_get_cached(fido_dev_t *dev, cbor_item_t **item, int *ms)
+{
+	int r;
+
+	if (dev->lb_cache == NULL)
+		return FIDO_ERR_NOTFOUND;
+	if (dev->lb_cache->len > LARGEBLOB_DIGEST_LENGTH) {
+		switch (r = largeblob_cache_probe(dev, ms)) {
+		case FIDO_OK:
+			if ((*item = largeblob_array_load(dev->lb_cache->ptr,
+			    dev->lb_cache->len)) == NULL)
+				break;
+			dev->lb_hits++;
+			return FIDO_OK;
+		case FIDO_ERR_TX:
+		case FIDO_ERR_RX:
+			return r;
+		default:
+			/* an offset past the array is invalid */
+			break;
+		}
+	}
+	dev->lb_misses++;
+
+	return FIDO_ERR_NOTFOUND;
+}
+
+static void
+largeblob_progress(const fido_dev_t *dev, int op, size_t done, size_t total)
+{
+	if (dev->lb_progress != NULL)
+		dev->lb_progress(dev->lb_progress_arg, op, done, total);
+}
+
 static int
 largeblob_get_array(fido_dev_t *dev, cbor_item_t **item, int *ms)
 {
@@ -440,6 +623,8 @@ largeblob_get_array(fido_dev_t *dev, cbor_item_t **item, int *ms)
 	*item = NULL;
 	if ((n = get_chunklen(dev)) == 0)
 		return FIDO_ERR_INVALID_ARGUMENT;
+	if ((r = largeblob_get_cached(dev, item, ms)) != FIDO_ERR_NOTFOUND)
+		return r;
 	if ((array = fido_blob_new()) == NULL)
 		return FIDO_ERR_INTERNAL;
 	do {
@@ -455,12 +640,16 @@ largeblob_get_array(fido_dev_t *dev, cbor_item_t **item, int *ms)
 			r = FIDO_ERR_INTERNAL;
 			goto fail;
 		}
+		/* the array's length is only known once it ends */
+		largeblob_progress(dev, FIDO_LARGEBLOB_READ, array->len,
+		    chunk->len == n ? 0 : array->len);
 	} while (chunk->len == n);
 
 	if (largeblob_array_check(array) != 0)
 		*item = cbor_new_definite_array(0); /* per spec */
-	else
-		*item = largeblob_array_load(array->ptr, array->len);
+	else if ((*item = largeblob_array_load(array->ptr,
+	    array->len)) != NULL)
+		largeblob_cache_store(dev, array->ptr, array->len, NULL);
 	if (*item == NULL)
 		r = FIDO_ERR_INTERNAL;
 	else
@@ -629,6 +818,8 @@ largeblob_set_array(fido_dev_t *dev, const cbor_item_t *item, const char *pin,
 			fido_log_debug("%s: body", __func__);
 			goto fail;
 		}
+		largeblob_progress(dev, FIDO_LARGEBLOB_WRITE,
+		    offset + chunklen, totalsize);
 	}
 	if ((r = largeblob_set_tx(dev, token, dgst, sizeof(dgst) - 16, cbor.len,
 	    totalsize, ms)) != FIDO_OK ||
@@ -636,6 +827,8 @@ largeblob_set_array(fido_dev_t *dev, const cbor_item_t *item, const char *pin,
 		fido_log_debug("%s: dgst", __func__);
 		goto fail;
 	}
+	largeblob_progress(dev, FIDO_LARGEBLOB_WRITE, totalsize, totalsize);
+	largeblob_cache_store(dev, cbor.ptr, cbor.len, dgst);
 
 	r = FIDO_OK;
 fail:
@@ -646,36 +839,134 @@ fail:
 }
 
 static int
-largeblob_add(fido_dev_t *dev, const fido_blob_t *key, cbor_item_t *item,
+largeblob_array_put(cbor_item_t **array, const fido_blob_t *key,
+    cbor_item_t *item)
+{
+	size_t idx;
+	int r;
+
+	switch (r = largeblob_array_lookup(NULL, &idx, *array, key)) {
+	case FIDO_OK:
+		if (!cbor_array_replace(*array, idx, item))
+			return FIDO_ERR_INTERNAL;
+		return FIDO_OK;
+	case FIDO_ERR_NOTFOUND:
+		if (cbor_array_append(array, item) < 0)
+			return FIDO_ERR_INTERNAL;
+		return FIDO_OK;
+	default:
+		fido_log_debug("%s: largeblob_array_lookup", __func__);
+		return r;
+	}
+}
+
+static int
+largeblob_array_del(cbor_item_t **array, const fido_blob_t *key)
+{
+	size_t idx;
+	int r;
+
+	if ((r = largeblob_array_lookup(NULL, &idx, *array, key)) != FIDO_OK) {
+		fido_log_debug("%s: largeblob_array_lookup", __func__);
+		return r;
+	}
+	if (cbor_array_drop(array, idx) < 0) {
+		fido_log_debug("%s: cbor_array_drop", __func__);
+		return FIDO_ERR_INTERNAL;
+	}
+
+	return FIDO_OK;
+}
+
+static int
+largeblob_array_fits(const fido_dev_t *dev, const cbor_item_t *array,
+    bool *fits)
+{
+	fido_blob_t cbor;
+
+	memset(&cbor, 0, sizeof(cbor));
+	if (fido_blob_serialise(&cbor, array) < 0) {
+		fido_log_debug("%s: fido_blob_serialise", __func__);
+		return FIDO_ERR_INTERNAL;
+	}
+	*fits = dev->lb_max >= LARGEBLOB_DIGEST_LENGTH &&
+	    cbor.len <= dev->lb_max - LARGEBLOB_DIGEST_LENGTH;
+	fido_blob_reset(&cbor);
+
+	return FIDO_OK;
+}
+
+/*
+ * Store body at the lowest compression level, i.e. the fastest to seal and
+ * to open, that keeps the array within maxLargeBlobArray.
+ */
+static int
+largeblob_put_fit(const fido_dev_t *dev, cbor_item_t **array,
+    const fido_blob_t *key, const fido_blob_t *body)
+{
+	cbor_item_t *item;
+	bool fits;
+	int r = FIDO_ERR_INTERNAL;
+
+	for (int level = 0; level <= 9; level++) {
+		/* a large body may only deflate within bounds when compressed */
+		if ((item = largeblob_encode(body, key, level)) == NULL) {
+			fido_log_debug("%s: largeblob_encode %d", __func__,
+			    level);
+			continue;
+		}
+		r = largeblob_array_put(array, key, item);
+		cbor_decref(&item);
+		if (r != FIDO_OK ||
+		    (r = largeblob_array_fits(dev, *array, &fits)) != FIDO_OK)
+			return r;
+		if (fits)
+			return FIDO_OK;
+		fido_log_debug("%s: level %d does not fit", __func__, level);
+		r = FIDO_ERR_LARGEBLOB_STORAGE_FULL;
+	}
+
+	return r;
+}
+
+static int
+largeblob_put(const fido_dev_t *dev, cbor_item_t **array,
+    const fido_blob_t *key, const fido_blob_t *body)
+{
+	cbor_item_t *item;
+	int level, r;
+
+	if ((level = dev->lb_level) == FIDO_LARGEBLOB_FIT) {
+		if (dev->lb_max != 0)
+			return largeblob_put_fit(dev, array, key, body);
+		fido_log_debug("%s: maxLargeBlobArray unknown", __func__);
+		level = FIDO_LARGEBLOB_DEFAULT;
+	}
+	if ((item = largeblob_encode(body, key, level)) == NULL) {
+		fido_log_debug("%s: largeblob_encode", __func__);
+		return FIDO_ERR_INTERNAL;
+	}
+	r = largeblob_array_put(array, key, item);
+	cbor_decref(&item);
+
+	return r;
+}
+
+static int
+largeblob_add(fido_dev_t *dev, const fido_blob_t *key, const fido_blob_t *body,
     const char *pin, int *ms)
 {
 	cbor_item_t *array = NULL;
-	size_t idx;
 	int r;
 
 	if ((r = largeblob_get_array(dev, &array, ms)) != FIDO_OK) {
 		fido_log_debug("%s: largeblob_get_array", __func__);
 		goto fail;
 	}
-
-	switch (r = largeblob_array_lookup(NULL, &idx, array, key)) {
-	case FIDO_OK:
-		if (!cbor_array_replace(array, idx, item)) {
-			r = FIDO_ERR_INTERNAL;
-			goto fail;
-		}
-		break;
-	case FIDO_ERR_NOTFOUND:
-		if (cbor_array_append(&array, item) < 0) {
-			r = FIDO_ERR_INTERNAL;
-			goto fail;
-		}
-		break;
-	default:
-		fido_log_debug("%s: largeblob_array_lookup", __func__);
+	if ((r = largeblob_put(dev, &array, key, body)) != FIDO_OK) {
+		fido_log_debug("%s: largeblob_put", __func__);
 		goto fail;
 	}
-
 	if ((r = largeblob_set_array(dev, array, pin, ms)) != FIDO_OK) {
 		fido_log_debug("%s: largeblob_set_array", __func__);
 		goto fail;
@@ -694,20 +985,14 @@ largeblob_drop(fido_dev_t *dev, const fido_blob_t *key, const char *pin,
     int *ms)
 {
 	cbor_item_t *array = NULL;
-	size_t idx;
 	int r;
 
 	if ((r = largeblob_get_array(dev, &array, ms)) != FIDO_OK) {
 		fido_log_debug("%s: largeblob_get_array", __func__);
 		goto fail;
 	}
-	if ((r = largeblob_array_lookup(NULL, &idx, array, key)) != FIDO_OK) {
-		fido_log_debug("%s: largeblob_array_lookup", __func__);
-		goto fail;
-	}
-	if (cbor_array_drop(&array, idx) < 0) {
-		fido_log_debug("%s: cbor_array_drop", __func__);
-		r = FIDO_ERR_INTERNAL;
+	if ((r = largeblob_array_del(&array, key)) != FIDO_OK) {
+		fido_log_debug("%s: largeblob_array_del", __func__);
 		goto fail;
 	}
 	if ((r = largeblob_set_array(dev, array, pin, ms)) != FIDO_OK) {
@@ -723,6 +1008,16 @@ fail:
 	return r;
 }
 
+static int
+largeblob_apply(const fido_dev_t *dev, cbor_item_t **array,
+    const fido_largeblob_edit_t *edit)
+{
+	if (fido_blob_is_empty(&edit->body))
+		return largeblob_array_del(array, &edit->key);
+
+	return largeblob_put(dev, array, &edit->key, &edit->body);
+}
+
 int
 fido_dev_largeblob_get(fido_dev_t *dev, const unsigned char *key_ptr,
     size_t key_len, unsigned char **blob_ptr, size_t *blob_len)
@@ -774,7 +1069,6 @@ fido_dev_largeblob_set(fido_dev_t *dev, const unsigned char *key_ptr,
     size_t key_len, const unsigned char *blob_ptr, size_t blob_len,
     const char *pin)
 {
-	cbor_item_t *item = NULL;
 	fido_blob_t key, body;
 	int ms = dev->timeout_ms;
 	int r;
@@ -797,17 +1091,9 @@ fido_dev_largeblob_set(fido_dev_t *dev, const unsigned char *key_ptr,
 		r = FIDO_ERR_INTERNAL;
 		goto fail;
 	}
-	if ((item = largeblob_encode(&body, &key)) == NULL) {
-		fido_log_debug("%s: largeblob_encode", __func__);
-		r = FIDO_ERR_INTERNAL;
-		goto fail;
-	}
-	if ((r = largeblob_add(dev, &key, item, pin, &ms)) != FIDO_OK)
+	if ((r = largeblob_add(dev, &key, &body, pin, &ms)) != FIDO_OK)
 		fido_log_debug("%s: largeblob_add", __func__);
 fail:
-	if (item != NULL)
-		cbor_decref(&item);
-
 	fido_blob_reset(&key);
 	fido_blob_reset(&body);
 
@@ -900,3 +1186,200 @@ fido_dev_largeblob_set_array(fido_dev_t *dev, const unsigned char *cbor_ptr,
 
 	return r;
 }
+
+fido_largeblob_batch_t *
+fido_largeblob_batch_new(void)
+{
+	return calloc(1, sizeof(fido_largeblob_batch_t));
+}
+
+void
+fido_largeblob_batch_free(fido_largeblob_batch_t **batch_p)
+{
+	fido_largeblob_batch_t *batch;
+
+	if (batch_p == NULL || (batch = *batch_p) == NULL)
+		return;
+	for (size_t i = 0; i < batch->len; i++) {
+		fido_blob_reset(&batch->edit[i].key);
+		fido_blob_reset(&batch->edit[i].body);
+	}
+	free(batch->edit);
+	free(batch);
+	*batch_p = NULL;
+}
+
+static int
+largeblob_batch_push(fido_largeblob_batch_t *batch,
+    const unsigned char *key_ptr, size_t key_len,
+    const unsigned char *blob_ptr, size_t blob_len)
+{
+	fido_largeblob_edit_t *edit;
+
+	if (batch == NULL || key_len != 32) {
+		fido_log_debug("%s: invalid batch=%p, key_len=%zu", __func__,
+		    (void *)batch, key_len);
+		return FIDO_ERR_INVALID_ARGUMENT;
+	}
+	if (batch->len == SIZE_MAX) {
+		fido_log_debug("%s: len", __func__);
+		return FIDO_ERR_INVALID_ARGUMENT;
+	}
+	if ((edit = recallocarray(batch->edit, batch->len, batch->len + 1,
+	    sizeof(*edit))) == NULL) {
+		fido_log_debug("%s: recallocarray", __func__);
+		return FIDO_ERR_INTERNAL;
+	}
+	batch->edit = edit;
+	edit = &batch->edit[batch->len];
+	if (fido_blob_set(&edit->key, key_ptr, key_len) < 0 ||
+	    (blob_ptr != NULL &&
+	    fido_blob_set(&edit->body, blob_ptr, blob_len) < 0)) {
+		fido_log_debug("%s: fido_blob_set", __func__);
+		fido_blob_reset(&edit->key);
+		fido_blob_reset(&edit->body);
+		return FIDO_ERR_INTERNAL;
+	}
+	batch->len++;
+
+	return FIDO_OK;
+}
+
+int
+fido_largeblob_batch_set(fido_largeblob_batch_t *batch,
+    const unsigned char *key_ptr, size_t key_len,
+    const unsigned char *blob_ptr, size_t blob_len)
+{
+	if (blob_ptr == NULL || blob_len == 0) {
+		fido_log_debug("%s: invalid blob_ptr=%p, blob_len=%zu", __func__,
+		    (const void *)blob_ptr, blob_len);
+		return FIDO_ERR_INVALID_ARGUMENT;
+	}
+
+	return largeblob_batch_push(batch, key_ptr, key_len, blob_ptr,
+	    blob_len);
+}
+
+int
+fido_largeblob_batch_remove(fido_largeblob_batch_t *batch,
+    const unsigned char *key_ptr, size_t key_len)
+{
+	return largeblob_batch_push(batch, key_ptr, key_len, NULL, 0);
+}
+
+size_t
+fido_largeblob_batch_count(const fido_largeblob_batch_t *batch)
+{
+	return batch->len;
+}
+
+size_t
+fido_largeblob_batch_failed(const fido_largeblob_batch_t *batch)
+{
+	return batch->failed;
+}
+
+int
+fido_dev_largeblob_commit(fido_dev_t *dev, fido_largeblob_batch_t *batch,
+    const char *pin)
+{
+	cbor_item_t *array = NULL;
+	int ms = dev->timeout_ms;
+	int r;
+
+	if (batch == NULL || batch->len == 0) {
+		fido_log_debug("%s: empty batch", __func__);
+		return FIDO_ERR_INVALID_ARGUMENT;
+	}
+	batch->failed = batch->len;
+	if ((r = largeblob_get_array(dev, &array, &ms)) != FIDO_OK) {
+		fido_log_debug("%s: largeblob_get_array", __func__);
+		goto fail;
+	}
+	/* nothing is written unless every edit applies */
+	for (size_t i = 0; i < batch->len; i++) {
+		if ((r = largeblob_apply(dev, &array, &batch->edit[i])) != FIDO_OK) {
+			fido_log_debug("%s: largeblob_apply %zu", __func__, i);
+			batch->failed = i;
+			goto fail;
+		}
+	}
+	if ((r = largeblob_set_array(dev, array, pin, &ms)) != FIDO_OK) {
+		fido_log_debug("%s: largeblob_set_array", __func__);
+		goto fail;
+	}
+
+	r = FIDO_OK;
+fail:
+	if (array != NULL)
+		cbor_decref(&array);
+
+	return r;
+}
+
+int
+fido_dev_set_largeblob_cache(fido_dev_t *dev, const char *path)
+{
+	struct stat st;
+	char *p = NULL;
+	bool dir;
+
+	dir = path != NULL && stat(path, &st) == 0 &&
+	    (st.st_mode & S_IFMT) == S_IFDIR;
+	if (path != NULL && (p = strdup(path)) == NULL) {
+		fido_log_debug("%s: strdup", __func__);
+		return FIDO_ERR_INTERNAL;
+	}
+	if (dev->lb_cache == NULL &&
+	    (dev->lb_cache = fido_blob_new()) == NULL) {
+		fido_log_debug("%s: fido_blob_new", __func__);
+		free(p);
+		return FIDO_ERR_INTERNAL;
+	}
+	free(dev->lb_cache_path);
+	free(dev->lb_cache_dir);
+	dev->lb_cache_path = NULL;
+	dev->lb_cache_dir = NULL;
+	fido_blob_reset(dev->lb_cache);
+	if (dir)
+		dev->lb_cache_dir = p; /* bound to a file by fido_dev_open() */
+	else if ((dev->lb_cache_path = p) != NULL)
+		largeblob_cache_load(dev);
+
+	return FIDO_OK;
+}
+
+uint64_t
+fido_dev_largeblob_cache_hits(const fido_dev_t *dev)
+{
+	return dev->lb_hits;
+}
+
+uint64_t
+fido_dev_largeblob_cache_misses(const fido_dev_t *dev)
+{
+	return dev->lb_misses;
+}
+
+int
+fido_dev_set_largeblob_level(fido_dev_t *dev, int level)
+{
+	if (level != FIDO_LARGEBLOB_DEFAULT && level != FIDO_LARGEBLOB_FIT &&
+	    (level < 0 || level > 9)) {
+		fido_log_debug("%s: invalid level %d", __func__, level);
+		return FIDO_ERR_INVALID_ARGUMENT;
+	}
+	dev->lb_level = level;
+
+	return FIDO_OK;
+}
+
+int
+fido_dev_set_largeblob_progress(fido_dev_t *dev,
+    fido_largeblob_progress_t *progress, void *arg)
+{
+	dev->lb_progress = progress;
+	dev->lb_progress_arg = arg;
+
+	return FIDO_OK;
+}
@@ -5,6 +5,10 @@
  * SPDX-License-Identifier: BSD-2-Clause
  */
 
+#ifdef _WIN32
+#include <windows.h>
+#endif
+
 #include <errno.h>
 #include "fido.h"
 
@@ -73,3 +77,23 @@ fido_time_delta(const struct timespec *ts_start, int *ms_remain)
 
 	return 0;
 }
+
+int
+fido_time_sleep(int ms)
+{
+#ifdef _WIN32
+	Sleep((DWORD)ms);
+#else
+	struct timespec ts;
+
+	ts.tv_sec = ms / 1000;
+	ts.tv_nsec = (ms % 1000) * 1000000L;
+
+	while (nanosleep(&ts, &ts) == -1)
+		if (errno != EINTR) {
+			fido_log_error(errno, "%s: nanosleep", __func__);
+			return -1;
+		}
+#endif
+	return 0;
+}
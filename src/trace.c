@@ -0,0 +1,449 @@
+/*
+ * Copyright (c) 2026 Token2. All rights reserved.
+ * Use of this source code is governed by a BSD-style
+ * license that can be found in the LICENSE file.
+ * SPDX-License-Identifier: BSD-2-Clause
+ */
+
+#include <errno.h>
+#include <stdio.h>
+
+#include "fido.h"
+
+/*
+ * Recording and replay of the HID reports exchanged with an authenticator.
+ *
+ * fido_dev_set_trace() makes the next fido_dev_open() record every report
+ * passed to and from the device's io functions, with its timing, until the
+ * device is closed. fido_dev_set_replay() installs io functions that open
+ * such a trace instead of a device and play it back, either as fast as the
+ * library asks for reports or, with FIDO_REPLAY_REALTIME, delaying every
+ * read by the time the authenticator took to answer. A trace file is:
+ *
+ *   header  "FIDOTRC1"
+ *   event   direction ('>' to the device, '<' from it), report length
+ *           (uint16), microseconds since the previous event (uint32), then
+ *           the report; integers are little-endian. Written reports start
+ *           with the report ID byte, read ones do not, as in fido_dev_io_t.
+ *
+ * On replay, writes must follow the recorded sequence: same length, same
+ * CTAPHID command in initialisation packets. Their payload may differ,
+ * since PIN protocol key agreement is randomised; the recorded responses
+ * are returned regardless. The CTAPHID_INIT nonce, which the library
+ * checks, is copied from the INIT request into the replayed response.
+ */
+
+#define TRACE_MAGIC	"FIDOTRC1"
+#define TRACE_MAGIC_LEN	8
+#define TRACE_HDR_LEN	7
+#define TRACE_TX	'>'
+#define TRACE_RX	'<'
+
+/* offsets in a report read from the device; writes have one more byte */
+#define FRAME_CMD	4
+#define FRAME_NONCE	7
+#define NONCE_LEN	8
+
+struct trace_rec {
+	FILE		*f;
+	struct timespec	 last;
+};
+
+struct trace_event {
+	int		 dir;
+	size_t		 len;
+	uint32_t	 delta_us;
+	const unsigned char *ptr;
+};
+
+struct replay {
+	unsigned char		*buf;
+	struct trace_event	*ev;
+	size_t			 nev;
+	size_t			 pos;
+	bool			 realtime;
+	struct timespec		 last;
+	unsigned char		 nonce[NONCE_LEN];
+	bool			 have_nonce;
+};
+
+static uint32_t
+elapsed_us(const struct timespec *since, const struct timespec *now)
+{
+	struct timespec	d;
+	uint64_t	us;
+
+	if (timespeccmp(now, since, <))
+		return (0);
+
+	timespecsub(now, since, &d);
+	us = (uint64_t)d.tv_sec * 1000000ULL + (uint64_t)d.tv_nsec / 1000ULL;
+
+	return (us > UINT32_MAX ? UINT32_MAX : (uint32_t)us);
+}
+
+int
+fido_dev_set_trace(fido_dev_t *dev, const char *path)
+{
+	char *p = NULL;
+
+	if (dev->io_handle != NULL) {
+		fido_log_debug("%s: non-NULL handle", __func__);
+		return (FIDO_ERR_INVALID_ARGUMENT);
+	}
+
+	if (path != NULL && (p = strdup(path)) == NULL) {
+		fido_log_debug("%s: strdup", __func__);
+		return (FIDO_ERR_INTERNAL);
+	}
+
+	free(dev->trace_path);
+	dev->trace_path = p;
+
+	return (FIDO_OK);
+}
+
+int
+fido_trace_open(fido_dev_t *dev)
+{
+	struct trace_rec *t;
+
+	if (dev->trace_path == NULL)
+		return (0);
+
+	if ((t = calloc(1, sizeof(*t))) == NULL) {
+		fido_log_debug("%s: calloc", __func__);
+		return (-1);
+	}
+
+	if ((t->f = fopen(dev->trace_path, "wb")) == NULL) {
+		fido_log_error(errno, "%s: fopen %s", __func__,
+		    dev->trace_path);
+		free(t);
+		return (-1);
+	}
+
+	if (fwrite(TRACE_MAGIC, 1, TRACE_MAGIC_LEN, t->f) != TRACE_MAGIC_LEN ||
+	    fido_time_now(&t->last) != 0) {
+		fido_log_debug("%s: header", __func__);
+		fclose(t->f);
+		free(t);
+		return (-1);
+	}
+
+	dev->trace = t;
+
+	return (0);
+}
+
+void
+fido_trace_close(fido_dev_t *dev)
+{
+	struct trace_rec *t;
+
+	if ((t = dev->trace) == NULL)
+		return;
+
+	if (fclose(t->f) != 0)
+		fido_log_error(errno, "%s: fclose", __func__);
+
+	free(t);
+	dev->trace = NULL;
+}
+
+void
+fido_trace_frame(fido_dev_t *dev, int dir, const void *buf, size_t len)
+{
+	struct trace_rec	*t;
+	struct timespec		 now;
+	unsigned char		 hdr[TRACE_HDR_LEN];
+	uint32_t		 us;
+
+	if ((t = dev->trace) == NULL)
+		return;
+
+	if (len > UINT16_MAX || fido_time_now(&now) != 0)
+		goto fail;
+
+	us = elapsed_us(&t->last, &now);
+	t->last = now;
+
+	hdr[0] = (unsigned char)dir;
+	hdr[1] = (unsigned char)(len & 0xff);
+	hdr[2] = (unsigned char)((len >> 8) & 0xff);
+	hdr[3] = (unsigned char)(us & 0xff);
+	hdr[4] = (unsigned char)((us >> 8) & 0xff);
+	hdr[5] = (unsigned char)((us >> 16) & 0xff);
+	hdr[6] = (unsigned char)((us >> 24) & 0xff);
+
+	if (fwrite(hdr, 1, sizeof(hdr), t->f) != sizeof(hdr) ||
+	    fwrite(buf, 1, len, t->f) != len)
+		goto fail;
+
+	return;
+fail:
+	fido_log_debug("%s: recording stopped", __func__);
+	fido_trace_close(dev);
+}
+
+static int
+read_file(const char *path, unsigned char **ptr, size_t *len)
+{
+	FILE	*f;
+	long	 size;
+	int	 ok = -1;
+
+	*ptr = NULL;
+	*len = 0;
+
+	if ((f = fopen(path, "rb")) == NULL) {
+		fido_log_error(errno, "%s: fopen %s", __func__, path);
+		return (-1);
+	}
+
+	if (fseek(f, 0, SEEK_END) != 0 || (size = ftell(f)) < 0 ||
+	    fseek(f, 0, SEEK_SET) != 0) {
+		fido_log_error(errno, "%s: seek", __func__);
+		goto fail;
+	}
+
+	if (size == 0 || (*ptr = malloc((size_t)size)) == NULL ||
+	    fread(*ptr, 1, (size_t)size, f) != (size_t)size) {
+		fido_log_debug("%s: read", __func__);
+		free(*ptr);
+		*ptr = NULL;
+		goto fail;
+	}
+
+	*len = (size_t)size;
+	ok = 0;
+fail:
+	fclose(f);
+
+	return (ok);
+}
+
+/* walk the events in buf, storing them in ev if non-NULL; return the count */
+static int
+parse_events(const unsigned char *buf, size_t len, struct trace_event *ev)
+{
+	size_t	off = TRACE_MAGIC_LEN;
+	size_t	n = 0;
+	size_t	evlen;
+
+	if (len < TRACE_MAGIC_LEN || memcmp(buf, TRACE_MAGIC,
+	    TRACE_MAGIC_LEN) != 0) {
+		fido_log_debug("%s: not a trace", __func__);
+		return (-1);
+	}
+
+	while (off < len) {
+		if (len - off < TRACE_HDR_LEN) {
+			fido_log_debug("%s: truncated header", __func__);
+			return (-1);
+		}
+		evlen = (size_t)buf[off + 1] | (size_t)buf[off + 2] << 8;
+		if ((buf[off] != TRACE_TX && buf[off] != TRACE_RX) ||
+		    evlen > CTAP_MAX_REPORT_LEN + 1 ||
+		    len - off - TRACE_HDR_LEN < evlen) {
+			fido_log_debug("%s: bad event at %zu", __func__, off);
+			return (-1);
+		}
+		if (ev != NULL) {
+			ev[n].dir = buf[off];
+			ev[n].len = evlen;
+			ev[n].delta_us = (uint32_t)buf[off + 3] |
+			    (uint32_t)buf[off + 4] << 8 |
+			    (uint32_t)buf[off + 5] << 16 |
+			    (uint32_t)buf[off + 6] << 24;
+			ev[n].ptr = buf + off + TRACE_HDR_LEN;
+		}
+		off += TRACE_HDR_LEN + evlen;
+		if (++n > INT_MAX)
+			return (-1);
+	}
+
+	return ((int)n);
+}
+
+static void *
+replay_open(const char *path, bool realtime)
+{
+	struct replay	*r;
+	size_t		 len;
+	int		 n;
+
+	if ((r = calloc(1, sizeof(*r))) == NULL) {
+		fido_log_debug("%s: calloc", __func__);
+		return (NULL);
+	}
+
+	if (read_file(path, &r->buf, &len) < 0 ||
+	    (n = parse_events(r->buf, len, NULL)) <= 0 ||
+	    (r->ev = calloc((size_t)n, sizeof(*r->ev))) == NULL ||
+	    parse_events(r->buf, len, r->ev) != n ||
+	    fido_time_now(&r->last) != 0) {
+		fido_log_debug("%s: %s", __func__, path);
+		free(r->ev);
+		free(r->buf);
+		free(r);
+		return (NULL);
+	}
+
+	r->nev = (size_t)n;
+	r->realtime = realtime;
+
+	return (r);
+}
+
+static void *
+replay_open_fast(const char *path)
+{
+	return (replay_open(path, false));
+}
+
+static void *
+replay_open_realtime(const char *path)
+{
+	return (replay_open(path, true));
+}
+
+static void
+replay_close(void *handle)
+{
+	struct replay *r = handle;
+
+	free(r->ev);
+	free(r->buf);
+	free(r);
+}
+
+static bool
+is_init(const unsigned char *frame, size_t len)
+{
+	return (len >= FRAME_NONCE + NONCE_LEN &&
+	    frame[0] == 0xff && frame[1] == 0xff && frame[2] == 0xff &&
+	    frame[3] == 0xff && frame[FRAME_CMD] == (CTAP_FRAME_INIT |
+	    CTAP_CMD_INIT));
+}
+
+/*
+ * In real time, wait until the authenticator would have answered: the
+ * event's delay after the previous one. Fails, like a read timing out, if
+ * that is more than 'ms' away.
+ */
+static int
+replay_wait(struct replay *r, const struct trace_event *ev, int ms)
+{
+	struct timespec	now;
+	uint32_t	us;
+	int		wait_ms;
+
+	if (!r->realtime)
+		return (0);
+
+	if (fido_time_now(&now) != 0)
+		return (-1);
+
+	if ((us = elapsed_us(&r->last, &now)) >= ev->delta_us)
+		return (0);
+
+	wait_ms = (int)((ev->delta_us - us + 999) / 1000);
+	if (ms >= 0 && wait_ms > ms) {
+		fido_time_sleep(ms);
+		return (-1);
+	}
+
+	return (fido_time_sleep(wait_ms));
+}
+
+static int
+replay_read(void *handle, unsigned char *buf, size_t len, int ms)
+{
+	struct replay		*r = handle;
+	const struct trace_event *ev;
+
+	if (r->pos == r->nev || (ev = &r->ev[r->pos])->dir != TRACE_RX) {
+		/* not answered in the recording either */
+		fido_log_debug("%s: no response at event %zu", __func__,
+		    r->pos);
+		return (-1);
+	}
+
+	if (ev->len > len || len > INT_MAX) {
+		fido_log_debug("%s: len %zu > %zu", __func__, ev->len, len);
+		return (-1);
+	}
+
+	if (replay_wait(r, ev, ms) < 0)
+		return (-1);
+
+	memcpy(buf, ev->ptr, ev->len);
+	if (r->have_nonce && is_init(buf, ev->len))
+		memcpy(buf + FRAME_NONCE, r->nonce, NONCE_LEN);
+
+	r->pos++;
+	if (fido_time_now(&r->last) != 0)
+		return (-1);
+
+	return ((int)ev->len);
+}
+
+static int
+replay_write(void *handle, const unsigned char *buf, size_t len)
+{
+	struct replay		*r = handle;
+	const struct trace_event *ev;
+
+	if (r->pos == r->nev || (ev = &r->ev[r->pos])->dir != TRACE_TX ||
+	    ev->len != len || len < 1 + FRAME_NONCE + NONCE_LEN ||
+	    len > INT_MAX) {
+		fido_log_debug("%s: trace diverged at event %zu", __func__,
+		    r->pos);
+		return (-1);
+	}
+
+	/* buf[0] is the report ID */
+	if ((buf[1 + FRAME_CMD] & CTAP_FRAME_INIT) &&
+	    buf[1 + FRAME_CMD] != ev->ptr[1 + FRAME_CMD]) {
+		fido_log_debug("%s: cmd 0x%02x, recorded 0x%02x", __func__,
+		    buf[1 + FRAME_CMD], ev->ptr[1 + FRAME_CMD]);
+		return (-1);
+	}
+
+	if (is_init(buf + 1, len - 1)) {
+		memcpy(r->nonce, buf + 1 + FRAME_NONCE, NONCE_LEN);
+		r->have_nonce = true;
+	}
+
+	r->pos++;
+	if (fido_time_now(&r->last) != 0)
+		return (-1);
+
+	return ((int)len);
+}
+
+int
+fido_dev_set_replay(fido_dev_t *dev, int flags)
+{
+	static const fido_dev_io_t fast = {
+		replay_open_fast,
+		replay_close,
+		replay_read,
+		replay_write,
+	};
+	static const fido_dev_io_t realtime = {
+		replay_open_realtime,
+		replay_close,
+		replay_read,
+		replay_write,
+	};
+
+	if (flags & ~FIDO_REPLAY_REALTIME) {
+		fido_log_debug("%s: flags=0x%x", __func__, (unsigned)flags);
+		return (FIDO_ERR_INVALID_ARGUMENT);
+	}
+
+	return (fido_dev_set_io_functions(dev, (flags & FIDO_REPLAY_REALTIME) ?
+	    &realtime : &fast));
+}
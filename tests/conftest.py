@@ -0,0 +1,48 @@
+"""
+Shared fixtures. The modules under test load libfido2 lazily or only call
+into it through a handful of functions, so the tests run against
+fake_libfido2, a stand-in module installed in its place, and need neither
+the shared library nor a key.
+"""
+
+import importlib
+import sys
+import types
+
+import pytest
+
+import fido2manage
+
+
+class FidoError(Exception):
+
+    def __init__(self, func, code):
+        self.func = func
+        self.code = code
+        self.name = f"error 0x{code & 0xff:x}"
+        super().__init__(f"{func}: {self.name}")
+
+
+@pytest.fixture
+def fake_libfido2(monkeypatch):
+    """Install a stand-in fido2manage.libfido2 for the test; set the
+    attributes the code under test uses on it."""
+    module = types.ModuleType("fido2manage.libfido2")
+    module.FidoError = FidoError
+    module.EXTENSIONS = {"hmac-secret": 0x01, "credProtect": 0x02}
+    monkeypatch.setitem(sys.modules, "fido2manage.libfido2", module)
+    monkeypatch.setattr(fido2manage, "libfido2", module, raising=False)
+    return module
+
+
+@pytest.fixture
+def reimport(monkeypatch, fake_libfido2):
+    """Import a fido2manage module afresh, so that it binds fake_libfido2
+    at import time; it is dropped again after the test."""
+    def load(name):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+        module = importlib.import_module(name)
+        monkeypatch.setitem(sys.modules, name, module)
+        return module
+
+    yield load
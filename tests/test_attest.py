@@ -0,0 +1,81 @@
+import base64
+
+import pytest
+
+
+LEAF = b"leaf certificate"
+FORGED = b"self-signed certificate"
+INTERMEDIATE = b"intermediate certificate"
+
+
+class Cache:
+
+    def __init__(self):
+        self.checked = []
+
+    def check(self, chain):
+        self.checked.append(chain)
+
+
+def b64(data):
+    return base64.b64encode(data).decode()
+
+
+@pytest.fixture
+def attest(reimport, fake_libfido2):
+    module = reimport("fido2manage.attest")
+    fake_libfido2.carried = [LEAF]
+    fake_libfido2.cred_verify = lambda cdh, rp_id, **kwargs: list(
+        fake_libfido2.carried)
+    return module
+
+
+def record(**fields):
+    r = {"client_data_hash": b64(b"\0" * 32), "rp_id": "example.com",
+         "fmt": "packed", "authdata": b64(b"authdata")}
+    r.update(fields)
+    return r
+
+
+def test_sig_validates_x5c(attest):
+    cache = Cache()
+    attest.verify_record(cache, record(sig=b64(b"sig"),
+                                       x5c=[b64(LEAF), b64(INTERMEDIATE)]))
+    assert cache.checked == [[LEAF, INTERMEDIATE]]
+
+
+def test_attstmt_validates_carried_chain(attest):
+    cache = Cache()
+    attest.verify_record(cache, record(attstmt=b64(b"attstmt")))
+    assert cache.checked == [[LEAF]]
+
+
+def test_attstmt_takes_intermediates_from_x5c(attest, fake_libfido2):
+    cache = Cache()
+    attest.verify_record(cache, record(attstmt=b64(b"attstmt"),
+                                       x5c=[b64(LEAF), b64(INTERMEDIATE)]))
+    assert cache.checked == [[LEAF, INTERMEDIATE]]
+
+    fake_libfido2.carried = [LEAF, INTERMEDIATE]
+    attest.verify_record(cache, record(attobj=b64(b"attobj"),
+                                       x5c=[b64(LEAF), b64(INTERMEDIATE)]))
+    assert cache.checked[-1] == [LEAF, INTERMEDIATE]
+
+
+def test_attstmt_with_mismatched_x5c(attest, fake_libfido2):
+    # a self-signed statement paired with a genuine vendor chain
+    fake_libfido2.carried = [FORGED]
+    cache = Cache()
+    with pytest.raises(attest.AttestationError, match="does not match"):
+        attest.verify_record(cache, record(
+            attstmt=b64(b"attstmt"), x5c=[b64(LEAF), b64(INTERMEDIATE)]))
+    assert cache.checked == []
+
+
+def test_attobj_without_certificate(attest, fake_libfido2):
+    fake_libfido2.carried = [b""]
+    cache = Cache()
+    with pytest.raises(attest.AttestationError, match="no attestation"):
+        attest.verify_record(cache, record(attobj=b64(b"attobj"),
+                                           x5c=[b64(LEAF)]))
+    assert cache.checked == []
@@ -0,0 +1,94 @@
+import threading
+
+import pytest
+
+from fido2manage.records import EnrollSample
+from fido2manage.scheduler import Scheduler
+
+CANCELLED = 0x2d  # FIDO_ERR_KEEPALIVE_CANCEL
+
+
+class Device:
+    """Takes the samples in libfido2.samples, (status, remaining) pairs;
+    None waits for a finger until cancel()."""
+
+    def __init__(self, libfido2, path):
+        self.libfido2 = libfido2
+        self.path = path
+        self.cancelled = threading.Event()
+        libfido2.devices.append(self)
+
+    def bio_enroll(self, pin, timeout_ms):
+        try:
+            for sample in self.libfido2.samples:
+                if sample is None:
+                    self.libfido2.waiting.set()
+                    self.cancelled.wait(5)
+                    raise self.libfido2.FidoError("fido_bio_dev_enroll_"
+                                                  "continue", CANCELLED)
+                yield sample
+            return b"template"
+        finally:
+            self.libfido2.events.append("enroll closed")
+
+    def cancel(self):
+        self.libfido2.events.append("cancel")
+        self.cancelled.set()
+
+    def close(self):
+        self.libfido2.events.append("close")
+
+
+@pytest.fixture
+def enroll(reimport, fake_libfido2):
+    fake_libfido2.samples = []
+    fake_libfido2.devices = []
+    fake_libfido2.events = []
+    fake_libfido2.waiting = threading.Event()
+    fake_libfido2.Device = lambda path: Device(fake_libfido2, path)
+    fake_libfido2.bio_enroll_strerr = lambda status: f"status {status}"
+    return reimport("fido2manage.enroll")
+
+
+def test_samples_then_template(enroll, fake_libfido2):
+    fake_libfido2.samples = [(0, 2), (0x0c, 2), (0, 1), (0, 0)]
+    e = enroll.Enrollment(Scheduler(), "/dev/hidraw0", "1234")
+    assert e.start().result(5) == b"template"
+    assert e.poll() == [EnrollSample(0, "status 0", 2),
+                        EnrollSample(0x0c, "status 12", 2),
+                        EnrollSample(0, "status 0", 1),
+                        EnrollSample(0, "status 0", 0)]
+    assert e.poll() == []
+    assert fake_libfido2.events == ["enroll closed", "close"]
+
+
+def test_cancel_during_a_sample(enroll, fake_libfido2):
+    fake_libfido2.samples = [(0, 2), None]
+    e = enroll.Enrollment(Scheduler(), "/dev/hidraw0", "1234")
+    future = e.start()
+    assert fake_libfido2.waiting.wait(5)
+    e.cancel()
+    assert future.result(5) is None
+    assert e.cancelled
+    assert e.poll() == [EnrollSample(0, "status 0", 2)]
+    assert fake_libfido2.events == ["cancel", "enroll closed", "close"]
+
+
+def test_cancel_before_start(enroll, fake_libfido2):
+    e = enroll.Enrollment(Scheduler(), "/dev/hidraw0", "1234")
+    e.cancel()
+    assert e.start().result(5) is None
+    assert fake_libfido2.devices == []
+
+
+def test_error_not_cancelled(enroll, fake_libfido2):
+    def bio_enroll(pin, timeout_ms):
+        raise fake_libfido2.FidoError("fido_bio_dev_enroll_begin", 0x31)
+        yield
+
+    fake_libfido2.Device = lambda path: type("D", (Device,), {
+        "bio_enroll": staticmethod(bio_enroll)})(fake_libfido2, path)
+    e = enroll.Enrollment(Scheduler(), "/dev/hidraw0", "wrong")
+    with pytest.raises(fake_libfido2.FidoError):
+        e.start().result(5)
+    assert fake_libfido2.events == ["close"]
@@ -0,0 +1,111 @@
+import threading
+import time
+
+import pytest
+
+from fido2manage.scheduler import Scheduler
+
+
+class Device:
+    """A key that is touched once libfido2.touched[path] is set, or fails
+    to open if libfido2.broken holds path."""
+
+    def __init__(self, libfido2, path):
+        if path in libfido2.broken:
+            raise OSError(f"{path}: unplugged")
+        self.libfido2 = libfido2
+        self.path = path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def touch_begin(self):
+        self.libfido2.events.append(("blink", self.path))
+        self.libfido2.blinking.release()
+
+    def touch_status(self, ms):
+        touched = self.libfido2.touched.get(self.path)
+        return touched is not None and touched.wait(ms / 1000)
+
+    def cancel(self):
+        self.libfido2.events.append(("cancel", self.path))
+
+
+@pytest.fixture
+def identify(reimport, fake_libfido2):
+    fake_libfido2.broken = set()
+    fake_libfido2.touched = {}
+    fake_libfido2.events = []
+    fake_libfido2.blinking = threading.Semaphore(0)
+    fake_libfido2.Device = lambda path: Device(fake_libfido2, path)
+    return reimport("fido2manage.identify")
+
+
+def keys(*paths):
+    return {path: path for path in paths}
+
+
+def settle(scheduler, *devices):
+    deadline = time.monotonic() + 5
+    while any(scheduler.busy(d) for d in devices):
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_first_touch_wins(identify, fake_libfido2):
+    touch_a, touch_b = threading.Event(), threading.Event()
+    fake_libfido2.touched = {"a": touch_a, "b": touch_b}
+    scheduler = Scheduler()
+    i = identify.Identify(scheduler, keys("a", "b", "c"), poll_ms=1)
+    future = i.start()
+    for _ in range(3):
+        assert fake_libfido2.blinking.acquire(timeout=5)
+    touch_b.set()
+    assert future.result(5) == "b"
+    # a touch after the first one changes nothing
+    touch_a.set()
+    settle(scheduler, "a", "b", "c")
+    assert future.result() == "b"
+    events = fake_libfido2.events
+    assert {e for e in events if e[0] == "blink"} == {
+        ("blink", "a"), ("blink", "b"), ("blink", "c")}
+    # the others stop blinking; the key touched already has
+    assert ("cancel", "c") in events and ("cancel", "b") not in events
+
+
+def test_failed_key_left_out(identify, fake_libfido2):
+    touched = threading.Event()
+    touched.set()
+    fake_libfido2.broken = {"a"}
+    fake_libfido2.touched = {"b": touched}
+    i = identify.Identify(Scheduler(), keys("a", "b"), poll_ms=1)
+    assert i.start().result(5) == "b"
+
+
+def test_every_key_failed(identify, fake_libfido2):
+    fake_libfido2.broken = {"a", "b"}
+    i = identify.Identify(Scheduler(), keys("a", "b"), poll_ms=1)
+    with pytest.raises(OSError):
+        i.start().result(5)
+
+
+def test_timeout(identify, fake_libfido2):
+    i = identify.Identify(Scheduler(), keys("a", "b"), timeout_ms=20,
+                          poll_ms=1)
+    assert i.start().result(5) is None
+    assert ("cancel", "a") in fake_libfido2.events
+    assert ("cancel", "b") in fake_libfido2.events
+
+
+def test_cancel(identify, fake_libfido2):
+    i = identify.Identify(Scheduler(), keys("a"), poll_ms=1)
+    future = i.start()
+    i.cancel()
+    assert future.result(5) is None
+
+
+def test_no_keys(identify):
+    assert identify.Identify(Scheduler(), {}).start().result(5) is None
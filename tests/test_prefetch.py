@@ -0,0 +1,96 @@
+import threading
+
+import pytest
+
+from fido2manage.prefetch import Cancelled, Session
+from fido2manage.scheduler import Scheduler
+
+
+@pytest.fixture
+def session():
+    return Session(Scheduler(), "dev")
+
+
+def test_fetch_reuses_the_future(session):
+    calls = []
+
+    def read(s, value):
+        calls.append(value)
+        return value
+
+    first = session.fetch("passkeys", read, 1)
+    assert first.result(5) == 1
+    assert session.fetch("passkeys", read, 2) is first
+    assert session.cached("passkeys") is first
+    assert calls == [1]
+
+
+def test_fetch_again_after_failure_or_forget(session):
+    results = [OSError("unplugged"), "ok", "fresh"]
+
+    def read(s):
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    with pytest.raises(OSError):
+        session.fetch("passkeys", read).result(5)
+    assert session.fetch("passkeys", read).result(5) == "ok"
+    session.forget("passkeys")
+    assert session.cached("passkeys") is None
+    assert session.fetch("passkeys", read).result(5) == "fresh"
+
+
+def test_patch_finished_read(session):
+    future = session.fetch("passkeys", lambda s: ["a", "b"])
+    future.result(5)
+    session.patch("passkeys", lambda rks: [rk for rk in rks if rk != "a"])
+    assert session.cached("passkeys") is not future
+    assert session.cached("passkeys").result() == ["b"]
+    # nothing fetched, nothing to patch
+    session.patch("fingerprints", lambda fps: pytest.fail("patched"))
+    assert session.cached("fingerprints") is None
+
+
+def test_patch_leaves_unfinished_and_failed_reads(session):
+    gate = threading.Event()
+
+    def fail(s):
+        raise OSError("unplugged")
+
+    failed = session.fetch("fingerprints", fail)
+    with pytest.raises(OSError):
+        failed.result(5)
+    running = session.fetch("passkeys", lambda s: gate.wait(5) and ["a"])
+    session.patch("passkeys", lambda rks: pytest.fail("patched"))
+    session.patch("fingerprints", lambda fps: pytest.fail("patched"))
+    assert session.cached("passkeys") is running
+    assert session.cached("fingerprints") is failed
+    gate.set()
+    assert running.result(5) == ["a"]
+
+
+def test_close_cancels_queued_and_stops_running(session):
+    started, gate = threading.Event(), threading.Event()
+    steps = []
+
+    def walk(s):
+        started.set()
+        gate.wait(5)
+        s.check()
+        steps.append("after check")
+
+    running = session.fetch("passkeys", walk)
+    assert started.wait(5)
+    queued = session.fetch("fingerprints", lambda s: steps.append("queued"))
+    session.close()
+    assert session.closed
+    assert queued.cancelled()
+    assert session.cached("passkeys") is None
+    gate.set()
+    with pytest.raises(Cancelled):
+        running.result(5)
+    assert steps == []
+    with pytest.raises(Cancelled):
+        session.fetch("passkeys", walk)
@@ -0,0 +1,102 @@
+import pytest
+
+from fido2manage import reset as replug
+from fido2manage.devices import AddressError
+from fido2manage.records import DeviceInfo
+
+
+def key(path, vendor=0x349e, product=0x0022):
+    return DeviceInfo(1, path, "Token2", vendor, product)
+
+
+class Device:
+
+    def __init__(self, libfido2, path):
+        self.libfido2 = libfido2
+        self.path = path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def reset(self):
+        self.libfido2.resets.append(self.path)
+
+
+@pytest.fixture
+def libfido2(monkeypatch, fake_libfido2):
+    """manifest() returns the lists in fake_libfido2.manifests in turn,
+    then the last one for good."""
+    fake_libfido2.manifests = []
+    fake_libfido2.resets = []
+
+    def manifest():
+        if len(fake_libfido2.manifests) > 1:
+            return fake_libfido2.manifests.pop(0)
+        return fake_libfido2.manifests[0]
+
+    fake_libfido2.manifest = manifest
+    fake_libfido2.Device = lambda path: Device(fake_libfido2, path)
+    monkeypatch.setattr(replug, "_nodes", lambda: None)
+    monkeypatch.setattr(replug, "node_identity", lambda path: None)
+    monkeypatch.setattr(replug, "usb_serial", lambda path: None)
+    return fake_libfido2
+
+
+def run(path, timeout_ms=1000):
+    r = replug.ReplugReset(None, path, timeout_ms=timeout_ms, poll_ms=1)
+    return r, r._run()
+
+
+def test_no_serial_refuses_two_of_a_kind(libfido2):
+    libfido2.manifests = [[key("ioreg://1"), key("ioreg://2")]]
+    r = replug.ReplugReset(None, "ioreg://1", poll_ms=1)
+    assert r.warning() is not None
+    with pytest.raises(AddressError):
+        r._run()
+    assert libfido2.resets == []
+
+
+def test_no_serial_other_model_does_not_count(libfido2):
+    libfido2.manifests = [[key("ioreg://1"), key("ioreg://2", product=1)],
+                          [key("ioreg://2", product=1)],
+                          [key("ioreg://2", product=1), key("ioreg://3")]]
+    r, timing = run("ioreg://1")
+    assert libfido2.resets == ["ioreg://3"]
+    assert timing.path == "ioreg://3" and r.state == "sent"
+
+
+def test_no_serial_ignores_arrival_before_gone(libfido2):
+    libfido2.manifests = [[key("ioreg://1")],
+                          [key("ioreg://1"), key("ioreg://2")],  # a twin
+                          [key("ioreg://2")],                    # key left
+                          [key("ioreg://2"), key("ioreg://3")]]  # back
+    r, timing = run("ioreg://1")
+    assert libfido2.resets == ["ioreg://3"]
+
+
+def test_no_serial_same_path_back(libfido2):
+    libfido2.manifests = [[key("windows://1")], [], [key("windows://1")]]
+    r, timing = run("windows://1")
+    assert libfido2.resets == ["windows://1"]
+
+
+def test_no_serial_timeout(libfido2):
+    libfido2.manifests = [[key("ioreg://1")],
+                          [key("ioreg://1"), key("ioreg://2")]]
+    r, timing = run("ioreg://1", timeout_ms=100)
+    assert timing is None and r.state == "armed"
+    assert libfido2.resets == []
+
+
+def test_serial_arrival(libfido2, monkeypatch):
+    serials = {"/dev/hidraw0": "A", "/dev/hidraw1": "B", "/dev/hidraw2": "A"}
+    monkeypatch.setattr(replug, "usb_serial", serials.get)
+    libfido2.manifests = [[key("/dev/hidraw0"), key("/dev/hidraw1")],
+                          [key("/dev/hidraw1")],
+                          [key("/dev/hidraw1"), key("/dev/hidraw2")]]
+    r, timing = run("/dev/hidraw0")
+    assert r.warning() is None
+    assert libfido2.resets == ["/dev/hidraw2"]
@@ -0,0 +1,105 @@
+import threading
+import time
+
+import pytest
+
+from fido2manage.scheduler import READ, TOUCH, Scheduler
+
+
+def idle(scheduler, device):
+    """Wait until the worker for device has put its last result away."""
+    deadline = time.monotonic() + 5
+    while scheduler.busy(device):
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+@pytest.fixture
+def blocked():
+    """A scheduler whose queue for "dev" is held by a running operation
+    until release() is called, so that what is submitted meanwhile
+    queues."""
+    scheduler = Scheduler()
+    started, gate = threading.Event(), threading.Event()
+
+    def block():
+        started.set()
+        gate.wait(5)
+
+    scheduler.submit("dev", block, label="block")
+    assert started.wait(5)
+    scheduler.release = gate.set
+    yield scheduler
+    gate.set()
+
+
+def test_reads_go_ahead_of_touch(blocked):
+    order = []
+    futures = [blocked.submit("dev", order.append, "touch", lane=TOUCH),
+               blocked.submit("dev", order.append, "read 1", lane=READ),
+               blocked.submit("dev", order.append, "read 2", lane=READ)]
+    assert blocked.stats()["dev"].queued == 3
+    assert blocked.stats()["dev"].running == "block"
+    blocked.release()
+    for future in futures:
+        future.result(5)
+    assert order == ["read 1", "read 2", "touch"]
+
+
+def test_one_at_a_time_per_device(blocked):
+    ran = threading.Event()
+    other = blocked.submit("other", ran.set)
+    other.result(5)  # not held up by "dev"
+    future = blocked.submit("dev", lambda: 1)
+    assert not future.done()
+    blocked.release()
+    assert future.result(5) == 1
+    assert ran.is_set()
+
+
+def test_coalesce_shares_the_queued_read(blocked):
+    calls = []
+
+    def read():
+        calls.append(1)
+        return len(calls)
+
+    first = blocked.submit("dev", read, coalesce="info")
+    second = blocked.submit("dev", read, coalesce="info")
+    assert second is first
+    assert blocked.stats()["dev"].coalesced == 1
+    blocked.release()
+    assert first.result(5) == 1
+    idle(blocked, "dev")
+    # the key is dropped once the read is done: the next one runs again
+    assert blocked._queues["dev"].pending == {}
+    assert blocked.submit("dev", read, coalesce="info").result(5) == 2
+    assert calls == [1, 1]
+
+
+def test_coalesce_key_dropped_after_failure():
+    scheduler = Scheduler()
+
+    def fail():
+        raise OSError("unplugged")
+
+    with pytest.raises(OSError):
+        scheduler.submit("dev", fail, coalesce="info").result(5)
+    idle(scheduler, "dev")
+    assert scheduler._queues["dev"].pending == {}
+    assert scheduler.submit("dev", lambda: "ok",
+                            coalesce="info").result(5) == "ok"
+    idle(scheduler, "dev")
+    stats = scheduler.stats()["dev"]
+    assert stats.completed == 2 and stats.coalesced == 0
+
+
+def test_cancelled_while_queued(blocked):
+    calls = []
+    future = blocked.submit("dev", calls.append, 1, coalesce="info")
+    assert future.cancel()
+    blocked.release()
+    idle(blocked, "dev")
+    assert calls == []
+    assert blocked._queues["dev"].pending == {}
+    assert not blocked.busy("dev")
@@ -170,7 +170,9 @@ bio_enroll(const char *path)
 	dev = open_dev(path);
 	if ((pin = get_pin(path)) == NULL)
 		goto out;
+	/* stream each sample's status through pipes, too */
 	printf("Touch your security key.\n");
+	fflush(stdout);
 	r = fido_bio_dev_enroll_begin(dev, t, e, 10000, pin);
 	freezero(pin, PINBUF_LEN);
 	pin = NULL;
@@ -179,11 +181,13 @@ bio_enroll(const char *path)
 		goto out;
 	}
 	printf("%s.\n", enroll_strerr(fido_bio_enroll_last_status(e)));
+	fflush(stdout);
 
 	while (fido_bio_enroll_remaining_samples(e) > 0) {
 		printf("Touch your security key (%u sample%s left).\n",
 		    (unsigned)fido_bio_enroll_remaining_samples(e),
 		    plural(fido_bio_enroll_remaining_samples(e)));
+		fflush(stdout);
 		if ((r = fido_bio_dev_enroll_continue(dev, t, e,
 		    10000)) != FIDO_OK) {
 			fido_dev_cancel(dev);
@@ -192,6 +196,7 @@ bio_enroll(const char *path)
 			goto out;
 		}
 		printf("%s.\n", enroll_strerr(fido_bio_enroll_last_status(e)));
+		fflush(stdout);
 	}
 
 	ok = 0;
@@ -5,6 +5,7 @@
  * SPDX-License-Identifier: BSD-2-Clause
  */
 
+#include <stdbool.h>
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
@@ -45,152 +46,254 @@ out:
 	exit(ok);
 }
 
-int
-config_always_uv(char *path, int toggle)
+struct config_plan {
+	int	 uv;		/* desired alwaysUv, or -1 */
+	int	 minlen;	/* desired minPINLength, or -1 */
+	bool	 force;		/* desired forcePINChange */
+	char	**rpid;		/* desired minPINLength RP IDs */
+	size_t	 nrpid;
+};
+
+static char **
+parse_rpids(const char *rpids, size_t *np)
 {
-	fido_dev_t *dev;
-	char *pin = NULL;
-	int v, r, ok = 1;
+	char *otmp, *tmp, *cp;
+	char **rpid = NULL;
+	size_t n;
 
-	dev = open_dev(path);
-	if (get_devopt(dev, "alwaysUv", &v) < 0) {
-		warnx("%s: getdevopt", __func__);
-		goto out;
-	}
-	if (v == -1) {
-		warnx("%s: option not found", __func__);
-		goto out;
-	}
-	if (v == toggle) {
-		ok = 0;
-		goto out;
-	}
-	if ((r = fido_dev_toggle_always_uv(dev, NULL)) != FIDO_OK &&
-	    should_retry_with_pin(dev, r)) {
-		if ((pin = get_pin(path)) == NULL)
-			goto out;
-		r = fido_dev_toggle_always_uv(dev, pin);
-		freezero(pin, PINBUF_LEN);
-		pin = NULL;
-	}
-	if (r != FIDO_OK) {
-		warnx("fido_dev_toggle_always_uv: %s (0x%x)",
-		    fido_strerr(r), r);
-		goto out;
+	if ((tmp = strdup(rpids)) == NULL)
+		err(1, "strdup");
+	otmp = tmp;
+	for (n = 0; (cp = strsep(&tmp, ",")) != NULL; n++) {
+		if (n == SIZE_MAX || (rpid = recallocarray(rpid, n, n + 1,
+		    sizeof(*rpid))) == NULL)
+			err(1, "recallocarray");
+		if ((rpid[n] = strdup(cp)) == NULL)
+			err(1, "strdup");
+		if (*rpid[n] == '\0')
+			errx(1, "empty rpid");
 	}
+	free(otmp);
+	if (rpid == NULL || n == 0)
+		errx(1, "could not parse rp_id");
 
-	ok = 0;
-out:
-	fido_dev_close(dev);
-	fido_dev_free(&dev);
+	*np = n;
 
-	exit(ok);
+	return (rpid);
 }
 
-int
-config_pin_minlen(char *path, const char *pinlen)
+static int
+get_opt(const fido_cbor_info_t *ci, const char *name)
 {
-	fido_dev_t *dev;
-	char *pin = NULL;
-	int len, r, ok = 1;
+	char * const *names = fido_cbor_info_options_name_ptr(ci);
+	const bool *values = fido_cbor_info_options_value_ptr(ci);
 
-	dev = open_dev(path);
-	if ((len = base10(pinlen)) < 0 || len > 63) {
-		warnx("%s: len > 63", __func__);
-		goto out;
+	for (size_t i = 0; i < fido_cbor_info_options_len(ci); i++)
+		if (strcmp(names[i], name) == 0)
+			return (values[i]);
+
+	return (-1);
+}
+
+/*
+ * Compare the desired configuration against a single getInfo snapshot and
+ * print the resulting plan. Steps that would not change anything are
+ * dropped from the plan; steps the authenticator cannot honour fail the
+ * whole plan before any PIN is requested. Returns 0 on success, -1 on
+ * failure.
+ */
+static int
+config_plan_build(const fido_cbor_info_t *ci, struct config_plan *p)
+{
+	uint64_t minlen = fido_cbor_info_minpinlen(ci);
+	int v, ok = 0;
+
+	if (p->uv != -1) {
+		if ((v = get_opt(ci, "alwaysUv")) == -1) {
+			printf("alwaysUv: not supported\n");
+			ok = -1;
+		} else if (v == p->uv) {
+			printf("alwaysUv: already %s, skipping\n",
+			    v ? "on" : "off");
+			p->uv = -1;
+		} else
+			printf("alwaysUv: %s -> %s\n", v ? "on" : "off",
+			    p->uv ? "on" : "off");
 	}
-	if ((r = fido_dev_set_pin_minlen(dev, (size_t)len, NULL)) != FIDO_OK &&
-	    should_retry_with_pin(dev, r)) {
-		if ((pin = get_pin(path)) == NULL)
-			goto out;
-		r = fido_dev_set_pin_minlen(dev, (size_t)len, pin);
-		freezero(pin, PINBUF_LEN);
-		pin = NULL;
+
+	if ((p->minlen != -1 || p->force || p->rpid != NULL) &&
+	    get_opt(ci, "setMinPINLength") != 1) {
+		printf("setMinPINLength: not supported\n");
+		return (-1);
 	}
-	if (r != FIDO_OK) {
-		warnx("fido_dev_set_pin_minlen: %s (0x%x)", fido_strerr(r), r);
-		goto out;
+
+	if (p->minlen != -1) {
+		if ((uint64_t)p->minlen == minlen) {
+			printf("minPINLength: already %d, skipping\n",
+			    p->minlen);
+			p->minlen = -1;
+		} else if ((uint64_t)p->minlen < minlen) {
+			printf("minPINLength: %d -> %d: cannot be decreased\n",
+			    (int)minlen, p->minlen);
+			ok = -1;
+		} else
+			printf("minPINLength: %d -> %d\n", (int)minlen,
+			    p->minlen);
 	}
 
-	ok = 0;
-out:
-	fido_dev_close(dev);
-	fido_dev_free(&dev);
+	if (p->force) {
+		if (fido_cbor_info_new_pin_required(ci)) {
+			printf("forcePINChange: already set, skipping\n");
+			p->force = false;
+		} else
+			printf("forcePINChange: false -> true\n");
+	}
 
-	exit(ok);
+	if (p->rpid != NULL) {
+		/* the current list is not part of getInfo; always apply */
+		if (p->nrpid > fido_cbor_info_maxrpid_minpinlen(ci)) {
+			printf("minPINLength RP IDs: %zu > %d\n", p->nrpid,
+			    (int)fido_cbor_info_maxrpid_minpinlen(ci));
+			ok = -1;
+		} else {
+			printf("minPINLength RP IDs: ");
+			for (size_t i = 0; i < p->nrpid; i++)
+				printf("%s%s", i > 0 ? ", " : "", p->rpid[i]);
+			printf("\n");
+		}
+	}
+
+	return (ok);
 }
 
-int
-config_force_pin_change(char *path)
+enum config_step {
+	STEP_ALWAYS_UV,
+	STEP_PIN_MINLEN,
+	STEP_PIN_MINLEN_RPID,
+	STEP_FORCE_PIN_CHANGE,
+};
+
+static const char *
+step_name(enum config_step step)
 {
-	fido_dev_t *dev;
-	char *pin = NULL;
-	int r, ok = 1;
+	switch (step) {
+	case STEP_ALWAYS_UV:
+		return ("fido_dev_toggle_always_uv");
+	case STEP_PIN_MINLEN:
+		return ("fido_dev_set_pin_minlen");
+	case STEP_PIN_MINLEN_RPID:
+		return ("fido_dev_set_pin_minlen_rpid");
+	case STEP_FORCE_PIN_CHANGE:
+		return ("fido_dev_force_pin_change");
+	}
 
-	dev = open_dev(path);
-	if ((r = fido_dev_force_pin_change(dev, NULL)) != FIDO_OK &&
-	    should_retry_with_pin(dev, r)) {
-		if ((pin = get_pin(path)) == NULL)
-			goto out;
-		r = fido_dev_force_pin_change(dev, pin);
-		freezero(pin, PINBUF_LEN);
-		pin = NULL;
+	return ("unknown");
+}
+
+/*
+ * Run a configuration command, asking for the PIN at most once per plan.
+ */
+static int
+config_run(fido_dev_t *dev, const char *path, const struct config_plan *p,
+    enum config_step step, char **pin)
+{
+	int r = FIDO_ERR_INVALID_ARGUMENT;
+
+	for (;;) {
+		switch (step) {
+		case STEP_ALWAYS_UV:
+			r = fido_dev_toggle_always_uv(dev, *pin);
+			break;
+		case STEP_PIN_MINLEN:
+			r = fido_dev_set_pin_minlen(dev, (size_t)p->minlen,
+			    *pin);
+			break;
+		case STEP_PIN_MINLEN_RPID:
+			r = fido_dev_set_pin_minlen_rpid(dev,
+			    (const char * const *)p->rpid, p->nrpid, *pin);
+			break;
+		case STEP_FORCE_PIN_CHANGE:
+			r = fido_dev_force_pin_change(dev, *pin);
+			break;
+		}
+		if (r == FIDO_OK || *pin != NULL ||
+		    !should_retry_with_pin(dev, r))
+			break;
+		if ((*pin = get_pin(path)) == NULL)
+			return (-1);
 	}
 	if (r != FIDO_OK) {
-		warnx("fido_dev_force_pin_change: %s (0x%x)", fido_strerr(r), r);
-		goto out;
+		warnx("%s: %s (0x%x)", step_name(step), fido_strerr(r), r);
+		return (-1);
 	}
 
-	ok = 0;
-out:
-	fido_dev_close(dev);
-	fido_dev_free(&dev);
-
-	exit(ok);
+	return (0);
 }
 
 int
-config_pin_minlen_rpid(char *path, const char *rpids)
+config_plan(char *path, int uv, const char *pinlen, const char *rpids,
+    bool force, bool dryrun)
 {
+	fido_cbor_info_t *ci = NULL;
 	fido_dev_t *dev;
-	char *otmp, *tmp, *cp;
-	char *pin = NULL, **rpid = NULL;
+	struct config_plan p;
+	char *pin = NULL;
 	int r, ok = 1;
-	size_t n;
 
-	if ((tmp = strdup(rpids)) == NULL)
-		err(1, "strdup");
-	otmp = tmp;
-	for (n = 0; (cp = strsep(&tmp, ",")) != NULL; n++) {
-		if (n == SIZE_MAX || (rpid = recallocarray(rpid, n, n + 1,
-		    sizeof(*rpid))) == NULL)
-			err(1, "recallocarray");
-		if ((rpid[n] = strdup(cp)) == NULL)
-			err(1, "strdup");
-		if (*rpid[n] == '\0')
-			errx(1, "empty rpid");
-	}
-	free(otmp);
-	if (rpid == NULL || n == 0)
-		errx(1, "could not parse rp_id");
+	memset(&p, 0, sizeof(p));
+	p.uv = uv;
+	p.minlen = -1;
+	p.force = force;
+
+	if (pinlen != NULL && ((p.minlen = base10(pinlen)) < 0 ||
+	    p.minlen > 63))
+		errx(1, "%s: len > 63", __func__);
+	if (rpids != NULL)
+		p.rpid = parse_rpids(rpids, &p.nrpid);
+
 	dev = open_dev(path);
-	if ((r = fido_dev_set_pin_minlen_rpid(dev, (const char * const *)rpid,
-	    n, NULL)) != FIDO_OK && should_retry_with_pin(dev, r)) {
-		if ((pin = get_pin(path)) == NULL)
-			goto out;
-		r = fido_dev_set_pin_minlen_rpid(dev, (const char * const *)rpid,
-		    n, pin);
-		freezero(pin, PINBUF_LEN);
-		pin = NULL;
+	if ((ci = fido_cbor_info_new()) == NULL)
+		errx(1, "fido_cbor_info_new");
+	if ((r = fido_dev_get_cbor_info(dev, ci)) != FIDO_OK) {
+		warnx("fido_dev_get_cbor_info: %s (0x%x)", fido_strerr(r), r);
+		goto out;
 	}
-	if (r != FIDO_OK) {
-		warnx("fido_dev_set_pin_minlen_rpid: %s (0x%x)",
-		    fido_strerr(r), r);
+
+	printf("plan for %s:\n", path);
+	if (config_plan_build(ci, &p) < 0)
+		goto out;
+	if (p.uv == -1 && p.minlen == -1 && !p.force && p.rpid == NULL) {
+		printf("nothing to do\n");
+		ok = 0;
+		goto out;
+	}
+	if (dryrun) {
+		ok = 0;
 		goto out;
 	}
 
+	if (p.uv != -1 &&
+	    config_run(dev, path, &p, STEP_ALWAYS_UV, &pin) < 0)
+		goto out;
+	if (p.minlen != -1 &&
+	    config_run(dev, path, &p, STEP_PIN_MINLEN, &pin) < 0)
+		goto out;
+	if (p.rpid != NULL &&
+	    config_run(dev, path, &p, STEP_PIN_MINLEN_RPID, &pin) < 0)
+		goto out;
+	/* last, as it flags the current PIN for replacement */
+	if (p.force &&
+	    config_run(dev, path, &p, STEP_FORCE_PIN_CHANGE, &pin) < 0)
+		goto out;
+
 	ok = 0;
 out:
+	if (pin != NULL)
+		freezero(pin, PINBUF_LEN);
+	for (size_t i = 0; i < p.nrpid; i++)
+		free(p.rpid[i]);
+	free(p.rpid);
+	fido_cbor_info_free(&ci);
 	fido_dev_close(dev);
 	fido_dev_free(&dev);
 
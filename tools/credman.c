@@ -55,6 +55,8 @@ credman_get_metadata(fido_dev_t *dev, const char *path)
         (unsigned)fido_credman_rk_existing(metadata));
     printf("remaining rk(s): %u\n",
         (unsigned)fido_credman_rk_remaining(metadata));
+    printf("io retries: %llu\n",
+        (unsigned long long)fido_dev_io_retries(dev));
 
     ok = 0;
 out:
@@ -382,3 +384,190 @@ out:
 
     exit(ok);
 }
+
+/*
+ * Split the next comma-separated field off *cp, in place. A field may be
+ * quoted, with "" standing for a quote; *cp is NULL after the last one.
+ */
+static int
+csv_field(char **cp, char **field)
+{
+    char *s = *cp, *d;
+
+    if (s == NULL)
+        return -1;
+    if (*s != '"') {
+        *field = s;
+        s += strcspn(s, ",\r\n");
+        *cp = *s == ',' ? s + 1 : NULL;
+        *s = '\0';
+        return 0;
+    }
+    *field = d = ++s;
+    for (;;) {
+        if (*s == '\0')
+            return -1;
+        if (*s == '"' && *++s != '"')
+            break;
+        *d++ = *s++;
+    }
+    if (*s == ',')
+        *cp = s + 1;
+    else if (*s == '\0' || *s == '\r' || *s == '\n')
+        *cp = NULL;
+    else
+        return -1;
+    *d = '\0';
+
+    return 0;
+}
+
+static const fido_cred_t *
+find_rk(const fido_credman_rp_t *rp, fido_credman_rk_t **rk,
+    const void *cred_id, size_t cred_id_len)
+{
+    const fido_cred_t *cred;
+
+    for (size_t i = 0; i < fido_credman_rp_count(rp); i++)
+        for (size_t j = 0; j < fido_credman_rk_count(rk[i]); j++) {
+            cred = fido_credman_rk(rk[i], j);
+            if (cred != NULL && fido_cred_id_len(cred) == cred_id_len &&
+                memcmp(fido_cred_id_ptr(cred), cred_id, cred_id_len) == 0)
+                return cred;
+        }
+
+    return NULL;
+}
+
+/*
+ * Each line of batchf is "cred_id,name,display_name", where cred_id is
+ * base64 and an empty name or display_name is left as it is. Every
+ * credential is found from one enumeration of the resident credentials,
+ * and all of them are updated under one PIN/UV auth token. The outcome of
+ * each line is printed; a credential that is not on the key is reported
+ * and skipped.
+ */
+int
+credman_update_batch(const char *path, const char *batchf)
+{
+    fido_dev_t *dev = NULL;
+    fido_credman_rp_t *rp = NULL;
+    fido_credman_rk_t **rk = NULL;
+    fido_credman_batch_t *batch = NULL;
+    const fido_cred_t *cred;
+    const char *rp_id;
+    FILE *fp;
+    char *line = NULL, *cp, *id, *name, *display_name;
+    char *pin = NULL;
+    const char *use_pin = global_pin;
+    void *cred_id_ptr = NULL;
+    size_t cred_id_len = 0, linesize = 0, lineno = 0, n, *lines = NULL, *tmp;
+    int r = FIDO_ERR_INTERNAL, failed = 0, ok = 1;
+
+    fp = open_read(batchf);
+    dev = open_dev(path);
+
+    if ((rp = fido_credman_rp_new()) == NULL) {
+        warnx("fido_credman_rp_new");
+        goto out;
+    }
+    r = fido_credman_get_dev_rp(dev, rp, use_pin);
+    if (r != FIDO_OK && use_pin == NULL && should_retry_with_pin(dev, r)) {
+        if ((pin = get_pin(path)) == NULL)
+            goto out;
+        use_pin = pin;
+        r = fido_credman_get_dev_rp(dev, rp, use_pin);
+    }
+    if (r != FIDO_OK) {
+        warnx("fido_credman_get_dev_rp: %s", fido_strerr(r));
+        goto out;
+    }
+    if ((rk = calloc(fido_credman_rp_count(rp) + 1, sizeof(*rk))) == NULL) {
+        warnx("calloc");
+        goto out;
+    }
+    for (size_t i = 0; i < fido_credman_rp_count(rp); i++) {
+        if ((rp_id = fido_credman_rp_id(rp, i)) == NULL ||
+            (rk[i] = fido_credman_rk_new()) == NULL) {
+            warnx("fido_credman_rk_new");
+            goto out;
+        }
+        r = fido_credman_get_dev_rk(dev, rp_id, rk[i], use_pin);
+        if (r != FIDO_OK) {
+            warnx("fido_credman_get_dev_rk %s: %s", rp_id, fido_strerr(r));
+            goto out;
+        }
+    }
+
+    if ((batch = fido_credman_batch_new()) == NULL) {
+        warnx("fido_credman_batch_new");
+        goto out;
+    }
+    while (getline(&line, &linesize, fp) != -1) {
+        lineno++;
+        cp = line + strspn(line, " \t");
+        if (*cp == '\0' || *cp == '\r' || *cp == '\n' || *cp == '#')
+            continue;
+        if (csv_field(&cp, &id) < 0 || csv_field(&cp, &name) < 0 ||
+            csv_field(&cp, &display_name) < 0 || cp != NULL || *id == '\0') {
+            warnx("%s:%zu: syntax error", batchf, lineno);
+            goto out;
+        }
+        if (base64_decode(id, &cred_id_ptr, &cred_id_len) < 0) {
+            warnx("%s:%zu: base64_decode %s", batchf, lineno, id);
+            goto out;
+        }
+        if ((cred = find_rk(rp, rk, cred_id_ptr, cred_id_len)) == NULL) {
+            printf("%s:%zu: %s: not found\n", batchf, lineno, id);
+            failed = 1;
+        } else {
+            r = fido_credman_batch_set_user(batch, cred_id_ptr, cred_id_len,
+                fido_cred_user_id_ptr(cred), fido_cred_user_id_len(cred),
+                *name != '\0' ? name : fido_cred_user_name(cred),
+                *display_name != '\0' ? display_name :
+                fido_cred_display_name(cred));
+            if (r != FIDO_OK) {
+                warnx("%s:%zu: fido_credman_batch_set_user: %s", batchf,
+                    lineno, fido_strerr(r));
+                goto out;
+            }
+            n = fido_credman_batch_count(batch);
+            if ((tmp = recallocarray(lines, n - 1, n,
+                sizeof(*lines))) == NULL) {
+                warnx("recallocarray");
+                goto out;
+            }
+            lines = tmp;
+            lines[n - 1] = lineno;
+        }
+        free(cred_id_ptr);
+        cred_id_ptr = NULL;
+    }
+
+    if ((n = fido_credman_batch_count(batch)) != 0) {
+        r = fido_credman_set_dev_rk_batch(dev, batch, use_pin);
+        for (size_t i = 0; i < n; i++)
+            printf("%s:%zu: %s\n", batchf, lines[i],
+                fido_strerr(fido_credman_batch_status(batch, i)));
+        if (r != FIDO_OK)
+            failed = 1;
+    }
+
+    ok = failed;
+out:
+    if (rk != NULL)
+        for (size_t i = 0; rp != NULL && i < fido_credman_rp_count(rp); i++)
+            fido_credman_rk_free(&rk[i]);
+    free(rk);
+    free(cred_id_ptr);
+    free(lines);
+    free(line);
+    freezero(pin, PINBUF_LEN);
+    fclose(fp);
+    fido_credman_batch_free(&batch);
+    fido_credman_rp_free(&rp);
+    fido_dev_close(dev);
+    fido_dev_free(&dev);
+
+    exit(ok);
+}
@@ -13,6 +13,7 @@
 #include <openssl/ec.h>
 
 #include <fido.h>
+#include <stdbool.h>
 #include <stddef.h>
 #include <stdio.h>
 
@@ -21,7 +22,7 @@ struct blob {
 	size_t len;
 };
 
-#define TOKEN_OPT	"CDGILPRSVabcdefi:k:l:m:n:p:w:ruP"
+#define TOKEN_OPT	"CDGILPRSVabcdefi:k:l:m:n:p:w:rtuxz:P"
 
 #define FLAG_DEBUG	0x001
 #define FLAG_QUIET	0x002
@@ -34,6 +35,8 @@ struct blob {
 #define FLAG_CD		0x100
 extern char* global_pin;
 #define PINBUF_LEN	256
+#define IO_RETRIES	3
+#define IO_RETRY_MS	50
 
 EC_KEY *read_ec_pubkey(const char *);
 fido_dev_t *open_dev(const char *);
@@ -53,22 +56,21 @@ int bio_enroll(const char *);
 void bio_info(fido_dev_t *);
 int bio_list(const char *);
 int bio_set_name(const char *, const char *, const char *);
+int blob_batch(const char *, const char *, const char *);
 int blob_clean(const char *);
 int blob_list(const char *);
 int blob_delete(const char *, const char *, const char *, const char *);
 int blob_get(const char *, const char *, const char *, const char *,
     const char *);
 int blob_set(const char *, const char *, const char *, const char *,
-    const char *);
-int config_always_uv(char *, int);
+    const char *, const char *);
 int config_entattest(char *);
-int config_force_pin_change(char *);
-int config_pin_minlen(char *, const char *);
-int config_pin_minlen_rpid(char *, const char *);
+int config_plan(char *, int, const char *, const char *, bool, bool);
 int cose_type(const char *, int *);
 int cred_make(int, char **);
 int cred_verify(int, char **);
 int credman_delete_rk(const char *, const char *);
+int credman_update_batch(const char *, const char *);
 int credman_update_rk(const char *, const char *, const char *, const char *,
     const char *);
 int credman_get_metadata(fido_dev_t *, const char *);
@@ -21,14 +21,16 @@ usage(void)
 "usage: fido2-token -C [-d] device\n"
 "       fido2-token -Db [-k key_path] [-i cred_id -n rp_id] device\n"
 "       fido2-token -Dei template_id device\n"
-"       fido2-token -Du device\n"
+"       fido2-token -Du [-x] device\n"
 "       fido2-token -Gb [-k key_path] [-i cred_id -n rp_id] blob_path device\n"
 "       fido2-token -I [-cd] [-k rp_id -i cred_id]  device\n"
 "       fido2-token -L [-bder] [-k rp_id] [device]\n"
 "       fido2-token -R [-d] device\n"
-"       fido2-token -S [-adefu] [-l pin_length] [-i template_id -n template_name] device\n"
-"       fido2-token -Sb [-k key_path] [-i cred_id -n rp_id] blob_path device\n"
+"       fido2-token -S [-adefux] [-l pin_length] [-i template_id -n template_name] device\n"
+"       fido2-token -Sb [-z level] [-k key_path] [-i cred_id -n rp_id] blob_path device\n"
+"       fido2-token -Sbt [-z level] batch_path device\n"
 "       fido2-token -Sc -i cred_id -k user_id -n name -p display_name device\n"
+"       fido2-token -Sct batch_path device\n"
 "       fido2-token -S -P new_pin device\n" // Add this line for setting a new pin from the command line		
 "       fido2-token -Sm rp_id device\n"
 "       fido2-token -V\n"
@@ -86,7 +88,10 @@ main(int argc, char **argv)
 		case 'p':
 		case 'P':			
 		case 'r':
+		case 't':
 		case 'u':
+		case 'x':
+		case 'z':
 			break; /* ignore */
 		case 'd':
 			flags = FIDO_DEBUG;
@@ -26,12 +26,35 @@
 #include "extern.h"
 
 #define BOUND (1024UL * 1024UL)
+#define KEYLEN 32 /* largeBlobKey */
+#define PEEKLEN 64 /* plaintext decrypted to pre-check a key */
+#define MAXRATIO 1032 /* deflate's best compression ratio */
+#define IOCHUNK (64UL * 1024UL) /* blob_path is read and written in these */
+
+struct blobkey {
+	const u_char      *key;   /* largeBlobKey */
+	const fido_cred_t *cred;
+	const char        *rp_id;
+	int                used;  /* already matched an array entry */
+};
 
 struct rkmap {
-	fido_credman_rp_t  *rp; /* known rps */
-	fido_credman_rk_t **rk; /* rk per rp */
+	char               *path; /* device the map was read from */
+	fido_credman_rp_t  *rp;   /* known rps */
+	fido_credman_rk_t **rk;   /* rk per rp */
+	struct blobkey     *key;  /* every distinct largeBlobKey */
+	size_t              nkey;
 };
 
+/*
+ * Enumerated once per operation: by -L -b to match entries to keys, and by
+ * -S -b -t, whose lookups then all come from it. A single get, set or
+ * delete finds its key through one fido_credman_get_dev_rk() instead.
+ * The map is not kept on disk between invocations: it holds every
+ * largeBlobKey on the device.
+ */
+static struct rkmap session_map;
+
 static void
 free_rkmap(struct rkmap *map)
 {
@@ -41,13 +64,68 @@ free_rkmap(struct rkmap *map)
 		fido_credman_rp_free(&map->rp);
 	}
 	free(map->rk);
+	free(map->key);
+	free(map->path);
+	memset(map, 0, sizeof(*map));
+}
+
+static int
+cmp_blobkey(const void *a, const void *b)
+{
+	return memcmp(((const struct blobkey *)a)->key,
+	    ((const struct blobkey *)b)->key, KEYLEN);
 }
 
 static int
-map_known_rps(fido_dev_t *dev, const char *path, struct rkmap *map)
+index_keys(struct rkmap *map)
+{
+	const fido_cred_t *cred;
+	size_t i, j, n = 0;
+
+	for (i = 0; i < fido_credman_rp_count(map->rp); i++)
+		n += fido_credman_rk_count(map->rk[i]);
+	if (n == 0)
+		return 0;
+	if ((map->key = calloc(n, sizeof(*map->key))) == NULL) {
+		warnx("%s: calloc", __func__);
+		return -1;
+	}
+	for (i = 0; i < fido_credman_rp_count(map->rp); i++)
+		for (j = 0; j < fido_credman_rk_count(map->rk[i]); j++) {
+			cred = fido_credman_rk(map->rk[i], j);
+			if (cred == NULL ||
+			    fido_cred_largeblob_key_ptr(cred) == NULL ||
+			    fido_cred_largeblob_key_len(cred) != KEYLEN)
+				continue;
+			map->key[map->nkey].key =
+			    fido_cred_largeblob_key_ptr(cred);
+			map->key[map->nkey].cred = cred;
+			map->key[map->nkey].rp_id =
+			    fido_credman_rp_id(map->rp, i);
+			map->nkey++;
+		}
+	if (map->nkey == 0)
+		return 0;
+
+	/* a key shared by two credentials decrypts the same entries */
+	qsort(map->key, map->nkey, sizeof(*map->key), cmp_blobkey);
+	for (i = 1, j = 0; i < map->nkey; i++)
+		if (cmp_blobkey(&map->key[j], &map->key[i]) != 0)
+			map->key[++j] = map->key[i];
+	map->nkey = j + 1;
+
+	return 0;
+}
+
+/*
+ * The PIN read to enumerate is left in *pin, for the caller to use again
+ * and free.
+ */
+static int
+map_known_rps(fido_dev_t *dev, const char *path, struct rkmap *map,
+    char **pin)
 {
 	const char *rp_id;
-	char *pin = NULL;
 	size_t n;
 	int r, ok = -1;
 
@@ -55,9 +133,9 @@ map_known_rps(fido_dev_t *dev, const char *path, struct rkmap *map)
 		warnx("%s: fido_credman_rp_new", __func__);
 		goto out;
 	}
-	if ((pin = get_pin(path)) == NULL)
+	if (*pin == NULL && (*pin = get_pin(path)) == NULL)
 		goto out;
-	if ((r = fido_credman_get_dev_rp(dev, map->rp, pin)) != FIDO_OK) {
+	if ((r = fido_credman_get_dev_rp(dev, map->rp, *pin)) != FIDO_OK) {
 		warnx("fido_credman_get_dev_rp: %s", fido_strerr(r));
 		goto out;
 	}
@@ -79,58 +157,93 @@ map_known_rps(fido_dev_t *dev, const char *path, struct rkmap *map)
 			goto out;
 		}
 		if ((r = fido_credman_get_dev_rk(dev, rp_id, map->rk[i],
-		    pin)) != FIDO_OK) {
+		    *pin)) != FIDO_OK) {
 			warnx("%s: fido_credman_get_dev_rk %s: %s", __func__,
 			    rp_id, fido_strerr(r));
 			goto out;
 		}
 	}
+	if (index_keys(map) < 0)
+		goto out;
+	if ((map->path = strdup(path)) == NULL) {
+		warnx("%s: strdup", __func__);
+		goto out;
+	}
 
 	ok = 0;
 out:
-	freezero(pin, PINBUF_LEN);
-
 	return ok;
 }
 
+static const struct rkmap *
+known_rps(fido_dev_t *dev, const char *path, char **pin)
+{
+	if (session_map.path != NULL && strcmp(session_map.path, path) == 0)
+		return &session_map;
+	free_rkmap(&session_map);
+	if (map_known_rps(dev, path, &session_map, pin) < 0) {
+		free_rkmap(&session_map);
+		return NULL;
+	}
+
+	return &session_map;
+}
+
+static const fido_credman_rk_t *
+cached_rk(const char *path, const char *rp_id)
+{
+	if (session_map.path == NULL || strcmp(session_map.path, path) != 0)
+		return NULL;
+	for (size_t i = 0; i < fido_credman_rp_count(session_map.rp); i++)
+		if (strcmp(fido_credman_rp_id(session_map.rp, i), rp_id) == 0)
+			return session_map.rk[i];
+
+	return NULL;
+}
+
 static int
 lookup_key(const char *path, fido_dev_t *dev, const char *rp_id,
     const struct blob *cred_id, char **pin, struct blob *key)
 {
 	fido_credman_rk_t *rk = NULL;
+	const fido_credman_rk_t *known;
 	const fido_cred_t *cred = NULL;
 	size_t i, n;
 	int r, ok = -1;
 
-	if ((rk = fido_credman_rk_new()) == NULL) {
-		warnx("%s: fido_credman_rk_new", __func__);
-		goto out;
-	}
-	if ((r = fido_credman_get_dev_rk(dev, rp_id, rk, *pin)) != FIDO_OK &&
-	    *pin == NULL && should_retry_with_pin(dev, r)) {
-		if ((*pin = get_pin(path)) == NULL)
+	if ((known = cached_rk(path, rp_id)) == NULL) {
+		if ((rk = fido_credman_rk_new()) == NULL) {
+			warnx("%s: fido_credman_rk_new", __func__);
 			goto out;
-		r = fido_credman_get_dev_rk(dev, rp_id, rk, *pin);
-	}
-	if (r != FIDO_OK) {
-		warnx("%s: fido_credman_get_dev_rk: %s", __func__,
-		    fido_strerr(r));
-		goto out;
+		}
+		if ((r = fido_credman_get_dev_rk(dev, rp_id, rk,
+		    *pin)) != FIDO_OK && *pin == NULL &&
+		    should_retry_with_pin(dev, r)) {
+			if ((*pin = get_pin(path)) == NULL)
+				goto out;
+			r = fido_credman_get_dev_rk(dev, rp_id, rk, *pin);
+		}
+		if (r != FIDO_OK) {
+			warnx("%s: fido_credman_get_dev_rk: %s", __func__,
+			    fido_strerr(r));
+			goto out;
+		}
+		known = rk;
 	}
-	if ((n = fido_credman_rk_count(rk)) == 0) {
+	if ((n = fido_credman_rk_count(known)) == 0) {
 		warnx("%s: rp id not found", __func__);
 		goto out;
 	}
 	if (n == 1 && cred_id->len == 0) {
 		/* use the credential we found */
-		cred = fido_credman_rk(rk, 0);
+		cred = fido_credman_rk(known, 0);
 	} else {
 		if (cred_id->len == 0) {
 			warnx("%s: multiple credentials found", __func__);
 			goto out;
 		}
 		for (i = 0; i < n; i++) {
-			const fido_cred_t *x = fido_credman_rk(rk, i);
+			const fido_cred_t *x = fido_credman_rk(known, i);
 			if (fido_cred_id_len(x) <= cred_id->len &&
 			    !memcmp(fido_cred_id_ptr(x), cred_id->ptr,
 			    fido_cred_id_len(x))) {
@@ -193,9 +306,133 @@ load_key(const char *keyf, const char *cred_id64, const char *rp_id,
 	return r;
 }
 
+/*
+ * Read a blob from blobf, or stdin if it is "-", in chunks, so that pipes
+ * work; libfido2 takes at most BOUND bytes.
+ */
+static int
+read_blob(const char *blobf, struct blob *blob)
+{
+	FILE *fp;
+	u_char *tmp;
+	size_t n;
+	int ok = -1;
+
+	memset(blob, 0, sizeof(*blob));
+	fp = open_read(blobf);
+	do {
+		if ((tmp = recallocarray(blob->ptr, blob->len,
+		    blob->len + IOCHUNK, 1)) == NULL) {
+			warn("%s: recallocarray", __func__);
+			goto fail;
+		}
+		blob->ptr = tmp;
+		n = fread(blob->ptr + blob->len, 1, IOCHUNK, fp);
+		if ((blob->len += n) > BOUND) {
+			warnx("%s: larger than %lu bytes", blobf, BOUND);
+			goto fail;
+		}
+	} while (n == IOCHUNK);
+	if (ferror(fp)) {
+		warnx("%s: fread %s", __func__, blobf);
+		goto fail;
+	}
+
+	ok = 0;
+fail:
+	if (fp != stdin)
+		fclose(fp);
+	if (ok < 0) {
+		freezero(blob->ptr, blob->len);
+		memset(blob, 0, sizeof(*blob));
+	}
+
+	return ok;
+}
+
+/* write blob to blobf, or stdout if it is "-", in chunks */
+static int
+write_blob(const char *blobf, const struct blob *blob)
+{
+	FILE *fp;
+	size_t n;
+	int ok = -1;
+
+	fp = open_write(blobf);
+	for (size_t off = 0; off < blob->len; off += n) {
+		if ((n = blob->len - off) > IOCHUNK)
+			n = IOCHUNK;
+		if (fwrite(blob->ptr + off, 1, n, fp) != n) {
+			warnx("%s: fwrite %s", __func__, blobf);
+			goto fail;
+		}
+	}
+	if (fflush(fp) != 0) {
+		warnx("%s: fflush %s", __func__, blobf);
+		goto fail;
+	}
+
+	ok = 0;
+fail:
+	if (fp != stdout)
+		fclose(fp);
+
+	return ok;
+}
+
+static void
+print_progress(void *arg, int op, size_t done, size_t total)
+{
+	const char *what = op == FIDO_LARGEBLOB_READ ? "read" : "wrote";
+
+	(void)arg;
+
+	if (total == 0)
+		fprintf(stderr, "\rlargeBlobs: %s %zu bytes", what, done);
+	else
+		fprintf(stderr, "\rlargeBlobs: %s %zu/%zu bytes", what, done,
+		    total);
+	if (done == total)
+		fputc('\n', stderr);
+}
+
+/* show the array's transfer, fragment by fragment, on a terminal */
+static void
+show_progress(fido_dev_t *dev)
+{
+#ifdef HAVE_UNISTD_H
+	if (isatty(STDERR_FILENO))
+		fido_dev_set_largeblob_progress(dev, print_progress, NULL);
+#else
+	(void)dev;
+#endif
+}
+
+/* level is 0 to 9, or "fit" for the lowest that fits the array */
+static int
+set_level(fido_dev_t *dev, const char *level)
+{
+	int n, r;
+
+	if (level == NULL)
+		return 0;
+	if (strcmp(level, "fit") == 0)
+		n = FIDO_LARGEBLOB_FIT;
+	else if ((n = base10(level)) < 0 || n > 9) {
+		warnx("invalid compression level %s", level);
+		return -1;
+	}
+	if ((r = fido_dev_set_largeblob_level(dev, n)) != FIDO_OK) {
+		warnx("fido_dev_set_largeblob_level: %s", fido_strerr(r));
+		return -1;
+	}
+
+	return 0;
+}
+
 int
 blob_set(const char *path, const char *keyf, const char *rp_id,
-    const char *cred_id64, const char *blobf)
+    const char *cred_id64, const char *blobf, const char *level)
 {
 	fido_dev_t *dev;
 	struct blob key, blob;
@@ -203,10 +440,11 @@ blob_set(const char *path, const char *keyf, const char *rp_id,
 	int r, ok = 1;
 
 	dev = open_dev(path);
+	show_progress(dev);
 	memset(&key, 0, sizeof(key));
 	memset(&blob, 0, sizeof(blob));
 
-	if (read_file(blobf, &blob.ptr, &blob.len) < 0 ||
+	if (set_level(dev, level) < 0 || read_blob(blobf, &blob) < 0 ||
 	    load_key(keyf, cred_id64, rp_id, path, dev, &pin, &key) < 0)
 		goto out;
 	if ((r = fido_dev_largeblob_set(dev, key.ptr, key.len, blob.ptr,
@@ -243,6 +481,7 @@ blob_get(const char *path, const char *keyf, const char *rp_id,
 	int r, ok = 1;
 
 	dev = open_dev(path);
+	show_progress(dev);
 	memset(&key, 0, sizeof(key));
 	memset(&blob, 0, sizeof(blob));
 
@@ -253,7 +492,7 @@ blob_get(const char *path, const char *keyf, const char *rp_id,
 		warnx("fido_dev_largeblob_get: %s", fido_strerr(r));
 		goto out;
 	}
-	if (write_file(blobf, blob.ptr, blob.len) < 0)
+	if (write_blob(blobf, &blob) < 0)
 		goto out;
 
 	ok = 0; /* success */
@@ -278,6 +517,7 @@ blob_delete(const char *path, const char *keyf, const char *rp_id,
 	int r, ok = 1;
 
 	dev = open_dev(path);
+	show_progress(dev);
 	memset(&key, 0, sizeof(key));
 
 	if (load_key(keyf, cred_id64, rp_id, path, dev, &pin, &key) < 0)
@@ -304,6 +544,139 @@ out:
 	exit(ok);
 }
 
+static char *
+next_field(char **cp)
+{
+	char *field;
+
+	while ((field = strsep(cp, " \t\r\n")) != NULL && *field == '\0')
+		continue;
+
+	return field;
+}
+
+/*
+ * Each line of batchf is "set rp_id cred_id blob_path" or "delete rp_id
+ * cred_id", where cred_id may be - if rp_id has a single credential. The
+ * keys are all looked up from one enumeration of the credentials, and the
+ * edits are committed to the array in one write.
+ */
+int
+blob_batch(const char *path, const char *batchf, const char *level)
+{
+	fido_dev_t *dev;
+	fido_largeblob_batch_t *batch = NULL;
+	struct blob key, blob, cred_id;
+	FILE *fp;
+	char *line = NULL, *cp, *op, *rp_id, *id, *blobf;
+	char *pin = NULL;
+	size_t linesize = 0, lineno = 0, n, *lines = NULL, *tmp;
+	int r, ok = 1;
+
+	fp = open_read(batchf);
+	dev = open_dev(path);
+	show_progress(dev);
+	memset(&key, 0, sizeof(key));
+	memset(&blob, 0, sizeof(blob));
+	memset(&cred_id, 0, sizeof(cred_id));
+
+	if (set_level(dev, level) < 0)
+		goto out;
+	if ((batch = fido_largeblob_batch_new()) == NULL) {
+		warnx("fido_largeblob_batch_new");
+		goto out;
+	}
+	if (known_rps(dev, path, &pin) == NULL)
+		goto out;
+	while (getline(&line, &linesize, fp) != -1) {
+		lineno++;
+		cp = line;
+		if ((op = next_field(&cp)) == NULL || *op == '#')
+			continue;
+		rp_id = next_field(&cp);
+		id = next_field(&cp);
+		blobf = strcmp(op, "set") == 0 ? next_field(&cp) : NULL;
+		if (rp_id == NULL || id == NULL || next_field(&cp) != NULL ||
+		    (strcmp(op, "delete") != 0 && blobf == NULL)) {
+			warnx("%s:%zu: syntax error", batchf, lineno);
+			goto out;
+		}
+		if (strcmp(id, "-") != 0 && base64_decode(id,
+		    (void *)&cred_id.ptr, &cred_id.len) < 0) {
+			warnx("%s:%zu: base64_decode %s", batchf, lineno, id);
+			goto out;
+		}
+		if (lookup_key(path, dev, rp_id, &cred_id, &pin, &key) < 0 ||
+		    (blobf != NULL &&
+		    read_blob(blobf, &blob) < 0)) {
+			warnx("%s:%zu: %s", batchf, lineno, op);
+			goto out;
+		}
+		if (blobf != NULL)
+			r = fido_largeblob_batch_set(batch, key.ptr, key.len,
+			    blob.ptr, blob.len);
+		else
+			r = fido_largeblob_batch_remove(batch, key.ptr,
+			    key.len);
+		if (r != FIDO_OK) {
+			warnx("%s:%zu: fido_largeblob_batch_%s: %s", batchf,
+			    lineno, blobf != NULL ? "set" : "remove",
+			    fido_strerr(r));
+			goto out;
+		}
+		n = fido_largeblob_batch_count(batch);
+		if ((tmp = recallocarray(lines, n - 1, n,
+		    sizeof(*lines))) == NULL) {
+			warnx("%s: recallocarray", __func__);
+			goto out;
+		}
+		lines = tmp;
+		lines[n - 1] = lineno;
+		freezero(key.ptr, key.len);
+		freezero(blob.ptr, blob.len);
+		free(cred_id.ptr);
+		memset(&key, 0, sizeof(key));
+		memset(&blob, 0, sizeof(blob));
+		memset(&cred_id, 0, sizeof(cred_id));
+	}
+	if (fido_largeblob_batch_count(batch) == 0) {
+		ok = 0; /* nothing to do */
+		goto out;
+	}
+	if ((r = fido_dev_largeblob_commit(dev, batch, pin)) != FIDO_OK &&
+	    pin == NULL && should_retry_with_pin(dev, r)) {
+		if ((pin = get_pin(path)) == NULL)
+			goto out;
+		r = fido_dev_largeblob_commit(dev, batch, pin);
+	}
+	if (r != FIDO_OK) {
+		if ((n = fido_largeblob_batch_failed(batch)) <
+		    fido_largeblob_batch_count(batch))
+			warnx("%s:%zu: %s", batchf, lines[n], fido_strerr(r));
+		else
+			warnx("fido_dev_largeblob_commit: %s",
+			    fido_strerr(r));
+		goto out;
+	}
+
+	ok = 0; /* success */
+out:
+	freezero(key.ptr, key.len);
+	freezero(blob.ptr, blob.len);
+	freezero(pin, PINBUF_LEN);
+	free(cred_id.ptr);
+	free(lines);
+	free(line);
+	fclose(fp);
+
+	fido_largeblob_batch_free(&batch);
+	free_rkmap(&session_map);
+	fido_dev_close(dev);
+	fido_dev_free(&dev);
+
+	exit(ok);
+}
+
 static int
 try_decompress(const struct blob *in, uint64_t origsiz, int wbits)
 {
@@ -355,9 +728,84 @@ decompress(const struct blob *plaintext, uint64_t origsiz)
 	return try_decompress(plaintext, origsiz, -MAX_WBITS); /* rfc1951 */
 }
 
+static int
+try_inflate_prefix(const u_char *ptr, size_t len, uint64_t origsiz, int wbits)
+{
+	u_char buf[4096];
+	z_stream zs;
+	uint64_t total = 0;
+	int r, ok = -1;
+
+	memset(&zs, 0, sizeof(zs));
+
+	if (inflateInit2(&zs, wbits) != Z_OK)
+		return -1;
+
+	zs.next_in = (u_char *)ptr;
+	zs.avail_in = (u_int)len;
+	do {
+		zs.next_out = buf;
+		zs.avail_out = sizeof(buf);
+		r = inflate(&zs, Z_SYNC_FLUSH);
+		total += sizeof(buf) - zs.avail_out;
+	} while (r == Z_OK && zs.avail_in > 0 && total <= origsiz);
+
+	if (total > origsiz)
+		goto fail;
+	if (r == Z_STREAM_END && total != origsiz)
+		goto fail;
+	if (r != Z_OK && r != Z_STREAM_END && r != Z_BUF_ERROR)
+		goto fail;
+
+	ok = 0;
+fail:
+	inflateEnd(&zs);
+	explicit_bzero(buf, sizeof(buf));
+
+	return ok;
+}
+
+/*
+ * Cheaply rule out most wrong keys: decrypt the first PEEKLEN bytes without
+ * checking the tag, which needs all of the ciphertext, and see whether they
+ * start a deflate stream of at most origsiz bytes. A random prefix fails
+ * that in all but about 1 in 200 cases; the right key never does.
+ */
+static int
+peek(const struct blob *ciphertext, const struct blob *nonce,
+    uint64_t origsiz, const u_char *key)
+{
+	u_char prefix[PEEKLEN];
+	EVP_CIPHER_CTX *ctx = NULL;
+	const EVP_CIPHER *cipher;
+	size_t len;
+	int ok = -1;
+
+	if ((len = ciphertext->len - 16) > sizeof(prefix))
+		len = sizeof(prefix);
+	if ((ctx = EVP_CIPHER_CTX_new()) == NULL ||
+	    (cipher = EVP_aes_256_gcm()) == NULL ||
+	    EVP_CipherInit(ctx, cipher, key, nonce->ptr, 0) == 0)
+		goto out;
+	if (EVP_Cipher(ctx, prefix, ciphertext->ptr, (u_int)len) < 0)
+		goto out;
+	if (try_inflate_prefix(prefix, len, origsiz, MAX_WBITS) < 0 &&
+	    try_inflate_prefix(prefix, len, origsiz, -MAX_WBITS) < 0)
+		goto out;
+
+	ok = 0;
+out:
+	explicit_bzero(prefix, sizeof(prefix));
+
+	if (ctx != NULL)
+		EVP_CIPHER_CTX_free(ctx);
+
+	return ok;
+}
+
 static int
 decode(const struct blob *ciphertext, const struct blob *nonce,
-    uint64_t origsiz, const fido_cred_t *cred)
+    uint64_t origsiz, const u_char *key)
 {
 	uint8_t aad[4 + sizeof(uint64_t)];
 	EVP_CIPHER_CTX *ctx = NULL;
@@ -368,23 +816,12 @@ decode(const struct blob *ciphertext, const struct blob *nonce,
 
 	memset(&plaintext, 0, sizeof(plaintext));
 
-	if (nonce->len != 12)
-		return -1;
-	if (cred == NULL ||
-	    fido_cred_largeblob_key_ptr(cred) == NULL ||
-	    fido_cred_largeblob_key_len(cred) != 32)
-		return -1;
-	if (ciphertext->len > UINT_MAX ||
-	    ciphertext->len > SIZE_MAX - 16 ||
-	    ciphertext->len < 16)
-		return -1;
 	plaintext.len = ciphertext->len - 16;
 	if ((plaintext.ptr = calloc(1, plaintext.len)) == NULL)
 		return -1;
 	if ((ctx = EVP_CIPHER_CTX_new()) == NULL ||
 	    (cipher = EVP_aes_256_gcm()) == NULL ||
-	    EVP_CipherInit(ctx, cipher, fido_cred_largeblob_key_ptr(cred),
-	    nonce->ptr, 0) == 0)
+	    EVP_CipherInit(ctx, cipher, key, nonce->ptr, 0) == 0)
 		goto out;
 	if (EVP_CIPHER_CTX_ctrl(ctx, EVP_CTRL_GCM_SET_TAG, 16,
 	    ciphertext->ptr + ciphertext->len - 16) == 0)
@@ -413,16 +850,44 @@ out:
 	return ok;
 }
 
-static const fido_cred_t *
-try_rp(const fido_credman_rk_t *rk, const struct blob *ciphertext,
-    const struct blob *nonce, uint64_t origsiz)
+/*
+ * Whether an entry can be decoded at all, so that no key needs to be tried
+ * on one that cannot.
+ */
+static int
+plausible(const struct blob *ciphertext, const struct blob *nonce,
+    uint64_t origsiz)
 {
-	const fido_cred_t *cred;
+	if (nonce->len != 12)
+		return 0;
+	/* tag and at least an empty deflate block */
+	if (ciphertext->len > UINT_MAX || ciphertext->len < 16 + 2)
+		return 0;
+	if (origsiz > BOUND ||
+	    origsiz > (uint64_t)(ciphertext->len - 16 + 1) * MAXRATIO)
+		return 0;
 
-	for (size_t i = 0; i < fido_credman_rk_count(rk); i++)
-		if ((cred = fido_credman_rk(rk, i)) != NULL &&
-		    decode(ciphertext, nonce, origsiz, cred) == 0)
-			return cred;
+	return 1;
+}
+
+static const struct blobkey *
+find_key(struct blobkey *keys, size_t nkey, const struct blob *ciphertext,
+    const struct blob *nonce, uint64_t origsiz)
+{
+	/*
+	 * A key encrypts at most one entry unless the array was written by
+	 * something other than libfido2, so keys already matched go last.
+	 */
+	for (int used = 0; used < 2; used++)
+		for (size_t i = 0; i < nkey; i++) {
+			if (keys[i].used != used ||
+			    peek(ciphertext, nonce, origsiz, keys[i].key) < 0 ||
+			    decode(ciphertext, nonce, origsiz,
+			    keys[i].key) < 0)
+				continue;
+			keys[i].used = 1;
+			return &keys[i];
+		}
 
 	return NULL;
 }
@@ -484,9 +949,10 @@ decode_blob_entry(const cbor_item_t *item, struct blob *ciphertext,
 }
 
 static void
-print_blob_entry(size_t idx, const cbor_item_t *item, const struct rkmap *map)
+print_blob_entry(size_t idx, const cbor_item_t *item, struct rkmap *map)
 {
 	struct blob ciphertext, nonce;
+	const struct blobkey *key = NULL;
 	const fido_cred_t *cred = NULL;
 	const char *rp_id = NULL;
 	char *cred_id = NULL;
@@ -499,12 +965,11 @@ print_blob_entry(size_t idx, const cbor_item_t *item, const struct rkmap *map)
 		printf("%02zu: <skipped: bad cbor>\n", idx);
 		goto out;
 	}
-	for (size_t i = 0; i < fido_credman_rp_count(map->rp); i++) {
-		if ((cred = try_rp(map->rk[i], &ciphertext, &nonce,
-		    origsiz)) != NULL) {
-			rp_id = fido_credman_rp_id(map->rp, i);
-			break;
-		}
+	if (plausible(&ciphertext, &nonce, origsiz) &&
+	    (key = find_key(map->key, map->nkey, &ciphertext, &nonce,
+	    origsiz)) != NULL) {
+		cred = key->cred;
+		rp_id = key->rp_id;
 	}
 	if (cred == NULL) {
 		if ((cred_id = strdup("<unknown>")) == NULL) {
@@ -583,14 +1048,13 @@ out:
 int
 blob_list(const char *path)
 {
-	struct rkmap map;
 	fido_dev_t *dev = NULL;
 	cbor_item_t *item = NULL, **v;
+	char *pin = NULL;
 	int ok = 1;
 
-	memset(&map, 0, sizeof(map));
 	dev = open_dev(path);
-	if (map_known_rps(dev, path, &map) < 0 ||
+	if (known_rps(dev, path, &pin) == NULL ||
 	    (item = get_cbor_array(dev)) == NULL)
 		goto out;
 	if (cbor_array_size(item) == 0) {
@@ -602,11 +1066,12 @@ blob_list(const char *path)
 		goto out;
 	}
 	for (size_t i = 0; i < cbor_array_size(item); i++)
-		print_blob_entry(i, v[i], &map);
+		print_blob_entry(i, v[i], &session_map);
 
 	ok = 0; /* success */
 out:
-	free_rkmap(&map);
+	freezero(pin, PINBUF_LEN);
+	free_rkmap(&session_map);
 
 	if (item != NULL)
 		cbor_decref(&item);
@@ -434,6 +434,10 @@ token_info(int argc, char **argv, char *path)
 
 	bio_info(dev);
 
+	/* print transport retries performed by the commands above */
+	printf("io retries: %llu\n",
+	    (unsigned long long)fido_dev_io_retries(dev));
+
 	fido_cbor_info_free(&ci);
 end:
 	fido_dev_close(dev);
@@ -509,13 +513,16 @@ token_set(int argc, char **argv, char *path)
 	char	*display_name = NULL;
 	char	*name = NULL;
 	char	*rpid = NULL;
+	char	*level = NULL;
 	char* pin2 = NULL; // New variable for the PIN
 	int	 blob = 0;
+	int	 batch = 0;
 	int	 cred = 0;
 	int	 ch;
 	int	 enroll = 0;
 	int	 ea = 0;
 	int	 uv = 0;
+	bool	 dryrun = false;
 	bool	 force = false;
 
 	optind = 1;
@@ -555,9 +562,18 @@ token_set(int argc, char **argv, char *path)
 		case 'n':
 			name = optarg;
 			break;
+		case 't':
+			batch = 1;
+			break;
 		case 'u':
 			uv = 1;
 			break;
+		case 'x':
+			dryrun = true;
+			break;
+		case 'z':
+			level = optarg;
+			break;
 		case 'P': // New case for the PIN
 			pin2 = argv[3];
 			break;			
@@ -575,10 +591,20 @@ token_set(int argc, char **argv, char *path)
 	if (blob) {
 		if (argc != 2)
 			usage();
-		return (blob_set(path, key, name, id, argv[0]));
+		if (batch) {
+			if (key || name || id)
+				usage();
+			return (blob_batch(path, argv[0], level));
+		}
+		return (blob_set(path, key, name, id, argv[0], level));
 	}
 
 	if (cred) {
+		if (batch) {
+			if (argc != 2 || id || key || name || display_name)
+				usage();
+			return (credman_update_batch(path, argv[0]));
+		}
 		if (!id || !key)
 			usage();
 		if (!name && !display_name)
@@ -602,14 +628,11 @@ token_set(int argc, char **argv, char *path)
 		return (config_entattest(path));
 	}
 
-	if (len)
-		return (config_pin_minlen(path, len));
-	if (rpid)
-		return (config_pin_minlen_rpid(path, rpid));
-	if (force)
-		return (config_force_pin_change(path));
-	if (uv)
-		return (config_always_uv(path, 1));
+	if (len || rpid || force || uv)
+		return (config_plan(path, uv ? 1 : -1, len, rpid, force,
+		    dryrun));
+	if (dryrun)
+		usage();
 
 		// Use pin_set2 if a PIN is provided, otherwise fallback to pin_set
 	if (pin2 != NULL) {
@@ -699,6 +722,7 @@ token_delete(int argc, char **argv, char *path)
 	int		 ch;
 	int		 enroll = 0;
 	int		 uv = 0;
+	bool		 dryrun = false;
 
 	optind = 1;
 
@@ -722,6 +746,9 @@ token_delete(int argc, char **argv, char *path)
 		case 'u':
 			uv = 1;
 			break;
+		case 'x':
+			dryrun = true;
+			break;
 		default:
 			break; /* ignore */
 		}
@@ -744,5 +771,5 @@ token_delete(int argc, char **argv, char *path)
 	if (uv == 0)
 		usage();
 
-	return (config_always_uv(path, 0));
+	return (config_plan(path, 0, NULL, NULL, false, dryrun));
 }
@@ -175,11 +175,39 @@ fido_dev_t *
 open_dev(const char *path)
 {
 	fido_dev_t *dev;
-	int r;
+	const char *env;
+	int r, retries = IO_RETRIES, flags = 0;
 
 	if ((dev = fido_dev_new()) == NULL)
 		errx(1, "fido_dev_new");
 
+	/* retry idempotent commands on transient busy/lost responses */
+	if ((env = getenv("FIDO2_IO_RETRIES")) != NULL &&
+	    (retries = base10(env)) < 0)
+		errx(1, "FIDO2_IO_RETRIES: invalid value");
+	if ((r = fido_dev_set_retry_policy(dev, retries,
+	    IO_RETRY_MS)) != FIDO_OK)
+		errx(1, "fido_dev_set_retry_policy: %s", fido_strerr(r));
+
+	/* record the session, or replay a recorded one instead of 'path' */
+	if ((env = getenv("FIDO2_TRACE")) != NULL &&
+	    (r = fido_dev_set_trace(dev, env)) != FIDO_OK)
+		errx(1, "fido_dev_set_trace: %s", fido_strerr(r));
+	/*
+	 * confirm a cached large-blob array by its digest, one round trip;
+	 * a directory keeps a copy per authenticator
+	 */
+	if ((env = getenv("FIDO2_LARGEBLOB_CACHE")) != NULL &&
+	    (r = fido_dev_set_largeblob_cache(dev, env)) != FIDO_OK)
+		errx(1, "fido_dev_set_largeblob_cache: %s", fido_strerr(r));
+	if ((env = getenv("FIDO2_REPLAY")) != NULL) {
+		if (getenv("FIDO2_REPLAY_REALTIME") != NULL)
+			flags |= FIDO_REPLAY_REALTIME;
+		if ((r = fido_dev_set_replay(dev, flags)) != FIDO_OK)
+			errx(1, "fido_dev_set_replay: %s", fido_strerr(r));
+		path = env;
+	}
+
 	r = fido_dev_open(dev, path);
 	if (r != FIDO_OK)
 		errx(1, "fido_dev_open %s: %s", path, fido_strerr(r));